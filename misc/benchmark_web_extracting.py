@@ -0,0 +1,88 @@
+"""Benchmark web page extraction, BeautifulSoup against the single pass parser backends.
+
+Usage: `python misc/benchmark_web_extracting.py [DIR] [--rounds N]`, with `source` on the PYTHONPATH.
+
+Parses the saved `*.html` pages in DIR, `misc/test_files` by default. If there aren't any, synthetic docs site pages
+are generated instead so the comparison still runs.
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from bs4 import BeautifulSoup
+from docq.data_source.support.html_parsing import LxmlHtmlParser, PythonHtmlParser
+from docq.data_source.support.web_extracting import BaseTextExtractor, GenericTextExtractor
+
+PAGE_URL = "https://docs.example.com/guide/page.html"
+
+
+def _synthetic_pages(count: int = 50) -> List[str]:
+    pages = []
+    for i in range(count):
+        nav = "".join(f'<li><a class="reference internal" href="/guide/{j}.html">Page {j}</a></li>' for j in range(150))
+        body = "".join(
+            f"<h3>Section {j}</h3><p>Paragraph {j} of page {i} with <a href='#s{j}'>a link</a> and <code>code</code>"
+            " and some more text so it's about as long as a paragraph in real documentation.</p>"
+            for j in range(60)
+        )
+        pages.append(
+            f"<!DOCTYPE html><html><head><title>Page {i}</title><link rel='canonical' href='/guide/{i}.html'>"
+            "<script>window.dataLayer = [];</script><style>body { margin: 0; }</style></head>"
+            f"<body><nav><ul>{nav}</ul></nav><div role='main'><h1>Page {i}</h1><h2>Subtitle</h2>{body}</div>"
+            "<footer><p>Copyright</p></footer></body></html>"
+        )
+    return pages
+
+
+def _legacy_extract(extractor: BaseTextExtractor, html: str) -> None:
+    soup = BeautifulSoup(html, "html.parser")
+    extractor.extract_text(soup, PAGE_URL)
+    extractor.extract_title(soup)
+    extractor.extract_subtitle(soup)
+    extractor.extract_links(soup, PAGE_URL, PAGE_URL)
+    soup.find("link", rel="canonical", href=True)
+
+
+def _pages_per_second(extract: Callable[[str], None], pages: List[str], rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for html in pages:
+            extract(html)
+    return rounds * len(pages) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """Run the benchmark."""
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("dir", nargs="?", default=Path(__file__).parent / "test_files", type=Path)
+    arg_parser.add_argument("--rounds", default=3, type=int)
+    args = arg_parser.parse_args()
+
+    pages = [path.read_text(errors="replace") for path in sorted(args.dir.glob("*.html"))]
+    if not pages:
+        print(f"No *.html pages in {args.dir}, using synthetic pages")  # noqa: T201
+        pages = _synthetic_pages()
+    print(f"{len(pages)} pages, {sum(map(len, pages)) // 1024} KiB, {args.rounds} rounds")  # noqa: T201
+
+    extractor = GenericTextExtractor(parser=PythonHtmlParser())
+    candidates = {
+        "beautifulsoup": lambda html: _legacy_extract(extractor, html),
+        "python": lambda html: extractor.extract_page(html, PAGE_URL),
+    }
+    try:
+        lxml_extractor = GenericTextExtractor(parser=LxmlHtmlParser())
+        candidates["lxml"] = lambda html: lxml_extractor.extract_page(html, PAGE_URL)
+    except ImportError:
+        print("lxml isn't installed, skipping it")  # noqa: T201
+
+    baseline = None
+    for name, extract in candidates.items():
+        rate = _pages_per_second(extract, pages, args.rounds)
+        baseline = baseline or rate
+        print(f"{name:>14}: {rate:8.1f} pages/s  {rate / baseline:5.1f}x")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
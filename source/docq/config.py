@@ -24,6 +24,24 @@ ENV_VAR_DOCQ_SLACK_CLIENT_ID = "DOCQ_SLACK_CLIENT_ID"
 ENV_VAR_DOCQ_SLACK_CLIENT_SECRET = "DOCQ_SLACK_CLIENT_SECRET"  # noqa: S105
 ENV_VAR_DOCQ_SLACK_SIGNING_SECRET = "DOCQ_SLACK_SIGNING_SECRET"  # noqa: S105
 
+ENV_VAR_DOCQ_INDEX_CACHE_MAX_ENTRIES = "DOCQ_INDEX_CACHE_MAX_ENTRIES"
+ENV_VAR_DOCQ_INDEX_CACHE_MAX_BYTES = "DOCQ_INDEX_CACHE_MAX_BYTES"
+ENV_VAR_DOCQ_RETRIEVAL_MAX_WORKERS = "DOCQ_RETRIEVAL_MAX_WORKERS"
+ENV_VAR_DOCQ_RESPONSE_CACHE_ENABLED = "DOCQ_RESPONSE_CACHE_ENABLED"
+ENV_VAR_DOCQ_RESPONSE_CACHE_SIMILARITY_THRESHOLD = "DOCQ_RESPONSE_CACHE_SIMILARITY_THRESHOLD"
+ENV_VAR_DOCQ_RESPONSE_CACHE_TTL_SECONDS = "DOCQ_RESPONSE_CACHE_TTL_SECONDS"
+ENV_VAR_DOCQ_RESPONSE_CACHE_MAX_ENTRIES = "DOCQ_RESPONSE_CACHE_MAX_ENTRIES"
+ENV_VAR_DOCQ_EMBEDDING_CACHE_ENABLED = "DOCQ_EMBEDDING_CACHE_ENABLED"
+ENV_VAR_DOCQ_EMBEDDING_CACHE_MAX_ENTRIES = "DOCQ_EMBEDDING_CACHE_MAX_ENTRIES"
+ENV_VAR_DOCQ_EMBEDDING_CACHE_MAX_DISK_ENTRIES = "DOCQ_EMBEDDING_CACHE_MAX_DISK_ENTRIES"
+ENV_VAR_DOCQ_INDEXING_MAX_WORKERS = "DOCQ_INDEXING_MAX_WORKERS"
+ENV_VAR_DOCQ_SYNC_MAX_CONCURRENT = "DOCQ_SYNC_MAX_CONCURRENT"
+ENV_VAR_DOCQ_EXTRACTION_MAX_WORKERS = "DOCQ_EXTRACTION_MAX_WORKERS"
+ENV_VAR_DOCQ_EXTRACTION_TIMEOUT_SECONDS = "DOCQ_EXTRACTION_TIMEOUT_SECONDS"
+ENV_VAR_DOCQ_DOWNLOAD_MAX_CONCURRENCY = "DOCQ_DOWNLOAD_MAX_CONCURRENCY"
+ENV_VAR_DOCQ_CRAWL_MAX_CONCURRENCY = "DOCQ_CRAWL_MAX_CONCURRENCY"
+ENV_VAR_DOCQ_HTML_PARSER = "DOCQ_HTML_PARSER"
+
 
 class SpaceType(Enum):
     """Space types. These reflect scope of data access."""
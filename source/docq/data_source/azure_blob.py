@@ -3,14 +3,15 @@
 import logging as log
 import os
 from datetime import datetime
-from typing import List
+from typing import Iterator, List, Optional
 from urllib.parse import urlparse
 
 from llama_index.core.schema import Document
 
 from ..domain import ConfigKey, SpaceKey
 from ..support.store import get_index_dir
-from .main import DocumentMetadata, SpaceDataSourceFileBased
+from .main import DocumentMetadata, DocumentSync, SpaceDataSourceFileBased
+from .support.manifest import SyncManifest
 from .support.opendal_reader.base import OpendalReader
 
 
@@ -45,7 +46,23 @@ class AzureBlob(SpaceDataSourceFileBased):
 
     def load(self, space: SpaceKey, configs: dict) -> List[Document]:
         """Load the documents from azure blob container."""
+        return list(self.iter_documents(space, configs))
+
+    def iter_documents(self, space: SpaceKey, configs: dict) -> Iterator[Document]:
+        """Yield the documents from azure blob container, downloading and extracting one file at a time."""
+        yield from self._iter_documents(space, configs)
+
+    def sync_documents(
+        self, space: SpaceKey, configs: dict, incremental: bool = False
+    ) -> tuple[Iterator[Document], DocumentSync]:
+        """Yield the documents of blobs that changed since the last sync, when `incremental`."""
+        return self._sync_with_manifest(
+            space, incremental, lambda manifest: self._iter_documents(space, configs, manifest)
+        )
 
+    def _iter_documents(
+        self, space: SpaceKey, configs: dict, manifest: Optional[SyncManifest] = None
+    ) -> Iterator[Document]:
         def lambda_metadata(x: str) -> dict:
             return {
                 str(DocumentMetadata.FILE_PATH.name).lower(): x,
@@ -78,14 +95,13 @@ class AzureBlob(SpaceDataSourceFileBased):
         loader = OpendalReader(
             scheme="azblob",
             file_metadata=lambda_metadata,
+            manifest=manifest,
             **options,
         )
 
-        documents = loader.load_data()
+        yield from loader.iter_data()
 
         file_list = loader.get_document_list()
         log.debug("Number of files: %s", len(file_list))
         persist_path = get_index_dir(space)
         self._save_document_list(file_list, persist_path, self._DOCUMENT_LIST_FILENAME)
-
-        return documents
@@ -3,14 +3,15 @@ import json
 import logging as log
 import os
 from datetime import datetime
-from typing import Any, List, Self
+from typing import Any, Iterator, List, Optional, Self
 
 from llama_index.core.schema import Document
 
 from .. import services
 from ..domain import ConfigKey, SpaceKey
 from ..support.store import get_index_dir
-from .main import DocumentMetadata, FileStorageServiceKeys, SpaceDataSourceFileBased
+from .main import DocumentMetadata, DocumentSync, FileStorageServiceKeys, SpaceDataSourceFileBased
+from .support.manifest import SyncManifest
 from .support.opendal_reader.base import GoogleDriveReader, OpendalReader
 
 
@@ -63,7 +64,23 @@ class GDrive(SpaceDataSourceFileBased):
 
     def load(self: Self, space: SpaceKey, configs: dict) -> list[Document] | None:
         """Load the documents from google drive."""
+        return list(self.iter_documents(space, configs))
 
+    def iter_documents(self: Self, space: SpaceKey, configs: dict) -> Iterator[Document]:
+        """Yield the documents from google drive, downloading and extracting one file at a time."""
+        yield from self._iter_documents(space, configs)
+
+    def sync_documents(
+        self: Self, space: SpaceKey, configs: dict, incremental: bool = False
+    ) -> tuple[Iterator[Document], DocumentSync]:
+        """Yield the documents of files in google drive that changed since the last sync, when `incremental`."""
+        return self._sync_with_manifest(
+            space, incremental, lambda manifest: self._iter_documents(space, configs, manifest)
+        )
+
+    def _iter_documents(
+        self: Self, space: SpaceKey, configs: dict, manifest: Optional[SyncManifest] = None
+    ) -> Iterator[Document]:
         def lambda_metadata(x: str) -> dict:
             return {
                 str(DocumentMetadata.FILE_PATH.name).lower(): x,
@@ -87,20 +104,21 @@ class GDrive(SpaceDataSourceFileBased):
             loader = OpendalReader(
                 scheme="gdrive",
                 file_metadata=lambda_metadata,
+                manifest=manifest,
                 **options,
             )
         except Exception as e:
             log.error("Failed to load google drive with opendal reader: %s", e)
             loader = GoogleDriveReader(
                 file_metadata=lambda_metadata,
+                manifest=manifest,
                 root=root_path["name"],
                 access_token=configs[self.credential],
                 selected_folder_id=root_path["id"]
             )
 
-        documents = loader.load_data()
+        yield from loader.iter_data()
         file_list = loader.get_document_list()
         log.debug("Loaded %s documents from google drive", len(file_list))
         persist_path = get_index_dir(space)
         self._save_document_list(file_list, persist_path, self._DOCUMENT_LIST_FILENAME)
-        return documents
@@ -1,9 +1,10 @@
 """Data source for scrapping articles from a knowledge base."""
 
-from typing import List
+from typing import List, Optional
 
 from ..domain import ConfigKey, SpaceKey
 from .main import DocumentMetadata
+from .support.manifest import SyncManifest
 from .support.web_extracting import BeautifulSoupWebReader, GenericKnowledgeBaseExtractor, GenericTextExtractor
 from .web_scraper import WebScraper
 
@@ -31,7 +32,9 @@ class KnowledgeBaseScraper(WebScraper):
         )
         return keys
 
-    def _initiate_web_reader(self, space: SpaceKey, configs: dict) -> BeautifulSoupWebReader:
+    def _initiate_web_reader(
+        self, space: SpaceKey, configs: dict, manifest: Optional[SyncManifest] = None
+    ) -> BeautifulSoupWebReader:
         """Initialize the web reader."""
 
         def lambda_metadata(x: str) -> dict:
@@ -51,4 +54,5 @@ class KnowledgeBaseScraper(WebScraper):
                 ),
             },
             lambda_metadata,
+            manifest=manifest,
         )
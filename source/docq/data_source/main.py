@@ -4,15 +4,16 @@ import json
 import logging as log
 import os
 from abc import ABC, abstractmethod
-from dataclasses import asdict
+from dataclasses import asdict, dataclass, field
 from enum import Enum
-from typing import List, Self
+from typing import Callable, Iterator, List, Self, Set
 
 from llama_index.core.schema import Document
 from opentelemetry import trace
 
 from ..domain import ConfigKey, DocumentListItem, SpaceKey
 from ..support.store import get_index_dir
+from .support.manifest import SyncManifest, load_manifest, save_manifest
 
 
 class DocumentMetadata(Enum):
@@ -39,6 +40,26 @@ class FileStorageServiceKeys(Enum):
 trace = trace.get_tracer("docq.api.data_source")
 
 
+@dataclass
+class DocumentSync:
+    """What a data source found while streaming documents for a reindex.
+
+    Filled in as the documents are iterated so only complete once they've all been consumed.
+    """
+
+    is_incremental: bool = False
+    """True if only documents of sources that changed since the last sync were yielded."""
+    unchanged_sources: Set[str] = field(default_factory=set)
+    """Source URIs skipped because they're unchanged. Their documents must be kept in the index."""
+    deleted_sources: Set[str] = field(default_factory=set)
+    """Source URIs that were in the last sync but are gone. Their documents must be removed from the index."""
+    on_commit: Callable[[], None] = lambda: None
+
+    def commit(self: Self) -> None:
+        """Record the sync as done, e.g. save the manifest. Call once the index has been persisted."""
+        self.on_commit()
+
+
 class SpaceDataSource(ABC):
     """Abstract definition of the data source for a space. To be extended by concrete data sources."""
 
@@ -66,6 +87,23 @@ class SpaceDataSource(ABC):
         """Load the documents from the data source."""
         pass
 
+    def iter_documents(self: Self, space: SpaceKey, configs: dict) -> Iterator[Document]:
+        """Yield the documents from the data source one at a time so the whole corpus is never held in memory.
+
+        Data sources that can stream override this. The default falls back to `load()`.
+        """
+        yield from self.load(space, configs) or []
+
+    def sync_documents(
+        self: Self, space: SpaceKey, configs: dict, incremental: bool = False
+    ) -> tuple[Iterator[Document], DocumentSync]:
+        """Stream the documents to reindex a space.
+
+        Data sources that keep a manifest override this to only yield the documents of sources that changed since the
+        last sync when `incremental`. The default yields every document, see `iter_documents()`.
+        """
+        return self.iter_documents(space, configs), DocumentSync()
+
     @abstractmethod
     @trace.start_as_current_span("SpaceDataSource.get_document_list")
     def get_document_list(self: Self, space: SpaceKey, configs: dict) -> List[DocumentListItem]:
@@ -91,6 +129,39 @@ class SpaceDataSourceFileBased(SpaceDataSource):
         persist_path = get_index_dir(space)
         return self._load_document_list(persist_path, self._DOCUMENT_LIST_FILENAME)
 
+    def _sync_with_manifest(
+        self: Self,
+        space: SpaceKey,
+        incremental: bool,
+        iter_documents: Callable[[SyncManifest], Iterator[Document]],
+    ) -> tuple[Iterator[Document], DocumentSync]:
+        """Implement `sync_documents()` with a manifest of the files synced, persisted next to the document list.
+
+        Args:
+            space: The space being synced.
+            incremental: Skip files that are unchanged since the last committed sync. Done only if there's a manifest.
+            iter_documents: Yields the documents of the files that changed, checking each against the manifest.
+        """
+        persist_path = get_index_dir(space)
+        manifest = SyncManifest(load_manifest(persist_path) if incremental else None)
+        sync = DocumentSync(
+            is_incremental=manifest.is_incremental,
+            unchanged_sources=manifest.unchanged_sources,
+            on_commit=lambda: save_manifest(manifest.current, persist_path),
+        )
+
+        def _documents() -> Iterator[Document]:
+            yield from iter_documents(manifest)
+            sync.deleted_sources.update(manifest.deleted_sources)
+            log.info(
+                "Synced %s files. %s unchanged, %s deleted",
+                len(manifest.current),
+                len(manifest.unchanged_sources),
+                len(sync.deleted_sources),
+            )
+
+        return _documents(), sync
+
     @trace.start_as_current_span("SpaceDataSourceFileBased._save_document_list")
     def _save_document_list(self: Self, document_list: List[DocumentListItem], persist_path: str, filename: str) -> None:
         path = os.path.join(persist_path, filename)
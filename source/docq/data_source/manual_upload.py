@@ -2,7 +2,7 @@
 
 import os
 from datetime import datetime
-from typing import List
+from typing import Iterator, List
 
 from llama_index.core.readers import SimpleDirectoryReader
 from llama_index.core.schema import Document
@@ -25,6 +25,10 @@ class ManualUpload(SpaceDataSourceFileBased):
 
     def load(self, space: SpaceKey, configs: dict) -> List[Document]:
         """Load the documents from manual upload."""
+        return list(self.iter_documents(space, configs))
+
+    def iter_documents(self, space: SpaceKey, configs: dict) -> Iterator[Document]:
+        """Yield the documents from manual upload, reading one file at a time."""
 
         # Keep filename as `doc_id` plus space info
         def lambda_metadata(x: str) -> dict:
@@ -39,7 +43,7 @@ class ManualUpload(SpaceDataSourceFileBased):
                 "file_name": os.path.basename(x),
             }
 
-        _documents = SimpleDirectoryReader(input_dir=get_upload_dir(space), file_metadata=lambda_metadata, exclude_hidden=False).load_data()
+        reader = SimpleDirectoryReader(input_dir=get_upload_dir(space), file_metadata=lambda_metadata, exclude_hidden=False)
 
         pdfreader_metadata_keys = ["page_label", "file_name"]
         exclude_embed_metadata_keys_ = [
@@ -68,7 +72,10 @@ class ManualUpload(SpaceDataSourceFileBased):
         #     documents_[i].excluded_embed_metadata_keys = exclude_embed_metadata_keys_
         #     documents_[i].excluded_llm_metadata_keys = excluded_llm_metadata_keys_
 
-        return self._add_exclude_metadata_keys(_documents, exclude_embed_metadata_keys_, excluded_llm_metadata_keys_)
+        for _documents in reader.iter_data():
+            yield from self._add_exclude_metadata_keys(
+                _documents, exclude_embed_metadata_keys_, excluded_llm_metadata_keys_
+            )
 
     def get_document_list(self, space: SpaceKey, configs: dict) -> List[DocumentListItem]:
         """Returns a list of tuples containing the name, creation time, and size (Mb) of each document in the specified space's configured data source.
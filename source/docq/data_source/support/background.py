@@ -0,0 +1,68 @@
+"""Bridge async producers, e.g. concurrent downloads, to the blocking iterators the data sources return."""
+
+import asyncio
+import functools
+import queue
+import threading
+from contextlib import suppress
+from typing import Any, AsyncIterator, Callable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+def _put_until_stopped(items: queue.Queue, stop: threading.Event, item: tuple[bool, Any]) -> bool:
+    """Put an item on the queue once there's room. False if the consumer stopped first."""
+    while not stop.is_set():
+        with suppress(queue.Full):
+            items.put(item, timeout=0.1)
+            return True
+    return False
+
+
+def _produce(agen_factory: Callable[[], AsyncIterator[T]], put: Callable[[tuple[bool, Any]], bool]) -> None:
+    """Run the async generator on a new event loop, passing `put` each item then an end marker or the error raised."""
+
+    async def _items() -> None:
+        async for item in agen_factory():
+            # put off the event loop so work in flight keeps going while the consumer catches up.
+            if not await asyncio.to_thread(put, (True, item)):
+                return
+
+    try:
+        asyncio.run(_items())
+        put((False, None))
+    except BaseException as e:  # noqa: B036
+        put((False, e))
+
+
+def _consume(items: queue.Queue) -> Iterator[Any]:
+    """Yield the items `_produce()` puts on the queue until its end marker, re-raising the error it ended with."""
+    while True:
+        is_item, value = items.get()
+        if not is_item:
+            if value is not None:
+                raise value
+            return
+        yield value
+
+
+def iter_in_background(
+    agen_factory: Callable[[], AsyncIterator[T]], max_buffered: int, thread_name: str = "docq-background"
+) -> Iterator[T]:
+    """Run an async generator on its own event loop in a background thread and yield its items here.
+
+    This lets downloads or crawling carry on while the consumer extracts and indexes what's already been fetched. At
+    most `max_buffered` items wait to be consumed, which bounds the memory or disk they take up. Errors raised by the
+    generator are re-raised here. If the consumer stops early the generator is closed, cancelling work in flight.
+    """
+    items: queue.Queue = queue.Queue(maxsize=max_buffered)
+    stop = threading.Event()
+    put = functools.partial(_put_until_stopped, items, stop)
+
+    thread = threading.Thread(target=_produce, args=(agen_factory, put), name=thread_name, daemon=True)
+    thread.start()
+    try:
+        yield from _consume(items)
+    finally:
+        stop.set()
+        thread.join()
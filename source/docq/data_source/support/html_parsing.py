@@ -0,0 +1,246 @@
+"""Pluggable HTML parser backends for web extraction.
+
+Rather than building a tree and walking it once for each thing extracted, a backend streams parse events through
+`_PageCollector` which picks out the title, headings, paragraphs, main content, links and canonical URL in a single
+pass. `LxmlHtmlParser` does this with lxml's C parser. `PythonHtmlParser` uses the standard library's parser so works
+without lxml installed.
+"""
+
+import functools
+import html.parser
+import logging as log
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Callable, Collection, Dict, List, Mapping, Optional, Self, Tuple
+
+from ...config import ENV_VAR_DOCQ_HTML_PARSER
+
+_VOID_ELEMENTS = frozenset(
+    {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+)
+_NON_TEXT_ELEMENTS = frozenset({"script", "style", "template"})
+"""Elements whose content isn't page text, as for `BeautifulSoup.get_text()`."""
+
+
+@dataclass
+class ParsedPage:
+    """What was picked out of a page in one pass. Texts are the concatenated text of the first matching element."""
+
+    title: Optional[str] = None
+    """Text of <title>."""
+    h1: Optional[str] = None
+    h2: Optional[str] = None
+    main: Optional[str] = None
+    """Text of the element with `role="main"`."""
+    paragraphs: List[str] = field(default_factory=list)
+    """Text of each <p>."""
+    class_texts: Dict[str, str] = field(default_factory=dict)
+    """Text of the first element matching each class selector asked for, keyed by selector."""
+    links: List[Tuple[str, str]] = field(default_factory=list)
+    """(href, class attribute) of each <a> with a href."""
+    canonical_url: Optional[str] = None
+    """href of <link rel="canonical">, as written."""
+
+
+def class_matches(selector: str, class_attr: Optional[str]) -> bool:
+    """Match a class attribute like BeautifulSoup's `class_=` does.
+
+    A selector with spaces must equal the whole attribute, otherwise it must be one of the classes.
+    """
+    if not class_attr:
+        return False
+    return class_attr == selector if " " in selector else selector in class_attr.split()
+
+
+class _PageCollector:
+    """Receives parse events, start/end/data/close as lxml's parser target interface, and fills in a `ParsedPage`."""
+
+    def __init__(self: Self, class_selectors: Collection[str]) -> None:
+        self._page = ParsedPage()
+        self._class_selectors = class_selectors
+        self._claimed: set = set()
+        # open elements, each with the text captures it started.
+        self._stack: List[Tuple[str, List[Tuple[List[str], Callable[[str], None]]]]] = []
+        self._active: Dict[int, List[str]] = {}
+        """Buffers of the captures open, by id as equal buffers are different captures."""
+        self._skip_depth = 0
+
+    def _capture_first(self: Self, key: Any, assign: Callable[[str], None], captures: list) -> None:
+        if key not in self._claimed:
+            self._claimed.add(key)
+            captures.append(([], assign))
+
+    def _set(self: Self, name: str) -> Callable[[str], None]:
+        return lambda text: setattr(self._page, name, text)
+
+    def start(self: Self, tag: str, attrib: Mapping[str, Optional[str]], nsmap: Any = None) -> None:
+        tag = tag.lower()
+        if tag in _VOID_ELEMENTS:
+            self._start_void(tag, attrib)
+            return
+        if tag == "a" and attrib.get("href") is not None:
+            self._page.links.append((attrib["href"] or "", attrib.get("class") or ""))
+
+        captures = self._start_captures(tag, attrib)
+        if tag in _NON_TEXT_ELEMENTS:
+            self._skip_depth += 1
+        self._active.update((id(buffer), buffer) for buffer, _ in captures)
+        self._stack.append((tag, captures))
+
+    def _start_void(self: Self, tag: str, attrib: Mapping[str, Optional[str]]) -> None:
+        page = self._page
+        is_link = tag == "link" and page.canonical_url is None and attrib.get("href")
+        if is_link and "canonical" in (attrib.get("rel") or "").lower().split():
+            page.canonical_url = attrib["href"]
+
+    def _start_captures(
+        self: Self, tag: str, attrib: Mapping[str, Optional[str]]
+    ) -> List[Tuple[List[str], Callable[[str], None]]]:
+        """The text captures an element starts: for a <p>, the first <title>, <h1>, <h2>, main or class match."""
+        page = self._page
+        captures: List[Tuple[List[str], Callable[[str], None]]] = []
+        if tag == "p":
+            # keep paragraphs in document order, nested ones end first.
+            page.paragraphs.append("")
+            captures.append(([], functools.partial(page.paragraphs.__setitem__, len(page.paragraphs) - 1)))
+        elif tag in ("title", "h1", "h2"):
+            self._capture_first(tag, self._set(tag), captures)
+        if attrib.get("role") == "main":
+            self._capture_first("main", self._set("main"), captures)
+        for selector in self._class_selectors:
+            if (selector, "class") not in self._claimed and class_matches(selector, attrib.get("class")):
+                self._capture_first((selector, "class"), functools.partial(self._set_class_text, selector), captures)
+        return captures
+
+    def _set_class_text(self: Self, selector: str, text: str) -> None:
+        self._page.class_texts.setdefault(selector, text)
+
+    def end(self: Self, tag: str) -> None:
+        tag = tag.lower()
+        if tag in _VOID_ELEMENTS:
+            return
+        # close any elements left open inside this one, as browsers do. Stray end tags are ignored.
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                while len(self._stack) > i:
+                    self._pop()
+                return
+
+    def _pop(self: Self) -> None:
+        tag, captures = self._stack.pop()
+        if tag in _NON_TEXT_ELEMENTS:
+            self._skip_depth -= 1
+        for buffer, assign in captures:
+            del self._active[id(buffer)]
+            assign("".join(buffer))
+
+    def data(self: Self, data: str) -> None:
+        if self._skip_depth:
+            return
+        for buffer in self._active.values():
+            buffer.append(data)
+
+    def close(self: Self) -> ParsedPage:
+        while self._stack:
+            self._pop()
+        return self._page
+
+
+class HtmlParser(ABC):
+    """A parser backend that extracts a `ParsedPage` from HTML in a single pass."""
+
+    name: str
+
+    @abstractmethod
+    def parse(self: Self, html: str, class_selectors: Collection[str] = ()) -> ParsedPage:
+        """Parse a page.
+
+        Args:
+            html: The page.
+            class_selectors: Class selectors, BeautifulSoup `class_=` style, whose first element's text to collect.
+        """
+
+
+class PythonHtmlParser(HtmlParser):
+    """Parses with the standard library's `html.parser`. Always available, slower than lxml."""
+
+    name = "python"
+
+    class _EventParser(html.parser.HTMLParser):
+        def __init__(self: Self, collector: _PageCollector) -> None:
+            super().__init__(convert_charrefs=True)
+            self._collector = collector
+
+        def handle_starttag(self: Self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+            self._collector.start(tag, dict(attrs))
+
+        def handle_startendtag(self: Self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+            self._collector.start(tag, dict(attrs))
+            self._collector.end(tag)
+
+        def handle_endtag(self: Self, tag: str) -> None:
+            self._collector.end(tag)
+
+        def handle_data(self: Self, data: str) -> None:
+            self._collector.data(data)
+
+    def parse(self: Self, html: str, class_selectors: Collection[str] = ()) -> ParsedPage:
+        """Parse a page with `html.parser`. See `HtmlParser` for the arguments."""
+        collector = _PageCollector(class_selectors)
+        parser = self._EventParser(collector)
+        parser.feed(html)
+        parser.close()
+        return collector.close()
+
+
+class LxmlHtmlParser(HtmlParser):
+    """Parses with lxml's C parser, streaming events to the collector without building a tree.
+
+    Raises:
+        ImportError: If lxml isn't installed.
+    """
+
+    name = "lxml"
+
+    def __init__(self: Self) -> None:
+        """Initialise the parser."""
+        try:
+            from lxml import etree
+        except ImportError as e:
+            raise ImportError("lxml is not installed. Please install it by running `pip install lxml`.") from e
+        self._etree = etree
+
+    def parse(self: Self, html: str, class_selectors: Collection[str] = ()) -> ParsedPage:
+        """Parse a page with lxml. See `HtmlParser` for the arguments."""
+        collector = _PageCollector(class_selectors)
+        if not html.strip():
+            return collector.close()
+        parser = self._etree.HTMLParser(target=collector)
+        parser.feed(html)
+        return parser.close()
+
+
+_default_parser: Optional[HtmlParser] = None
+
+
+def get_html_parser(name: Optional[str] = None) -> HtmlParser:
+    """Get a parser backend by name, `lxml` or `python`.
+
+    Defaults to `DOCQ_HTML_PARSER`, or lxml if it's installed and the standard library parser if not.
+    """
+    global _default_parser
+    name = name or os.environ.get(ENV_VAR_DOCQ_HTML_PARSER)
+    if name == PythonHtmlParser.name:
+        return PythonHtmlParser()
+    if name == LxmlHtmlParser.name:
+        return LxmlHtmlParser()
+    if name:
+        raise ValueError(f"Unknown HTML parser '{name}', expected '{LxmlHtmlParser.name}' or '{PythonHtmlParser.name}'")
+    if _default_parser is None:
+        try:
+            _default_parser = LxmlHtmlParser()
+        except ImportError:
+            log.info("lxml isn't installed, parsing web pages with the slower standard library parser")
+            _default_parser = PythonHtmlParser()
+    return _default_parser
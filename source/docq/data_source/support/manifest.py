@@ -0,0 +1,222 @@
+"""Manifest of the files or web pages a data source synced, used to skip those that haven't changed since."""
+
+import hashlib
+import json
+import logging as log
+import os
+import threading
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Self, Set
+
+from ...domain import DocumentListItem
+
+MANIFEST_FILENAME = "manifest.json"
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class ManifestEntry:
+    """A file as it was when last synced."""
+
+    source_uri: str
+    """Source path of the file. Matches the `source_uri` metadata of its documents."""
+    version: Optional[str]
+    """ETag, checksum or modified time reported by the remote store or web server. None if it reports none."""
+    size: int
+    content_hash: Optional[str]
+    """SHA-256 of the downloaded file or normalised page text. None if it was never downloaded."""
+    indexed_on: int
+    last_modified: Optional[str] = None
+    """`Last-Modified` header of a web page, sent back as `If-Modified-Since`."""
+    duplicate_of: Optional[str] = None
+    """Source URI of the web page this one is a near-duplicate of. Its content isn't indexed."""
+
+
+def file_content_hash(path: str) -> str:
+    """SHA-256 of a file on disk, read in chunks."""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def load_manifest(persist_path: str) -> Optional[Dict[str, ManifestEntry]]:
+    """Load the manifest saved by the last sync, keyed by source URI. None if there isn't one."""
+    path = os.path.join(persist_path, MANIFEST_FILENAME)
+    try:
+        with open(path, "r") as f:
+            return {item["source_uri"]: ManifestEntry(**item) for item in json.load(f)}
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log.warning("Ignoring unreadable manifest '%s', doing a full sync. Error: %s", path, e)
+        return None
+
+
+def save_manifest(manifest: Dict[str, ManifestEntry], persist_path: str) -> None:
+    """Save a manifest, replacing the previous one atomically."""
+    path = os.path.join(persist_path, MANIFEST_FILENAME)
+    os.makedirs(persist_path, exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump([asdict(entry) for entry in manifest.values()], f, ensure_ascii=False)
+    os.replace(f"{path}.tmp", path)
+    log.debug("Saved data source manifest to '%s'", path)
+
+
+class SyncManifest:
+    """Tracks the files seen by a sync against the manifest of the previous sync.
+
+    Readers call `is_unchanged()` with the metadata from the listing to skip downloading files whose version and size
+    are the same as last time, then `add_downloaded()` for the rest to skip extracting files whose content is the same.
+    """
+
+    def __init__(self: Self, previous: Optional[Dict[str, ManifestEntry]] = None) -> None:
+        """Initialise.
+
+        Args:
+            previous: The manifest of the last sync. None for a full sync, where every file is downloaded and extracted.
+        """
+        self.is_incremental = previous is not None
+        self.previous = previous or {}
+        self.current: Dict[str, ManifestEntry] = {}
+        """Every file seen by this sync, changed or not. Saved as the manifest once the sync is complete."""
+        self.unchanged_sources: Set[str] = set()
+        """Source URIs of files skipped because they haven't changed. Their documents must be kept in the index."""
+        self._versions: Dict[str, Optional[str]] = {}
+        # listing and downloads run in threads.
+        self._lock = threading.Lock()
+
+    def is_unchanged(self: Self, source_uri: str, version: Optional[str], size: int) -> bool:
+        """Check a listed file against the previous sync. Returns True if it needn't be downloaded."""
+        with self._lock:
+            self._versions[source_uri] = version
+            previous = self.previous.get(source_uri)
+            if previous is None or version is None or previous.version != version or previous.size != size:
+                return False
+            self.current[source_uri] = previous
+            self.unchanged_sources.add(source_uri)
+            return True
+
+    def add_downloaded(self: Self, downloaded_file: tuple[str, str, int, int]) -> bool:
+        """Record a downloaded file. Returns False if its content is the same as last sync so needn't be extracted.
+
+        Args:
+            downloaded_file: a tuple (source path, local path, indexed_on, size) as returned by the download functions.
+        """
+        source_uri, local_path, indexed_on, size = downloaded_file
+        return self.add_content(source_uri, file_content_hash(local_path), size, indexed_on)
+
+    def add_content(
+        self: Self,
+        source_uri: str,
+        content_hash: str,
+        size: int,
+        indexed_on: int,
+        version: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> bool:
+        """Record fetched content. Returns False if it's the same as last sync so needn't be indexed again.
+
+        Args:
+            source_uri: Source path of the file or URL of the page.
+            content_hash: Hash of the content, see `file_content_hash()`.
+            size: Size in bytes.
+            indexed_on: Timestamp it was fetched. Kept from the last sync if the content is the same.
+            version: ETag or the like. Defaults to the version seen by `is_unchanged()` when listing.
+            last_modified: `Last-Modified` header of a web page.
+        """
+        with self._lock:
+            previous = self.previous.get(source_uri)
+            unchanged = previous is not None and previous.content_hash == content_hash
+            self.current[source_uri] = ManifestEntry(
+                source_uri=source_uri,
+                version=version or self._versions.get(source_uri),
+                size=size,
+                content_hash=content_hash,
+                indexed_on=previous.indexed_on if previous and unchanged else indexed_on,
+                last_modified=last_modified,
+            )
+            if unchanged:
+                self.unchanged_sources.add(source_uri)
+            return not unchanged
+
+    def add_duplicate(
+        self: Self,
+        source_uri: str,
+        duplicate_of: str,
+        content_hash: Optional[str],
+        size: int,
+        indexed_on: int,
+        version: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        """Record a web page collapsed into a near-duplicate, so it's fetched conditionally next time but not indexed.
+
+        Args:
+            source_uri: URL of the page.
+            duplicate_of: URL of the page that's indexed instead.
+            content_hash: Hash of the normalised page text.
+            size: Size in bytes.
+            indexed_on: Timestamp it was fetched.
+            version: ETag of the page.
+            last_modified: `Last-Modified` header of the page.
+        """
+        with self._lock:
+            self.current[source_uri] = ManifestEntry(
+                source_uri=source_uri,
+                version=version,
+                size=size,
+                content_hash=content_hash,
+                indexed_on=indexed_on,
+                last_modified=last_modified,
+                duplicate_of=duplicate_of,
+            )
+            self.unchanged_sources.discard(source_uri)
+
+    def conditional_headers(self: Self, source_uri: str) -> Dict[str, str]:
+        """HTTP headers to fetch a web page with so the server only sends it if it changed since the last sync."""
+        previous = self.previous.get(source_uri)
+        headers = {}
+        if previous is not None and previous.version:
+            headers["If-None-Match"] = previous.version
+        if previous is not None and previous.last_modified:
+            headers["If-Modified-Since"] = previous.last_modified
+        return headers
+
+    def keep_unchanged(self: Self, source_uri: str) -> Optional[ManifestEntry]:
+        """Record that a source is unchanged since the last sync, e.g. a web server said it's not modified.
+
+        Returns:
+            Its entry from the last sync, None if it wasn't in the last sync.
+        """
+        with self._lock:
+            previous = self.previous.get(source_uri)
+            if previous is not None:
+                self.current[source_uri] = previous
+                self.unchanged_sources.add(source_uri)
+            return previous
+
+    def discard(self: Self, source_uri: str) -> None:
+        """Forget a file, e.g. because it failed to extract, so it's treated as deleted and synced again next time."""
+        with self._lock:
+            self.current.pop(source_uri, None)
+            self.unchanged_sources.discard(source_uri)
+
+    @property
+    def deleted_sources(self: Self) -> Set[str]:
+        """Source URIs of files in the previous sync that are gone. Only complete once the listing is exhausted.
+
+        Web pages indexed last time that are now near-duplicates of another page count as gone.
+        """
+        indexed = {uri for uri, entry in self.current.items() if entry.duplicate_of is None}
+        return {uri for uri, entry in self.previous.items() if entry.duplicate_of is None} - indexed
+
+    def get_document_list(self: Self) -> List[DocumentListItem]:
+        """The document list for every file seen by this sync, including unchanged files that weren't downloaded."""
+        return [
+            DocumentListItem(link=entry.source_uri, indexed_on=entry.indexed_on, size=entry.size)
+            for entry in self.current.values()
+            if entry.duplicate_of is None
+        ]
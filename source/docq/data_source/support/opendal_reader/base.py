@@ -27,10 +27,35 @@ A loader that fetches a file or iterates through a directory on a object store l
 """
 import asyncio
 import logging as log
+import multiprocessing
+import os
+import random
 import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import suppress
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, Self, Type, Union, cast
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Self,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+)
 
 import opendal
 from llama_index.core.readers.base import BaseReader
@@ -46,7 +71,32 @@ from llama_index.readers.file.tabular import PandasCSVReader
 from llama_index.readers.file.video_audio import VideoAudioReader
 
 from .... import services
+from ....config import (
+    ENV_VAR_DOCQ_DOWNLOAD_MAX_CONCURRENCY,
+    ENV_VAR_DOCQ_EXTRACTION_MAX_WORKERS,
+    ENV_VAR_DOCQ_EXTRACTION_TIMEOUT_SECONDS,
+)
 from ....domain import DocumentListItem
+from ..background import iter_in_background
+from ..manifest import SyncManifest
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+DEFAULT_EXTRACTION_TIMEOUT_SECONDS = 300.0
+"""How long to wait for a single file to be extracted before skipping it."""
+
+DEFAULT_DOWNLOAD_MAX_CONCURRENCY = 8
+"""How many files are downloaded at once."""
+
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+DOWNLOAD_MAX_ATTEMPTS = 3
+DOWNLOAD_RETRY_BACKOFF_SECONDS = 1.0
+
+GDRIVE_FILE_FIELDS = (
+    "files(id, name, parents, mimeType, modifiedTime, md5Checksum, webViewLink, webContentLink, size, fullFileExtension)"
+)
+ONEDRIVE_FILE_SELECT = "id,name,file,size,webUrl,eTag,lastModifiedDateTime,@microsoft.graph.downloadUrl"
 
 DEFAULT_FILE_READER_CLS: Dict[str, Type[BaseReader]] = {
     ".pdf": PDFReader,
@@ -96,6 +146,7 @@ class OpendalReader(BaseReader):
         path: str = "/",
         file_extractor: Optional[Dict[str, Union[str, BaseReader]]] = None,
         file_metadata: Optional[Callable[[str], Dict]] = None,
+        manifest: Optional[SyncManifest] = None,
         **kwargs: Optional[dict[str, Any]],
     ) -> None:
         """Initialize opendal operator, along with credentials if needed.
@@ -108,11 +159,13 @@ class OpendalReader(BaseReader):
                 extension to a BaseReader class that specifies how to convert that file
                 to text. NOTE: this isn't implemented yet.
             file_metadata (Optional[Callable[[str], Dict]]): A function that takes a source file path and returns a dictionary of metadata to be added to the Document object.
+            manifest (Optional[SyncManifest]): Tracks files against the last sync so unchanged files are skipped. If None every file is downloaded and extracted.
             **kwargs (Optional dict[str, any]): Additional arguments to pass to the `opendal.AsyncOperator` constructor. These are the scheme (object store) specific options.
         """
         super().__init__()
         self.path = path
         self.file_metadata = file_metadata
+        self.manifest = manifest
 
         self.supported_suffix = list(DEFAULT_FILE_READER_CLS.keys())
 
@@ -124,29 +177,41 @@ class OpendalReader(BaseReader):
             self.file_extractor = {}
 
         self.documents: List[Document] = []
+        self.downloaded_files: List[tuple[str, str, int, int]] = []
 
     def load_data(self: Self) -> List[Document]:
         """Load file(s) from OpenDAL."""
+        self.documents = list(self.iter_data())
+        return self.documents
+
+    def iter_data(self: Self) -> Iterator[Document]:
+        """Download file(s) from OpenDAL concurrently and extract them in the extraction process pool.
+
+        Downloading carries on in the background while files already downloaded are extracted and their documents
+        yielded. Each file is deleted once extracted so only a few are on disk at a time. See `iter_extracted_files()`.
+        """
         # TODO: think about the private and secure aspect of this temp folder.
         # NOTE: the following code cleans up the temp folder when existing the context.
-
+        self.downloaded_files = []
         with tempfile.TemporaryDirectory() as temp_dir:
-            if not self.path.endswith("/"):
-                result = asyncio.run(download_file_from_opendal(self.async_op, temp_dir, self.path))
-                self.downloaded_files.append(result)
-            else:
-                self.downloaded_files = asyncio.run(download_dir_from_opendal(self.async_op, temp_dir, self.path))
-
-            self.documents = asyncio.run(
-                extract_files(
-                    self.downloaded_files, file_extractor=self.file_extractor, file_metadata=self.file_metadata
-                )
-            )
 
-        return self.documents
+            def _downloads() -> AsyncIterator[Optional[tuple[str, str, int, int]]]:
+                if not self.path.endswith("/"):
+                    return _aiter_one(_download_opendal_object(self.async_op, temp_dir, self.path, self.manifest))
+                return iter_dir_from_opendal(self.async_op, temp_dir, self.path, manifest=self.manifest)
+
+            downloads = iter_in_background(_downloads, max_buffered=_download_max_concurrency())
+            yield from iter_extracted_files(
+                _tracked(downloads, self.downloaded_files, self.manifest),
+                self.file_extractor,
+                self.file_metadata,
+                on_failed=_discard_from(self.manifest),
+            )
 
     def get_document_list(self: Self) -> List[DocumentListItem]:
         """Get a list of all documents in the index. A document is a list are 1:1 with a file."""
+        if self.manifest is not None:
+            return self.manifest.get_document_list()
         dl: List[DocumentListItem] = []
         try:
             for df in self.downloaded_files:
@@ -168,6 +233,7 @@ class FileStorageBaseReader(BaseReader):
         path: str = "/",
         file_extractor: Optional[Dict[str, Union[str, BaseReader]]] = None,
         file_metadata: Optional[Callable[[str], Dict]] = None,
+        manifest: Optional[SyncManifest] = None,
         **kwargs: Optional[dict[str, Any]],
         ) -> None:
         """Initialize File storage service reader.
@@ -182,6 +248,7 @@ class FileStorageBaseReader(BaseReader):
                 extension to a BaseReader class that specifies how to convert that file
                 to text. NOTE: this isn't implemented yet.
             file_metadata (Optional[Callable[[str], Dict]]): A function that takes a source file path and returns a dictionary of metadata to be added to the Document object.
+            manifest (Optional[SyncManifest]): Tracks files against the last sync so unchanged files are skipped. If None every file is downloaded and extracted.
             kwargs (Optional dict[str, any]): Additional arguments to pass to the specific file storage service.
         """
         super().__init__()
@@ -192,16 +259,24 @@ class FileStorageBaseReader(BaseReader):
         self.root = root
         self.file_metadata = file_metadata
         self.selected_folder_id = selected_folder_id
+        self.manifest = manifest
         self.documents: List[Document] = []
         self.kwargs = kwargs
         self.downloaded_files: List[tuple[str, str, int, int]] = []
 
     def load_data(self: Self) -> List[Document]:
         """Load file(s) from file storage."""
+        self.documents = list(self.iter_data())
+        return self.documents
+
+    def iter_data(self: Self) -> Iterator[Document]:
+        """Download and extract file(s) from file storage one at a time, yielding the documents of each."""
         raise NotImplementedError
 
     def get_document_list(self: Self) -> List[DocumentListItem]:
         """Get a list of all documents in the index. A document is a list are 1:1 with a file."""
+        if self.manifest is not None:
+            return self.manifest.get_document_list()
         dl: List[DocumentListItem] = []
         try:
             for df in self.downloaded_files:
@@ -224,6 +299,7 @@ class GoogleDriveReader(FileStorageBaseReader):
         path: str = "/",
         file_extractor: Optional[Dict[str, Union[str, BaseReader]]] = None,
         file_metadata: Optional[Callable[[str], Dict]] = None,
+        manifest: Optional[SyncManifest] = None,
     ) -> None:
         """Initialize Google Drive reader."""
         super().__init__(
@@ -233,29 +309,41 @@ class GoogleDriveReader(FileStorageBaseReader):
             path=path,
             file_extractor=file_extractor,
             file_metadata=file_metadata,
+            manifest=manifest,
         )
 
-    def load_data(self: Self) -> List[Document]:
-        """Load file(s) from Google Drive."""
-        service = services.google_drive.get_drive_service(self.access_token)
+    def iter_data(self: Self) -> Iterator[Document]:
+        """Download file(s) from Google Drive concurrently, yielding the documents of each once extracted."""
         id_ = self.selected_folder_id if self.selected_folder_id is not None else "root"
-        folder_content = service.files().list(
-            q=f"'{id_}' in parents and trashed=false",
-            fields="files(id, name, parents, mimeType, modifiedTime, webViewLink, webContentLink, size, fullFileExtension)",
-        ).execute()
-        files = folder_content.get("files", [])
+        # The Drive client isn't thread safe so each download thread builds its own.
+        thread_local = threading.local()
+
+        def _download(file: dict, temp_dir: str) -> Optional[tuple[str, str, int, int]]:
+            if self.manifest is not None and self.manifest.is_unchanged(
+                file.get("webViewLink", ""),
+                file.get("md5Checksum") or file.get("modifiedTime"),
+                int(file.get("size", 0)),
+            ):
+                return None
+            if not hasattr(thread_local, "service"):
+                thread_local.service = services.google_drive.get_drive_service(self.access_token)
+            return download_gdrive_file(file, temp_dir, thread_local.service)
+
+        self.downloaded_files = []
         with tempfile.TemporaryDirectory() as temp_dir:
-            self.downloaded_files = asyncio.run(
-                download_from_gdrive(files, temp_dir, service)
+            files = services.google_drive.list_files(
+                services.google_drive.get_drive_service(self.access_token), id_, GDRIVE_FILE_FIELDS
             )
-
-            self.documents = asyncio.run(
-                extract_files(
-                    self.downloaded_files, file_extractor=self.file_extractor, file_metadata=self.file_metadata
-                )
+            downloads = iter_in_background(
+                lambda: iter_downloads_in_threads(files, lambda file: _download(file, temp_dir)),
+                max_buffered=_download_max_concurrency(),
+            )
+            yield from iter_extracted_files(
+                _tracked(downloads, self.downloaded_files, self.manifest),
+                self.file_extractor,
+                self.file_metadata,
+                on_failed=_discard_from(self.manifest),
             )
-
-        return self.documents
 
 
 class OneDriveReader(FileStorageBaseReader):
@@ -269,6 +357,7 @@ class OneDriveReader(FileStorageBaseReader):
         path: str = "/",
         file_extractor: Optional[Dict[str, Union[str, BaseReader]]] = None,
         file_metadata: Optional[Callable[[str], Dict]] = None,
+        manifest: Optional[SyncManifest] = None,
     ) -> None:
         """Initialize OneDrive reader."""
         super().__init__(
@@ -278,82 +367,211 @@ class OneDriveReader(FileStorageBaseReader):
             path=path,
             file_extractor=file_extractor,
             file_metadata=file_metadata,
+            manifest=manifest,
         )
 
-    def load_data(self: Self) -> List[Document]:
-        """Load file(s) from OneDrive."""
+    def iter_data(self: Self) -> Iterator[Document]:
+        """Download file(s) from OneDrive concurrently, yielding the documents of each once extracted."""
         client = services.ms_onedrive.get_client(self.access_token)
         id_ = self.selected_folder_id if self.selected_folder_id is not None else "/drive/root:"
+
+        def _download(file: dict, temp_dir: str) -> Optional[tuple[str, str, int, int]]:
+            if self.manifest is not None and self.manifest.is_unchanged(
+                file.get("webUrl", ""), file.get("eTag") or file.get("lastModifiedDateTime"), int(file.get("size", 0))
+            ):
+                return None
+            return download_onedrive_file(file, temp_dir, client)
+
+        self.downloaded_files = []
         if client is not None:
-            response = client.files.drive_specific_folder(id_, {
-                "$select": "id,name,file,size,webUrl",
-                "$filter": "file ne null",
-                "$top": 100, # Limiting to a maximum of 100 files for now.
-            })
-            files = response.data.get("value", [])
             with tempfile.TemporaryDirectory() as temp_dir:
-                self.downloaded_files = asyncio.run(
-                    download_from_onedrive(files, temp_dir, client)
+                files = services.ms_onedrive.list_files(client, id_, ONEDRIVE_FILE_SELECT)
+                downloads = iter_in_background(
+                    lambda: iter_downloads_in_threads(files, lambda file: _download(file, temp_dir)),
+                    max_buffered=_download_max_concurrency(),
                 )
-
-                self.documents = asyncio.run(
-                    extract_files(
-                        self.downloaded_files, file_extractor=self.file_extractor, file_metadata=self.file_metadata
-                    )
+                yield from iter_extracted_files(
+                    _tracked(downloads, self.downloaded_files, self.manifest),
+                    self.file_extractor,
+                    self.file_metadata,
+                    on_failed=_discard_from(self.manifest),
                 )
-        return self.documents
 
 
-async def download_from_onedrive(files: List[dict], temp_dir: str, client: Any,) -> List[tuple[str, str, int, int]]:
-    """Download files from OneDrive."""
-    downloaded_files: List[tuple[str, str, int, int]] = []
+def _download_max_concurrency() -> int:
+    return int(os.environ.get(ENV_VAR_DOCQ_DOWNLOAD_MAX_CONCURRENCY, DEFAULT_DOWNLOAD_MAX_CONCURRENCY))
 
-    for file in files:
-        suffix = Path(file["name"]).suffix
-        if suffix not in DEFAULT_FILE_READER_CLS:
-            log.debug("file suffix not supported: %s", suffix)
-            continue
-        file_path = f"{temp_dir}/{file['name']}"
-        indexed_on = datetime.timestamp(datetime.now().utcnow())
-        await asyncio.to_thread(
-            services.ms_onedrive.download_file, client, file["id"], file_path
-        )
-        downloaded_files.append(
-            (file["webUrl"], file_path, int(indexed_on), int(file["size"]))
-        )
 
-    return downloaded_files
+def _is_transient_error(error: Exception) -> bool:
+    """Network errors, timeouts, throttling and server errors are worth retrying, other client errors aren't."""
+    status = (
+        getattr(error, "status_code", None)
+        or getattr(getattr(error, "response", None), "status_code", None)
+        or getattr(getattr(error, "resp", None), "status", None)
+    )
+    if not isinstance(status, int):
+        return True
+    return status in (408, 429) or status >= 500
 
 
-async def download_from_gdrive(files: List[dict], temp_dir: str, service: Any,) -> List[tuple[str, str, int, int]]:
-    """Download files from Google Drive."""
-    downloaded_files: List[tuple[str, str, int, int]] = []
+async def _with_retries(download: Callable[[], Awaitable[T]], description: str) -> Optional[T]:
+    """Run a download, retrying transient errors with exponential backoff.
 
-    for file in files:
-        if file["mimeType"] == "application/vnd.google-apps.folder":
-            # TODO: Implement recursive folder download
-            continue
-        suffix = FILE_MIME_EXTENSION_MAP.get(file["mimeType"], None)
-        if suffix not in DEFAULT_FILE_READER_CLS:
-            continue
+    Returns:
+        The result of `download`, or None once it fails for good. The error is logged rather than raised so one
+        file doesn't fail the whole sync.
+    """
+    for attempt in range(1, DOWNLOAD_MAX_ATTEMPTS + 1):
+        try:
+            return await download()
+        except Exception as e:
+            if attempt == DOWNLOAD_MAX_ATTEMPTS or not _is_transient_error(e):
+                log.error("Downloading '%s' failed after %s attempt(s), skipping it. Error: %r", description, attempt, e)
+                return None
+            delay = DOWNLOAD_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1) * (0.5 + random.random())  # noqa: S311
+            log.warning("Downloading '%s' failed, retrying in %.1fs. Error: %r", description, delay, e)
+            await asyncio.sleep(delay)
+    return None
+
+
+async def _iter_concurrently(
+    items: AsyncIterator[T], process: Callable[[T], Awaitable[Optional[R]]], max_concurrency: int
+) -> AsyncIterator[R]:
+    """Run `process` on items with at most `max_concurrency` in flight, yielding results as they complete.
+
+    Items are only pulled as slots free up so a long listing is consumed at the pace of the downloads. None results
+    (skipped items) aren't yielded.
+    """
+    pending: set[asyncio.Future] = set()
+    items_exhausted = False
+    try:
+        while True:
+            while not items_exhausted and len(pending) < max_concurrency:
+                try:
+                    item = await anext(items)
+                except StopAsyncIteration:
+                    items_exhausted = True
+                    break
+                pending.add(asyncio.ensure_future(process(item)))
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if result is not None:
+                    yield result
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _aiter_in_thread(iterator: Iterator[T]) -> AsyncIterator[T]:
+    """Iterate a blocking iterator, e.g. a paginated listing, without blocking the event loop."""
+    done = object()
+    while (item := await asyncio.to_thread(next, iterator, done)) is not done:
+        yield cast(T, item)
+
+
+async def iter_downloads_in_threads(
+    files: Iterable[dict],
+    download: Callable[[dict], Optional[tuple[str, str, int, int]]],
+    max_concurrency: Optional[int] = None,
+) -> AsyncIterator[tuple[str, str, int, int]]:
+    """Download files with a blocking `download` function in threads, at most `max_concurrency` at once.
 
-        file_path = f"{temp_dir}/{file['name']}"
-        indexed_on = datetime.timestamp(datetime.now().utcnow())
-        await asyncio.to_thread(
-            services.google_drive.download_file, service, file["id"], file_path, file["mimeType"]
-        )
-        downloaded_files.append(
-            (file["webViewLink"], file_path, int(indexed_on), int(file["size"]))
+    Args:
+        files: File listing. May be a lazy, paginated iterator, it's consumed in a thread.
+        download: Downloads one file and returns a tuple (source path, local path, indexed_on, size), or None to
+            skip it. Transient errors are retried, see `_with_retries()`.
+        max_concurrency: Defaults to `DOCQ_DOWNLOAD_MAX_CONCURRENCY` or 8.
+
+    Yields:
+        a tuple (source path, local path, indexed_on, size) per file, in the order downloads complete.
+    """
+
+    async def _download(file: dict) -> Optional[tuple[str, str, int, int]]:
+        return await _with_retries(lambda: asyncio.to_thread(download, file), file.get("name", ""))
+
+    async for downloaded_file in _iter_concurrently(
+        _aiter_in_thread(iter(files)), _download, max_concurrency or _download_max_concurrency()
+    ):
+        yield downloaded_file
+
+
+def _local_file_path(temp_dir: str, file: dict) -> str:
+    # Prefix the id as files in different folders, or downloaded concurrently, can share a name.
+    return f"{temp_dir}/{file['id']}_{file['name']}"
+
+
+def download_onedrive_file(file: dict, temp_dir: str, client: Any) -> Optional[tuple[str, str, int, int]]:
+    """Download a file from OneDrive. Raises on failure.
+
+    Returns:
+        a tuple (source path, local path, indexed_on, size). None if the file type isn't supported.
+    """
+    suffix = Path(file["name"]).suffix
+    if suffix not in DEFAULT_FILE_READER_CLS:
+        log.debug("file suffix not supported: %s", suffix)
+        return None
+    file_path = _local_file_path(temp_dir, file)
+    indexed_on = datetime.timestamp(datetime.now().utcnow())
+    services.ms_onedrive.download_file(
+        client, file["id"], file_path, download_url=file.get("@microsoft.graph.downloadUrl")
+    )
+    return (file["webUrl"], file_path, int(indexed_on), int(file["size"]))
+
+
+async def download_from_onedrive(
+    files: List[dict], temp_dir: str, client: Any, max_concurrency: Optional[int] = None
+) -> List[tuple[str, str, int, int]]:
+    """Download files from OneDrive, several at once."""
+    return [
+        downloaded_file
+        async for downloaded_file in iter_downloads_in_threads(
+            files, lambda file: download_onedrive_file(file, temp_dir, client), max_concurrency
         )
+    ]
 
-    return downloaded_files
+
+def download_gdrive_file(file: dict, temp_dir: str, service: Any) -> Optional[tuple[str, str, int, int]]:
+    """Download a file from Google Drive. Raises on failure.
+
+    Returns:
+        a tuple (source path, local path, indexed_on, size). None if the file is a folder or type isn't supported.
+    """
+    if file["mimeType"] == "application/vnd.google-apps.folder":
+        # TODO: Implement recursive folder download
+        return None
+    suffix = FILE_MIME_EXTENSION_MAP.get(file["mimeType"], None)
+    if suffix not in DEFAULT_FILE_READER_CLS:
+        return None
+
+    file_path = _local_file_path(temp_dir, file)
+    indexed_on = datetime.timestamp(datetime.now().utcnow())
+    services.google_drive.download_file(service, file["id"], file_path, file["mimeType"])
+    return (file["webViewLink"], file_path, int(indexed_on), int(file["size"]))
+
+
+async def download_from_gdrive(
+    files: List[dict], temp_dir: str, service: Any, max_concurrency: Optional[int] = None
+) -> List[tuple[str, str, int, int]]:
+    """Download files from Google Drive, several at once.
+
+    NOTE: the Drive client isn't thread safe. Pass `max_concurrency=1` when sharing `service`.
+    """
+    return [
+        downloaded_file
+        async for downloaded_file in iter_downloads_in_threads(
+            files, lambda file: download_gdrive_file(file, temp_dir, service), max_concurrency
+        )
+    ]
 
 
 async def download_file_from_opendal(op: Any, temp_dir: str, path: str) -> tuple[str, str, int, int]:
-    """Download file from OpenDAL.
+    """Download file from OpenDAL, streaming it to disk in chunks.
 
     Returns:
-        a tuple (source path, local path, indexed_on, size)
+        a tuple (source path, local path, indexed_on, size). The source path is the object path in the store.
     """
     import opendal
 
@@ -366,70 +584,256 @@ async def download_file_from_opendal(op: Any, temp_dir: str, path: str) -> tuple
     indexed_on = datetime.timestamp(datetime.now().utcnow())
     async with op.open_reader(path) as r:
         with open(filepath, "wb") as w:
-            b = await r.read()
-            w.write(b)
-            file_size = len(b)
+            while chunk := await r.read(DOWNLOAD_CHUNK_SIZE):
+                w.write(chunk)
+                file_size += len(chunk)
 
-    return (filepath, filepath, int(indexed_on), file_size)
+    return (path, filepath, int(indexed_on), file_size)
 
 
-async def download_dir_from_opendal(
+async def _download_opendal_object(
+    op: Any, temp_dir: str, path: str, manifest: Optional[SyncManifest] = None
+) -> Optional[tuple[str, str, int, int]]:
+    """Download an object with retries, or skip it if its ETag and size are unchanged since the last sync."""
+
+    async def _download() -> Optional[tuple[str, str, int, int]]:
+        if manifest is not None:
+            metadata = await op.stat(path)
+            if manifest.is_unchanged(path, metadata.etag, metadata.content_length):
+                return None
+        return await download_file_from_opendal(op, temp_dir, path)
+
+    return await _with_retries(_download, path)
+
+
+async def _aiter_one(coro: Awaitable[T]) -> AsyncIterator[T]:
+    yield await coro
+
+
+async def iter_dir_from_opendal(
     op: Any,
     temp_dir: str,
     download_dir: str,
-) -> List[tuple[str, str, int, int]]:
-    """Download directory from opendal.
+    max_concurrency: Optional[int] = None,
+    manifest: Optional[SyncManifest] = None,
+) -> AsyncIterator[tuple[str, str, int, int]]:
+    """Download the files in a directory from opendal, several at once.
 
     Args:
         op: opendal operator
         temp_dir: temp directory to store the downloaded files
         download_dir: directory to download
-        supported_suffix: list of supported file suffixes
-        file_extractor: A mapping of file extractors to use for specific file types.
-        file_metadata: A function that takes a file path and returns a dictionary of metadata to be added to the Document object.
+        max_concurrency: max files downloading at once. Defaults to `DOCQ_DOWNLOAD_MAX_CONCURRENCY` or 8.
+        manifest: if given, objects whose ETag and size are unchanged since the last sync aren't downloaded.
 
-    Returns:
-      a list of tuples of 'source path' and 'local path'.
+    Yields:
+      a tuple (source path, local path, indexed_on, size) per file, in the order downloads complete.
     """
     import opendal
 
     log.debug("downloading dir using OpenDAL: %s", download_dir)
-    downloaded_files: List[tuple[str, str, int, int]] = []  # (source path, local path, indexed_on, size)
     op = cast(opendal.AsyncOperator, op)
+
+    async def _download(obj: Any) -> Optional[tuple[str, str, int, int]]:
+        if obj.path.endswith("/"):
+            return None
+        return await _download_opendal_object(op, temp_dir, obj.path, manifest)
+
     objs = await op.scan(download_dir)
-    async for obj in objs:
-        src_path, local_path, indexed_on, size = await download_file_from_opendal(op, temp_dir, obj.path)
-        downloaded_files.append((src_path, local_path, indexed_on, size))  # source path, local path
+    async for downloaded_file in _iter_concurrently(objs, _download, max_concurrency or _download_max_concurrency()):
+        yield downloaded_file
 
-    return downloaded_files
+
+async def download_dir_from_opendal(
+    op: Any,
+    temp_dir: str,
+    download_dir: str,
+) -> List[tuple[str, str, int, int]]:
+    """Download directory from opendal.
+
+    Args:
+        op: opendal operator
+        temp_dir: temp directory to store the downloaded files
+        download_dir: directory to download
+
+    Returns:
+      a list of tuples (source path, local path, indexed_on, size).
+    """
+    return [downloaded_file async for downloaded_file in iter_dir_from_opendal(op, temp_dir, download_dir)]
+
+
+def _tracked(
+    downloaded_files: Iterable[Optional[tuple[str, str, int, int]]],
+    seen: List[tuple[str, str, int, int]],
+    manifest: Optional[SyncManifest] = None,
+) -> Iterator[tuple[str, str, int, int]]:
+    """Pass through downloaded files to extract, recording each in `seen` and the manifest.
+
+    None (unsupported or unchanged files) is skipped, as are files whose content is the same as in the last sync.
+    """
+    for downloaded_file in downloaded_files:
+        if downloaded_file is None:
+            continue
+        seen.append(downloaded_file)
+        if manifest is not None and not manifest.add_downloaded(downloaded_file):
+            with suppress(FileNotFoundError):
+                os.remove(downloaded_file[1])
+            continue
+        yield downloaded_file
+
+
+def _discard_from(manifest: Optional[SyncManifest]) -> Optional[Callable[[tuple[str, str, int, int]], None]]:
+    """Forget files that failed to extract so the next sync tries them again rather than skipping them as unchanged."""
+    if manifest is None:
+        return None
+    return lambda downloaded_file: manifest.discard(downloaded_file[0])
+
+
+_extraction_executor: Optional[ProcessPoolExecutor] = None
+_extraction_executor_lock = threading.Lock()
+
+
+def _extraction_max_workers() -> int:
+    return int(os.environ.get(ENV_VAR_DOCQ_EXTRACTION_MAX_WORKERS, os.cpu_count() or 1))
+
+
+def _extraction_timeout() -> float:
+    return float(os.environ.get(ENV_VAR_DOCQ_EXTRACTION_TIMEOUT_SECONDS, DEFAULT_EXTRACTION_TIMEOUT_SECONDS))
+
+
+def get_extraction_executor() -> Executor:
+    """Get the process pool that files are extracted in, creating it on first use.
+
+    Parsing PDFs, Office documents etc. is CPU bound so is done in separate processes to use all cores. The number
+    of processes is set by `DOCQ_EXTRACTION_MAX_WORKERS` and defaults to the number of CPUs.
+    """
+    global _extraction_executor
+    with _extraction_executor_lock:
+        if _extraction_executor is None:
+            # spawn rather than fork. Forking a process that's running threads (Streamlit, indexing workers) can deadlock.
+            _extraction_executor = ProcessPoolExecutor(
+                max_workers=_extraction_max_workers(), mp_context=multiprocessing.get_context("spawn")
+            )
+        return _extraction_executor
+
+
+def _replace_broken_executor(executor: Executor) -> None:
+    """A worker process that died (e.g. a segfault in a native parser) breaks the pool so replace it for later files."""
+    global _extraction_executor
+    with _extraction_executor_lock:
+        if _extraction_executor is executor:
+            _extraction_executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _on_extraction_error(executor: Executor, file_path: Union[str, Path], error: BaseException) -> None:
+    if isinstance(error, BrokenProcessPool):
+        _replace_broken_executor(executor)
+    log.error("Extracting file '%s' failed, skipping it. Error: %r", file_path, error)
+
+
+def _submit_extraction(
+    executor: Executor,
+    downloaded_file: tuple[str, str, int, int],
+    file_metadata: Optional[Callable[[str], Dict]] = None,
+) -> "Future[List[Document]]":
+    # metadata is resolved here as `file_metadata` is often a closure which can't be sent to a worker process.
+    metadata = file_metadata(downloaded_file[0]) if file_metadata is not None else None
+    return executor.submit(read_file, Path(downloaded_file[1]), True, "ignore", None, metadata)
+
+
+def _collect_extraction(
+    executor: Executor,
+    downloaded_file: tuple[str, str, int, int],
+    future: "Future[List[Document]]",
+    deadline: float,
+    on_failed: Optional[Callable[[tuple[str, str, int, int]], None]] = None,
+) -> List[Document]:
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except Exception as e:
+        future.cancel()
+        _on_extraction_error(executor, downloaded_file[1], e)
+        if on_failed is not None:
+            on_failed(downloaded_file)
+        return []
+    finally:
+        with suppress(FileNotFoundError):
+            os.remove(downloaded_file[1])
+
+
+def iter_extracted_files(
+    downloaded_files: Iterable[tuple[str, str, int, int]],
+    file_extractor: Optional[Dict[str, Union[str, BaseReader]]] = None,
+    file_metadata: Optional[Callable[[str], Dict]] = None,
+    max_pending: Optional[int] = None,
+    timeout: Optional[float] = None,
+    on_failed: Optional[Callable[[tuple[str, str, int, int]], None]] = None,
+) -> Iterator[Document]:
+    """Extract files as they're downloaded, in the extraction process pool, yielding their documents in order.
+
+    Up to `max_pending` files are extracted at once while the next ones download. This also bounds how many
+    downloaded files are waiting on disk. Each local file is deleted once extracted.
+
+    A file that fails to extract, or isn't extracted within `timeout` seconds of being submitted, is logged and
+    skipped so one bad file doesn't fail the rest. NOTE: a timed out extraction keeps its worker busy until it finishes.
+
+    Args:
+        downloaded_files: tuples (source path, local path, indexed_on, size) as returned by the download functions.
+        file_extractor: A mapping of file extractors to use for specific file types. NOTE: this isn't implemented yet.
+        file_metadata: A function that takes the source path and returns a dictionary of metadata to be added to the Document object.
+        max_pending: Max files being extracted at once. Defaults to the number of extraction workers.
+        timeout: Seconds to wait for a file, counted from when it's submitted. Defaults to `DOCQ_EXTRACTION_TIMEOUT_SECONDS` or 5 minutes.
+        on_failed: Called with each downloaded file that failed to extract.
+    """
+    max_pending = max_pending or _extraction_max_workers()
+    timeout = timeout or _extraction_timeout()
+    # deadlines are set at submission so files queued behind a slow one aren't given its wait as well as their own.
+    pending: Deque[tuple[Executor, tuple[str, str, int, int], "Future[List[Document]]", float]] = deque()
+    try:
+        for downloaded_file in downloaded_files:
+            executor = get_extraction_executor()
+            try:
+                future = _submit_extraction(executor, downloaded_file, file_metadata)
+            except BrokenProcessPool:
+                _replace_broken_executor(executor)
+                executor = get_extraction_executor()
+                future = _submit_extraction(executor, downloaded_file, file_metadata)
+            pending.append((executor, downloaded_file, future, time.monotonic() + timeout))
+            if len(pending) >= max_pending:
+                yield from _collect_extraction(*pending.popleft(), on_failed)
+        while pending:
+            yield from _collect_extraction(*pending.popleft(), on_failed)
+    finally:
+        # the consumer stopped early, don't leave work queued up for files that are about to be deleted.
+        for _, _, future, _ in pending:
+            future.cancel()
 
 
 async def extract_files(
     downloaded_files: List[tuple[str, str, int, int]],
     file_extractor: Optional[Dict[str, Union[str, BaseReader]]] = None,
     file_metadata: Optional[Callable[[str], Dict]] = None,
+    max_concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
 ) -> List[Document]:
-    """Extract content of a list of files."""
+    """Extract content of a list of files in the extraction process pool.
+
+    At most `max_concurrency` files (default: the number of extraction workers) are extracted at once. Files that
+    fail or time out are skipped, see `extract_file()`.
+    """
     documents: List[Document] = []
-    tasks = []
+    semaphore = asyncio.Semaphore(max_concurrency or _extraction_max_workers())
     log.debug("number files to extract: %s", len(downloaded_files))
-    for fe in downloaded_files:
-        source_path = fe[0]
-        local_path = fe[1]
-        metadata = None
-        if file_metadata is not None:
-            metadata = file_metadata(source_path)
-
-        # TODO: this likely will not scale very much. We'll have to refactor to control the number of tasks.
-        task = asyncio.create_task(
-            extract_file(Path(local_path), filename_as_id=True, file_extractor=file_extractor, metadata=metadata)
-        )
-        tasks.append(task)
-        log.debug("extract task created for: %s", local_path)
 
-    log.debug("extract file - tasks started: %s", len(tasks))
+    async def _extract(fe: tuple[str, str, int, int]) -> List[Document]:
+        metadata = file_metadata(fe[0]) if file_metadata is not None else None
+        async with semaphore:
+            return await extract_file(
+                Path(fe[1]), filename_as_id=True, file_extractor=file_extractor, metadata=metadata, timeout=timeout
+            )
 
-    results = await asyncio.gather(*tasks)
+    results = await asyncio.gather(*(_extract(fe) for fe in downloaded_files))
 
     log.debug("extract file - tasks completed: %s", len(results))
 
@@ -446,6 +850,42 @@ async def extract_file(
     errors: str = "ignore",
     file_extractor: Optional[Dict[str, Union[str, BaseReader]]] = None,
     metadata: Optional[Dict] = None,
+    timeout: Optional[float] = None,
+) -> List[Document]:
+    """Extract content of a file on disk in the extraction process pool. See `read_file()`.
+
+    Returns no documents if extraction fails or takes longer than `timeout` seconds.
+    """
+    executor = get_extraction_executor()
+    try:
+        return await asyncio.wait_for(
+            asyncio.get_running_loop().run_in_executor(
+                executor, read_file, file_path, filename_as_id, errors, None, metadata
+            ),
+            timeout or _extraction_timeout(),
+        )
+    except Exception as e:
+        _on_extraction_error(executor, file_path, e)
+        return []
+
+
+_readers: Dict[str, BaseReader] = {}
+
+
+def _get_reader(file_suffix: str) -> BaseReader:
+    """Get the reader for a file suffix. Readers are created once per process, i.e. once per extraction worker."""
+    reader = _readers.get(file_suffix)
+    if reader is None:
+        reader = _readers[file_suffix] = DEFAULT_FILE_READER_CLS[file_suffix]()
+    return reader
+
+
+def read_file(
+    file_path: Path,
+    filename_as_id: bool = False,
+    errors: str = "ignore",
+    file_extractor: Optional[Dict[str, Union[str, BaseReader]]] = None,
+    metadata: Optional[Dict] = None,
 ) -> List[Document]:
     """Extract content of a file on disk.
 
@@ -468,9 +908,7 @@ async def extract_file(
     if file_suffix in supported_suffix:
         log.debug("file extractor found for file_suffix: %s", file_suffix)
 
-        # NOTE: pondering if its worth turning this into a class and uncomment the code above so reader classes are only instantiated once.
-        reader = DEFAULT_FILE_READER_CLS[file_suffix]()
-        docs = reader.load_data(file_path, extra_info=metadata)
+        docs = _get_reader(file_suffix).load_data(file_path, extra_info=metadata)
 
         # iterate over docs if needed
         if filename_as_id:
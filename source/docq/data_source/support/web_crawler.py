@@ -0,0 +1,445 @@
+"""Async web crawler used by the web scraper data sources.
+
+Pages are fetched concurrently over a pooled HTTP client. The crawl is polite: robots.txt rules and crawl delays are
+respected and only a few requests are in flight to any one host at a time. Links are followed recursively up to a depth
+limit, and sitemaps can be used as the list of pages to crawl. Pages can be fetched conditionally so unchanged pages
+aren't downloaded again.
+"""
+
+import asyncio
+import gzip
+import logging as log
+import os
+import random
+import re
+import xml.etree.ElementTree as ET  # noqa: N817
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, Generic, Iterator, List, Optional, Self, Set, Tuple, TypeVar
+from urllib.parse import parse_qsl, urldefrag, urlencode, urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+
+import docq
+import httpx
+
+from ...config import ENV_VAR_DOCQ_CRAWL_MAX_CONCURRENCY
+from .background import iter_in_background
+
+T = TypeVar("T")
+
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_PER_HOST_CONCURRENCY = 4
+DEFAULT_MAX_PAGES = 5000
+DEFAULT_TIMEOUT_SECONDS = 10
+FETCH_MAX_ATTEMPTS = 3
+FETCH_RETRY_BACKOFF_SECONDS = 1.0
+MAX_RETRY_AFTER_SECONDS = 60
+MAX_SITEMAP_DEPTH = 3
+"""How deep sitemap indexes are followed."""
+USER_AGENT = f"DocqBot/{docq.__version_str__} (+https://docq.ai)"
+
+_TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|msclkid|mc_cid|mc_eid)$")
+
+
+@dataclass
+class CrawledPage(Generic[T]):
+    """A page fetched and parsed by the crawler."""
+
+    url: str
+    depth: int
+    """Number of links followed from a seed URL to reach the page. 0 for seed URLs."""
+    result: Optional[T]
+    """What the `parse` function passed to the crawler returned for the page. None if it's not modified."""
+    not_modified: bool = False
+    """True if the server said the page hasn't changed since the conditional headers it was fetched with."""
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+ParsePage = Callable[[str, str], Tuple[Optional[T], List[str]]]
+"""Parses a page given its URL and HTML. Returns the result to yield, None to skip the page, and the links on it."""
+
+ConditionalHeaders = Callable[[str], Dict[str, str]]
+"""Gets the `If-None-Match` and `If-Modified-Since` headers to fetch a URL with, from when it was last fetched."""
+
+
+def normalise_url(url: str, base_url: Optional[str] = None) -> Optional[str]:
+    """Resolve a link against the page it's on and normalise it so variants of a URL are only crawled once.
+
+    The fragment and tracking query parameters like `utm_source` are dropped, the remaining query parameters sorted
+    and the host lower cased.
+
+    Returns:
+        The normalised URL, or None if it isn't a http(s) URL.
+    """
+    url, _ = urldefrag(urljoin(base_url, url.strip()) if base_url else url.strip())
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https"):
+        return None
+    query = sorted((k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True) if not _TRACKING_PARAMS.match(k))
+    return parsed._replace(netloc=parsed.netloc.lower(), query=urlencode(query)).geturl()
+
+
+def _origin(url: str) -> str:
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def _is_retryable(status_code: int) -> bool:
+    return status_code in (408, 429) or status_code >= 500
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return min(float(response.headers["retry-after"]), MAX_RETRY_AFTER_SECONDS)
+    except (KeyError, ValueError):
+        return None
+
+
+def _validators(response: httpx.Response) -> Dict[str, Optional[str]]:
+    return {"etag": response.headers.get("etag"), "last_modified": response.headers.get("last-modified")}
+
+
+def _sitemap_locs(root: ET.Element) -> List[str]:
+    """The <loc> of each <url> or <sitemap> entry, ignoring namespaced extensions like image sitemaps."""
+    return [loc.text.strip() for entry in root for loc in entry if loc.tag.rsplit("}", 1)[-1] == "loc" and loc.text]
+
+
+class _Host:
+    """Politeness state for one host: its robots.txt rules, crawl delay and the cap on requests in flight."""
+
+    def __init__(self: Self, per_host_concurrency: int) -> None:
+        self.robots: Optional[RobotFileParser] = None
+        self.crawl_delay = 0.0
+        self.semaphore = asyncio.Semaphore(per_host_concurrency)
+        self.robots_lock = asyncio.Lock()
+        self._pace_lock = asyncio.Lock()
+        self._next_request_at = 0.0
+
+    async def wait_turn(self: Self) -> None:
+        """Wait until the crawl delay since the last request to the host has passed."""
+        if not self.crawl_delay:
+            return
+        async with self._pace_lock:
+            loop = asyncio.get_running_loop()
+            if (wait := self._next_request_at - loop.time()) > 0:
+                await asyncio.sleep(wait)
+            self._next_request_at = loop.time() + self.crawl_delay
+
+
+class WebCrawler:
+    """Crawls web sites concurrently and politely.
+
+    Args:
+        max_concurrency: Max requests in flight across all hosts. Defaults to `DOCQ_CRAWL_MAX_CONCURRENCY` or 16.
+        per_host_concurrency: Max requests in flight to any one host.
+        max_pages: Stop discovering pages once this many have been queued.
+        timeout: Request timeout in seconds.
+        respect_robots: Whether to obey robots.txt. Only turn this off for sites you own.
+        user_agent: Sent with every request and matched against robots.txt rules.
+        transport: HTTP transport, for tests.
+    """
+
+    def __init__(
+        self: Self,
+        max_concurrency: Optional[int] = None,
+        per_host_concurrency: int = DEFAULT_PER_HOST_CONCURRENCY,
+        max_pages: int = DEFAULT_MAX_PAGES,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+        respect_robots: bool = True,
+        user_agent: str = USER_AGENT,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        """Initialise the crawler."""
+        self.max_concurrency = max_concurrency or int(
+            os.environ.get(ENV_VAR_DOCQ_CRAWL_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY)
+        )
+        self.per_host_concurrency = per_host_concurrency
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.respect_robots = respect_robots
+        self.user_agent = user_agent
+        self._transport = transport
+
+    def iter_pages(
+        self: Self,
+        seed_urls: List[str],
+        parse: ParsePage[T],
+        max_depth: int = 0,
+        include_seeds: bool = True,
+        from_sitemaps: bool = False,
+        conditional_headers: Optional[ConditionalHeaders] = None,
+        include_filter: Optional[str] = None,
+    ) -> Iterator[CrawledPage[T]]:
+        """Crawl from the seed URLs, yielding each page as it's parsed. Pages come back in the order they finish.
+
+        Args:
+            seed_urls: Where to start crawling.
+            parse: Parses each page in a worker thread so the event loop keeps fetching.
+            max_depth: How many links deep to follow from the seed URLs. 0 only fetches the seed URLs. Links found
+                on the seed pages are followed wherever they go, links found deeper only within the seed hosts.
+            include_seeds: Whether to yield the seed pages or only use them to discover links, e.g. index pages.
+            from_sitemaps: Treat the seed URLs as sitemaps, or sites whose sitemaps to find via robots.txt or
+                /sitemap.xml, and crawl the pages they list.
+            conditional_headers: Fetch pages conditionally with these headers. A page the server says hasn't changed
+                is yielded with `not_modified` set and isn't parsed. Pages whose links are needed to carry on crawling
+                are always fetched in full.
+            include_filter: Only crawl the pages listed by sitemaps that match this regex. Links found on pages are
+                filtered by `parse`.
+
+        Raises:
+            ValueError: If none of the seed URLs could be fetched, so an outage isn't mistaken for an empty site.
+        """
+        return iter_in_background(
+            lambda: self.crawl(
+                seed_urls, parse, max_depth, include_seeds, from_sitemaps, conditional_headers, include_filter
+            ),
+            max_buffered=self.max_concurrency,
+            thread_name="docq-crawler",
+        )
+
+    async def crawl(
+        self: Self,
+        seed_urls: List[str],
+        parse: ParsePage[T],
+        max_depth: int = 0,
+        include_seeds: bool = True,
+        from_sitemaps: bool = False,
+        conditional_headers: Optional[ConditionalHeaders] = None,
+        include_filter: Optional[str] = None,
+    ) -> AsyncIterator[CrawledPage[T]]:
+        """Crawl from the seed URLs, yielding each page as it's parsed. See `iter_pages()`."""
+        limits = httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+        async with httpx.AsyncClient(
+            headers={"User-Agent": self.user_agent},
+            timeout=self.timeout,
+            limits=limits,
+            follow_redirects=True,
+            transport=self._transport,
+        ) as client:
+            crawl = _Crawl(self, client, parse, max_depth, include_seeds, conditional_headers)
+            if from_sitemaps:
+                seed_urls = await crawl.read_sitemaps(seed_urls, include_filter)
+            async for page in crawl.run(seed_urls):
+                yield page
+
+
+class _Crawl(Generic[T]):
+    """State of one crawl: the frontier of URLs to fetch, the URLs seen so far and the hosts visited."""
+
+    _DONE = object()
+
+    def __init__(
+        self: Self,
+        crawler: WebCrawler,
+        client: httpx.AsyncClient,
+        parse: ParsePage[T],
+        max_depth: int,
+        include_seeds: bool,
+        conditional_headers: Optional[ConditionalHeaders],
+    ) -> None:
+        self._crawler = crawler
+        self._client = client
+        self._parse = parse
+        self._max_depth = max_depth
+        self._include_seeds = include_seeds
+        self._conditional_headers = conditional_headers
+        self._num_fetched = 0
+        self._frontier: asyncio.Queue[Tuple[str, int]] = asyncio.Queue()
+        self._seen: Set[str] = set()
+        self._seed_hosts: Set[str] = set()
+        self._hosts: Dict[str, _Host] = {}
+
+    async def run(self: Self, seed_urls: List[str]) -> AsyncIterator[CrawledPage[T]]:
+        """Crawl with a pool of workers until the frontier is exhausted."""
+        seed_urls = [url for url in map(normalise_url, seed_urls) if url is not None]
+        for url in seed_urls:
+            self._seed_hosts.add(urlparse(url).netloc)
+            self._enqueue(url, 0)
+
+        pages: asyncio.Queue = asyncio.Queue(maxsize=self._crawler.max_concurrency)
+
+        async def _finish() -> None:
+            await self._frontier.join()
+            await pages.put(self._DONE)
+
+        tasks = [asyncio.create_task(self._work(pages)) for _ in range(self._crawler.max_concurrency)]
+        tasks.append(asyncio.create_task(_finish()))
+        try:
+            while (page := await pages.get()) is not self._DONE:
+                yield page
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if seed_urls and not self._num_fetched:
+            raise ValueError(f"None of the URLs could be fetched: {', '.join(seed_urls)}")
+        log.info("Crawled %d pages from %d hosts", self._num_fetched, len(self._hosts))
+
+    def _enqueue(self: Self, url: str, depth: int) -> None:
+        if url in self._seen or len(self._seen) >= self._crawler.max_pages:
+            return
+        self._seen.add(url)
+        self._frontier.put_nowait((url, depth))
+
+    async def _work(self: Self, pages: asyncio.Queue) -> None:
+        while True:
+            url, depth = await self._frontier.get()
+            try:
+                page = await self._crawl_page(url, depth)
+                if page is not None:
+                    await pages.put(page)
+            except Exception as e:
+                log.error("Crawling '%s' failed, skipping it. Error: %r", url, e)
+            finally:
+                self._frontier.task_done()
+
+    async def _crawl_page(self: Self, url: str, depth: int) -> Optional[CrawledPage[T]]:
+        # a page whose links are needed is fetched in full, its links aren't known if it's not modified.
+        conditional = self._conditional_headers is not None and depth >= self._max_depth
+        response = await self._fetch(url, self._conditional_headers(url) if conditional else None)
+        if response is None:
+            return None
+        self._num_fetched += 1
+        if response.status_code == 304:
+            if depth == 0 and not self._include_seeds:
+                return None
+            return CrawledPage(url=url, depth=depth, result=None, not_modified=True, **_validators(response))
+        content_type = response.headers.get("content-type", "")
+        if content_type and "html" not in content_type:
+            log.debug("Skipping '%s', it isn't a web page: %s", url, content_type)
+            return None
+
+        result, links = await asyncio.to_thread(self._parse, url, response.text)
+
+        if depth < self._max_depth:
+            for link in links:
+                link = normalise_url(link, url)
+                if link is not None and (depth == 0 or urlparse(link).netloc in self._seed_hosts):
+                    self._enqueue(link, depth + 1)
+
+        if result is None or (depth == 0 and not self._include_seeds):
+            return None
+        return CrawledPage(url=url, depth=depth, result=result, **_validators(response))
+
+    async def _host(self: Self, url: str) -> _Host:
+        """Get the politeness state of a URL's host, reading its robots.txt on first use."""
+        origin = _origin(url)
+        host = self._hosts.get(origin)
+        if host is None:
+            host = self._hosts[origin] = _Host(self._crawler.per_host_concurrency)
+        async with host.robots_lock:
+            if host.robots is None:
+                host.robots = await self._read_robots(origin)
+                delay = host.robots.crawl_delay(self._crawler.user_agent) if self._crawler.respect_robots else None
+                host.crawl_delay = float(delay) if delay else 0.0
+        return host
+
+    async def _read_robots(self: Self, origin: str) -> RobotFileParser:
+        robots = RobotFileParser(f"{origin}/robots.txt")
+        if not self._crawler.respect_robots:
+            robots.allow_all = True
+            return robots
+        try:
+            response = await self._client.get(robots.url)
+        except httpx.HTTPError as e:
+            log.warning("Couldn't read '%s', crawling without it. Error: %r", robots.url, e)
+            robots.allow_all = True
+            return robots
+        if response.status_code in (401, 403):
+            robots.disallow_all = True
+        elif response.status_code >= 400:
+            robots.allow_all = True
+        else:
+            robots.parse(response.text.splitlines())
+        return robots
+
+    async def _fetch(self: Self, url: str, headers: Optional[Dict[str, str]] = None) -> Optional[httpx.Response]:
+        """GET a URL politely, retrying transient errors. None if it's disallowed by robots.txt or fails for good."""
+        host = await self._host(url)
+        if host.robots is not None and not host.robots.can_fetch(self._crawler.user_agent, url):
+            log.debug("Skipping '%s', disallowed by robots.txt", url)
+            return None
+
+        for attempt in range(1, FETCH_MAX_ATTEMPTS + 1):
+            retry_after = None
+            async with host.semaphore:
+                await host.wait_turn()
+                try:
+                    response = await self._client.get(url, headers=headers)
+                except httpx.HTTPError as e:
+                    error: object = repr(e)
+                else:
+                    if response.status_code < 400:
+                        return response
+                    if not _is_retryable(response.status_code):
+                        log.info("Skipping '%s', HTTP %s", url, response.status_code)
+                        return None
+                    error, retry_after = f"HTTP {response.status_code}", _retry_after(response)
+            if attempt == FETCH_MAX_ATTEMPTS:
+                log.warning("Fetching '%s' failed after %s attempts, skipping it. Error: %s", url, attempt, error)
+                return None
+            backoff = FETCH_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1) * (0.5 + random.random())  # noqa: S311
+            delay = retry_after or backoff
+            log.debug("Fetching '%s' failed, retrying in %.1fs. Error: %s", url, delay, error)
+            await asyncio.sleep(delay)
+        return None
+
+    async def read_sitemaps(self: Self, urls: List[str], include_filter: Optional[str] = None) -> List[str]:
+        """The page URLs listed by sitemaps, following sitemap indexes.
+
+        URLs that aren't sitemaps are taken to be sites, whose sitemaps are found via robots.txt or /sitemap.xml.
+
+        Args:
+            urls: Sitemaps or sites.
+            include_filter: Only return page URLs that match this regex.
+        """
+        pending = [(sitemap, 0) for sitemap in await self._find_sitemaps(urls)]
+        page_urls: List[str] = []
+        seen: Set[str] = set()
+        num_read = 0
+        while pending:
+            url, depth = pending.pop(0)
+            if url in seen:
+                continue
+            seen.add(url)
+            root = await self._read_sitemap(url)
+            if root is None:
+                continue
+            num_read += 1
+            if root.tag.rsplit("}", 1)[-1] == "sitemapindex":
+                if depth < MAX_SITEMAP_DEPTH:
+                    pending.extend((loc, depth + 1) for loc in _sitemap_locs(root))
+            else:
+                page_urls.extend(
+                    loc for loc in _sitemap_locs(root) if not include_filter or re.search(include_filter, loc)
+                )
+        if urls and not num_read:
+            raise ValueError(f"None of the sitemaps could be read: {', '.join(urls)}")
+        log.info("Found %d pages in %d sitemaps", len(page_urls), num_read)
+        return page_urls
+
+    async def _find_sitemaps(self: Self, urls: List[str]) -> List[str]:
+        """The sitemaps to read: URLs that are sitemaps, and the sitemaps of the sites the others are on."""
+        sitemaps: List[str] = []
+        for url in urls:
+            if urlparse(url).path.endswith((".xml", ".xml.gz")):
+                sitemaps.append(url)
+                continue
+            host = await self._host(url)
+            site_maps = host.robots.site_maps() if host.robots is not None else None
+            sitemaps.extend(site_maps or [f"{_origin(url)}/sitemap.xml"])
+        return sitemaps
+
+    async def _read_sitemap(self: Self, url: str) -> Optional[ET.Element]:
+        """Fetch and parse a sitemap or sitemap index, gzipped or not. None if it couldn't be fetched or parsed."""
+        response = await self._fetch(url)
+        if response is None:
+            return None
+        content = response.content
+        if content[:2] == b"\x1f\x8b":
+            content = gzip.decompress(content)
+        try:
+            return ET.fromstring(content)  # noqa: S314
+        except ET.ParseError as e:
+            log.warning("Skipping sitemap '%s', it isn't valid XML. Error: %s", url, e)
+            return None
@@ -1,22 +1,46 @@
 """Web page text extraction."""
 
+import hashlib
 import logging as log
 import re
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, Callable, Dict, List, Optional, Self
+from typing import Any, Callable, Dict, Iterator, List, Optional, Self, Tuple
 from urllib.parse import urljoin, urlparse
 
-import requests
 from bs4 import BeautifulSoup
 from llama_index.core.readers.base import BaseReader
 from llama_index.core.schema import Document
 from opentelemetry import trace
 
 from ...domain import DocumentListItem, SourcePageType
+from .html_parsing import HtmlParser, ParsedPage, class_matches, get_html_parser
+from .manifest import SyncManifest
+from .web_crawler import CrawledPage, WebCrawler, normalise_url
 
 tracer = trace.get_tracer(__name__)
 
+DEFAULT_INDEX_PAGE_CRAWL_DEPTH = 1
+
+
+def normalised_text_hash(text: Optional[str]) -> str:
+    """SHA-256 of page text with whitespace and case normalised, so trivially different copies of a page match."""
+    return hashlib.sha256(" ".join((text or "").split()).lower().encode()).hexdigest()
+
+
+@dataclass
+class ExtractedPage:
+    """Everything extracted from a web page."""
+
+    title: str
+    subtitle: str
+    text: Optional[str]
+    links: List[str]
+    """Links matching the extractor's link selector and the include filter, made absolute."""
+    canonical_url: str
+    """The canonical URL the page declares with `<link rel="canonical">`, or its own URL."""
+
 
 class BaseTextExtractor(ABC):
     """Abstract base class for webpage text extractors."""
@@ -25,10 +49,77 @@ class BaseTextExtractor(ABC):
         self: Self,
         title_css_selector: Optional[str] = None,
         subtitle_css_selector: Optional[str] = None,
+        parser: Optional[HtmlParser] = None,
     ) -> None:
-        """Initialize the text extractor."""
+        """Initialize the text extractor.
+
+        Args:
+            title_css_selector (str, optional): The CSS class to find the title by. BeautifulSoup style.
+            subtitle_css_selector (str, optional): The CSS class to find the subtitle by. BeautifulSoup style.
+            parser (HtmlParser, optional): The parser backend `extract_page()` uses. Defaults to `get_html_parser()`.
+        """
         self._title_css_selector = title_css_selector
         self._subtitle_css_selector = subtitle_css_selector
+        self._parser = parser
+
+    @property
+    def parser(self: Self) -> HtmlParser:
+        """The parser backend `extract_page()` uses."""
+        if self._parser is None:
+            self._parser = get_html_parser()
+        return self._parser
+
+    @tracer.start_as_current_span(name="extract_page")
+    def extract_page(self: Self, html: str, page_url: str, include_filter: Optional[str] = None) -> ExtractedPage:
+        """Extract the title, subtitle, text, links and canonical URL from a web page in a single parse.
+
+        Equivalent to the `extract_*()` methods on a BeautifulSoup of the page, but the page is parsed once with the
+        `parser` backend rather than built into a tree and searched for each.
+
+        Args:
+            html (str): The web page.
+            page_url (str): The URL of the web page, relative links are resolved against it.
+            include_filter (str, optional): Only extract links that match this regex.
+        """
+        span = trace.get_current_span()
+        class_selectors = [s for s in (self._title_css_selector, self._subtitle_css_selector) if s]
+        parsed = self.parser.parse(html, class_selectors)
+        span.set_attributes({"parser": self.parser.name, "total_links_count": len(parsed.links)})
+
+        if self._title_css_selector:
+            title = parsed.class_texts.get(self._title_css_selector)
+        else:
+            title = parsed.h1 if parsed.h1 is not None else parsed.title
+        subtitle = parsed.class_texts.get(self._subtitle_css_selector) if self._subtitle_css_selector else parsed.h2
+
+        selector = self.link_extract_selector()
+        links: List[str] = []
+        for href, class_attr in parsed.links:
+            if selector is not None and not class_matches(selector, class_attr):
+                continue
+            if include_filter and not re.search(include_filter, href):
+                continue
+            if not href.startswith("http"):
+                href = urljoin(page_url, href)
+            if href not in links:
+                links.append(href)
+        span.set_attribute("links_for_extraction_count", len(links))
+
+        return ExtractedPage(
+            title=title if title is not None else "web page",
+            subtitle=subtitle if subtitle is not None else "",
+            text=self.extract_text_from_parsed(parsed, html, page_url),
+            links=links,
+            canonical_url=(normalise_url(parsed.canonical_url, page_url) if parsed.canonical_url else None) or page_url,
+        )
+
+    def extract_text_from_parsed(self: Self, parsed: ParsedPage, html: str, page_url: str) -> Optional[str]:
+        """Extract text from a web page parsed by `extract_page()`.
+
+        Extractors override this to use what the parser collected. Defaults to `extract_text()` on a BeautifulSoup of
+        the page, so extractors that only implement `extract_text()` still work, they just parse the page twice.
+        """
+        return self.extract_text(soup=BeautifulSoup(html, "html.parser"), page_url=page_url)
 
     @abstractmethod
     @tracer.start_as_current_span(name="extract_text")
@@ -152,6 +243,12 @@ class ReadTheDocsTextExtractor(BaseTextExtractor):
 
         return text
 
+    def extract_text_from_parsed(self: Self, parsed: ParsedPage, html: str, page_url: str) -> Optional[str]:
+        """Extract the text of the element with `role="main"`."""
+        if parsed.main is None:
+            log.info("readthedocs_reader: No text blocks found on: %s", page_url)
+        return parsed.main
+
     def link_extract_selector(self: Self) -> Any:  # noqa: D102
         """Return CSS class names to filter <a> tags. To extract all links, return None."""
         return "reference internal"
@@ -180,6 +277,11 @@ class GenericTextExtractor(BaseTextExtractor):
 
         return page_text
 
+    def extract_text_from_parsed(self: Self, parsed: ParsedPage, html: str, page_url: str) -> Optional[str]:
+        """Extract the text of the <p> tags."""
+        trace.get_current_span().set_attribute("p_tags_count", len(parsed.paragraphs))
+        return "".join(f"/n{p}" for p in parsed.paragraphs)
+
     def link_extract_selector(self: Self) -> Any:
         """Return CSS class names to filter <a> tags. To extract all links, return None."""
         return None
@@ -208,30 +310,112 @@ class GenericKnowledgeBaseExtractor(BaseTextExtractor):
 
         return content_body
 
+    def extract_text_from_parsed(self: Self, parsed: ParsedPage, html: str, page_url: str) -> Optional[str]:
+        """Extract the text of the <p> tags."""
+        return "".join(f"/n{p}" for p in parsed.paragraphs)
+
     def link_extract_selector(self: Self) -> Any:  # noqa: D102
         return None
 
 
+def _crawl_options(source_page_type: Optional[SourcePageType], max_depth: Optional[int]) -> Tuple[int, bool, bool]:
+    """How to crawl a source page type: the crawl depth, whether to yield the seed pages and if they're sitemaps."""
+    if source_page_type == SourcePageType.index_page:
+        # the provided URLs are index pages, crawl the pages they link to
+        return max_depth or DEFAULT_INDEX_PAGE_CRAWL_DEPTH, False, False
+    if source_page_type == SourcePageType.page_list:
+        return 0, True, False
+    if source_page_type == SourcePageType.sitemap:
+        return 0, True, True
+    raise ValueError(f"Invalid source page type: {source_page_type}")
+
+
+@dataclass
+class _CrawledVariant:
+    """A page crawled by `BeautifulSoupWebReader`, before near-duplicates are collapsed."""
+
+    page: CrawledPage
+    document: Optional[Document]
+    """None if the page isn't modified since the last sync."""
+    canonical_url: Optional[str]
+    """The canonical URL the page declares. None if it isn't modified."""
+    text_hash: Optional[str]
+    document_list_item: DocumentListItem
+    can_keep: bool
+    """Whether it can be indexed: it was fetched in full, or it isn't modified and was indexed last sync."""
+
+    @property
+    def keys(self: Self) -> List[str]:
+        """What it has in common with its near-duplicates: its canonical URL, its own if it isn't modified, and text."""
+        keys = [self.canonical_url or self.page.url]
+        if self.text_hash is not None:
+            keys.append(self.text_hash)
+        return keys
+
+
+def _collapse_near_duplicates(
+    crawled: List[_CrawledVariant],
+) -> Iterator[Tuple[Optional[_CrawledVariant], List[_CrawledVariant]]]:
+    """Group pages that share a canonical URL or normalised text, and pick the page to keep of each group.
+
+    The page at the canonical URL is kept if it was crawled, else the page with the lexicographically smallest URL, so
+    the same page is kept whatever order the crawl finished them in.
+
+    Yields:
+        The page to keep of each group, None if none of them can be kept, and the rest of the group.
+    """
+    parents: Dict[str, str] = {}
+
+    def _root(key: str) -> str:
+        while parents.setdefault(key, key) != key:
+            key = parents[key]
+        return key
+
+    for variant in crawled:
+        first, *rest = variant.keys
+        for key in rest:
+            parents[_root(key)] = _root(first)
+
+    groups: Dict[str, List[_CrawledVariant]] = {}
+    for variant in crawled:
+        groups.setdefault(_root(variant.keys[0]), []).append(variant)
+    for group in groups.values():
+        canonical_urls = {variant.canonical_url for variant in group}
+        kept = min(
+            (variant for variant in group if variant.can_keep),
+            key=lambda variant: (variant.page.url not in canonical_urls, variant.page.url),
+            default=None,
+        )
+        yield kept, [variant for variant in group if variant is not kept]
+
+
 class BeautifulSoupWebReader(BaseReader):
     """BeautifulSoup web page reader.
 
-    Reads pages from the web.
+    Crawls pages from the web with `WebCrawler`.
     Requires the `bs4` and `urllib` packages.
 
     Args:
         website_extractor (Optional[Dict[str, Callable]]): A mapping of website
             hostname (e.g. google.com) to a function that specifies how to
             extract text from the BeautifulSoup.
+        crawler (Optional[WebCrawler]): The crawler used to fetch pages. Defaults to a `WebCrawler` with default limits.
+        manifest (Optional[SyncManifest]): Tracks pages against the last sync. Pages are fetched conditionally and
+            only pages whose text changed are yielded. If None every page is fetched and yielded.
     """
 
     def __init__(
         self: Self,
         website_extractors: Dict[str, BaseTextExtractor],
         website_metadata: Optional[Callable[[str], Dict]] = None,
+        crawler: Optional[WebCrawler] = None,
+        manifest: Optional[SyncManifest] = None,
     ) -> None:
         """Initialize with parameters."""
         self.website_extractors = website_extractors
         self.website_metadata = website_metadata
+        self.crawler = crawler or WebCrawler()
+        self.manifest = manifest
         self._document_list: List[DocumentListItem] = []
 
     @tracer.start_as_current_span(name="load_data")
@@ -240,112 +424,142 @@ class BeautifulSoupWebReader(BaseReader):
         urls: List[str],
         include_filter: Optional[str] = None,
         source_page_type: Optional[SourcePageType] = SourcePageType.index_page,
+        max_depth: Optional[int] = None,
     ) -> List[Document]:
         """Load data from the urls.
 
         Args:
             urls (List[str]): List of URLs to scrape.
             include_filter (Optional[str]): Only scrape pages that match this regex.
+            source_page_type (Optional[SourcePageType]): Whether the URLs are index pages to crawl from, the pages to
+                scrape or sitemaps listing the pages to scrape.
+            max_depth (Optional[int]): How many links deep to crawl from index pages. Defaults to 1, i.e. the pages
+                the index pages link to.
 
         Returns:
             List[Document]: List of documents.
 
+        """
+        return list(self.iter_data(urls, include_filter, source_page_type, max_depth))
+
+    def iter_data(
+        self: Self,
+        urls: List[str],
+        include_filter: Optional[str] = None,
+        source_page_type: Optional[SourcePageType] = SourcePageType.index_page,
+        max_depth: Optional[int] = None,
+    ) -> Iterator[Document]:
+        """Crawl the pages then yield a document per page. See `load_data()`.
+
+        Near-duplicate pages are collapsed: of the pages with a canonical URL (`<link rel="canonical">`) or normalised
+        text in common only one is yielded, so print views and query string variants aren't indexed twice. Pages are
+        held until the crawl is done so which one is kept doesn't depend on the order they finished in.
         """
         span = trace.get_current_span()
-        all_documents: List[Document] = []
-        page_links: List[str] = []
 
         if not urls or len(urls) == 0:
             raise ValueError("No URLs supplied.")
 
-        hostname = urlparse(urls[0]).hostname or "default"
-        if hostname in self.website_extractors:
-            extractor: BaseTextExtractor = self.website_extractors[hostname]
-        else:
-            extractor: BaseTextExtractor = self.website_extractors["default"]
-
+        extractor = self._get_extractor(urls[0])
         span.set_attribute("source_page_type", source_page_type.__str__())
+        log.debug("source page type: %s, number of URLs supplied: %s", source_page_type, len(urls))
+        crawl_depth, include_seeds, from_sitemaps = _crawl_options(source_page_type, max_depth)
+
+        def _parse(page_url: str, html: str) -> Tuple[Optional[Tuple[Document, str]], List[str]]:
+            extracted = extractor.extract_page(html, page_url, include_filter)
+            links = extracted.links if crawl_depth else []
+            return (self._create_document(extracted, page_url), extracted.canonical_url), links
+
+        manifest = self.manifest
+        crawled = [
+            self._crawled_variant(page)
+            for page in self.crawler.iter_pages(
+                urls,
+                _parse,
+                crawl_depth,
+                include_seeds,
+                from_sitemaps,
+                conditional_headers=manifest.conditional_headers if manifest is not None else None,
+                include_filter=include_filter,
+            )
+        ]
+
+        page_count, duplicate_count = 0, 0
+        for kept, duplicates in _collapse_near_duplicates(crawled):
+            for duplicate in duplicates:
+                self._record_duplicate(duplicate, kept)
+            duplicate_count += len(duplicates)
+            if kept is not None and self._record_kept(kept):
+                page_count += 1
+                yield kept.document
+
+        span.set_attributes({"page_count": page_count, "duplicate_count": duplicate_count})
+
+    def _crawled_variant(self: Self, page: CrawledPage) -> _CrawledVariant:
+        """What's known of a crawled page, from the manifest of the last sync if it isn't modified."""
+        if not page.not_modified:
+            document, canonical_url = page.result
+            indexed_on = int(document.metadata["indexed_on"])
+            item = DocumentListItem.create_instance(page.url, document.text, indexed_on)
+            return _CrawledVariant(page, document, canonical_url, normalised_text_hash(document.text), item, True)
+        previous = self.manifest.previous.get(page.url) if self.manifest is not None else None
+        if previous is None:
+            return _CrawledVariant(page, None, None, None, DocumentListItem(link=page.url, indexed_on=0, size=0), False)
+        item = DocumentListItem(link=page.url, indexed_on=previous.indexed_on, size=previous.size)
+        return _CrawledVariant(page, None, None, previous.content_hash, item, previous.duplicate_of is None)
+
+    def _record_kept(self: Self, kept: _CrawledVariant) -> bool:
+        """Record the page kept of a set of near-duplicates. Returns True if its document needs indexing."""
+        page, item = kept.page, kept.document_list_item
+        if page.not_modified:
+            self.manifest.keep_unchanged(page.url)
+            return False
+        if self.manifest is not None and not self.manifest.add_content(
+            page.url, kept.text_hash, item.size, item.indexed_on, page.etag, page.last_modified
+        ):
+            return False
+        self._document_list.append(item)
+        return True
+
+    def _record_duplicate(self: Self, duplicate: _CrawledVariant, kept: Optional[_CrawledVariant]) -> None:
+        """Record a page collapsed into a near-duplicate so it's fetched conditionally next sync.
+
+        If none of its near-duplicates could be kept it's forgotten instead, so it's fetched in full and indexed.
+        """
+        if self.manifest is None:
+            return
+        if kept is None:
+            self.manifest.discard(duplicate.page.url)
+            return
+        page, item = duplicate.page, duplicate.document_list_item
+        log.debug("Skipping '%s', it's a near-duplicate of '%s'", page.url, kept.page.url)
+        self.manifest.add_duplicate(
+            page.url, kept.page.url, duplicate.text_hash, item.size, item.indexed_on, page.etag, page.last_modified
+        )
 
-        # page_links = urls  # default case expect page urls to extract content from directly
-        log.debug("source page type : ", source_page_type)
-
-        if source_page_type == SourcePageType.index_page:
-            # the provided URLs are index pages, extract links from them first
-            log.debug("Number of index page URLs supplied: %s", len(urls))
-            for url in urls:
-                lnk = self._extract_links(url, extractor, include_filter)
-                page_links.extend(lnk)
-                span.add_event("extracted_links_from_index_page", {"url": url, "links_count": len(lnk)})
-        elif source_page_type == SourcePageType.page_list:
-            page_links = urls
-            log.debug("page list - links : ", page_links)
-        else:
-            raise ValueError(f"Invalid source page type: {source_page_type}")
-
-        span.set_attribute("page_links_count", len(page_links).__str__())
-        log.debug("page links : ", page_links)
-
-        for page_link in page_links:
-            try:
-                page_response = requests.get(page_link, timeout=5)
-                span.add_event("url_requested", {"page_link": page_link, "response_bytes": len(page_response.content)})
-                soup = BeautifulSoup(
-                    page_response.text, "html.parser"
-                )  # TODO: not sure why the original code used response.text here and response.content above. dig in later.
-
-                page_text = extractor.extract_text(
-                    soup=soup,
-                    page_url=page_link,
-                )
-
-                page_title = extractor.extract_title(soup=soup)
-                page_subtitle = extractor.extract_subtitle(soup=soup)
-                indexed_on = datetime.timestamp(datetime.now().utcnow())
-                metadata = {
-                    "source_website": urlparse(page_link).hostname,
-                    "source_uri": page_link,
-                    "indexed_on": indexed_on,
-                    "page_title": page_title,
-                    "page_subtitle": page_subtitle,
-                }
-
-                if self.website_metadata is not None:
-                    metadata.update(self.website_metadata(page_link))
-
-                all_documents.append(Document(text=page_text, extra_info=metadata))
-
-                self._document_list.append(DocumentListItem.create_instance(page_link, page_text, int(indexed_on)))
-
-            except Exception as e:
-                span.record_exception(e)
-                span.set_status(
-                    trace.Status(trace.StatusCode.ERROR, f"Error requesting web page, skipped : {page_link}")
-                )
-                log.exception("Error requesting web page, skipped: %s, Error: %s", page_link, e)
-                continue
+    def _get_extractor(self: Self, url: str) -> BaseTextExtractor:
+        """The extractor for the URL's host, or the default one."""
+        hostname = urlparse(url).hostname or "default"
+        return self.website_extractors.get(hostname, self.website_extractors["default"])
+
+    def _create_document(self: Self, extracted: ExtractedPage, page_url: str) -> Document:
+        indexed_on = datetime.timestamp(datetime.now().utcnow())
+        metadata = {
+            "source_website": urlparse(page_url).hostname,
+            "source_uri": page_url,
+            "indexed_on": indexed_on,
+            "page_title": extracted.title,
+            "page_subtitle": extracted.subtitle,
+        }
+
+        if self.website_metadata is not None:
+            metadata.update(self.website_metadata(page_url))
 
-        return all_documents
+        return Document(text=extracted.text, extra_info=metadata)
 
     def get_document_list(self: Self) -> List[DocumentListItem]:
         """Return a list of documents. Can be used for tracking state overtime by implementing persistence and displaying document lists to users."""
+        if self.manifest is not None:
+            # unchanged pages weren't yielded, the manifest has every page crawled.
+            return self.manifest.get_document_list()
         return self._document_list
-
-    @staticmethod
-    @tracer.start_as_current_span(name="extract_links")
-    def _extract_links(url: str, extractor: BaseTextExtractor, include_filter: Optional[str] = None) -> List[str]:
-        span = trace.get_current_span()
-        log.debug("Now processing root URL: %s", url)
-        span.add_event("start_processing_url", {"url": url})
-
-        try:
-            page = requests.get(url, timeout=5)
-            span.add_event("url_requested", {"url": url, "response_bytes": len(page.content)})
-        except Exception as e:
-            span.record_exception(e)
-            span.set_status(trace.Status(trace.StatusCode.ERROR, f"One of the inputs is not a valid url: {url}"))
-            raise ValueError(f"One of the inputs is not a valid url: {url}", e)  # noqa: B904
-
-        soup = BeautifulSoup(page.content, "html.parser")
-
-        page_links = extractor.extract_links(soup, url, url, include_filter=include_filter)
-        return page_links
@@ -2,13 +2,14 @@
 
 import logging as log
 from datetime import datetime
-from typing import List, Optional, Self
+from typing import Iterator, List, Optional, Self
 
 from llama_index.core.schema import Document
 
 from ..domain import ConfigKey, SourcePageType, SpaceKey
 from ..support.store import get_index_dir
-from .main import DocumentMetadata, SpaceDataSourceWebBased
+from .main import DocumentMetadata, DocumentSync, SpaceDataSourceWebBased
+from .support.manifest import SyncManifest
 from .support.web_extracting import BeautifulSoupWebReader, GenericTextExtractor
 
 
@@ -33,6 +34,7 @@ class WebScraper(SpaceDataSourceWebBased):
                     "select_box_options": {
                         SourcePageType.index_page.name: SourcePageType.index_page.value,
                         SourcePageType.page_list.name: SourcePageType.page_list.value,
+                        SourcePageType.sitemap.name: SourcePageType.sitemap.value,
                     },
                 },
             ),
@@ -44,38 +46,40 @@ class WebScraper(SpaceDataSourceWebBased):
                 True,
                 ref_link="Python Regex. URLs that match will be included in the index.",
             ),
+            ConfigKey(
+                "crawl_depth",
+                "Crawl Depth",
+                True,
+                ref_link="How many links deep to follow from index pages. Defaults to 1, the pages they link to.",
+            ),
         ]
 
     def load(self: Self, space: SpaceKey, configs: dict) -> List[Document]:
         """Extract text from web pages on a website and load each page as a Document."""
-        _documents = []
-        try:
-            log.debug("configs: %s", configs)
-            persist_path = get_index_dir(space)
-
-            bs_web_reader = self._initiate_web_reader(space, configs)
-
-            source_page_type_str = configs.get("source_page_type")
-            log.debug("source_page_type: ", source_page_type_str)
-            source_page_type = (
-                SourcePageType[source_page_type_str[0]] if source_page_type_str else SourcePageType.index_page
-            )
-
-            _documents = bs_web_reader.load_data(
-                urls=configs["website_url"].split(","),
-                include_filter=configs["include_filter"],
-                source_page_type=source_page_type,
-            )
-
-            document_list = bs_web_reader.get_document_list()
-
-            log.debug("created document list: %s", document_list)
-            self._save_document_list(document_list, persist_path, self._DOCUMENT_LIST_FILENAME)
+        return list(self.iter_documents(space, configs))
 
-            log.info("web doc count %d", len(_documents))
+    def iter_documents(self: Self, space: SpaceKey, configs: dict) -> Iterator[Document]:
+        """Extract text from web pages on a website and yield each page as a Document as it's scraped."""
+        try:
+            yield from self._iter_documents(space, configs)
         except Exception as e:
             log.error("Error loading web documents", e)
 
+    def sync_documents(
+        self: Self, space: SpaceKey, configs: dict, incremental: bool = False
+    ) -> tuple[Iterator[Document], DocumentSync]:
+        """Yield the documents of pages that changed since the last sync, when `incremental`.
+
+        Pages are fetched conditionally with the `ETag` and `Last-Modified` of the last sync. Unlike `iter_documents()`
+        errors are raised so a failed crawl fails the reindex rather than removing every page from the index.
+        """
+        return self._sync_with_manifest(
+            space, incremental, lambda manifest: self._iter_documents(space, configs, manifest)
+        )
+
+    def _iter_documents(
+        self: Self, space: SpaceKey, configs: dict, manifest: Optional[SyncManifest] = None
+    ) -> Iterator[Document]:
         webscaper_metadata_keys = []
         exclude_embed_metadata_keys_ = [
             str(DocumentMetadata.SPACE_ID.name).lower(),
@@ -95,9 +99,40 @@ class WebScraper(SpaceDataSourceWebBased):
             str(DocumentMetadata.INDEXED_ON.name).lower(),
         ]
 
-        return self._add_exclude_metadata_keys(_documents, exclude_embed_metadata_keys_, excluded_llm_metadata_keys_)
+        doc_count = 0
+        log.debug("configs: %s", configs)
+        persist_path = get_index_dir(space)
+
+        bs_web_reader = self._initiate_web_reader(space, configs, manifest)
+
+        source_page_type_str = configs.get("source_page_type")
+        log.debug("source_page_type: ", source_page_type_str)
+        source_page_type = (
+            SourcePageType[source_page_type_str[0]] if source_page_type_str else SourcePageType.index_page
+        )
+        crawl_depth = configs.get("crawl_depth")
+
+        for document in bs_web_reader.iter_data(
+            urls=configs["website_url"].split(","),
+            include_filter=configs["include_filter"],
+            source_page_type=source_page_type,
+            max_depth=int(crawl_depth) if crawl_depth else None,
+        ):
+            doc_count += 1
+            yield from self._add_exclude_metadata_keys(
+                [document], exclude_embed_metadata_keys_, excluded_llm_metadata_keys_
+            )
+
+        document_list = bs_web_reader.get_document_list()
+
+        log.debug("created document list: %s", document_list)
+        self._save_document_list(document_list, persist_path, self._DOCUMENT_LIST_FILENAME)
+
+        log.info("web doc count %d", doc_count)
 
-    def _initiate_web_reader(self: Self, space: SpaceKey, configs: dict) -> BeautifulSoupWebReader:
+    def _initiate_web_reader(
+        self: Self, space: SpaceKey, configs: dict, manifest: Optional[SyncManifest] = None
+    ) -> BeautifulSoupWebReader:
         """Initialize the web reader."""
 
         def lambda_metadata(x: str) -> dict:
@@ -114,4 +149,5 @@ class WebScraper(SpaceDataSourceWebBased):
                 "default": GenericTextExtractor(),
             },
             lambda_metadata,
+            manifest=manifest,
         )
@@ -7,7 +7,7 @@ from contextlib import closing
 from opentelemetry import trace
 
 import docq
-from docq.support.store import SpaceType, get_sqlite_org_slack_messages_file, get_sqlite_shared_system_file
+from docq.support.store import SpaceType, get_sqlite_shared_system_file
 
 tracer = trace.get_tracer(__name__, docq.__version_str__)
 
@@ -80,22 +80,21 @@ def add_space_type_to_spaces_table() -> None:
             raise Exception("Migration add_space_type_to_spaces_table failed") from e
 
 #####
-# NOTE: this is being called from the slack_messages init() function for ease because org scoped.
+# NOTE: this is a migration of the slack messages schema, run by `ensure_schema()` because it's org scoped.
 #####
-def add_column_threadts_to_slackmessages_table(org_id: int) -> None:
+def add_column_threadts_to_slackmessages_table(connection: sqlite3.Connection) -> None:
     """Add thread_ts column to docq_slack_messages table.
 
     Check if thread_ts column exists in docq_slack_messages table. if exists log and return.
 
-    Create thread_ts column in docq_slack_messages table with parameter thread_ts TEXT.
+    Create thread_ts column in docq_slack_messages table with parameter thread_ts TEXT. Runs in the caller's
+    transaction, which is rolled back if this fails.
     """
     with tracer.start_as_current_span("add_column_threadts_to_slackmessages_table") as span:
         span.add_event("Running migration add_column_threadts_to_slackmessages_table")
         logging.info("Running migration add_column_threadts_to_slackmessages_table")
 
-        with closing(sqlite3.connect(get_sqlite_org_slack_messages_file(org_id=org_id))) as connection, closing(
-            connection.cursor()
-        ) as cursor:
+        with closing(connection.cursor()) as cursor:
             cursor.execute("SELECT name FROM pragma_table_info('docq_slack_messages') WHERE name = 'thread_ts'")
 
             if cursor.fetchone() is None:
@@ -104,11 +103,9 @@ def add_column_threadts_to_slackmessages_table(org_id: int) -> None:
                 )
                 span.add_event("thread_ts column does not exist, adding it")
                 try:
-                    cursor.execute("BEGIN TRANSACTION")
                     cursor.execute(
                         "ALTER TABLE docq_slack_messages ADD COLUMN thread_ts TEXT",
                     )
-                    connection.commit()
                     logging.info(
                         "db_migrations.add_column_threadts_to_slackmessages_table, thread_ts column added successfully"
                     )
@@ -127,4 +124,4 @@ def add_column_threadts_to_slackmessages_table(org_id: int) -> None:
                     )
                     span.set_attribute("migration_successful", "false")
                     span.record_exception(e)
-                    connection.rollback()
+                    raise
@@ -63,6 +63,7 @@ class SourcePageType(Enum):
 
     index_page = "Index Page"
     page_list = "Page List"
+    sitemap = "Sitemap"
 
 
 @dataclass
@@ -2,12 +2,11 @@
 
 import logging
 import sqlite3
-from contextlib import closing
 from typing import Optional
 
 from docq.config import SpaceType
 from docq.domain import SpaceKey
-from docq.support.store import get_sqlite_shared_system_file
+from docq.support.store import get_sqlite_shared_system_file, sqlite_connection
 from slack_sdk.oauth.installation_store import Installation
 
 from .models import SlackChannel, SlackInstallation
@@ -49,7 +48,7 @@ CREATE TABLE IF NOT EXISTS docq_slack_channels (
 
 def _init() -> None:
     """Initialize the Slack integration."""
-    with closing(sqlite3.connect(get_sqlite_shared_system_file())) as connection:
+    with sqlite_connection(get_sqlite_shared_system_file()) as connection:
         connection.execute(SQL_CREATE_DOCQ_SLACK_APP_INSTALL_TABLE)
         connection.execute(SQL_CREATE_DOCQ_SLACK_CHANNELS_TABLE)
         connection.commit()
@@ -57,7 +56,7 @@ def _init() -> None:
 
 def create_docq_slack_installation(installation: Installation, org_id: int) -> None:
     """Create a Docq installation."""
-    with closing(sqlite3.connect(get_sqlite_shared_system_file())) as connection:
+    with sqlite_connection(get_sqlite_shared_system_file()) as connection:
         connection.execute(
             "INSERT OR REPLACE INTO docq_slack_installations (app_id, team_id, team_name, org_id) VALUES (?, ?, ?, ?)",
             (installation.app_id, installation.team_id, installation.team_name, org_id),
@@ -67,7 +66,7 @@ def create_docq_slack_installation(installation: Installation, org_id: int) -> N
 
 def update_docq_slack_installation(app_id: str, team_name: str, org_id: int, space_group_id: int) -> None:
     """Update a Docq installation."""
-    with closing(sqlite3.connect(get_sqlite_shared_system_file())) as connection:
+    with sqlite_connection(get_sqlite_shared_system_file()) as connection:
         connection.execute(
             "UPDATE docq_slack_installations SET space_group_id = ? WHERE app_id = ? AND team_name = ? AND org_id = ?",
             (space_group_id, app_id, team_name, org_id),
@@ -77,7 +76,7 @@ def update_docq_slack_installation(app_id: str, team_name: str, org_id: int, spa
 
 def list_docq_slack_installations(org_id: Optional[int], team_id: Optional[str]) -> list[SlackInstallation]:
     """List Docq installations."""
-    with closing(sqlite3.connect(get_sqlite_shared_system_file())) as connection:
+    with sqlite_connection(get_sqlite_shared_system_file()) as connection:
         cursor = connection.cursor()
         if org_id:
             criteria = " WHERE org_id = ?"
@@ -101,7 +100,7 @@ def list_docq_slack_installations(org_id: Optional[int], team_id: Optional[str])
 
 # def get_docq_slack_installation(app_id: str, team_id: str, org_id: int) -> SlackInstallation:
 #     """Get a Docq installation."""
-#     with closing(sqlite3.connect(get_sqlite_shared_system_file())) as connection:
+#     with sqlite_connection(get_sqlite_shared_system_file()) as connection:
 #         cursor = connection.cursor()
 #         cursor.execute(
 #             "SELECT app_id, team_id, team_name, org_id, space_group_id, created_at FROM docq_slack_installations WHERE app_id = ? AND team_id = ? AND org_id = ?",
@@ -115,7 +114,7 @@ def list_docq_slack_installations(org_id: Optional[int], team_id: Optional[str])
 
 def integration_exists(app_id: str, team_id: str, selected_org_id: int) -> bool:
     """Check if an integration exists."""
-    with closing(sqlite3.connect(get_sqlite_shared_system_file())) as connection:
+    with sqlite_connection(get_sqlite_shared_system_file()) as connection:
         cursor = connection.cursor()
         cursor.execute(
             "SELECT id FROM docq_slack_installations WHERE app_id = ? AND team_id = ? AND org_id = ?",
@@ -129,7 +128,7 @@ def integration_exists(app_id: str, team_id: str, selected_org_id: int) -> bool:
 
 def insert_or_update_slack_channel(channel_id: str, channel_name: str, org_id: int) -> None:
     """Insert or update a channel."""
-    with closing(sqlite3.connect(get_sqlite_shared_system_file())) as connection:
+    with sqlite_connection(get_sqlite_shared_system_file()) as connection:
         connection.execute(
             "INSERT OR REPLACE INTO docq_slack_channels (channel_id, channel_name, org_id) VALUES (?, ?, ?)",
             (channel_id, channel_name, org_id),
@@ -139,7 +138,7 @@ def insert_or_update_slack_channel(channel_id: str, channel_name: str, org_id: i
 
 def link_space_group_to_slack_channel(org_id: int, channel_id: str, channel_name: str, space_group_id: int,) -> None:
     """Add a space group to a channel."""
-    with closing(sqlite3.connect(get_sqlite_shared_system_file())) as connection:
+    with sqlite_connection(get_sqlite_shared_system_file()) as connection:
         connection.execute(
             "INSERT OR REPLACE INTO docq_slack_channels (space_group_id, channel_id, channel_name, org_id) VALUES (?, ?, ?, ?)",
             (space_group_id, channel_id, channel_name, org_id),
@@ -149,7 +148,7 @@ def link_space_group_to_slack_channel(org_id: int, channel_id: str, channel_name
 
 def get_slack_channel_linked_space_group_id(org_id: int, channel_id: str) -> Optional[int]:
     """Get a channel space group id."""
-    with closing(sqlite3.connect(get_sqlite_shared_system_file())) as connection:
+    with sqlite_connection(get_sqlite_shared_system_file()) as connection:
         cursor = connection.cursor()
         try:
             cursor.execute(
@@ -165,7 +164,7 @@ def get_slack_channel_linked_space_group_id(org_id: int, channel_id: str) -> Opt
 
 def list_slack_channels(org_id: int) -> list[SlackChannel]:
     """List Slack channels."""
-    with closing(sqlite3.connect(get_sqlite_shared_system_file())) as connection:
+    with sqlite_connection(get_sqlite_shared_system_file()) as connection:
         cursor = connection.cursor()
         cursor.execute(
             "SELECT channel_id, channel_name, org_id, space_group_id, created_at FROM docq_slack_channels WHERE org_id = ?",
@@ -182,7 +181,7 @@ def list_slack_channels(org_id: int) -> list[SlackChannel]:
 
 def get_slack_channel(channel_id: str) -> SlackChannel:
     """Get a channel."""
-    with closing(sqlite3.connect(get_sqlite_shared_system_file())) as connection:
+    with sqlite_connection(get_sqlite_shared_system_file()) as connection:
         cursor = connection.cursor()
         cursor.execute(
             "SELECT channel_id, channel_name, org_id, space_group_id, created_at FROM docq_slack_channels WHERE channel_id = ?",
@@ -196,7 +195,7 @@ def get_slack_channel(channel_id: str) -> SlackChannel:
 
 def get_slack_bot_token(app_id: str, team_id: str) -> str:
     """Get a bot token."""
-    with closing(sqlite3.connect(get_sqlite_shared_system_file())) as connection:
+    with sqlite_connection(get_sqlite_shared_system_file()) as connection:
         cursor = connection.cursor()
         cursor.execute(
             "SELECT bot_token FROM slack_bots WHERE app_id = ? AND team_id = ?", (app_id, team_id)
@@ -205,7 +204,7 @@ def get_slack_bot_token(app_id: str, team_id: str) -> str:
 
 def get_rag_spaces(channel_id: str) -> Optional[list[SpaceKey]]:
     """Get a list of spaces configured for the given channel."""
-    with closing(sqlite3.connect(get_sqlite_shared_system_file())) as connection:
+    with sqlite_connection(get_sqlite_shared_system_file()) as connection:
         cursor = connection.cursor()
         cursor.execute(
             """
@@ -224,7 +223,7 @@ def get_rag_spaces(channel_id: str) -> Optional[list[SpaceKey]]:
 
 def get_org_id_from_channel_id(channel_id: str) -> Optional[int]:
     """Get the org id from a channel id."""
-    with closing(sqlite3.connect(get_sqlite_shared_system_file())) as connection:
+    with sqlite_connection(get_sqlite_shared_system_file()) as connection:
         cursor = connection.cursor()
         cursor.execute(
             "SELECT org_id FROM docq_slack_channels WHERE channel_id = ?", (channel_id,)
@@ -1,13 +1,11 @@
 """Slack messages handler."""
 
-import sqlite3
-from contextlib import closing
 from typing import List, Optional
 
 from docq import db_migrations
 from llama_index.core.llms import ChatMessage, MessageRole
 
-from ...support.store import get_sqlite_org_slack_messages_file
+from ...support.store import SqliteSchema, ensure_schema, get_sqlite_org_slack_messages_file, sqlite_connection
 from .models import SlackMessage
 
 SQL_CREATE_TABLE_DOCQ_SLACK_MESSAGES = """
@@ -26,16 +24,19 @@ CREATE TABLE IF NOT EXISTS docq_slack_messages (
 """
 #
 
+SLACK_MESSAGES_SCHEMA = SqliteSchema(
+    name="docq_slack_messages",
+    migrations=(SQL_CREATE_TABLE_DOCQ_SLACK_MESSAGES, db_migrations.add_column_threadts_to_slackmessages_table),
+)
+
 
 def _init(org_id: int) -> None:
     """Initialize the Slack integration.
 
-    We don't call this in setup because and org_id context is required.
+    We don't call this in setup because and org_id context is required. The schema is only checked against the
+    database the first time for each org in a process.
     """
-    with closing(sqlite3.connect(get_sqlite_org_slack_messages_file(org_id=org_id))) as connection:
-        connection.execute(SQL_CREATE_TABLE_DOCQ_SLACK_MESSAGES)
-        connection.commit()
-        db_migrations.add_column_threadts_to_slackmessages_table(org_id)
+    ensure_schema(get_sqlite_org_slack_messages_file(org_id=org_id), SLACK_MESSAGES_SCHEMA)
 
 
 def insert_or_update_message(
@@ -51,7 +52,7 @@ def insert_or_update_message(
 ) -> None:
     """Insert or update a message."""
     _init(org_id)
-    with closing(sqlite3.connect(get_sqlite_org_slack_messages_file(org_id=org_id))) as connection:
+    with sqlite_connection(get_sqlite_org_slack_messages_file(org_id=org_id)) as connection:
         connection.execute(
             "INSERT OR REPLACE INTO docq_slack_messages (client_msg_id, type, channel_id, team_id, user_id, text, ts, thread_ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
             (client_msg_id, type_, channel, team, user, text, ts, thread_ts),
@@ -62,7 +63,7 @@ def insert_or_update_message(
 def is_message_handled(client_msg_id: str, ts: str, org_id: int) -> bool:
     """Check if a message exists."""
     _init(org_id)
-    with closing(sqlite3.connect(get_sqlite_org_slack_messages_file(org_id=org_id))) as connection:
+    with sqlite_connection(get_sqlite_org_slack_messages_file(org_id=org_id)) as connection:
         cursor = connection.cursor()
         cursor.execute(
             "SELECT id FROM docq_slack_messages WHERE client_msg_id = ? AND ts = ?",
@@ -77,7 +78,7 @@ def list_slack_messages(channel: str, org_id: int) -> list[SlackMessage]:
     unthreaded and threaded messages.
     """
     _init(org_id)
-    with closing(sqlite3.connect(get_sqlite_org_slack_messages_file(org_id=org_id))) as connection:
+    with sqlite_connection(get_sqlite_org_slack_messages_file(org_id=org_id)) as connection:
         cursor = connection.cursor()
         cursor.execute(
             "SELECT client_msg_id, type, channel_id, team_id, user_id, text, ts, thread_ts, created_at FROM docq_slack_messages WHERE channel_id = ?",
@@ -103,7 +104,7 @@ def list_slack_messages(channel: str, org_id: int) -> list[SlackMessage]:
 def list_slack_thread_messages(channel: str, org_id: int, thread_ts: str) -> list[SlackMessage]:
     """Get a list of messages for a specific thread."""
     _init(org_id)
-    with closing(sqlite3.connect(get_sqlite_org_slack_messages_file(org_id=org_id))) as connection:
+    with sqlite_connection(get_sqlite_org_slack_messages_file(org_id=org_id)) as connection:
         cursor = connection.cursor()
         cursor.execute(
             "SELECT client_msg_id, type, channel_id, team_id, user_id, text, ts, thread_ts, created_at FROM docq_slack_messages WHERE channel_id = ? AND thread_ts = ?",
@@ -12,6 +12,7 @@ from docq.domain import Assistant, AssistantType
 from docq.support.store import (
     get_sqlite_global_system_file,
     get_sqlite_org_system_file,
+    sqlite_connection,
 )
 
 DEFAULT_QA_SYSTEM_PROMPT = """
@@ -138,8 +139,8 @@ def _init(org_id: Optional[int] = None) -> None:
     Args:
         org_id (Optional[int]): The org id. If None then will initialise the global scope table.
     """
-    with closing(
-        sqlite3.connect(__get_assistants_sqlite_file(org_id=org_id), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        __get_assistants_sqlite_file(org_id=org_id), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(SQL_CREATE_ASSISTANTS_TABLE)
         connection.commit()
@@ -245,8 +246,8 @@ def list_assistants(org_id: Optional[int] = None, assistant_type: Optional[Assis
         sql += " WHERE type = ?"
         params = (assistant_type.name,)
 
-    with closing(
-        sqlite3.connect(__get_assistants_sqlite_file(org_id=org_id), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        __get_assistants_sqlite_file(org_id=org_id), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(sql, params)
         rows = cursor.fetchall()
@@ -272,7 +273,7 @@ def get_assistant(assistant_scoped_id: str, org_id: Optional[int]) -> ASSISTANT:
         # global scope
         path = __get_assistants_sqlite_file(org_id=None)
 
-    with closing(sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)) as connection, closing(
+    with sqlite_connection(path, detect_types=sqlite3.PARSE_DECLTYPES) as connection, closing(
         connection.cursor()
     ) as cursor:
         cursor.execute(
@@ -350,8 +351,8 @@ def create_or_update_assistant(
         result_id = assistant_id
 
     try:
-        with closing(
-            sqlite3.connect(__get_assistants_sqlite_file(org_id=org_id), detect_types=sqlite3.PARSE_DECLTYPES)
+        with sqlite_connection(
+            __get_assistants_sqlite_file(org_id=org_id), detect_types=sqlite3.PARSE_DECLTYPES
         ) as connection, closing(connection.cursor()) as cursor:
             cursor.execute(
                 sql,
@@ -382,8 +383,8 @@ def __get_assistants_sqlite_file(org_id: Optional[int]) -> str:
 
 def __create_default_assistants_if_needed() -> None:
     """Create the default personas."""
-    with closing(
-        sqlite3.connect(__get_assistants_sqlite_file(org_id=None), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        __get_assistants_sqlite_file(org_id=None), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(
             "SELECT id, name, type, archived, system_prompt_template, user_prompt_template, llm_settings_collection_key, created_at, updated_at FROM assistants WHERE name in ('General Q&A','General Q&A Assistant','Elon Musk')"
@@ -12,16 +12,16 @@ from streamlit import runtime
 
 from .data_source.main import DocumentMetadata
 from .domain import SpaceKey
-from .manage_spaces import reindex
+from .manage_indexing_jobs import enqueue_reindex
 from .support.store import get_upload_dir, get_upload_file
 
 
-def upload(filename: str, content: bytes, space: SpaceKey) -> None:
-    """Upload the file to the space."""
+def upload(filename: str, content: bytes, space: SpaceKey) -> int:
+    """Upload the file to the space. Returns the id of the indexing job queued for the space."""
     with open(get_upload_file(space, filename), "wb") as f:
         f.write(content)
 
-    reindex(space)
+    return enqueue_reindex(space)
 
 
 def get_file(filename: str, space: SpaceKey) -> str:
@@ -29,19 +29,19 @@ def get_file(filename: str, space: SpaceKey) -> str:
     return get_upload_file(space, filename)
 
 
-def delete(filename: str, space: SpaceKey) -> None:
-    """Delete the file from the space."""
+def delete(filename: str, space: SpaceKey) -> int:
+    """Delete the file from the space. Returns the id of the indexing job queued for the space."""
     file = get_upload_file(space, filename)
     os.remove(file)
 
-    reindex(space)
+    return enqueue_reindex(space)
 
 
-def delete_all(space: SpaceKey) -> None:
-    """Delete all files in the space."""
+def delete_all(space: SpaceKey) -> int:
+    """Delete all files in the space. Returns the id of the indexing job queued for the space."""
     shutil.rmtree(get_upload_dir(space))
 
-    reindex(space)
+    return enqueue_reindex(space)
 
 def _is_web_address(uri: str) -> bool:
     """Return true if the uri is a web address."""
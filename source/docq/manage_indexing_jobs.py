@@ -0,0 +1,419 @@
+"""Functions to manage background indexing jobs.
+
+Reindexing a space can take minutes, e.g. a large web scraper space, so it's queued as a job instead of running in
+the Streamlit script run or API request that asked for it. Jobs are persisted in SQLite and run by a pool of worker
+threads. Only one job per space runs at a time, which stops concurrent reindexes of a space racing to persist its
+index, and a request for a space that already has a job waiting is coalesced into that job.
+
+Several processes can share the jobs table. A running job is leased to the process running it, which renews the
+lease with a heartbeat. Jobs whose lease expires, e.g. because the process was killed, are queued again.
+"""
+
+import logging as log
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Any, ContextManager, List, Optional, Self
+
+from opentelemetry import trace
+
+import docq
+
+from .config import ENV_VAR_DOCQ_INDEXING_MAX_WORKERS, SpaceType
+from .domain import SpaceKey
+from .manage_indices import IndexingCancelledError, IndexingProgress
+from .support.store import SqliteSchema, ensure_schema, get_sqlite_shared_system_file, sqlite_connection
+
+tracer = trace.get_tracer(__name__, docq.__version_str__)
+
+DEFAULT_MAX_WORKERS = 2
+POLL_INTERVAL_SECONDS = 5
+"""How often idle workers look for jobs they weren't notified about, e.g. queued by another process."""
+HEARTBEAT_INTERVAL_SECONDS = 30
+"""How often a process renews the leases of the jobs it's running."""
+LEASE_SECONDS = 120
+"""How long after its last heartbeat a running job is presumed abandoned and queued again."""
+
+_WORKER_ID = uuid.uuid4().hex
+"""Identifies this process as the owner of the jobs it runs."""
+
+SQL_CREATE_INDEXING_JOBS_TABLE = """
+CREATE TABLE IF NOT EXISTS indexing_jobs (
+    id INTEGER PRIMARY KEY,
+    org_id INTEGER NOT NULL,
+    space_type TEXT NOT NULL,
+    space_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    documents_loaded INTEGER,
+    nodes_to_embed INTEGER,
+    nodes_embedded INTEGER,
+    cancel_requested BOOL DEFAULT 0,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+)
+"""
+
+SQL_CREATE_INDEXING_JOBS_SPACE_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_indexing_jobs_space_status ON indexing_jobs (org_id, space_type, space_id, status)
+"""
+
+INDEXING_JOBS_SCHEMA = SqliteSchema(
+    name="indexing_jobs",
+    migrations=(
+        SQL_CREATE_INDEXING_JOBS_TABLE,
+        SQL_CREATE_INDEXING_JOBS_SPACE_INDEX,
+        "ALTER TABLE indexing_jobs ADD COLUMN worker_id TEXT",
+        "ALTER TABLE indexing_jobs ADD COLUMN heartbeat_at REAL",
+    ),
+)
+
+_SELECT_JOB = "SELECT id, org_id, space_type, space_id, status, documents_loaded, nodes_to_embed, nodes_embedded, cancel_requested, error, created_at, started_at, finished_at FROM indexing_jobs"
+
+
+class IndexingJobStatus(Enum):
+    """Indexing job status."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+FINISHED_STATUSES = (IndexingJobStatus.SUCCEEDED, IndexingJobStatus.FAILED, IndexingJobStatus.CANCELLED)
+
+
+@dataclass
+class IndexingJob:
+    """A request to reindex a space and its progress."""
+
+    id_: int
+    space: SpaceKey
+    status: IndexingJobStatus
+    documents_loaded: Optional[int]
+    """Number of documents loaded from the data source so far. None until the first batch is loaded."""
+    nodes_to_embed: Optional[int]
+    """Number of new or changed nodes parsed for embedding so far. None until the first batch is parsed."""
+    nodes_embedded: Optional[int]
+    cancel_requested: bool
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    @property
+    def is_finished(self: Self) -> bool:
+        """True once the job has succeeded, failed or been cancelled."""
+        return self.status in FINISHED_STATUSES
+
+
+def _connect() -> ContextManager[sqlite3.Connection]:
+    db_file = get_sqlite_shared_system_file()
+    ensure_schema(db_file, INDEXING_JOBS_SCHEMA)
+    return sqlite_connection(db_file, detect_types=sqlite3.PARSE_DECLTYPES)
+
+
+def _format_job(row: Any) -> IndexingJob:
+    return IndexingJob(
+        id_=row[0],
+        space=SpaceKey(SpaceType[row[2]], row[3], row[1]),
+        status=IndexingJobStatus(row[4]),
+        documents_loaded=row[5],
+        nodes_to_embed=row[6],
+        nodes_embedded=row[7],
+        cancel_requested=bool(row[8]),
+        error=row[9],
+        created_at=row[10],
+        started_at=row[11],
+        finished_at=row[12],
+    )
+
+
+def _space_params(space: SpaceKey) -> tuple[int, str, int]:
+    return (space.org_id, space.type_.name, space.id_)
+
+
+class _JobProgress(IndexingProgress):
+    """Records the progress of a running job and cancels it when requested or its lease has been lost."""
+
+    def __init__(self: Self, job_id: int, worker_id: str = _WORKER_ID) -> None:
+        self.job_id = job_id
+        self.worker_id = worker_id
+
+    def _update(self: Self, column: str, count: int) -> None:
+        sql = f"UPDATE indexing_jobs SET {column} = COALESCE({column}, 0) + ? WHERE id = ?"  # noqa: S608
+        with _connect() as connection:
+            connection.execute(sql, (count, self.job_id))
+            connection.commit()
+
+    def on_documents_loaded(self: Self, count: int) -> None:
+        """Add to the number of documents loaded."""
+        self._update("documents_loaded", count)
+
+    def on_nodes_parsed(self: Self, count: int) -> None:
+        """Add to the number of nodes to embed."""
+        self._update("nodes_to_embed", count)
+
+    def on_nodes_embedded(self: Self, count: int) -> None:
+        """Add to the number of nodes embedded."""
+        self._update("nodes_embedded", count)
+
+    def check_cancelled(self: Self) -> None:
+        """Raise `IndexingCancelledError` if `cancel_job()` was called for this job or another process took it over."""
+        with _connect() as connection:
+            row = connection.execute(
+                "SELECT cancel_requested, worker_id FROM indexing_jobs WHERE id = ?", (self.job_id,)
+            ).fetchone()
+        if row is not None and row[0]:
+            raise IndexingCancelledError(f"Indexing job {self.job_id} was cancelled")
+        if row is not None and row[1] != self.worker_id:
+            raise IndexingCancelledError(f"Indexing job {self.job_id} lost its lease, it was requeued")
+
+
+def _requeue_expired_jobs(connection: sqlite3.Connection) -> None:
+    """Queue running jobs again whose lease has expired. Those that were being cancelled are cancelled."""
+    expired_before = time.time() - LEASE_SECONDS
+    expired = "status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)"
+    cancelled = connection.execute(
+        f"UPDATE indexing_jobs SET status = ?, finished_at = CURRENT_TIMESTAMP WHERE {expired} AND cancel_requested = 1",  # noqa: S608
+        (IndexingJobStatus.CANCELLED.value, IndexingJobStatus.RUNNING.value, expired_before),
+    ).rowcount
+    requeued = connection.execute(
+        f"UPDATE indexing_jobs SET status = ?, started_at = NULL, worker_id = NULL, heartbeat_at = NULL WHERE {expired}",  # noqa: S608
+        (IndexingJobStatus.QUEUED.value, IndexingJobStatus.RUNNING.value, expired_before),
+    ).rowcount
+    if cancelled or requeued:
+        log.info("Indexing job leases expired, %s requeued and %s cancelled", requeued, cancelled)
+
+
+def _claim_next_job(worker_id: str = _WORKER_ID) -> Optional[IndexingJob]:
+    """Mark the oldest queued job whose space has no running job as running, leased to the worker, and return it."""
+    with _connect() as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        _requeue_expired_jobs(connection)
+        row = connection.execute(
+            f"""{_SELECT_JOB} AS j WHERE status = ? AND NOT EXISTS (
+                SELECT 1 FROM indexing_jobs r
+                WHERE r.org_id = j.org_id AND r.space_type = j.space_type AND r.space_id = j.space_id AND r.status = ?
+            ) ORDER BY id LIMIT 1""",  # noqa: S608
+            (IndexingJobStatus.QUEUED.value, IndexingJobStatus.RUNNING.value),
+        ).fetchone()
+        if row is None:
+            connection.commit()
+            return None
+        connection.execute(
+            "UPDATE indexing_jobs SET status = ?, started_at = CURRENT_TIMESTAMP, worker_id = ?, heartbeat_at = ? WHERE id = ?",
+            (IndexingJobStatus.RUNNING.value, worker_id, time.time(), row[0]),
+        )
+        connection.commit()
+    return _format_job(row)
+
+
+def _finish_job(
+    job_id: int, status: IndexingJobStatus, error: Optional[str] = None, worker_id: str = _WORKER_ID
+) -> None:
+    """Record the outcome of a job, unless its lease expired and it's been taken over since."""
+    with _connect() as connection:
+        connection.execute(
+            "UPDATE indexing_jobs SET status = ?, error = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ? AND worker_id = ?",
+            (status.value, error, job_id, worker_id),
+        )
+        connection.commit()
+
+
+def _renew_leases(worker_id: str = _WORKER_ID) -> None:
+    """Heartbeat the jobs the worker is running."""
+    with _connect() as connection:
+        connection.execute(
+            "UPDATE indexing_jobs SET heartbeat_at = ? WHERE worker_id = ? AND status = ?",
+            (time.time(), worker_id, IndexingJobStatus.RUNNING.value),
+        )
+        connection.commit()
+
+
+def _run_job(job: IndexingJob) -> IndexingJobStatus:
+    """Reindex the space of a claimed job and record the outcome."""
+    # imported here because manage_spaces queues jobs through this module.
+    from .manage_spaces import _reindex
+
+    with tracer.start_as_current_span("manage_indexing_jobs._run_job") as span:
+        span.set_attributes({"job_id": job.id_, "space_id": job.space.id_, "space_org_id": job.space.org_id})
+        log.info("Indexing job %s started for space %s", job.id_, job.space)
+        try:
+            _reindex(job.space, _JobProgress(job.id_))
+            status, error = IndexingJobStatus.SUCCEEDED, None
+        except IndexingCancelledError:
+            status, error = IndexingJobStatus.CANCELLED, None
+        except Exception as e:
+            log.exception("Indexing job %s for space %s failed. Error: %s", job.id_, job.space, e)
+            span.record_exception(e)
+            status, error = IndexingJobStatus.FAILED, str(e)
+        _finish_job(job.id_, status, error)
+        span.set_attribute("status", status.value)
+        log.info("Indexing job %s for space %s finished: %s", job.id_, job.space, status.value)
+        return status
+
+
+class _IndexingWorkerPool:
+    """Daemon threads that claim and run queued jobs, plus one that renews the leases of the running jobs."""
+
+    def __init__(self: Self, max_workers: int) -> None:
+        self.max_workers = max_workers
+        self._threads: List[threading.Thread] = []
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+
+    def start(self: Self) -> None:
+        """Start workers, replacing any that died. Safe to call repeatedly."""
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.max_workers:
+                thread = threading.Thread(
+                    target=self._work, name=f"docq-indexing-worker-{len(self._threads)}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            if self._heartbeat_thread is None or not self._heartbeat_thread.is_alive():
+                self._heartbeat_thread = threading.Thread(
+                    target=self._heartbeat, name="docq-indexing-heartbeat", daemon=True
+                )
+                self._heartbeat_thread.start()
+
+    def notify(self: Self) -> None:
+        """Wake idle workers to look for jobs."""
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def _work(self: Self) -> None:
+        while True:
+            try:
+                job = _claim_next_job()
+            except sqlite3.Error as e:
+                log.warning("Failed to claim indexing job, will retry. Error: %s", e)
+                job = None
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(POLL_INTERVAL_SECONDS)
+                continue
+            _run_job(job)
+            # a job for the same space may have been waiting on this one.
+            self.notify()
+
+    def _heartbeat(self: Self) -> None:
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL_SECONDS)
+            try:
+                _renew_leases()
+            except sqlite3.Error as e:
+                log.warning("Failed to renew indexing job leases, will retry. Error: %s", e)
+
+
+_worker_pool = _IndexingWorkerPool(int(os.environ.get(ENV_VAR_DOCQ_INDEXING_MAX_WORKERS, DEFAULT_MAX_WORKERS)))
+
+
+@tracer.start_as_current_span("manage_indexing_jobs._init")
+def _init() -> None:
+    """Initialize the database and start the workers.
+
+    Jobs left running by a process that has since stopped are queued again once their lease expires.
+    """
+    ensure_schema(get_sqlite_shared_system_file(), INDEXING_JOBS_SCHEMA)
+    _worker_pool.start()
+
+
+@tracer.start_as_current_span("manage_indexing_jobs.enqueue_reindex")
+def enqueue_reindex(space: SpaceKey) -> int:
+    """Queue a job to reindex a space in the background.
+
+    If the space already has a queued job, that job covers this request too and no new job is created. A job that's
+    already running may have loaded the documents before the change that prompted this request, so a new job is
+    queued behind it.
+
+    Returns:
+        The id of the queued job.
+    """
+    span = trace.get_current_span()
+    with _connect() as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        row = connection.execute(
+            "SELECT id FROM indexing_jobs WHERE org_id = ? AND space_type = ? AND space_id = ? AND status = ? AND cancel_requested = 0",
+            (*_space_params(space), IndexingJobStatus.QUEUED.value),
+        ).fetchone()
+        if row is not None:
+            job_id = row[0]
+            span.add_event("coalesced", {"job_id": job_id})
+        else:
+            cursor = connection.execute(
+                "INSERT INTO indexing_jobs (org_id, space_type, space_id, status) VALUES (?, ?, ?, ?)",
+                (*_space_params(space), IndexingJobStatus.QUEUED.value),
+            )
+            job_id = cursor.lastrowid
+        connection.commit()
+    if job_id is None:
+        raise ValueError(f"Failed to queue indexing job for space {space}")
+    log.debug("enqueue_reindex(): space %s, job %s", space, job_id)
+
+    _worker_pool.start()
+    _worker_pool.notify()
+    return job_id
+
+
+def get_job(job_id: int) -> Optional[IndexingJob]:
+    """Get an indexing job."""
+    with _connect() as connection:
+        row = connection.execute(f"{_SELECT_JOB} WHERE id = ?", (job_id,)).fetchone()  # noqa: S608
+    return _format_job(row) if row else None
+
+
+def list_jobs(space: SpaceKey, limit: int = 10) -> List[IndexingJob]:
+    """List the most recent indexing jobs of a space, newest first."""
+    with _connect() as connection:
+        rows = connection.execute(
+            f"{_SELECT_JOB} WHERE org_id = ? AND space_type = ? AND space_id = ? ORDER BY id DESC LIMIT ?",  # noqa: S608
+            (*_space_params(space), limit),
+        ).fetchall()
+    return [_format_job(row) for row in rows]
+
+
+def cancel_job(job_id: int) -> bool:
+    """Cancel an indexing job.
+
+    A queued job is cancelled straight away. A running job stops at its next progress check without persisting
+    anything.
+
+    Returns:
+        False if the job doesn't exist or has already finished.
+    """
+    with _connect() as connection:
+        cancelled = connection.execute(
+            "UPDATE indexing_jobs SET status = ?, cancel_requested = 1, finished_at = CURRENT_TIMESTAMP WHERE id = ? AND status = ?",
+            (IndexingJobStatus.CANCELLED.value, job_id, IndexingJobStatus.QUEUED.value),
+        ).rowcount
+        cancel_requested = connection.execute(
+            "UPDATE indexing_jobs SET cancel_requested = 1 WHERE id = ? AND status = ?",
+            (job_id, IndexingJobStatus.RUNNING.value),
+        ).rowcount
+        connection.commit()
+    return bool(cancelled or cancel_requested)
+
+
+def wait_for_job(job_id: int, timeout: Optional[float] = None, poll_interval: float = 0.5) -> Optional[IndexingJob]:
+    """Block until a job has finished or the timeout in seconds passes.
+
+    Returns:
+        The job as last seen, check `is_finished` if a timeout was given. None if the job doesn't exist.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        job = get_job(job_id)
+        if job is None or job.is_finished or (deadline is not None and time.monotonic() >= deadline):
+            return job
+        time.sleep(poll_interval)
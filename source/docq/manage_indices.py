@@ -1,37 +1,238 @@
 """Functions to manage indices."""
 
+import hashlib
+import json
 import logging as log
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional, Self, Sequence
+from weakref import WeakKeyDictionary
 
 from llama_index.core.indices import DocumentSummaryIndex, VectorStoreIndex
 from llama_index.core.indices.base import BaseIndex
 from llama_index.core.indices.loading import load_index_from_storage
-from llama_index.core.schema import Document
+from llama_index.core.ingestion import run_transformations
+from llama_index.core.schema import BaseNode, Document
 from opentelemetry import trace
 from opentelemetry.trace import Status, StatusCode
 
 import docq
 
+from .data_source.main import DocumentMetadata
 from .domain import SpaceKey
-from .model_selection.main import LlmUsageSettingsCollection, ModelCapability, _get_service_context
-from .support.store import _get_default_storage_context, _get_storage_context, get_index_dir
+from .model_selection.main import (
+    LlmUsageSettingsCollection,
+    ModelCapability,
+    _get_service_context,
+    get_embed_max_concurrency,
+)
+from .support import response_cache
+from .support.index_cache import index_cache
+from .support.llama_index.bm25 import BM25Index
+from .support.llama_index.embeddings import embed_nodes
+from .support.store import _get_default_storage_context, _get_storage_context, get_index_dir, get_index_dir_state
 
 tracer = trace.get_tracer(__name__, docq.__version_str__)
 
+_SOURCE_URI_KEY = DocumentMetadata.SOURCE_URI.name.lower()
+_FILE_PATH_KEY = DocumentMetadata.FILE_PATH.name.lower()
+_VOLATILE_METADATA_KEYS = {DocumentMetadata.INDEXED_ON.name.lower()}
 
-@tracer.start_as_current_span("manage_spaces._create_vector_index")
-def _create_vector_index(
-    documents: List[Document], model_settings_collection: LlmUsageSettingsCollection
-) -> VectorStoreIndex:
+BM25_CACHE_COLLECTION_KEY = "__bm25__"
+"""Stands in for the model settings collection key in index cache keys. BM25 indices are model independent."""
+
+DOCUMENT_BATCH_SIZE = 64
+"""Documents are parsed, embedded and inserted this many at a time while a space is indexed."""
+
+NODE_INSERT_BATCH_SIZE = 256
+"""Embedded nodes are inserted in batches of this size so cancellation can be checked."""
+
+# The space each loaded index came from, so lexical indices persisted alongside can be found from just the index.
+_index_spaces: "WeakKeyDictionary[BaseIndex, SpaceKey]" = WeakKeyDictionary()
+
+
+class IndexingCancelledError(Exception):
+    """Raised from `IndexingProgress.check_cancelled()` to abandon indexing before anything is persisted."""
+
+
+class IndexingProgress:
+    """Receives progress while a space is indexed. The default implementation ignores it and never cancels.
+
+    Documents are streamed from the data source in batches so counts are increments, not totals.
+    """
+
+    def on_documents_loaded(self: Self, count: int) -> None:
+        """Another `count` documents were loaded from the data source."""
+
+    def on_nodes_parsed(self: Self, count: int) -> None:
+        """Another `count` nodes that need embedding were parsed from documents."""
+
+    def on_nodes_embedded(self: Self, count: int) -> None:
+        """Another `count` nodes were embedded."""
+
+    def check_cancelled(self: Self) -> None:
+        """Raise `IndexingCancelledError` if indexing should stop. Called before each batch of nodes."""
+
+
+def document_content_hash(document: Document) -> str:
+    """Hash of the text and metadata of a document, ignoring metadata that changes on every load."""
+    metadata = {k: v for k, v in document.metadata.items() if k not in _VOLATILE_METADATA_KEYS}
+    return hashlib.sha256(
+        (document.text + json.dumps(metadata, sort_keys=True, default=str)).encode("utf-8")
+    ).hexdigest()
+
+
+def iter_document_batches(
+    documents: Iterable[Document], batch_size: int = DOCUMENT_BATCH_SIZE
+) -> Iterator[List[Document]]:
+    """Group a stream of documents into lists of at most `batch_size`."""
+    batch: List[Document] = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _assign_document_ids(documents: List[Document], ordinals: Optional[Dict[str, int]] = None) -> None:
+    """Give documents ids that are stable across loads so they can be matched against a persisted docstore.
+
+    The id is derived from the source URI and the position of the document among those from the same source, e.g.
+    the pages of a PDF. Documents without a source URI fall back to their content hash.
+
+    Args:
+        documents: Documents to assign ids to, in load order.
+        ordinals: Positions seen so far per source. Pass the same dict for each batch of a stream of documents so a
+            source whose documents span batches keeps counting up.
+    """
+    ordinals = {} if ordinals is None else ordinals
+    for document in documents:
+        source = document.metadata.get(_SOURCE_URI_KEY) or document.metadata.get(_FILE_PATH_KEY)
+        if source is None:
+            document.id_ = document_content_hash(document)
+            continue
+        ordinal = ordinals.get(source, 0)
+        ordinals[source] = ordinal + 1
+        document.id_ = hashlib.sha256(f"{source}#{ordinal}".encode("utf-8")).hexdigest()
+
+
+def _insert_nodes(
+    index: VectorStoreIndex,
+    nodes: Sequence[BaseNode],
+    model_settings_collection: LlmUsageSettingsCollection,
+    progress: IndexingProgress,
+) -> None:
+    """Embed nodes concurrently then insert them in batches, reporting progress and checking for cancellation.
+
+    Embedding requests are sized and run concurrently per the model settings collection, see `aembed_nodes()`. Nodes
+    already have their embeddings when inserted so the index doesn't embed them again one batch at a time.
+    """
+    progress.on_nodes_parsed(len(nodes))
+    num_embedded = 0
+
+    def _on_embedded(total: int) -> None:
+        nonlocal num_embedded
+        progress.on_nodes_embedded(total - num_embedded)
+        num_embedded = total
+
+    embed_nodes(
+        nodes,
+        _get_service_context(model_settings_collection).embed_model,
+        max_concurrency=get_embed_max_concurrency(model_settings_collection),
+        on_embedded=_on_embedded,
+        check_cancelled=progress.check_cancelled,
+    )
+    for i in range(0, len(nodes), NODE_INSERT_BATCH_SIZE):
+        progress.check_cancelled()
+        index.insert_nodes(list(nodes[i : i + NODE_INSERT_BATCH_SIZE]))
+
+
+def _create_empty_vector_index(model_settings_collection: LlmUsageSettingsCollection) -> VectorStoreIndex:
     # Use default storage and service context to initialise index purely for persisting
-    return VectorStoreIndex.from_documents(
-        documents,
+    return VectorStoreIndex(
+        nodes=[],
         storage_context=_get_default_storage_context(),
         service_context=_get_service_context(model_settings_collection),
         kwargs=model_settings_collection.model_usage_settings[ModelCapability.CHAT].additional_args,
     )
 
 
+@tracer.start_as_current_span("manage_indices._load_index_for_update")
+def _load_index_for_update(
+    space: SpaceKey, model_settings_collection: LlmUsageSettingsCollection
+) -> Optional[VectorStoreIndex]:
+    """Load a private copy of the persisted vector index of a space to modify.
+
+    The index cache isn't used because cached indices are shared with queries in flight.
+
+    Returns:
+        None if the space doesn't have a vector index persisted yet.
+    """
+    generation, _ = get_index_dir_state(space)
+    if generation == 0:
+        return None
+    sc = _get_service_context(model_settings_collection)
+    index = load_index_from_storage(
+        storage_context=_get_storage_context(space), service_context=sc, callback_manager=sc.callback_manager
+    )
+    return index if isinstance(index, VectorStoreIndex) else None
+
+
+def _upsert_documents(
+    index: VectorStoreIndex,
+    documents: List[Document],
+    model_settings_collection: LlmUsageSettingsCollection,
+    progress: Optional[IndexingProgress] = None,
+) -> tuple[int, int]:
+    """Insert documents that are new or changed since the index was built, replacing the nodes of changed ones.
+
+    Documents are matched to the docstore by id (see `_assign_document_ids()`) and compared by content hash.
+
+    Returns:
+        (number of documents inserted, number of changed documents whose old nodes were deleted).
+    """
+    docstore = index.docstore
+    changed = [doc for doc in documents if docstore.get_document_hash(doc.id_) != document_content_hash(doc)]
+    to_delete = [doc.id_ for doc in changed if docstore.get_ref_doc_info(doc.id_) is not None]
+
+    for ref_doc_id in to_delete:
+        index.delete_ref_doc(ref_doc_id, delete_from_docstore=True)
+
+    if changed:
+        nodes = run_transformations(changed, _get_service_context(model_settings_collection).transformations)
+        _insert_nodes(index, nodes, model_settings_collection, progress or IndexingProgress())
+        # replace the Llama Index document hashes, they include volatile metadata so would never match on reindex.
+        for document in changed:
+            docstore.set_document_hash(document.id_, document_content_hash(document))
+
+    return len(changed), len(to_delete)
+
+
+def _delete_documents_except(
+    index: VectorStoreIndex, document_ids: set[str], source_uris: Optional[set[str]] = None
+) -> int:
+    """Delete the nodes of documents that aren't in `document_ids`, i.e. were removed from the data source.
+
+    Args:
+        index: The index to delete from.
+        document_ids: Ids of the documents to keep.
+        source_uris: Also keep the documents of these sources, e.g. those skipped by an incremental sync as unchanged.
+
+    Returns:
+        The number of documents deleted.
+    """
+    source_uris = source_uris or set()
+    to_delete = [
+        ref_doc_id
+        for ref_doc_id, ref_doc_info in (index.docstore.get_all_ref_doc_info() or {}).items()
+        if ref_doc_id not in document_ids
+        and (ref_doc_info.metadata or {}).get(_SOURCE_URI_KEY) not in source_uris
+    ]
+    for ref_doc_id in to_delete:
+        index.delete_ref_doc(ref_doc_id, delete_from_docstore=True)
+    return len(to_delete)
+
+
 @tracer.start_as_current_span("manage_spaces._create_document_summary_index")
 def _create_document_summary_index(
     documents: List[Document], model_settings_collection: LlmUsageSettingsCollection
@@ -49,15 +250,84 @@ def _create_document_summary_index(
 def _persist_index(index: BaseIndex, space: SpaceKey) -> None:
     """Persist an Space datasource index to disk."""
     index.storage_context.persist(persist_dir=get_index_dir(space))
+    invalidate_cached_index(space)
+
+
+@tracer.start_as_current_span("manage_indices._persist_bm25_index")
+def _persist_bm25_index(index: BaseIndex, space: SpaceKey) -> BM25Index:
+    """Build a BM25 index over the nodes in the docstore of an index and persist it in the space index dir."""
+    bm25_index = BM25Index.from_docstore(index.docstore)
+    bm25_index.persist(get_index_dir(space))
+    invalidate_cached_index(space)
+    return bm25_index
+
+
+def invalidate_cached_index(space: SpaceKey) -> None:
+    """Drop any in-memory copies of the index for a space so the next load reads it from disk.
+
+    Cached responses that used the space are dropped too.
+    """
+    removed = index_cache.invalidate(space.value())
+    log.debug("invalidate_cached_index(): space %s, %s entries removed", space, removed)
+    if response_cache.is_enabled():
+        response_cache.invalidate_space(space)
 
 
 @tracer.start_as_current_span(name="_load_index_from_storage")
 def _load_index_from_storage(space: SpaceKey, model_settings_collection: LlmUsageSettingsCollection) -> BaseIndex:
+    """Load the index for a space, reusing an in-memory copy if the persisted index hasn't changed."""
+    span = trace.get_current_span()
+    generation, size_bytes = get_index_dir_state(space)
+    cache_key = (space.value(), model_settings_collection.key, generation)
+    span.set_attributes({"space": str(space), "index_generation": generation, "index_size_bytes": size_bytes})
+
+    cached_index = index_cache.get(cache_key)
+    if cached_index is not None:
+        return cached_index
+
     # set service context explicitly for multi model compatibility
     sc = _get_service_context(model_settings_collection)
-    return load_index_from_storage(
+    index = load_index_from_storage(
         storage_context=_get_storage_context(space), service_context=sc, callback_manager=sc.callback_manager
     )
+    index_cache.put(cache_key, index, size_bytes)
+    _index_spaces[index] = space
+    return index
+
+
+@tracer.start_as_current_span(name="_load_bm25_index_from_storage")
+def _load_bm25_index_from_storage(space: SpaceKey, index: BaseIndex) -> BM25Index:
+    """Load the persisted BM25 index for a space, reusing an in-memory copy if unchanged.
+
+    Spaces indexed before BM25 indices were persisted get one built in memory from the docstore of `index`. It's
+    only persisted by the next reindex, queries never write to the index dir.
+    """
+    generation, size_bytes = get_index_dir_state(space)
+    cache_key = (space.value(), BM25_CACHE_COLLECTION_KEY, generation)
+    cached_bm25_index = index_cache.get(cache_key)
+    if cached_bm25_index is not None:
+        return cached_bm25_index
+
+    index_dir = get_index_dir(space)
+    if BM25Index.exists(index_dir):
+        bm25_index = BM25Index.load(index_dir)
+    else:
+        log.info("No BM25 index persisted for space '%s', building one in memory until it's reindexed.", space)
+        bm25_index = BM25Index.from_docstore(index.docstore)
+    index_cache.put(cache_key, bm25_index, size_bytes)
+    return bm25_index
+
+
+def load_bm25_index(index: BaseIndex) -> BM25Index:
+    """Return the BM25 index for an index.
+
+    For indices loaded from a space the persisted BM25 index is used. Otherwise (e.g. an index only held in memory)
+    one is built from the docstore, which scales with the size of the docstore.
+    """
+    space = _index_spaces.get(index)
+    if space is None:
+        return BM25Index.from_docstore(index.docstore)
+    return _load_bm25_index_from_storage(space, index)
 
 
 def load_indices_from_storage(
@@ -86,4 +356,5 @@ def load_indices_from_storage(
                 )
                 continue
         span.add_event("indices_loaded", {"num_indices_loaded": len(indices), "num_spaces_given": len(spaces)})
+        span.set_attributes(index_cache.stats().as_attributes())
         return indices
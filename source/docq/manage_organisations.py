@@ -8,7 +8,7 @@ from typing import List, Tuple
 
 from . import manage_settings, manage_users
 from .constants import DEFAULT_ORG_ID, DEFAULT_ORG_NAME
-from .support.store import get_sqlite_shared_system_file
+from .support.store import get_sqlite_shared_system_file, sqlite_connection
 
 SQL_CREATE_ORGS_TABLE = """
 CREATE TABLE IF NOT EXISTS orgs (
@@ -22,8 +22,8 @@ CREATE TABLE IF NOT EXISTS orgs (
 
 def _init() -> None:
     """Initialize the database."""
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(SQL_CREATE_ORGS_TABLE)
         connection.commit()
@@ -31,8 +31,8 @@ def _init() -> None:
 
 def _init_default_org_if_necessary() -> bool:
     created = False
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         (count,) = cursor.execute("SELECT COUNT(*) FROM orgs WHERE id = ?", (DEFAULT_ORG_ID,)).fetchone()
         if int(count) > 0:
@@ -66,8 +66,8 @@ def list_organisations(
         List[Tuple[int, str, List[Tuple[int, str, bool]], datetime, datetime]]: The list of orgs [org_id, org_name, [user id, users fullname, is org admin] created_at, updated_at].
     """
     orgs = []
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         if user_id:
             log.debug("Listing orgs that user_id '%s' is member", user_id)
@@ -99,8 +99,8 @@ def _create_organisation_sql(connection_cursor: sqlite3.Cursor, name: str) -> sq
 
     Example:
     ```python
-        with closing(
-            sqlite3.connect(get_sqlite_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+        with sqlite_connection(
+            get_sqlite_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
         ) as connection, closing(connection.cursor()) as cursor:
             try:
                 cursor.execute("BEGIN TRANSACTION")
@@ -133,8 +133,8 @@ def create_organisation(name: str, creating_user_id: int) -> int | None:
     """
     org_id = None
     log.debug("Creating org: %s", name)
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         try:
             cursor.execute("BEGIN TRANSACTION")
@@ -178,8 +178,8 @@ def update_organisation(id_: int, name: str = None) -> bool:
     query += " WHERE id = ?"
     params.append(id_)
     log.debug("Update org query: %s, params: %s", query, params)
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         try:
             cursor.execute(query, tuple(params))
@@ -200,8 +200,8 @@ def archive_organisation(id_: int) -> bool:
         bool: True if the org is archived, False otherwise.
     """
     log.debug("Archiving user: %d", id_)
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(
             "UPDATE orgs SET archived = 1, updated_at = ? WHERE id = ?",
@@ -23,7 +23,7 @@ from .config import (
     SystemSettingsKey,
     UserSettingsKey,
 )
-from .support.store import get_sqlite_shared_system_file, get_sqlite_usage_file
+from .support.store import get_sqlite_shared_system_file, get_sqlite_usage_file, sqlite_connection
 
 tracer = trace.get_tracer(__name__, docq.__version_str__)
 
@@ -73,8 +73,8 @@ def _init_default_system_settings() -> None:
 @tracer.start_as_current_span("manage_settings._init")
 def _init(user_id: Optional[int] = None) -> None:
     """Initialize the database."""
-    with closing(
-        sqlite3.connect(_get_sqlite_file(user_id), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        _get_sqlite_file(user_id), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(SQL_CREATE_SETTINGS_TABLE)
         connection.commit()
@@ -86,8 +86,8 @@ def _get_sqlite_file(user_id: Optional[int] = None) -> str:
 
 def _get_settings(org_id: int, user_id: int) -> dict[str, str]:
     log.debug("Getting settings for user '%s'", str(user_id))
-    with closing(
-        sqlite3.connect(_get_sqlite_file(user_id), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        _get_sqlite_file(user_id), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         rows = cursor.execute(
             "SELECT key, val FROM settings WHERE user_id = ? AND org_id = ?",
@@ -99,8 +99,8 @@ def _get_settings(org_id: int, user_id: int) -> dict[str, str]:
 
 
 def _update_settings(settings: dict, org_id: int, user_id: Optional[int] = None) -> bool:
-    with closing(
-        sqlite3.connect(_get_sqlite_file(user_id), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        _get_sqlite_file(user_id), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         user_id = user_id or USER_ID_AS_SYSTEM
         log.debug("Updating settings for user %d", user_id)
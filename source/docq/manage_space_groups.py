@@ -6,7 +6,7 @@ from contextlib import closing
 from datetime import datetime
 from typing import List, Tuple
 
-from .support.store import get_sqlite_shared_system_file
+from .support.store import bulk_insert, get_sqlite_shared_system_file, sqlite_connection, transaction
 
 SQL_CREATE_SPACE_GROUPS_TABLE = """
 CREATE TABLE IF NOT EXISTS space_groups (
@@ -32,8 +32,8 @@ CREATE TABLE IF NOT EXISTS space_group_members (
 
 def _init() -> None:
     """Initialize the database."""
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(SQL_CREATE_SPACE_GROUPS_TABLE)
         cursor.execute(SQL_CREATE_SPACE_GROUP_MEMBERS_TABLE)
@@ -53,8 +53,8 @@ def list_space_groups(
         List[Tuple[int, str, List[Tuple[int, str]], datetime, datetime]]: The list of space groups.
     """
     log.debug("Listing space groups: %s", name_match)
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         space_groups = cursor.execute(
             "SELECT id, org_id, name, summary, created_at, updated_at FROM space_groups WHERE org_id = ? AND name LIKE ?",
@@ -87,8 +87,8 @@ def create_space_group(org_id: int, name: str, summary: str = None) -> bool:
         bool: True if the space group is created, False otherwise.
     """
     log.debug("Creating space group: %s", name)
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(
             "INSERT INTO space_groups (org_id, name, summary) VALUES (?, ?, ?)",
@@ -134,15 +134,10 @@ def update_space_group(id_: int, org_id: int, members: List[int], name: str = No
     params.append(id_)
     params.append(org_id)
 
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
-    ) as connection, closing(connection.cursor()) as cursor:
-        cursor.execute(query, params)
-        cursor.execute("DELETE FROM space_group_members WHERE group_id = ?", (id_,))
-        cursor.executemany(
-            "INSERT INTO space_group_members (group_id, space_id) VALUES (?, ?)", [(id_, x) for x in members]
-        )
-        connection.commit()
+    with transaction(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES) as connection:
+        connection.execute(query, params)
+        connection.execute("DELETE FROM space_group_members WHERE group_id = ?", (id_,))
+        bulk_insert(connection, "space_group_members", ("group_id", "space_id"), [(id_, x) for x in members])
         return True
 
 
@@ -157,8 +152,8 @@ def delete_space_group(id_: int, org_id: int) -> bool:
         bool: True if the space group is deleted, False otherwise.
     """
     log.debug("Deleting group: %d", id_)
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute("DELETE FROM space_group_members WHERE group_id = ?", (id_,))
         cursor.execute("DELETE FROM space_groups WHERE id = ? AND org_id = ?", (id_, org_id))
@@ -1,12 +1,13 @@
 """Functions to manage spaces."""
 
+import itertools
 import json
 import logging as log
 import random
 import sqlite3
 from contextlib import closing
 from datetime import datetime
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional
 
 from opentelemetry import trace
 
@@ -15,9 +16,21 @@ from docq.access_control.main import SpaceAccessor, SpaceAccessType
 from docq.config import SpaceType
 from docq.data_source.list import SpaceDataSources
 from docq.domain import DocumentListItem, SpaceKey
-from docq.manage_indices import _create_vector_index, _persist_index
+from docq.manage_indexing_jobs import enqueue_reindex
+from docq.manage_indices import (
+    IndexingProgress,
+    _assign_document_ids,
+    _create_empty_vector_index,
+    _delete_documents_except,
+    _load_index_for_update,
+    _persist_bm25_index,
+    _persist_index,
+    _upsert_documents,
+    invalidate_cached_index,
+    iter_document_batches,
+)
 from docq.model_selection.main import get_saved_model_settings_collection
-from docq.support.store import get_sqlite_shared_system_file
+from docq.support.store import bulk_insert, get_sqlite_shared_system_file, sqlite_connection, transaction
 
 tracer = trace.get_tracer(__name__, docq.__version_str__)
 
@@ -55,8 +68,8 @@ SPACE = tuple[int, int, str, str, bool, str, dict, str, datetime, datetime]
 @tracer.start_as_current_span("manage_spaces._init")
 def _init() -> None:
     """Initialize the database."""
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(SQL_CREATE_SPACES_TABLE)
         cursor.execute(SQL_CREATE_SPACE_ACCESS_TABLE)
@@ -107,8 +120,8 @@ def create_space(
     )
     log.debug("Creating space with params: %s", params)
     rowid = None
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(
             "INSERT INTO spaces (org_id, name, space_type, summary, datasource_type, datasource_configs) VALUES (?, ?, ?, ?, ?, ?)",
@@ -121,7 +134,7 @@ def create_space(
         log.debug("Created space with rowid: %d", rowid)
         space = SpaceKey(space_type, rowid, org_id)
 
-    reindex(space)
+    enqueue_reindex(space)
 
     return space
 
@@ -132,8 +145,8 @@ def list_space(org_id: int, space_type: Optional[str] = None) -> list[SPACE]:
     if (space_type is not None) and (space_type not in SpaceType.__members__):
         raise ValueError(f"Invalid space type {space_type}")
 
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         _query = "SELECT id, org_id, name, summary, archived, datasource_type, datasource_configs, space_type, created_at, updated_at FROM spaces WHERE org_id = ?"
         params = (org_id,)
@@ -156,7 +169,25 @@ def list_space(org_id: int, space_type: Optional[str] = None) -> list[SPACE]:
 
 @tracer.start_as_current_span("manage_spaces.reindex")
 def reindex(space: SpaceKey) -> None:
-    """Reindex documents in a space from scratch. If an index already exists, it will be overwritten."""
+    """Reindex documents in a space, blocking until done.
+
+    If an index already exists only documents that were added, changed or removed since it was built are updated.
+    Otherwise the index is built from scratch. Errors are logged, not raised. Use
+    `manage_indexing_jobs.enqueue_reindex()` to reindex in the background instead.
+    """
+    try:
+        _reindex(space)
+    except Exception as e:
+        log.exception("Error indexing space '%s'. Error: %s", space, e)
+
+
+def _reindex(space: SpaceKey, progress: Optional[IndexingProgress] = None) -> None:
+    """Reindex documents in a space, reporting progress. Errors are raised.
+
+    Raises:
+        IndexingCancelledError: If `progress` cancels indexing. Nothing has been persisted.
+    """
+    progress = progress or IndexingProgress()
     span = trace.get_current_span()
     span.set_attributes({"space_id": space.id_, "space_org_id": space.org_id})
     try:
@@ -167,26 +198,71 @@ def reindex(space: SpaceKey) -> None:
         if _space_data_source is None:
             raise ValueError(f"No data source found for space {space}")
         (ds_type, ds_configs) = _space_data_source
-        log.debug("reindex(): get datasource instance")
-        documents = SpaceDataSources[ds_type].value.load(space, ds_configs)
-
-        if documents:
-            log.debug("reindex(): docs to index, %s", len(documents))
-            log.debug("reindex(): first doc metadata: %s", documents[0].metadata)
-            log.debug("reindex(): first doc text: %s", documents[0].text)
-            span.set_attributes({"num_docs_to_index": len(documents)})
+        # summary_index = _create_document_summary_index(documents, saved_model_settings)
+        # _persist_index(summary_index, space)
+        vector_index = None
+        try:
+            vector_index = _load_index_for_update(space, saved_model_settings)
+        except Exception as e:
+            log.warning("reindex(): failed to load existing index for space '%s', rebuilding. Error: %s", space, e)
+        is_new_index = vector_index is None
 
-            # summary_index = _create_document_summary_index(documents, saved_model_settings)
-            # _persist_index(summary_index, space)
-            vector_index = _create_vector_index(documents, saved_model_settings)
-            _persist_index(vector_index, space)
-    except Exception as e:
-        if e.__str__().__contains__("No files found"):
+        log.debug("reindex(): get datasource instance")
+        # Documents are streamed from the data source and indexed a batch at a time rather than all loaded up front.
+        # With an existing index, data sources that keep a manifest only yield documents of files that changed.
+        documents, sync = SpaceDataSources[ds_type].value.sync_documents(
+            space, ds_configs, incremental=not is_new_index
+        )
+        batches = iter_document_batches(documents)
+        try:
+            first_batch = next(batches, None)
+        except Exception as e:
+            if "No files found" not in str(e):
+                raise
+            first_batch = None
+        if not first_batch and is_new_index:
+            # with an existing index carry on, documents no longer in the source are deleted from it.
             log.info("Reindex skipped. No documents found in space '%s'", space)
             span.add_event("Reindex skipped. No documents found in space", {"space": str(space)})
+            return
+
+        if vector_index is None:
+            span.add_event("reindex_full")
+            vector_index = _create_empty_vector_index(saved_model_settings)
         else:
-            log.exception("Error indexing space '%s'. Error: %s", space, e)
+            span.add_event("reindex_incremental")
+
+        ordinals: Dict[str, int] = {}
+        seen_ids: set[str] = set()
+        num_inserted, num_deleted = 0, 0
+        for batch in itertools.chain([first_batch] if first_batch else [], batches):
+            progress.on_documents_loaded(len(batch))
+            progress.check_cancelled()
+            _assign_document_ids(batch, ordinals)
+            seen_ids.update(document.id_ for document in batch)
+            batch_inserted, batch_deleted = _upsert_documents(vector_index, batch, saved_model_settings, progress)
+            num_inserted += batch_inserted
+            num_deleted += batch_deleted
+        num_deleted += _delete_documents_except(vector_index, seen_ids, sync.unchanged_sources)
+        progress.check_cancelled()
+
+        log.debug("reindex(): docs indexed, %s", len(seen_ids))
+        span.set_attributes(
+            {
+                "num_docs_to_index": len(seen_ids),
+                "num_docs_inserted": num_inserted,
+                "num_docs_deleted": num_deleted,
+                "num_sources_unchanged": len(sync.unchanged_sources),
+                "num_sources_deleted": len(sync.deleted_sources),
+            }
+        )
+        if is_new_index or num_inserted or num_deleted:
+            _persist_index(vector_index, space)
+            _persist_bm25_index(vector_index, space)
+        # only once the index is persisted, otherwise files skipped next time might never have been indexed.
+        sync.commit()
     finally:
+        invalidate_cached_index(space)
         log.debug("reindex(): Complete")
 
 
@@ -239,8 +315,8 @@ def get_space_data_source(space: SpaceKey) -> tuple[str, dict] | None:
 def get_shared_space(id_: int, org_id: int) -> Optional[SPACE]:
     """Get a shared space."""
     log.debug("get_shared_space(): Getting space with id=%d", id_)
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(
             "SELECT id, org_id, name, summary, archived, datasource_type, datasource_configs, space_type, created_at, updated_at FROM spaces WHERE id = ? AND org_id = ?",
@@ -258,8 +334,8 @@ def get_shared_spaces(space_ids: List[int]) -> list[SPACE]:
         list[tuple[int, int, str, str, bool, str, dict, datetime, datetime]] - [id, org_id, name, summary, archived, datasource_type, datasource_configs, created_at, updated_at]
     """
     log.debug("get_shared_spaces(): Getting space with ids=%s", space_ids)
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         placeholders = ", ".join("?" * len(space_ids))
         query = "SELECT id, org_id, name, summary, archived, datasource_type, datasource_configs, space_type, created_at, updated_at FROM spaces WHERE id IN ({})".format(  # noqa: S608
@@ -305,8 +381,8 @@ def update_shared_space(
 
     log.debug("Updating space %d with query: %s | Params: %s", id_, query, params)
 
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(query, params)
         connection.commit()
@@ -351,8 +427,8 @@ def get_thread_space(org_id: int, thread_id: int) -> SpaceKey | None:
     NOTE: if this doesn't return it doesn't mean the space doesn't exist as it's filtered by org_id. Use space_name_exists() to check if a space with name already exists.
     """
     result = None
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         name = f"Thread-{thread_id} %"  # FIXME: urg this is nasty.
         cursor.execute(
@@ -370,8 +446,8 @@ def thread_space_exists(thread_id: int) -> bool:
     """Check if a thread space exists. Space names are unique. Thread spaces have a special naming convention based on thread_id. Use this to check if a Space with the generated name already exists."""
     exists = True  # default to true as the safer option
     name = f"Thread-{thread_id} %"
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute("SELECT id, name FROM spaces WHERE name LIKE ?", (name,))
         row = cursor.fetchone()
@@ -394,8 +470,8 @@ def list_thread_spaces(org_id: int) -> list[SPACE]:
 @tracer.start_as_current_span("manage_spaces.list_public_spaces")
 def list_public_spaces(selected_org_id: int, space_group_id: int) -> list[SPACE]:
     """List all public spaces from a given space group."""
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(
             """
@@ -417,8 +493,8 @@ def list_public_spaces(selected_org_id: int, space_group_id: int) -> list[SPACE]
 def get_shared_space_permissions(id_: int, org_id: int) -> List[SpaceAccessor]:
     """Get the permissions for a shared space."""
     log.debug("get_shared_space_permissions(): Getting permissions for space with id=%d", id_)
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(
             "SELECT sa.access_type, u.id as user_id, u.username as user_name, g.id as group_id, g.name as group_name FROM spaces s LEFT JOIN space_access sa ON s.id = sa.space_id AND sa.space_id = ? AND s.org_id = ? LEFT JOIN users u ON sa.accessor_id = u.id LEFT JOIN user_groups g on sa.accessor_id = g.id",
@@ -443,29 +519,25 @@ def get_shared_space_permissions(id_: int, org_id: int) -> List[SpaceAccessor]:
 def update_shared_space_permissions(id_: int, accessors: List[SpaceAccessor]) -> bool:
     """Update the permissions for a shared space."""
     log.debug("update_shared_space_permissions(): Updating permissions for space with id=%d", id_)
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
-    ) as connection, closing(connection.cursor()) as cursor:
-        cursor.execute("DELETE FROM space_access WHERE space_id = ?", (id_,))
-        for accessor in accessors:
-            if accessor.type_ == SpaceAccessType.PUBLIC:
-                cursor.execute(
-                    "INSERT INTO space_access (space_id, access_type) VALUES (?, ?)", (id_, SpaceAccessType.PUBLIC.name)
-                )
-            else:
-                cursor.execute(
-                    "INSERT INTO space_access (space_id, access_type, accessor_id) VALUES (?, ?, ?)",
-                    (id_, accessor.type_.name, accessor.accessor_id),
-                )
-        connection.commit()
+    with transaction(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES) as connection:
+        connection.execute("DELETE FROM space_access WHERE space_id = ?", (id_,))
+        bulk_insert(
+            connection,
+            "space_access",
+            ("space_id", "access_type", "accessor_id"),
+            [
+                (id_, accessor.type_.name, None if accessor.type_ == SpaceAccessType.PUBLIC else accessor.accessor_id)
+                for accessor in accessors
+            ],
+        )
         return True
 
 
 def get_space(space_id: int, org_id: int) -> Optional[SPACE]:
     """Get a space."""
     log.debug("get_space(): Getting space with id=%d", space_id)
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(
             "SELECT id, org_id, name, summary, archived, datasource_type, datasource_configs, space_type, created_at, updated_at FROM spaces WHERE id = ? AND org_id = ?",
@@ -0,0 +1,239 @@
+"""Functions to manage scheduled re-syncs of spaces.
+
+A space can have a sync schedule that reindexes it every so often, e.g. hourly for a web scraped knowledge base or
+nightly for a blob container, so its index stays fresh without an admin reindexing it by hand. Schedules are persisted
+in SQLite so survive restarts. A scheduler thread queues a reindex job (see `manage_indexing_jobs`) for each schedule
+that's due. Runs are jittered so spaces on the same interval don't all sync at once, and only a limited number of
+scheduled jobs are queued or running at a time so manual reindexes aren't starved.
+"""
+
+import logging as log
+import os
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, ContextManager, List, Optional, Self
+
+from opentelemetry import trace
+
+import docq
+
+from .config import ENV_VAR_DOCQ_SYNC_MAX_CONCURRENT, SpaceType
+from .domain import SpaceKey
+from .manage_indexing_jobs import IndexingJobStatus, enqueue_reindex
+from .support.store import get_sqlite_shared_system_file, sqlite_connection
+
+tracer = trace.get_tracer(__name__, docq.__version_str__)
+
+DEFAULT_MAX_CONCURRENT = 2
+MIN_INTERVAL_MINUTES = 5
+JITTER_FRACTION = 0.1
+"""Each run is scheduled up to this fraction of the interval early or late."""
+TICK_SECONDS = 30
+"""How often the scheduler looks for due schedules."""
+
+SQL_CREATE_SPACE_SYNC_SCHEDULES_TABLE = """
+CREATE TABLE IF NOT EXISTS space_sync_schedules (
+    space_id INTEGER PRIMARY KEY,
+    interval_minutes INTEGER NOT NULL,
+    enabled BOOL DEFAULT 1,
+    next_run_at TIMESTAMP NOT NULL,
+    last_run_at TIMESTAMP,
+    last_job_id INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (space_id) REFERENCES spaces (id)
+)
+"""
+
+SQL_CREATE_SPACE_SYNC_SCHEDULES_DUE_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_space_sync_schedules_due ON space_sync_schedules (enabled, next_run_at)
+"""
+
+_SELECT_SCHEDULE = """
+SELECT sc.space_id, s.org_id, s.space_type, sc.interval_minutes, sc.enabled, sc.next_run_at, sc.last_run_at, sc.last_job_id
+FROM space_sync_schedules sc
+JOIN spaces s ON s.id = sc.space_id
+"""
+
+
+@dataclass
+class SyncSchedule:
+    """When a space is next re-synced automatically."""
+
+    space: SpaceKey
+    interval_minutes: int
+    enabled: bool
+    next_run_at: datetime
+    """UTC."""
+    last_run_at: Optional[datetime]
+    """UTC. When the last scheduled reindex was queued."""
+    last_job_id: Optional[int]
+    """The indexing job queued by the last run."""
+
+
+def _connect() -> ContextManager[sqlite3.Connection]:
+    return sqlite_connection(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+
+
+def _format_schedule(row: Any) -> SyncSchedule:
+    return SyncSchedule(
+        space=SpaceKey(SpaceType[row[2]], row[0], row[1]),
+        interval_minutes=row[3],
+        enabled=bool(row[4]),
+        next_run_at=row[5],
+        last_run_at=row[6],
+        last_job_id=row[7],
+    )
+
+
+def _next_run_at(interval_minutes: int, now: datetime) -> datetime:
+    jitter = random.uniform(-JITTER_FRACTION, JITTER_FRACTION)  # noqa: S311
+    return now + timedelta(minutes=interval_minutes * (1 + jitter))
+
+
+def _max_concurrent() -> int:
+    return int(os.environ.get(ENV_VAR_DOCQ_SYNC_MAX_CONCURRENT, DEFAULT_MAX_CONCURRENT))
+
+
+@tracer.start_as_current_span("manage_sync_schedules.set_schedule")
+def set_schedule(space: SpaceKey, interval_minutes: int, enabled: bool = True) -> SyncSchedule:
+    """Re-sync a space automatically every `interval_minutes`, e.g. 1440 for nightly. Replaces any existing schedule.
+
+    The first run is one interval from now.
+
+    Raises:
+        ValueError: If the interval is shorter than `MIN_INTERVAL_MINUTES` or the space is a thread space.
+    """
+    if interval_minutes < MIN_INTERVAL_MINUTES:
+        raise ValueError(f"Sync interval must be at least {MIN_INTERVAL_MINUTES} minutes")
+    if space.type_ == SpaceType.THREAD:
+        raise ValueError("Thread spaces can't have a sync schedule")
+    with _connect() as connection:
+        connection.execute(
+            """INSERT INTO space_sync_schedules (space_id, interval_minutes, enabled, next_run_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (space_id) DO UPDATE SET interval_minutes = excluded.interval_minutes, enabled = excluded.enabled,
+            next_run_at = excluded.next_run_at, updated_at = CURRENT_TIMESTAMP""",
+            (space.id_, interval_minutes, enabled, _next_run_at(interval_minutes, datetime.utcnow())),
+        )
+        connection.commit()
+    schedule = get_schedule(space)
+    if schedule is None:
+        raise ValueError(f"Failed to set sync schedule for space {space}")
+    return schedule
+
+
+def get_schedule(space: SpaceKey) -> Optional[SyncSchedule]:
+    """Get the sync schedule of a space. None if it doesn't have one."""
+    with _connect() as connection:
+        row = connection.execute(
+            f"{_SELECT_SCHEDULE} WHERE sc.space_id = ? AND s.org_id = ?", (space.id_, space.org_id)  # noqa: S608
+        ).fetchone()
+    return _format_schedule(row) if row else None
+
+
+@tracer.start_as_current_span("manage_sync_schedules.delete_schedule")
+def delete_schedule(space: SpaceKey) -> bool:
+    """Stop re-syncing a space automatically.
+
+    Returns:
+        False if the space didn't have a schedule.
+    """
+    with _connect() as connection:
+        deleted = connection.execute("DELETE FROM space_sync_schedules WHERE space_id = ?", (space.id_,)).rowcount
+        connection.commit()
+    return bool(deleted)
+
+
+def _count_active_scheduled_jobs(connection: sqlite3.Connection) -> int:
+    return connection.execute(
+        "SELECT COUNT(*) FROM space_sync_schedules sc JOIN indexing_jobs j ON j.id = sc.last_job_id WHERE j.status IN (?, ?)",
+        (IndexingJobStatus.QUEUED.value, IndexingJobStatus.RUNNING.value),
+    ).fetchone()[0]
+
+
+def _claim_due_schedules(now: datetime) -> List[SyncSchedule]:
+    """Claim schedules that are due, up to the concurrency cap, and move them on to their next run.
+
+    Runs in a write transaction so if several processes share the database each run is claimed once.
+    """
+    with _connect() as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        available = _max_concurrent() - _count_active_scheduled_jobs(connection)
+        if available <= 0:
+            connection.rollback()
+            return []
+        rows = connection.execute(
+            f"{_SELECT_SCHEDULE} WHERE sc.enabled = 1 AND s.archived = 0 AND sc.next_run_at <= ? ORDER BY sc.next_run_at LIMIT ?",  # noqa: S608
+            (now, available),
+        ).fetchall()
+        schedules = [_format_schedule(row) for row in rows]
+        for schedule in schedules:
+            connection.execute(
+                "UPDATE space_sync_schedules SET next_run_at = ?, last_run_at = ? WHERE space_id = ?",
+                (_next_run_at(schedule.interval_minutes, now), now, schedule.space.id_),
+            )
+        connection.commit()
+    return schedules
+
+
+@tracer.start_as_current_span("manage_sync_schedules.run_due_schedules")
+def run_due_schedules(now: Optional[datetime] = None) -> int:
+    """Queue a reindex for each space whose schedule is due, as long as the cap on scheduled jobs allows.
+
+    Schedules held back by the cap stay due so they run on a later tick.
+
+    Returns:
+        The number of reindexes queued.
+    """
+    span = trace.get_current_span()
+    schedules = _claim_due_schedules(now or datetime.utcnow())
+    for schedule in schedules:
+        job_id = enqueue_reindex(schedule.space)
+        with _connect() as connection:
+            connection.execute(
+                "UPDATE space_sync_schedules SET last_job_id = ? WHERE space_id = ?", (job_id, schedule.space.id_)
+            )
+            connection.commit()
+        log.info("Scheduled sync of space %s queued as indexing job %s", schedule.space, job_id)
+    span.set_attribute("num_queued", len(schedules))
+    return len(schedules)
+
+
+class _SyncScheduler:
+    """Daemon thread that queues due syncs every `TICK_SECONDS`."""
+
+    def __init__(self: Self) -> None:
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self: Self) -> None:
+        """Start the scheduler thread if it isn't running. Safe to call repeatedly."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="docq-sync-scheduler", daemon=True)
+                self._thread.start()
+
+    def _run(self: Self) -> None:
+        while True:
+            try:
+                run_due_schedules()
+            except Exception as e:
+                log.warning("Failed to run due sync schedules, will retry. Error: %s", e)
+            time.sleep(TICK_SECONDS)
+
+
+_scheduler = _SyncScheduler()
+
+
+@tracer.start_as_current_span("manage_sync_schedules._init")
+def _init() -> None:
+    """Initialize the database and start the scheduler."""
+    with _connect() as connection:
+        connection.execute(SQL_CREATE_SPACE_SYNC_SCHEDULES_TABLE)
+        connection.execute(SQL_CREATE_SPACE_SYNC_SCHEDULES_DUE_INDEX)
+        connection.commit()
+    _scheduler.start()
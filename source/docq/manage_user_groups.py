@@ -6,7 +6,7 @@ from contextlib import closing
 from datetime import datetime
 from typing import List, Tuple
 
-from .support.store import get_sqlite_shared_system_file
+from .support.store import bulk_insert, get_sqlite_shared_system_file, sqlite_connection, transaction
 
 SQL_CREATE_USER_GROUPS_TABLE = """
 CREATE TABLE IF NOT EXISTS user_groups (
@@ -32,8 +32,8 @@ CREATE TABLE IF NOT EXISTS user_group_members (
 
 def _init() -> None:
     """Initialize the database."""
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(SQL_CREATE_USER_GROUPS_TABLE)
         cursor.execute(SQL_CREATE_USER_GROUP_MEMBERS_TABLE)
@@ -57,8 +57,8 @@ def list_user_groups(
     if not org_id:
         raise ValueError("`org_id` cannot be None.")
 
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         user_groups = cursor.execute(
             "SELECT id, name, created_at, updated_at FROM user_groups WHERE org_id = ? AND name LIKE ?",
@@ -88,8 +88,8 @@ def create_user_group(name: str, org_id: int) -> bool:
         bool: True if the user group is created, False otherwise.
     """
     log.debug("Creating user group: %s", name)
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(
             "INSERT INTO user_groups (name, org_id) VALUES (?, ?)",
@@ -124,15 +124,10 @@ def update_user_group(id_: int, members: List[int], name: str = None) -> bool:
     query += " WHERE id = ?"
     params.append(id_)
 
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
-    ) as connection, closing(connection.cursor()) as cursor:
-        cursor.execute(query, params)
-        cursor.execute("DELETE FROM user_group_members WHERE group_id = ?", (id_,))
-        cursor.executemany(
-            "INSERT INTO user_group_members (group_id, user_id) VALUES (?, ?)", [(id_, x) for x in members]
-        )
-        connection.commit()
+    with transaction(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES) as connection:
+        connection.execute(query, params)
+        connection.execute("DELETE FROM user_group_members WHERE group_id = ?", (id_,))
+        bulk_insert(connection, "user_group_members", ("group_id", "user_id"), [(id_, x) for x in members])
         return True
 
 
@@ -147,8 +142,8 @@ def delete_user_group(id_: int, org_id: int) -> bool:
         bool: True if the user group is deleted, False otherwise.
     """
     log.debug("Deleting user group: %d", id_)
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute("DELETE FROM user_group_members WHERE group_id = ? ", (id_,))
         cursor.execute("DELETE FROM user_groups WHERE id = ? AND org_id = ?", (id_, org_id))
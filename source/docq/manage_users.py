@@ -16,7 +16,7 @@ import docq
 from . import manage_organisations
 from . import manage_settings as msettings
 from .constants import DEFAULT_ADMIN_FULLNAME, DEFAULT_ADMIN_ID, DEFAULT_ADMIN_PASSWORD, DEFAULT_ADMIN_USERNAME
-from .support.store import get_sqlite_shared_system_file
+from .support.store import bulk_insert, get_sqlite_shared_system_file, sqlite_connection, transaction
 
 tracer = trace.get_tracer(__name__, docq.__version_str__)
 
@@ -50,8 +50,8 @@ PH = PasswordHasher()
 @tracer.start_as_current_span(name="manage_users._init")
 def _init() -> None:
     """Initialize the database."""
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(SQL_CREATE_USERS_TABLE)
         cursor.execute(SQL_CREATE_ORG_MEMBERS_TABLE)
@@ -60,8 +60,8 @@ def _init() -> None:
 @tracer.start_as_current_span(name="manage_users._init_admin_if_necessary")
 def _init_admin_if_necessary() -> bool:
     created = False
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         (count,) = cursor.execute("SELECT COUNT(*) FROM users WHERE super_admin = ?", (1,)).fetchone()
         if int(count) > 0:
@@ -99,8 +99,8 @@ def authenticate(username: str, password: str) -> Tuple[int, str, bool, str] | N
     """
     log.debug("Authenticating user: %s", username)
     span = trace.get_current_span()
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         selected = cursor.execute(
             "SELECT id, password, fullname, super_admin, verified FROM users WHERE username = ? AND archived = 0",
@@ -161,8 +161,8 @@ def get_user(user_id: int = None, username: str = None) -> Tuple[int, str, str,
     else:
         raise ValueError("Either user_id or username must be provided")
 
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         return cursor.execute(
             query,
@@ -180,8 +180,8 @@ def list_users(username_match: str = None) -> List[Tuple[int, str, str, bool, bo
         List[Tuple[int, str, str, bool, bool, datetime, datetime]]: The list of users [user id, username, fullname, super_admin, archived, created_at, updated_at].
     """
     log.debug("Listing users: %s", username_match)
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         return cursor.execute(
             "SELECT id, username, fullname, super_admin, archived, created_at, updated_at FROM users WHERE username LIKE ?",
@@ -216,8 +216,8 @@ def list_users_by_org(
             org_admin_match,
         )
 
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         return cursor.execute(query, tuple(params)).fetchall()
 
@@ -232,8 +232,8 @@ def list_selected_users(ids_: List[int]) -> List[Tuple[int, str, str, bool, bool
         List[Tuple[int, str, str, str, bool, bool, datetime, datetime]]: The list of users.
     """
     log.debug("Listing users: %s", ids_)
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         return cursor.execute(
             "SELECT id, username, fullname, super_admin, archived, created_at, updated_at FROM users WHERE id IN ({})".format(  # noqa: S608
@@ -294,8 +294,8 @@ def update_user(
 
     log.debug("Query: %s | Params: %s", query, params)
 
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(query, tuple(params))
         connection.commit()
@@ -332,8 +332,8 @@ def create_user(
 
     user_id = None
     personal_org_id = None
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         try:
             cursor.execute("BEGIN TRANSACTION")
@@ -381,8 +381,8 @@ def create_user(
 def set_user_as_verified(id_: int) -> bool:
     """Verify a user."""
     log.debug("Verifying user: %d", id_)
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(
             "UPDATE users SET verified = ?, updated_at = ? WHERE id = ?",
@@ -405,7 +405,7 @@ def check_account_activated(username: str) -> bool:
     Returns:
         bool: True if the user's account is activated, False otherwise.
     """
-    with closing(sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)) as connection:
+    with sqlite_connection(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES) as connection:
         return (
             connection.execute(
                 "SELECT id FROM users WHERE username = ? AND verified = ?",
@@ -427,8 +427,8 @@ def reset_password(id_: int, password: str) -> bool:
     """
     log.debug("Resetting password for user: %d", id)
     hashed_password = PH.hash(password)
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(
             "UPDATE users SET password = ?, updated_at = ? WHERE id = ?",
@@ -452,8 +452,8 @@ def archive_user(id_: int) -> bool:
         bool: True if the user is archived, False otherwise.
     """
     log.debug("Archiving user: %d", id_)
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         cursor.execute(
             "UPDATE users SET archived = 1, updated_at = ? WHERE id = ?",
@@ -485,8 +485,8 @@ def add_organisation_member(org_id: int, user_id: int, org_admin: bool = False)
     """
     log.debug("Adding user: %s to org: %s", user_id, org_id)
     success = False
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         try:
             _add_organisation_member_sql(cursor, org_id, user_id, org_admin)
@@ -511,8 +511,8 @@ def user_is_org_member(org_id: int, user_id: int) -> bool:
         bool: True if the user is a member of the org, False otherwise.
     """
     log.debug("Checking if user: %s is a member of org: %s", user_id, org_id)
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
         return (
             cursor.execute(
@@ -535,24 +535,18 @@ def update_organisation_members(org_id: int, users: List[Tuple[int, bool]]) -> b
     """
     log.debug("Updating org members for org_id: %s", org_id)
     success = False
-    with closing(
-        sqlite3.connect(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES)
-    ) as connection, closing(connection.cursor()) as cursor:
-        try:
-            cursor.execute("BEGIN TRANSACTION")
-            cursor.execute(
+    try:
+        with transaction(get_sqlite_shared_system_file(), detect_types=sqlite3.PARSE_DECLTYPES) as connection:
+            connection.execute(
                 "DELETE FROM org_members WHERE org_id = ?",
                 (org_id,),
             )
-            cursor.executemany(
-                "INSERT INTO org_members (org_id, user_id, org_admin) VALUES (?, ?, ?)",
-                [(org_id, x[0], x[1]) for x in users],
+            bulk_insert(
+                connection, "org_members", ("org_id", "user_id", "org_admin"), [(org_id, x[0], x[1]) for x in users]
             )
-            connection.commit()
-            success = True
-        except Exception as e:
-            success = False
-            connection.rollback()
-            log.error("Error updating org members, rolled back: %s", e)
+        success = True
+    except Exception as e:
+        success = False
+        log.error("Error updating org members, rolled back: %s", e)
 
     return success
@@ -8,9 +8,10 @@ Model collections grouped by provider and model capability is just one way to st
 
 import logging as log
 import os
+import threading
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Any, Dict, Mapping, Optional
+from typing import Any, Callable, Dict, Mapping, Optional, Self
 
 import docq
 from docq.config import (
@@ -25,6 +26,7 @@ from docq.config import (
 )
 from docq.manage_settings import get_organisation_settings
 from docq.support.llama_index.callbackhandlers import OtelCallbackHandler
+from docq.support.llama_index.embeddings import CachedEmbedding, is_embedding_cache_enabled
 from docq.support.store import get_models_dir
 from llama_index.core.callbacks.base import CallbackManager
 from llama_index.core.embeddings import BaseEmbedding
@@ -40,6 +42,9 @@ from vertexai.preview.generative_models import HarmBlockThreshold, HarmCategory
 
 tracer = trace.get_tracer(__name__, docq.__version_str__)
 
+EMBEDDING_CLIENT_MAX_RETRIES = 2
+"""Kept low so rate limits surface to the adaptive backoff used when indexing, see `embeddings.aembed_nodes()`."""
+
 
 class ModelProvider(str, Enum):
     """Model provider names.
@@ -115,6 +120,10 @@ class LlmUsageSettings:
     temperature: float = 0.1
     additional_args: Optional[Mapping[str, Any]] = field(default_factory=dict)
     """Any additional model API specific arguments to be passed to function like chat and completion"""
+    embed_batch_size: Optional[int] = None
+    """Embedding only. Number of texts sent per embedding request. None uses the model's default."""
+    embed_max_concurrency: int = 1
+    """Embedding only. Maximum number of embedding requests in flight while indexing."""
 
 
 @dataclass
@@ -257,6 +266,8 @@ LLM_MODEL_COLLECTIONS = {
             ModelCapability.EMBEDDING: LlmUsageSettings(
                 model_capability=ModelCapability.EMBEDDING,
                 service_instance_config=LLM_SERVICE_INSTANCES["openai-ada-002"],
+                embed_batch_size=128,
+                embed_max_concurrency=8,
             ),
         },
     ),
@@ -272,6 +283,8 @@ LLM_MODEL_COLLECTIONS = {
             ModelCapability.EMBEDDING: LlmUsageSettings(
                 model_capability=ModelCapability.EMBEDDING,
                 service_instance_config=LLM_SERVICE_INSTANCES["azure-openai-ada-002"],
+                embed_batch_size=128,
+                embed_max_concurrency=4,
             ),
         },
     ),
@@ -439,8 +452,68 @@ def list_available_model_settings_collections() -> dict:
     """List available models."""
     return {k: v.name for k, v in LLM_MODEL_COLLECTIONS.items()}
 
+class _ModelCache:
+    """Process-wide cache of model objects built for a model settings collection.
+
+    Constructing LLM clients, embedding models (e.g. loading ONNX models from disk) and service contexts is slow.
+    They are built once per (kind, collection key), lazily and thread-safely, then reused. Building one key doesn't
+    block lookups or building for other keys.
+    """
+
+    def __init__(self: Self) -> None:
+        """Initialise the cache."""
+        self._values: Dict[tuple[str, str], Any] = {}
+        self._key_locks: Dict[tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get_or_create(self: Self, kind: str, collection_key: str, factory: Callable[[], Any]) -> Any:
+        """Return the cached value, calling `factory` to build it on first use."""
+        key = (kind, collection_key)
+        value = self._values.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            value = self._values.get(key)
+            if value is None:
+                value = factory()
+                if value is not None:
+                    self._values[key] = value
+            return value
+
+    def invalidate(self: Self, collection_key: Optional[str] = None) -> None:
+        """Drop the cached values for a collection key, or everything if no key is given."""
+        with self._lock:
+            for key in list(self._values):
+                if collection_key is None or key[1] == collection_key:
+                    del self._values[key]
+
+
+_model_cache = _ModelCache()
+
+
+def invalidate_model_cache(model_settings_collection_key: Optional[str] = None) -> None:
+    """Rebuild the LLM, embedding model and service context on next use. Call when model settings change.
+
+    Args:
+        model_settings_collection_key: Only invalidate this collection. Defaults to all collections.
+    """
+    log.info("Invalidating cached models for collection: %s", model_settings_collection_key or "all")
+    _model_cache.invalidate(model_settings_collection_key)
+
+
 @tracer.start_as_current_span(name="_get_service_context")
 def _get_service_context(model_settings_collection: LlmUsageSettingsCollection) -> ServiceContext:
+    """Get the service context for a model settings collection. Built once per collection key and reused."""
+    return _model_cache.get_or_create(
+        "service_context",
+        model_settings_collection.key,
+        lambda: _create_service_context(model_settings_collection),
+    )
+
+
+def _create_service_context(model_settings_collection: LlmUsageSettingsCollection) -> ServiceContext:
     log.debug(
         "EXPERIMENTS['INCLUDE_EXTRACTED_METADATA']['enabled']: %s", EXPERIMENTS["INCLUDE_EXTRACTED_METADATA"]["enabled"]
     )
@@ -470,6 +543,16 @@ def _get_service_context(model_settings_collection: LlmUsageSettingsCollection)
 
 @tracer.start_as_current_span(name="_get_generation_model")
 def _get_generation_model(model_settings_collection: LlmUsageSettingsCollection) -> LLM | None:
+    if not model_settings_collection:
+        return None
+    return _model_cache.get_or_create(
+        "llm",
+        model_settings_collection.key,
+        lambda: _create_generation_model(model_settings_collection),
+    )
+
+
+def _create_generation_model(model_settings_collection: LlmUsageSettingsCollection) -> LLM | None:
     import litellm
 
     litellm.telemetry = False
@@ -543,19 +626,39 @@ def _get_generation_model(model_settings_collection: LlmUsageSettingsCollection)
 
         model.max_retries = 3
 
-        print("model: ", model)
-        print("model_settings_collection: ", model_settings_collection)
+        log.debug("Chat model created: %s, model settings collection: %s", model, model_settings_collection.key)
 
         return model
 
 
+def get_embed_max_concurrency(model_settings_collection: LlmUsageSettingsCollection) -> int:
+    """Maximum number of embedding requests in flight while indexing with the collection's embedding model."""
+    embedding_model_settings = model_settings_collection.model_usage_settings.get(ModelCapability.EMBEDDING)
+    return embedding_model_settings.embed_max_concurrency if embedding_model_settings else 1
+
+
 @tracer.start_as_current_span(name="_get_embed_model")
 def _get_embed_model(model_settings_collection: LlmUsageSettingsCollection) -> BaseEmbedding | None:
+    if not model_settings_collection:
+        return None
+    return _model_cache.get_or_create(
+        "embed_model",
+        model_settings_collection.key,
+        lambda: _create_embed_model(model_settings_collection),
+    )
+
+
+def _create_embed_model(model_settings_collection: LlmUsageSettingsCollection) -> BaseEmbedding | None:
     embedding_model = None
     if model_settings_collection and model_settings_collection.model_usage_settings[ModelCapability.EMBEDDING]:
         embedding_model_settings = model_settings_collection.model_usage_settings[ModelCapability.EMBEDDING]
         _callback_manager = CallbackManager([OtelCallbackHandler(tracer_provider=trace.get_tracer_provider())])
         sc = embedding_model_settings.service_instance_config
+        batch_kwargs = (
+            {"embed_batch_size": embedding_model_settings.embed_batch_size}
+            if embedding_model_settings.embed_batch_size
+            else {}
+        )
         with tracer.start_as_current_span(name=f"LangchainEmbedding.{sc.provider}"):
             if sc.provider == ModelProvider.AZURE_OPENAI:
                 embedding_model = AzureOpenAIEmbedding(
@@ -566,22 +669,30 @@ def _get_embed_model(model_settings_collection: LlmUsageSettingsCollection) -> B
                     # openai_api_type="azure",
                     api_version=os.getenv(ENV_VAR_DOCQ_AZURE_OPENAI_API_VERSION),
                     callback_manager=_callback_manager,
+                    max_retries=EMBEDDING_CLIENT_MAX_RETRIES,
+                    **batch_kwargs,
                 )
             elif sc.provider == ModelProvider.OPENAI:
                 embedding_model = OpenAIEmbedding(
                     model=sc.model_name,
                     api_key=os.getenv("DOCQ_OPENAI_API_KEY"),
                     callback_manager=_callback_manager,
+                    max_retries=EMBEDDING_CLIENT_MAX_RETRIES,
+                    **batch_kwargs,
                 )
             elif sc.provider == ModelProvider.HUGGINGFACE_OPTIMUM_BAAI:
                 embedding_model = OptimumEmbedding(
                     folder_name=get_models_dir(sc.model_name),
                     callback_manager=_callback_manager,
+                    **batch_kwargs,
                 )
             else:
                 # defaults
                 embedding_model = OpenAIEmbedding()
 
+        if is_embedding_cache_enabled():
+            embedding_model = CachedEmbedding(embedding_model, namespace=f"{sc.provider.name}:{sc.model_name}")
+
     return embedding_model
 
 
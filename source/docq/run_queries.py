@@ -4,7 +4,7 @@ import logging as log
 import sqlite3
 from contextlib import closing
 from datetime import datetime
-from typing import Literal, Optional
+from typing import Generator, Literal, Optional
 
 from llama_index.core.llms import ChatMessage, MessageRole
 
@@ -13,12 +13,17 @@ from docq.domain import FeatureKey, SpaceKey
 from docq.manage_assistants import Assistant
 from docq.manage_documents import format_document_sources
 from docq.model_selection.main import LlmUsageSettingsCollection
-from docq.support.llm import query_error, run_ask, run_chat
+from docq.support.llm import query_error, run_ask, run_ask_stream, run_chat, run_chat_stream
 from docq.support.store import (
+    SqliteSchema,
+    bulk_insert,
+    ensure_schema,
     get_history_table_name,
     get_history_thread_table_name,
     get_public_sqlite_usage_file,
     get_sqlite_usage_file,
+    sqlite_connection,
+    transaction,
 )
 
 # TODO: add thread_space_id to hold the space that's hard attached to a thread for adhoc uploads
@@ -44,6 +49,14 @@ CREATE TABLE IF NOT EXISTS {table} (
 )
 """
 
+SQL_CREATE_MESSAGE_THREAD_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_{table}_thread_id_timestamp ON {table} (thread_id, timestamp)
+"""
+
+SQL_CREATE_THREAD_CREATED_AT_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_{table}_created_at ON {table} (created_at)
+"""
+
 
 MESSAGE_TEMPLATE = "{message}"
 
@@ -52,37 +65,54 @@ MESSAGE_WITH_SOURCES_TEMPLATE = "{message}\n{source}"
 NUMBER_OF_MESSAGES_IN_HISTORY = 10
 
 
-def _save_messages(data: list[tuple[str, bool, datetime, int]], feature: FeatureKey) -> list:
-    """feature.id_ needs to be the user_id."""
-    rows = []
-    tablename = get_history_table_name(feature.type_)
-    thread_tablename = get_history_thread_table_name(feature.type_)
+def _history_schema(feature_type: OrganisationFeatureType) -> SqliteSchema:
+    """The thread and message tables of a feature's chat history."""
+    tablename = get_history_table_name(feature_type)
+    thread_tablename = get_history_thread_table_name(feature_type)
+    return SqliteSchema(
+        name=tablename,
+        migrations=(
+            SQL_CREATE_THREAD_TABLE.format(table=thread_tablename),
+            SQL_CREATE_MESSAGE_TABLE.format(table=tablename, thread_table=thread_tablename),
+            SQL_CREATE_MESSAGE_THREAD_INDEX.format(table=tablename),
+            SQL_CREATE_THREAD_CREATED_AT_INDEX.format(table=thread_tablename),
+        ),
+    )
+
+
+def _init_history(usage_file: str, feature_type: OrganisationFeatureType) -> str:
+    """Make sure a usage file has a feature's chat history tables, up to date. Returns the file."""
+    ensure_schema(usage_file, _history_schema(feature_type))
+    return usage_file
+
+
+def _get_messages_file(feature: FeatureKey) -> str:
     usage_file = (
         get_sqlite_usage_file(feature.id_)
         if feature.type_ != OrganisationFeatureType.ASK_PUBLIC
         else get_public_sqlite_usage_file(str(feature.id_))
     )
-    with closing(sqlite3.connect(usage_file, detect_types=sqlite3.PARSE_DECLTYPES)) as connection, closing(
-        connection.cursor()
-    ) as cursor:
-        cursor.execute(
-            SQL_CREATE_MESSAGE_TABLE.format(
-                table=tablename,
-                thread_table=thread_tablename,
-            )
-        )
+    return _init_history(usage_file, feature.type_)
 
-        for x in data:
-            log.debug("Saving message: %s", x)
-            cursor.execute(f"INSERT INTO {tablename} (message, human, timestamp, thread_id) VALUES (?, ?, ?, ?)", x)  # noqa: S608
-            rows.append((cursor.lastrowid, x[0], x[1], x[2], x[3]))
-        connection.commit()
 
-    return rows
+def _save_messages(data: list[tuple[str, bool, datetime, int]], feature: FeatureKey) -> list:
+    """feature.id_ needs to be the user_id."""
+    tablename = get_history_table_name(feature.type_)
+    usage_file = _get_messages_file(feature)
+    log.debug("Saving messages: %s", data)
+    with transaction(usage_file, detect_types=sqlite3.PARSE_DECLTYPES) as connection:
+        ids = bulk_insert(connection, tablename, ("message", "human", "timestamp", "thread_id"), data, return_ids=True)
+
+    return [(id_, *x) for id_, x in zip(ids, data)]
 
 
 def _retrieve_messages(
-    cutoff: datetime, size: int, feature: FeatureKey, thread_id: int, sort_order: Literal["ASC", "DESC"] = "DESC"
+    cutoff: datetime,
+    size: int,
+    feature: FeatureKey,
+    thread_id: int,
+    sort_order: Literal["ASC", "DESC"] = "DESC",
+    before_id: Optional[int] = None,
 ) -> list[tuple[int, str, bool, datetime, int]]:
     """Retrieve the history of messages up to certain size and cutoff.
 
@@ -92,55 +122,103 @@ def _retrieve_messages(
         feature: The feature key.
         thread_id: The thread id.
         sort_order: The order to sort the messages.
+        before_id: The id of the message at `cutoff` to page back from, typically the earliest message already
+            retrieved. Messages with the same timestamp and a lower id are included. If None only messages strictly
+            before `cutoff` are.
 
     Returns:
         list pf tuples of (id:int, message:str, human:bool, timestamp, thread_id:int).
     """
     tablename = get_history_table_name(feature.type_)
-    thread_tablename = get_history_thread_table_name(feature.type_)
-    usage_file = (
-        get_sqlite_usage_file(feature.id_)
-        if feature.type_ != OrganisationFeatureType.ASK_PUBLIC
-        else get_public_sqlite_usage_file(str(feature.id_))
-    )
+    usage_file = _get_messages_file(feature)
     rows = None
-    with closing(sqlite3.connect(usage_file, detect_types=sqlite3.PARSE_DECLTYPES)) as connection, closing(
+    # (thread_id, timestamp) index with the rowid as the tie breaker, so the cursor is a single index range scan.
+    where = "thread_id = ? AND (timestamp < ? OR (timestamp = ? AND id < ?))"
+    params = (thread_id, cutoff, cutoff, before_id if before_id is not None else -1)
+    with sqlite_connection(usage_file, detect_types=sqlite3.PARSE_DECLTYPES) as connection, closing(
         connection.cursor()
     ) as cursor:
-        cursor.execute(SQL_CREATE_THREAD_TABLE.format(table=thread_tablename))
-        cursor.execute(SQL_CREATE_MESSAGE_TABLE.format(table=tablename, thread_table=thread_tablename))
-        log.debug("Retrieving message params: thread_id=%s, cutoff=%s, size=%s", thread_id, cutoff, size)
+        log.debug(
+            "Retrieving message params: thread_id=%s, cutoff=%s, before_id=%s, size=%s",
+            thread_id,
+            cutoff,
+            before_id,
+            size,
+        )
         if sort_order == "ASC":
             rows = cursor.execute(
-                f"SELECT id, message, human, timestamp, thread_id FROM {tablename} WHERE thread_id = ? AND timestamp < ? ORDER BY timestamp LIMIT ?",  # noqa: S608
-                (thread_id, cutoff, size),
+                f"SELECT id, message, human, timestamp, thread_id FROM {tablename} WHERE {where} ORDER BY timestamp, id LIMIT ?",  # noqa: S608
+                (*params, size),
             ).fetchall()
         else:
             rows = cursor.execute(
-                f"SELECT id, message, human, timestamp, thread_id FROM {tablename} WHERE thread_id = ? AND timestamp < ? ORDER BY timestamp DESC LIMIT ?",  # noqa: S608
-                (thread_id, cutoff, size),
+                f"SELECT id, message, human, timestamp, thread_id FROM {tablename} WHERE {where} ORDER BY timestamp DESC, id DESC LIMIT ?",  # noqa: S608
+                (*params, size),
             ).fetchall()
             rows.reverse()
 
     return rows
 
 
-def list_thread_history(feature: FeatureKey, id_: Optional[int] = None) -> list[tuple[int, str, int]]:
-    """List threads or a thread if id_ is provided."""
+def list_thread_history(
+    feature: FeatureKey,
+    id_: Optional[int] = None,
+    limit: Optional[int] = None,
+    after_id: Optional[int] = None,
+    offset: int = 0,
+) -> list[tuple[int, str, int]]:
+    """List threads, most recently created first, or a thread if id_ is provided.
+
+    Args:
+        feature: The feature key.
+        id_: The id of the thread to get.
+        limit: The maximum number of threads to return. All if None.
+        after_id: Keyset cursor, the id of the last thread of the previous page. Threads listed after it are returned.
+        offset: Number of threads to skip, after `after_id` if given. Prefer `after_id` for paging, offsets are
+            scanned past.
+
+    Returns:
+        list of tuples of (id, topic, created_at).
+    """
     tablename = get_history_thread_table_name(feature.type_)
     rows = None
-    with closing(
-        sqlite3.connect(get_sqlite_usage_file(feature.id_), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        _init_history(get_sqlite_usage_file(feature.id_), feature.type_), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
-        cursor.execute(
-            SQL_CREATE_THREAD_TABLE.format(
-                table=tablename,
-            )
-        )
         if id_:
             rows = cursor.execute(f"SELECT id, topic, created_at FROM {tablename} WHERE id = ?", (id_,)).fetchall()  # noqa: S608
         else:
-            rows = cursor.execute(f"SELECT id, topic, created_at FROM {tablename} ORDER BY created_at DESC").fetchall()  # noqa: S608
+            where = ""
+            if after_id is not None:
+                where = (
+                    f"WHERE created_at < (SELECT created_at FROM {tablename} WHERE id = ?1) "
+                    f"OR (created_at = (SELECT created_at FROM {tablename} WHERE id = ?1) AND id < ?1)"
+                )
+            rows = cursor.execute(
+                f"SELECT id, topic, created_at FROM {tablename} {where} ORDER BY created_at DESC, id DESC LIMIT ?2 OFFSET ?3",  # noqa: S608
+                [after_id, -1 if limit is None else limit, offset],
+            ).fetchall()
+
+    return rows
+
+
+def list_thread_history_with_first_message(feature: FeatureKey) -> list[tuple[int, str, datetime, Optional[str]]]:
+    """List threads, most recently created first, each with its first human message in one query.
+
+    Returns:
+        list of tuples of (id, topic, created_at, first human message or None if there isn't one).
+    """
+    tablename = get_history_table_name(feature.type_)
+    thread_tablename = get_history_thread_table_name(feature.type_)
+    with sqlite_connection(
+        _init_history(get_sqlite_usage_file(feature.id_), feature.type_), detect_types=sqlite3.PARSE_DECLTYPES
+    ) as connection, closing(connection.cursor()) as cursor:
+        # the correlated subquery is a (thread_id, timestamp) index lookup per thread.
+        rows = cursor.execute(
+            f"""SELECT t.id, t.topic, t.created_at, (
+                SELECT m.message FROM {tablename} m WHERE m.thread_id = t.id AND m.human ORDER BY m.timestamp, m.id LIMIT 1
+            ) FROM {thread_tablename} t ORDER BY t.created_at DESC, t.id DESC"""  # noqa: S608
+        ).fetchall()
 
     return rows
 
@@ -149,14 +227,9 @@ def get_thread_topic(feature: FeatureKey, thread_id: int) -> str | None:
     """Retrieve the topic of a thread."""
     tablename = get_history_thread_table_name(feature.type_)
     row = None
-    with closing(
-        sqlite3.connect(get_sqlite_usage_file(feature.id_), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        _init_history(get_sqlite_usage_file(feature.id_), feature.type_), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
-        cursor.execute(
-            SQL_CREATE_THREAD_TABLE.format(
-                table=tablename,
-            )
-        )
         row = cursor.execute(f"SELECT topic FROM {tablename} WHERE id = ?", (thread_id,)).fetchone()  # noqa: S608
 
     return row[0] if row else None  # f"New thread {thread_id}"
@@ -165,18 +238,30 @@ def get_thread_topic(feature: FeatureKey, thread_id: int) -> str | None:
 def update_thread_topic(topic: str, feature: FeatureKey, thread_id: int) -> None:
     """Update the topic of a thread."""
     tablename = get_history_thread_table_name(feature.type_)
-    with closing(
-        sqlite3.connect(get_sqlite_usage_file(feature.id_), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        _init_history(get_sqlite_usage_file(feature.id_), feature.type_), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
-        cursor.execute(
-            SQL_CREATE_THREAD_TABLE.format(
-                table=tablename,
-            )
-        )
         cursor.execute(f"UPDATE {tablename} SET topic = ? WHERE id = ?", (topic, thread_id))  # noqa: S608
         connection.commit()
 
 
+def update_thread_topics(topics: list[tuple[int, str]], feature: FeatureKey) -> None:
+    """Update the topics of several threads in one transaction.
+
+    Args:
+        topics: (thread_id, topic) of each thread to update.
+        feature: The feature key.
+    """
+    if not topics:
+        return
+    tablename = get_history_thread_table_name(feature.type_)
+    with transaction(_init_history(get_sqlite_usage_file(feature.id_), feature.type_)) as connection:
+        connection.executemany(
+            f"UPDATE {tablename} SET topic = ? WHERE id = ?",  # noqa: S608
+            [(topic, thread_id) for thread_id, topic in topics],
+        )
+
+
 def get_chat_summerised_history(
     feature: FeatureKey, thread_id: int, size: Optional[int] = None
 ) -> list[tuple[int, str, bool]]:
@@ -211,15 +296,9 @@ def get_history_as_chat_messages(
 def create_history_thread(topic: str, feature: FeatureKey) -> int | None:
     """Create a new thread for the history i.e a new chat session."""
     tablename = get_history_thread_table_name(feature.type_)
-    with closing(
-        sqlite3.connect(get_sqlite_usage_file(feature.id_), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        _init_history(get_sqlite_usage_file(feature.id_), feature.type_), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
-        cursor.execute(
-            SQL_CREATE_THREAD_TABLE.format(
-                table=tablename,
-            )
-        )
-
         cursor.execute(f"INSERT INTO {tablename} (topic) VALUES (?)", (topic,))  # noqa: S608
 
         id_ = cursor.lastrowid
@@ -240,7 +319,7 @@ def delete_thread(thread_id: int, feature: FeatureKey) -> bool:
         else get_public_sqlite_usage_file(str(feature.id_))
     )
     is_deleted = False
-    with closing(sqlite3.connect(usage_file, detect_types=sqlite3.PARSE_DECLTYPES)) as connection, closing(
+    with sqlite_connection(usage_file, detect_types=sqlite3.PARSE_DECLTYPES) as connection, closing(
         connection.cursor()
     ) as cursor:
         cursor.execute("PRAGMA foreign_keys = ON;")
@@ -266,14 +345,9 @@ def get_latest_thread(feature: FeatureKey) -> tuple[int, str, int] | None:
     """
     tablename = get_history_thread_table_name(feature.type_)
     rows = None
-    with closing(
-        sqlite3.connect(get_sqlite_usage_file(feature.id_), detect_types=sqlite3.PARSE_DECLTYPES)
+    with sqlite_connection(
+        _init_history(get_sqlite_usage_file(feature.id_), feature.type_), detect_types=sqlite3.PARSE_DECLTYPES
     ) as connection, closing(connection.cursor()) as cursor:
-        cursor.execute(
-            SQL_CREATE_THREAD_TABLE.format(
-                table=tablename,
-            )
-        )
         rows = cursor.execute(
             f"SELECT id, topic, created_at FROM {tablename} ORDER BY created_at DESC LIMIT 1"  # noqa: S608
         ).fetchall()
@@ -287,8 +361,8 @@ def thread_exists(thread_id: int, user_id: int, feature_type: OrganisationFeatur
     thread_exists = False
     tablename = get_history_thread_table_name(feature_type)
     try:
-        with closing(
-            sqlite3.connect(get_sqlite_usage_file(user_id), detect_types=sqlite3.PARSE_DECLTYPES)
+        with sqlite_connection(
+            get_sqlite_usage_file(user_id), detect_types=sqlite3.PARSE_DECLTYPES
         ) as connection, closing(connection.cursor()) as cursor:
             row = cursor.execute(f"SELECT id FROM {tablename} WHERE id = ?", (thread_id,)).fetchone()  # noqa: S608
             thread_exists = row is not None
@@ -349,8 +423,70 @@ def query(
     return _save_messages(data, feature)
 
 
+def query_stream(
+    input_: str,
+    feature: FeatureKey,
+    thread_id: int,
+    model_settings_collection: LlmUsageSettingsCollection,
+    assistant: Assistant,
+    spaces: Optional[list[SpaceKey]] = None,
+) -> Generator[str, None, list]:
+    """Streaming version of `query()`. Yields the response text as it's generated by the LLM.
+
+    The messages are saved once the stream completes. The saved rows are the generator return value, use
+    `rows = yield from query_stream(...)` to get hold of them. If the consumer stops early (closes the generator,
+    e.g. a client disconnecting) the question is still saved along with the part of the answer streamed so far.
+    """
+    log.debug(
+        "Query (stream): '%s' for feature: '%s' with shared-spaces: '%s'",
+        input_,
+        feature,
+        spaces,
+    )
+    data = [(input_, bool(True), datetime.now(), thread_id)]
+    is_chat = feature.type_ == OrganisationFeatureType.CHAT_PRIVATE
+
+    history_messages = get_history_as_chat_messages(feature=feature, thread_id=thread_id)
+
+    chunks: list[str] = []
+    source_nodes = []
+    try:
+        try:
+            response = (
+                run_chat_stream(input_, history_messages, model_settings_collection, assistant)
+                if is_chat
+                else run_ask_stream(input_, history_messages, model_settings_collection, assistant, spaces)
+            )
+            for token in response.response_gen:
+                chunks.append(token)
+                yield token
+            source_nodes = response.source_nodes
+
+        except Exception as e:
+            # the stream may have failed part way through, keep what was already sent.
+            error_message = ("\n\n" if chunks else "") + str(query_error(e, model_settings_collection).response)
+            chunks.append(error_message)
+            yield error_message
+
+        if not is_chat:
+            # same as MESSAGE_WITH_SOURCES_TEMPLATE so what's streamed matches what's saved.
+            sources = f"\n{format_document_sources(source_nodes)}"
+            chunks.append(sources)
+            yield sources
+    finally:
+        if chunks:
+            data.append(("".join(chunks), False, datetime.now(), thread_id))
+        rows = _save_messages(data, feature)
+
+    return rows
+
+
 def history(
-    cutoff: datetime, size: int, feature: FeatureKey, thread_id: int
+    cutoff: datetime, size: int, feature: FeatureKey, thread_id: int, before_id: Optional[int] = None
 ) -> list[tuple[int, str, bool, datetime, int]]:
-    """Retrieve the history of messages up to certain size and cutoff."""
-    return _retrieve_messages(cutoff, size, feature, thread_id)
+    """Retrieve the history of messages up to certain size and cutoff.
+
+    To page back through a thread pass the timestamp and id of the earliest message already retrieved as `cutoff`
+    and `before_id`. See `_retrieve_messages()`.
+    """
+    return _retrieve_messages(cutoff, size, feature, thread_id, before_id=before_id)
@@ -3,7 +3,7 @@
 import json
 import logging as log
 import os
-from typing import Any, Optional, Union
+from typing import Any, Iterator, Optional, Union
 
 from google.auth.external_account_authorized_user import Credentials as ExtCredentials
 from google.auth.transport.requests import Request
@@ -16,6 +16,9 @@ CREDENTIALS_KEY = "DOCQ_GOOGLE_APPLICATION_CREDENTIALS"
 REDIRECT_URL_KEY = "DOCQ_GOOGLE_AUTH_REDIRECT_URL"
 CREDENTIAL_JSON_KEY = "DOCQ_GOOGLE_APPLICATION_CREDENTIALS_JSON"
 
+LIST_PAGE_SIZE = 1000
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
 GOOGLE_APPLICATION_CREDS_PATH = os.environ.get(CREDENTIALS_KEY)
 FLOW_REDIRECT_URI = os.environ.get(REDIRECT_URL_KEY)
 CREDENTIAL_JSON = os.environ.get(CREDENTIAL_JSON_KEY)
@@ -128,23 +131,40 @@ def _export_gdrive_docs(service: Any, file_id: str) -> Any:
     return service.files().export(fileId=file_id, mimeType="application/pdf")
 
 
-def download_file(service: Any, file_id: str, file_name: str, mime: str) -> bool:
-    """Download file."""
-    try:
-        if "google-apps" in mime:
-            request = _export_gdrive_docs(service, file_id)
-            file_name = f"{file_name}.pdf"
-        else:
-            request = service.files().get_media(fileId=file_id)
-        with open(file_name, "wb") as fh:
-            downloader, done = MediaIoBaseDownload(fh, request), False
-            while done is False:
-                status, done = downloader.next_chunk()
-                log.debug("Download - %s", f"{file_name}: {str(status.progress() * 100)}%")
-        return True
-    except Exception as e:
-        log.error("Failed to download file: %s", e)
-        return False
+def list_files(service: Any, folder_id: str, fields: str) -> Iterator[dict]:
+    """List the files in a folder that aren't trashed, following `nextPageToken` through every page.
+
+    Args:
+        service: Drive service from `get_drive_service()`.
+        folder_id: Id of the folder, or "root".
+        fields: The file fields to return, e.g. "files(id, name)".
+    """
+    page_token = None
+    while True:
+        response = service.files().list(
+            q=f"'{folder_id}' in parents and trashed=false",
+            fields=f"nextPageToken, {fields}",
+            pageSize=LIST_PAGE_SIZE,
+            pageToken=page_token,
+        ).execute()
+        yield from response.get("files", [])
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return
+
+
+def download_file(service: Any, file_id: str, file_name: str, mime: str) -> None:
+    """Download file, streaming it to disk in chunks. Raises on failure so the caller can retry."""
+    if "google-apps" in mime:
+        request = _export_gdrive_docs(service, file_id)
+        file_name = f"{file_name}.pdf"
+    else:
+        request = service.files().get_media(fileId=file_id)
+    with open(file_name, "wb") as fh:
+        downloader, done = MediaIoBaseDownload(fh, request, chunksize=DOWNLOAD_CHUNK_SIZE), False
+        while done is False:
+            status, done = downloader.next_chunk()
+            log.debug("Download - %s", f"{file_name}: {str(status.progress() * 100)}%")
 
 
 def get_auth_url(data: dict) -> Optional[dict]:
@@ -2,14 +2,20 @@
 import logging as log
 import os
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Iterator, Optional
+from urllib.parse import parse_qsl, urlparse
 
+import requests
 from microsoftgraph.client import Client
 
 DOCQ_MS_ONEDRIVE_CLIENT_ID_KEY = "DOCQ_MS_ONEDRIVE_CLIENT_ID"
 DOCQ_MS_ONEDRIVE_CLIENT_SEC_RET_KEY = "DOCQ_MS_ONEDRIVE_CLIENT_SECRET"
 DOCQ_MS_ONEDRIVE_REDIRECT_URI_KEY = "DOCQ_MS_ONEDRIVE_REDIRECT_URI"
 
+LIST_PAGE_SIZE = 200
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+DOWNLOAD_TIMEOUT_SECONDS = 60
+
 SCOPES = [
     "offline_access",
     "User.Read",
@@ -99,14 +105,43 @@ def list_folders(token: dict) -> list[dict]:
         return []
 
 
-def download_file(client: Client, file_id: str, file_path: str) -> None:
-    """Download a file from Microsoft OneDrive."""
-    try:
-        with open(file_path, "wb") as file:
-            data = client.files.drive_download_contents(file_id).data
-            file.write(data)
-    except Exception as e:
-        log.error("services.ms_onedrive -- download_file -- Error: %s", e)
+def list_files(client: Client, folder_id: str, select: str) -> Iterator[dict]:
+    """List the files (not folders) in a folder, following `@odata.nextLink` through every page.
+
+    Args:
+        client: Client from `get_client()`.
+        folder_id: Id of the folder.
+        select: Comma separated item properties to return.
+    """
+    params = {"$select": select, "$filter": "file ne null", "$top": LIST_PAGE_SIZE}
+    while True:
+        data = client.files.drive_specific_folder(folder_id, params).data
+        yield from data.get("value", [])
+        next_link = data.get("@odata.nextLink")
+        if not next_link:
+            return
+        # The next link repeats the query along with a `$skiptoken` for the next page.
+        params = dict(parse_qsl(urlparse(next_link).query))
+
+
+def download_file(client: Client, file_id: str, file_path: str, download_url: Optional[str] = None) -> None:
+    """Download a file from Microsoft OneDrive. Raises on failure so the caller can retry.
+
+    Args:
+        client: Client from `get_client()`.
+        file_id: Id of the file.
+        file_path: Local path to write to.
+        download_url: The item's pre-authenticated `@microsoft.graph.downloadUrl`. If given the file is streamed to
+            disk in chunks, otherwise it's downloaded into memory first.
+    """
+    with open(file_path, "wb") as file:
+        if download_url is None:
+            file.write(client.files.drive_download_contents(file_id).data)
+            return
+        with requests.get(download_url, stream=True, timeout=DOWNLOAD_TIMEOUT_SECONDS) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                file.write(chunk)
 
 
 def api_enabled() -> bool:
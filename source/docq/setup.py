@@ -9,10 +9,12 @@ from docq import db_migrations, extensions, manage_assistants
 
 from . import (
     integrations,
+    manage_indexing_jobs,
     manage_organisations,
     manage_settings,
     manage_space_groups,
     manage_spaces,
+    manage_sync_schedules,
     manage_user_groups,
     manage_users,
     services,
@@ -42,6 +44,8 @@ def init() -> None:
         manage_user_groups._init()
         manage_settings._init()
         manage_spaces._init()
+        manage_indexing_jobs._init()
+        manage_sync_schedules._init()
         manage_users._init()
         manage_assistants._init()
         db_migrations.run() # run db migrations after all tables are created
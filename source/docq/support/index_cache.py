@@ -0,0 +1,156 @@
+"""Process-wide in-memory LRU cache of loaded space indices.
+
+Loading an index from disk deserialises every JSON store under the space index dir. Busy spaces are loaded on every
+query so the loaded objects are kept in memory and only reloaded when the persisted index changes.
+"""
+
+import logging as log
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional, Self
+
+from opentelemetry import trace
+
+from ..config import ENV_VAR_DOCQ_INDEX_CACHE_MAX_BYTES, ENV_VAR_DOCQ_INDEX_CACHE_MAX_ENTRIES
+
+DEFAULT_MAX_ENTRIES = 32
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # 1 GiB
+
+IndexCacheKey = tuple[str, str, int]
+"""(space key value, model settings collection key, persist dir generation)."""
+
+
+@dataclass
+class IndexCacheStats:
+    """Counters for the index cache."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+    entries: int = 0
+    size_bytes: int = 0
+
+    def as_attributes(self: Self, prefix: str = "index_cache") -> dict[str, int]:
+        """Return the counters as OpenTelemetry span attributes."""
+        return {
+            f"{prefix}.hits": self.hits,
+            f"{prefix}.misses": self.misses,
+            f"{prefix}.evictions": self.evictions,
+            f"{prefix}.invalidations": self.invalidations,
+            f"{prefix}.entries": self.entries,
+            f"{prefix}.size_bytes": self.size_bytes,
+        }
+
+
+class IndexCache:
+    """Thread-safe LRU cache bounded by both entry count and (estimated) size in bytes.
+
+    The size of an entry is provided by the caller when it's added. For indices this is the size of the persisted
+    files on disk which is a reasonable proxy for the in-memory footprint.
+    """
+
+    def __init__(self: Self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        """Initialise the cache."""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[IndexCacheKey, tuple[Any, int]] = OrderedDict()
+        self._lock = threading.RLock()
+        self._stats = IndexCacheStats()
+
+    def get(self: Self, key: IndexCacheKey) -> Optional[Any]:
+        """Get an entry and mark it as most recently used. Returns None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats.misses += 1
+                self._record("index_cache_miss", key)
+                return None
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            self._record("index_cache_hit", key)
+            return entry[0]
+
+    def put(self: Self, key: IndexCacheKey, value: Any, size_bytes: int) -> None:
+        """Add an entry, evicting least recently used entries until within bounds.
+
+        Entries for the same space and model collection with an older generation are dropped as they are stale.
+        """
+        if size_bytes > self.max_bytes or self.max_entries <= 0:
+            log.debug("IndexCache: entry '%s' of %s bytes exceeds cache bounds, not caching.", key, size_bytes)
+            return
+        with self._lock:
+            for stale_key in [k for k in self._entries if k[:2] == key[:2] and k != key]:
+                self._remove(stale_key)
+                self._stats.invalidations += 1
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size_bytes)
+            self._stats.size_bytes += size_bytes
+            while len(self._entries) > self.max_entries or self._stats.size_bytes > self.max_bytes:
+                evicted_key, _ = next(iter(self._entries.items()))
+                self._remove(evicted_key)
+                self._stats.evictions += 1
+                self._record("index_cache_eviction", evicted_key)
+            self._stats.entries = len(self._entries)
+
+    def invalidate(self: Self, space_value: str) -> int:
+        """Remove all entries for a space regardless of model collection or generation. Returns the number removed."""
+        with self._lock:
+            keys = [k for k in self._entries if k[0] == space_value]
+            for key in keys:
+                self._remove(key)
+            self._stats.invalidations += len(keys)
+            self._stats.entries = len(self._entries)
+            if keys:
+                self._record("index_cache_invalidated", keys[0])
+            return len(keys)
+
+    def clear(self: Self) -> None:
+        """Remove all entries. Counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._stats.entries = 0
+            self._stats.size_bytes = 0
+
+    def stats(self: Self) -> IndexCacheStats:
+        """Return a snapshot of the cache counters."""
+        with self._lock:
+            return IndexCacheStats(**self._stats.__dict__)
+
+    def __len__(self: Self) -> int:
+        """Number of entries in the cache."""
+        return len(self._entries)
+
+    def __contains__(self: Self, key: IndexCacheKey) -> bool:
+        """Check if a key is in the cache without touching LRU order or counters."""
+        return key in self._entries
+
+    def _remove(self: Self, key: IndexCacheKey) -> None:
+        _, size_bytes = self._entries.pop(key)
+        self._stats.size_bytes -= size_bytes
+
+    def _record(self: Self, event_name: str, key: IndexCacheKey) -> None:
+        """Export the counters on the current span."""
+        span = trace.get_current_span()
+        span.add_event(
+            name=event_name, attributes={"index_cache.space": key[0], "index_cache.model_collection": key[1]}
+        )
+        span.set_attributes(self._stats.as_attributes())
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        log.warning("Invalid value for env var '%s', using default %s", name, default)
+        return default
+
+
+index_cache = IndexCache(
+    max_entries=_env_int(ENV_VAR_DOCQ_INDEX_CACHE_MAX_ENTRIES, DEFAULT_MAX_ENTRIES),
+    max_bytes=_env_int(ENV_VAR_DOCQ_INDEX_CACHE_MAX_BYTES, DEFAULT_MAX_BYTES),
+)
+"""Process-wide cache of loaded space indices."""
@@ -0,0 +1,208 @@
+"""Persisted BM25 lexical index and retriever.
+
+The Llama Index `BM25Retriever` tokenises and scores the whole docstore every time it's constructed. `BM25Index` is
+built once per (re)index, persisted in the space index dir as an inverted index (postings, doc lengths, idf) and
+searched by only visiting the postings of the query terms.
+"""
+
+import asyncio
+import heapq
+import json
+import math
+import os
+import re
+import tempfile
+from collections import Counter
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Self, Tuple, Type
+
+import docq
+from nltk.stem import PorterStemmer
+from opentelemetry import trace
+
+from llama_index.core.callbacks.base import CallbackManager
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import BaseNode, NodeWithScore, QueryBundle
+from llama_index.core.storage.docstore.types import BaseDocumentStore
+from llama_index.core.utils import globals_helper
+
+from .vector_stores import _persist_dir_lock
+
+tracer = trace.get_tracer(__name__, docq.__version_str__)
+
+BM25_INDEX_FILENAME = "bm25_index.json"
+BM25_INDEX_FORMAT_VERSION = 1
+
+_WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+_stemmer = PorterStemmer()
+
+
+@lru_cache(maxsize=100_000)
+def _stem(word: str) -> str:
+    return _stemmer.stem(word)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split into words, remove stopwords and stem."""
+    stopwords = globals_helper.stopwords
+    return [_stem(word) for word in _WORD_PATTERN.findall(text.lower()) if word not in stopwords]
+
+
+class BM25Index:
+    """Okapi BM25 inverted index over the nodes of a docstore.
+
+    Args:
+        node_ids: Node id for each indexed document (row).
+        doc_lengths: Token count for each row.
+        postings: term -> (row ids, term frequencies).
+        idf: term -> inverse document frequency.
+        k1: BM25 term frequency saturation.
+        b: BM25 length normalisation.
+    """
+
+    def __init__(
+        self: Self,
+        node_ids: List[str],
+        doc_lengths: List[int],
+        postings: Dict[str, Tuple[List[int], List[int]]],
+        idf: Dict[str, float],
+        k1: float = 1.5,
+        b: float = 0.75,
+    ) -> None:
+        """Initialise the index from its parts. Use `build()` or `load()` to create one."""
+        self.node_ids = node_ids
+        self.doc_lengths = doc_lengths
+        self.postings = postings
+        self.idf = idf
+        self.k1 = k1
+        self.b = b
+        avgdl = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+        # per row length normalisation term of the BM25 denominator, precomputed once.
+        self._norms = [k1 * (1 - b + b * (dl / avgdl if avgdl else 0.0)) for dl in doc_lengths]
+
+    def __len__(self: Self) -> int:
+        """Number of indexed nodes."""
+        return len(self.node_ids)
+
+    @classmethod
+    def build(
+        cls: Type["BM25Index"],
+        nodes: Iterable[BaseNode],
+        tokenizer: Callable[[str], List[str]] = tokenize,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ) -> "BM25Index":
+        """Build an index by tokenising the content of each node."""
+        with tracer.start_as_current_span("BM25Index.build") as span:
+            node_ids: List[str] = []
+            doc_lengths: List[int] = []
+            postings: Dict[str, Tuple[List[int], List[int]]] = {}
+            for row, node in enumerate(nodes):
+                tokens = tokenizer(node.get_content())
+                node_ids.append(node.node_id)
+                doc_lengths.append(len(tokens))
+                for term, tf in Counter(tokens).items():
+                    rows, tfs = postings.setdefault(term, ([], []))
+                    rows.append(row)
+                    tfs.append(tf)
+
+            n = len(node_ids)
+            idf = {
+                term: math.log((n - len(rows) + 0.5) / (len(rows) + 0.5) + 1.0) for term, (rows, _) in postings.items()
+            }
+            span.set_attributes({"num_nodes": n, "num_terms": len(postings)})
+            return cls(node_ids, doc_lengths, postings, idf, k1=k1, b=b)
+
+    @classmethod
+    def from_docstore(cls: Type["BM25Index"], docstore: BaseDocumentStore) -> "BM25Index":
+        """Build an index over all nodes in a docstore."""
+        return cls.build(docstore.docs.values())
+
+    def search(
+        self: Self, query_str: str, top_k: int, tokenizer: Callable[[str], List[str]] = tokenize
+    ) -> List[Tuple[str, float]]:
+        """Return up to `top_k` (node id, score) pairs ordered by descending score.
+
+        Only the postings of the query terms are visited.
+        """
+        scores: Dict[int, float] = {}
+        k1_1 = self.k1 + 1
+        for term in set(tokenizer(query_str)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            idf = self.idf[term]
+            for row, tf in zip(*posting):
+                scores[row] = scores.get(row, 0.0) + idf * tf * k1_1 / (tf + self._norms[row])
+
+        top = heapq.nlargest(top_k, scores.items(), key=lambda x: x[1])
+        return [(self.node_ids[row], score) for row, score in top]
+
+    def persist(self: Self, persist_dir: str) -> None:
+        """Persist the index to the directory. Written to a uniquely named temp file first then swapped in."""
+        path = os.path.join(persist_dir, BM25_INDEX_FILENAME)
+        data = {
+            "version": BM25_INDEX_FORMAT_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "node_ids": self.node_ids,
+            "doc_lengths": self.doc_lengths,
+            "idf": self.idf,
+            "postings": self.postings,
+        }
+        with _persist_dir_lock(persist_dir):
+            fd, tmp_path = tempfile.mkstemp(dir=persist_dir, prefix=f"{BM25_INDEX_FILENAME}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    @classmethod
+    def exists(cls: Type["BM25Index"], persist_dir: str) -> bool:
+        """Check if an index has been persisted in the directory."""
+        return os.path.exists(os.path.join(persist_dir, BM25_INDEX_FILENAME))
+
+    @classmethod
+    def load(cls: Type["BM25Index"], persist_dir: str) -> "BM25Index":
+        """Load a persisted index."""
+        with tracer.start_as_current_span("BM25Index.load") as span:
+            with open(os.path.join(persist_dir, BM25_INDEX_FILENAME), "r") as f:
+                data = json.load(f)
+            if data.get("version") != BM25_INDEX_FORMAT_VERSION:
+                raise ValueError(f"Unsupported BM25 index format version '{data.get('version')}'")
+            span.set_attributes({"num_nodes": len(data["node_ids"]), "num_terms": len(data["postings"])})
+            postings = {term: (rows, tfs) for term, (rows, tfs) in data["postings"].items()}
+            return cls(data["node_ids"], data["doc_lengths"], postings, data["idf"], k1=data["k1"], b=data["b"])
+
+
+class BM25IndexRetriever(BaseRetriever):
+    """Retriever backed by a prebuilt `BM25Index`. Nodes are fetched from the docstore by id."""
+
+    def __init__(
+        self: Self,
+        bm25_index: BM25Index,
+        docstore: BaseDocumentStore,
+        similarity_top_k: int = 4,
+        callback_manager: Optional[CallbackManager] = None,
+        verbose: bool = False,
+    ) -> None:
+        """Initialise the retriever."""
+        self._bm25_index = bm25_index
+        self._docstore = docstore
+        self._similarity_top_k = similarity_top_k
+        super().__init__(callback_manager=callback_manager, verbose=verbose)
+
+    def _retrieve(self: Self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        nodes: List[NodeWithScore] = []
+        for node_id, score in self._bm25_index.search(query_bundle.query_str, self._similarity_top_k):
+            node = self._docstore.get_document(node_id, raise_error=False)
+            if node is not None:
+                nodes.append(NodeWithScore(node=node, score=score))
+        return nodes
+
+    async def _aretrieve(self: Self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        # scoring is CPU bound, run it off the event loop so concurrent LLM calls aren't held up.
+        return await asyncio.to_thread(self._retrieve, query_bundle)
@@ -0,0 +1,504 @@
+"""Docq owned Llama Index embedding model wrappers."""
+
+import asyncio
+import hashlib
+import logging as log
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Self, Sequence, Type
+
+import docq
+import numpy as np
+from docq.config import (
+    ENV_VAR_DOCQ_EMBEDDING_CACHE_ENABLED,
+    ENV_VAR_DOCQ_EMBEDDING_CACHE_MAX_DISK_ENTRIES,
+    ENV_VAR_DOCQ_EMBEDDING_CACHE_MAX_ENTRIES,
+)
+from docq.support.store import SqliteSchema, ensure_schema, get_sqlite_embedding_cache_file, sqlite_connection
+from opentelemetry import context as otel_context
+from opentelemetry import trace
+
+from llama_index.core.base.embeddings.base import Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.core.schema import BaseNode, MetadataMode
+from llama_index.core.utils import get_tokenizer
+
+tracer = trace.get_tracer(__name__, docq.__version_str__)
+
+DEFAULT_MAX_MEMORY_ENTRIES = 10_000
+DEFAULT_MAX_DISK_ENTRIES = 100_000  # ~1.2GB of 1536 dimension embeddings
+_SQLITE_MAX_VARIABLES = 500  # stay well below the SQLite host parameter limit for `IN (...)` lookups
+
+DEFAULT_MAX_RETRIES = 6
+"""Times a batch is retried after being rate limited before giving up."""
+MIN_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+
+SQL_CREATE_EMBEDDING_CACHE_TABLE = """
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    key TEXT PRIMARY KEY,
+    embedding BLOB NOT NULL
+)
+"""
+
+SQL_ADD_EMBEDDING_CACHE_LAST_ACCESSED_AT = """
+ALTER TABLE embedding_cache ADD COLUMN last_accessed_at REAL NOT NULL DEFAULT 0
+"""
+
+SQL_CREATE_EMBEDDING_CACHE_LAST_ACCESSED_AT_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_accessed_at ON embedding_cache (last_accessed_at)
+"""
+
+EMBEDDING_CACHE_SCHEMA = SqliteSchema(
+    name="embedding_cache",
+    migrations=(
+        SQL_CREATE_EMBEDDING_CACHE_TABLE,
+        SQL_ADD_EMBEDDING_CACHE_LAST_ACCESSED_AT,
+        SQL_CREATE_EMBEDDING_CACHE_LAST_ACCESSED_AT_INDEX,
+    ),
+)
+
+
+def is_embedding_cache_enabled() -> bool:
+    """Check if the embedding cache is turned on. It's on unless `DOCQ_EMBEDDING_CACHE_ENABLED` is set false."""
+    return os.environ.get(ENV_VAR_DOCQ_EMBEDDING_CACHE_ENABLED, "true").lower() in ("true", "1", "yes")
+
+
+def embedding_cache_key(namespace: str, kind: str, text: str) -> str:
+    """Content hash key for an embedding.
+
+    Args:
+        namespace: Identifies the embedding model e.g. provider and model name so models never share entries.
+        kind: `query` or `text`. Some models embed queries differently to documents.
+        text: The text that's embedded.
+    """
+    return hashlib.sha256(f"{namespace}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Two tier cache of embeddings keyed by `embedding_cache_key()`.
+
+    An in-memory LRU tier in front of a SQLite tier under `DOCQ_DATA`. The SQLite tier is shared across processes
+    and survives restarts so unchanged chunks aren't re-embedded when a space is reindexed. It's also LRU, the least
+    recently used entries beyond `max_disk_entries` are evicted when embeddings are added.
+    """
+
+    def __init__(
+        self: Self,
+        max_memory_entries: int = DEFAULT_MAX_MEMORY_ENTRIES,
+        max_disk_entries: int = DEFAULT_MAX_DISK_ENTRIES,
+    ) -> None:
+        """Initialise the cache."""
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: OrderedDict[str, List[float]] = OrderedDict()
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def _connect(self: Self) -> Iterator[sqlite3.Connection]:
+        db_file = get_sqlite_embedding_cache_file()
+        ensure_schema(db_file, EMBEDDING_CACHE_SCHEMA)
+        with sqlite_connection(db_file) as connection:
+            yield connection
+
+    def _put_memory(self: Self, key: str, embedding: List[float]) -> None:
+        with self._lock:
+            self._memory[key] = embedding
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get_many(self: Self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        """Return the cached embeddings for the keys that are found."""
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for key in keys:
+                embedding = self._memory.get(key)
+                if embedding is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = embedding
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            try:
+                now = time.time()
+                with self._connect() as connection:
+                    for i in range(0, len(missing), _SQLITE_MAX_VARIABLES):
+                        batch = missing[i : i + _SQLITE_MAX_VARIABLES]
+                        placeholders = ",".join("?" * len(batch))
+                        rows = connection.execute(
+                            f"SELECT key, embedding FROM embedding_cache WHERE key IN ({placeholders})",  # noqa: S608
+                            batch,
+                        ).fetchall()
+                        for key, blob in rows:
+                            embedding = np.frombuffer(blob, dtype=np.float64).tolist()
+                            found[key] = embedding
+                            self._put_memory(key, embedding)
+                        if rows:
+                            hits = [key for key, _ in rows]
+                            hit_placeholders = ",".join("?" * len(hits))
+                            connection.execute(
+                                f"UPDATE embedding_cache SET last_accessed_at = ? WHERE key IN ({hit_placeholders})",  # noqa: S608
+                                (now, *hits),
+                            )
+                    connection.commit()
+            except sqlite3.Error as e:
+                log.warning("Embedding cache read failed, embeddings will be recomputed. Error: %s", e)
+        return found
+
+    def put_many(self: Self, items: Dict[str, List[float]]) -> None:
+        """Add embeddings to both tiers. The least recently used beyond `max_disk_entries` are evicted from disk."""
+        for key, embedding in items.items():
+            self._put_memory(key, embedding)
+        try:
+            now = time.time()
+            with self._connect() as connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache (key, embedding, last_accessed_at) VALUES (?, ?, ?)",
+                    [(key, np.asarray(embedding, dtype=np.float64).tobytes(), now) for key, embedding in items.items()],
+                )
+                (count,) = connection.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()
+                if count > self.max_disk_entries:
+                    evicted = connection.execute(
+                        "DELETE FROM embedding_cache WHERE key IN (SELECT key FROM embedding_cache ORDER BY last_accessed_at LIMIT ?)",
+                        (count - self.max_disk_entries,),
+                    ).rowcount
+                    log.debug("Embedding cache evicted %d least recently used entries", evicted)
+                connection.commit()
+        except sqlite3.Error as e:
+            log.warning("Embedding cache write failed. Error: %s", e)
+
+    def clear_memory(self: Self) -> None:
+        """Empty the in-memory tier."""
+        with self._lock:
+            self._memory.clear()
+
+
+embedding_cache = EmbeddingCache(
+    max_memory_entries=int(os.environ.get(ENV_VAR_DOCQ_EMBEDDING_CACHE_MAX_ENTRIES, DEFAULT_MAX_MEMORY_ENTRIES)),
+    max_disk_entries=int(os.environ.get(ENV_VAR_DOCQ_EMBEDDING_CACHE_MAX_DISK_ENTRIES, DEFAULT_MAX_DISK_ENTRIES)),
+)
+"""Process-wide embedding cache shared by all `CachedEmbedding` instances."""
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Wraps an embedding model so each distinct text is only embedded once per model.
+
+    Used for both ingestion, where unchanged chunks are skipped on reindex, and retrieval, where the same query is
+    embedded by several retrievers. Only texts that miss the cache are sent to the wrapped model, in one batch.
+    """
+
+    namespace: str
+    """Identifies the wrapped model in cache keys e.g. `{provider}:{model name}`."""
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(
+        self: Self,
+        embed_model: BaseEmbedding,
+        namespace: str,
+        cache: Optional[EmbeddingCache] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Initialise the wrapper."""
+        super().__init__(
+            namespace=namespace,
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            callback_manager=embed_model.callback_manager,
+            **kwargs,
+        )
+        self._embed_model = embed_model
+        self._cache = cache or embedding_cache
+
+    @classmethod
+    def class_name(cls: Type["CachedEmbedding"]) -> str:
+        """Class name."""
+        return "CachedEmbedding"
+
+    @property
+    def embed_model(self: Self) -> BaseEmbedding:
+        """The wrapped embedding model."""
+        return self._embed_model
+
+    def _lookup(self: Self, kind: str, texts: List[str]) -> tuple[List[str], Dict[str, List[float]], List[str]]:
+        keys = [embedding_cache_key(self.namespace, kind, text) for text in texts]
+        found = self._cache.get_many(keys)
+        missing_texts = list(dict.fromkeys(text for key, text in zip(keys, texts) if key not in found))
+        span = trace.get_current_span()
+        span.add_event(
+            "embedding_cache.lookup",
+            attributes={"kind": kind, "num_texts": len(texts), "num_hits": sum(key in found for key in keys)},
+        )
+        return keys, found, missing_texts
+
+    def _store(self: Self, kind: str, texts: List[str], embeddings: List[Embedding]) -> Dict[str, List[float]]:
+        items = {
+            embedding_cache_key(self.namespace, kind, text): embedding for text, embedding in zip(texts, embeddings)
+        }
+        if items:
+            self._cache.put_many(items)
+        return items
+
+    def _get_query_embedding(self: Self, query: str) -> Embedding:
+        keys, found, missing = self._lookup("query", [query])
+        if missing:
+            found.update(self._store("query", missing, [self._embed_model._get_query_embedding(query)]))
+        return found[keys[0]]
+
+    async def _aget_query_embedding(self: Self, query: str) -> Embedding:
+        keys, found, missing = self._lookup("query", [query])
+        if missing:
+            found.update(self._store("query", missing, [await self._embed_model._aget_query_embedding(query)]))
+        return found[keys[0]]
+
+    def _get_text_embedding(self: Self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self: Self, text: str) -> Embedding:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self: Self, texts: List[str]) -> List[Embedding]:
+        keys, found, missing = self._lookup("text", texts)
+        if missing:
+            found.update(self._store("text", missing, self._embed_model._get_text_embeddings(missing)))
+        return [found[key] for key in keys]
+
+    async def _aget_text_embeddings(self: Self, texts: List[str]) -> List[Embedding]:
+        keys, found, missing = self._lookup("text", texts)
+        if missing:
+            found.update(self._store("text", missing, await self._embed_model._aget_text_embeddings(missing)))
+        return [found[key] for key in keys]
+
+
+def _is_rate_limit_error(e: BaseException) -> bool:
+    """True for HTTP 429 errors from OpenAI compatible clients."""
+    return getattr(e, "status_code", None) == 429 or type(e).__name__ == "RateLimitError"
+
+
+def _retry_after_seconds(e: BaseException) -> Optional[float]:
+    """The wait the provider asked for in the `retry-after-ms` or `retry-after` headers of a rate limit error."""
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+class AdaptiveConcurrencyLimiter:
+    """Limits the embedding requests in flight, backing off when the provider rate limits.
+
+    Additive increase, multiplicative decrease. A rate limited request halves the limit and pauses every request for
+    the backoff, so workers don't keep hammering the endpoint into a storm of 429s. After as many successes as the
+    current limit, the limit goes up by one, back towards `max_concurrency`.
+    """
+
+    def __init__(
+        self: Self,
+        max_concurrency: int,
+        min_backoff: float = MIN_BACKOFF_SECONDS,
+        max_backoff: float = MAX_BACKOFF_SECONDS,
+    ) -> None:
+        """Initialise the limiter."""
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self._in_flight = 0
+        self._successes = 0
+        self._resume_at = 0.0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self: Self) -> None:
+        """Wait for a free slot and for any backoff to pass."""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def __aexit__(self: Self, *args: Any) -> None:
+        """Free the slot."""
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self: Self) -> None:
+        """Record a successful request."""
+        self._successes += 1
+        if self.limit < self.max_concurrency and self._successes >= self.limit:
+            self.limit += 1
+            self._successes = 0
+
+    def on_rate_limited(self: Self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Record a rate limited request. Returns the backoff in seconds."""
+        self.limit = max(1, self.limit // 2)
+        self._successes = 0
+        if retry_after is None:
+            # exponential backoff with jitter so retries don't line up
+            jitter = random.uniform(0.5, 1.0)  # noqa: S311
+            retry_after = min(self.max_backoff, self.min_backoff * 2**attempt) * jitter
+        self._resume_at = max(self._resume_at, time.monotonic() + retry_after)
+        return retry_after
+
+
+@dataclass
+class EmbeddingThroughput:
+    """Outcome of `embed_nodes()`."""
+
+    num_nodes: int = 0
+    num_tokens: int = 0
+    num_batches: int = 0
+    num_rate_limited: int = 0
+    seconds: float = 0.0
+
+    @property
+    def nodes_per_second(self: Self) -> float:
+        """Nodes embedded per second."""
+        return self.num_nodes / self.seconds if self.seconds else 0.0
+
+    @property
+    def tokens_per_second(self: Self) -> float:
+        """Tokens embedded per second."""
+        return self.num_tokens / self.seconds if self.seconds else 0.0
+
+
+async def aembed_nodes(
+    nodes: Sequence[BaseNode],
+    embed_model: BaseEmbedding,
+    max_concurrency: int = 1,
+    on_embedded: Optional[Callable[[int], None]] = None,
+    check_cancelled: Optional[Callable[[], None]] = None,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+) -> EmbeddingThroughput:
+    """Embed nodes that don't have an embedding yet, in batches of `embed_model.embed_batch_size` run concurrently.
+
+    At most `max_concurrency` batches are in flight. Rate limited batches are retried with adaptive backoff, see
+    `AdaptiveConcurrencyLimiter`. Throughput is recorded on the current span.
+
+    Args:
+        nodes: Nodes to embed. Embeddings are set on the nodes in place.
+        embed_model: The model to embed with.
+        max_concurrency: Maximum number of batches in flight.
+        on_embedded: Called with the total number of nodes embedded so far after each batch.
+        check_cancelled: Called before each batch is sent. Raise from it to stop. Batches in flight are cancelled.
+        max_retries: Times a rate limited batch is retried.
+    """
+    with tracer.start_as_current_span("embeddings.embed_nodes") as span:
+        pending = [node for node in nodes if node.embedding is None]
+        batch_size = max(1, embed_model.embed_batch_size)
+        batches = [pending[i : i + batch_size] for i in range(0, len(pending), batch_size)]
+        limiter = AdaptiveConcurrencyLimiter(max_concurrency)
+        tokenizer = get_tokenizer()
+        throughput = EmbeddingThroughput(num_batches=len(batches))
+        start = time.perf_counter()
+
+        async def _embed_batch(batch: List[BaseNode]) -> None:
+            texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+            for attempt in range(max_retries + 1):
+                async with limiter:
+                    if check_cancelled:
+                        check_cancelled()
+                    try:
+                        embeddings = await embed_model.aget_text_embedding_batch(texts)
+                    except Exception as e:
+                        if not _is_rate_limit_error(e) or attempt == max_retries:
+                            raise
+                        throughput.num_rate_limited += 1
+                        backoff = limiter.on_rate_limited(attempt, _retry_after_seconds(e))
+                        log.info(
+                            "Embedding rate limited, backing off %.1fs. Concurrency now %s", backoff, limiter.limit
+                        )
+                        continue
+                    limiter.on_success()
+                for node, embedding in zip(batch, embeddings, strict=True):
+                    node.embedding = embedding
+                throughput.num_nodes += len(batch)
+                throughput.num_tokens += sum(len(tokenizer(text)) for text in texts)
+                if on_embedded:
+                    on_embedded(throughput.num_nodes)
+                return
+
+        tasks = [asyncio.ensure_future(_embed_batch(batch)) for batch in batches]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            throughput.seconds = time.perf_counter() - start
+            span.set_attributes(
+                {
+                    "num_nodes": throughput.num_nodes,
+                    "num_tokens": throughput.num_tokens,
+                    "num_batches": throughput.num_batches,
+                    "num_rate_limited": throughput.num_rate_limited,
+                    "batch_size": batch_size,
+                    "max_concurrency": limiter.max_concurrency,
+                    "final_concurrency": limiter.limit,
+                    "seconds": throughput.seconds,
+                    "nodes_per_second": throughput.nodes_per_second,
+                    "tokens_per_second": throughput.tokens_per_second,
+                }
+            )
+        log.info(
+            "Embedded %s nodes in %.1fs, %.1f nodes/s, %.0f tokens/s",
+            throughput.num_nodes,
+            throughput.seconds,
+            throughput.nodes_per_second,
+            throughput.tokens_per_second,
+        )
+        return throughput
+
+
+_embedding_loop: Optional[asyncio.AbstractEventLoop] = None
+_embedding_loop_lock = threading.Lock()
+
+
+def _get_embedding_loop() -> asyncio.AbstractEventLoop:
+    """The long-lived event loop blocking `embed_nodes()` calls run on, started on first use.
+
+    Embedding models are memoized and their async clients are bound to the loop they were first used on. A new loop
+    per call (`asyncio.run`) would leave later calls with a client tied to a closed loop.
+    """
+    global _embedding_loop
+    with _embedding_loop_lock:
+        if _embedding_loop is None:
+            _embedding_loop = asyncio.new_event_loop()
+            threading.Thread(target=_embedding_loop.run_forever, name="docq-embedding-loop", daemon=True).start()
+        return _embedding_loop
+
+
+def embed_nodes(
+    nodes: Sequence[BaseNode],
+    embed_model: BaseEmbedding,
+    max_concurrency: int = 1,
+    on_embedded: Optional[Callable[[int], None]] = None,
+    check_cancelled: Optional[Callable[[], None]] = None,
+) -> EmbeddingThroughput:
+    """Blocking version of `aembed_nodes`. Runs on the shared embedding event loop so can't be called from it."""
+    ctx = otel_context.get_current()
+
+    async def _embed() -> EmbeddingThroughput:
+        token = otel_context.attach(ctx)  # keep the embedding span under the caller's trace
+        try:
+            return await aembed_nodes(nodes, embed_model, max_concurrency, on_embedded, check_cancelled)
+        finally:
+            otel_context.detach(token)
+
+    return asyncio.run_coroutine_threadsafe(_embed(), _get_embedding_loop()).result()
@@ -3,12 +3,12 @@
 These aren't always implementations of LlamaIndex's `BaseNodePostProcessor` interface, but they are used in a similar way.
 """
 
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from llama_index.core.schema import NodeWithScore
 
 
-def reciprocal_rank_fusion(results: Dict[str, List[NodeWithScore]]) -> List[NodeWithScore]:
+def reciprocal_rank_fusion(results: Dict[str, List[NodeWithScore]], top_k: Optional[int] = None) -> List[NodeWithScore]:
     """Apply reciprocal rank fusion.
 
     The original paper uses k=60 for best results:
@@ -18,6 +18,7 @@ def reciprocal_rank_fusion(results: Dict[str, List[NodeWithScore]]) -> List[Node
 
     Args:
         results: A dictionary of results `NodeWithScore` from multiple search methods.
+        top_k: (optional) Only return the top k fused results. All are returned by default.
     """
     k = 60.0  # `k` is a parameter used to control the impact of outlier rankings.
     fused_scores = {}
@@ -41,4 +42,4 @@ def reciprocal_rank_fusion(results: Dict[str, List[NodeWithScore]]) -> List[Node
         reranked_nodes.append(text_to_node[text])
         reranked_nodes[-1].score = score
     print("reranked_nodes: ", len(reranked_nodes))
-    return reranked_nodes
+    return reranked_nodes[:top_k] if top_k is not None else reranked_nodes
@@ -1,6 +1,9 @@
 """Custom Llama Index query pipeline components."""
 
+import asyncio
+import os
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Callable, Dict, List, Optional, Self
 
 from llama_index.core.base.query_pipeline.query import (
@@ -20,11 +23,19 @@ from llama_index.core.prompts.mixin import (
     PromptMixinType,
 )
 from llama_index.core.query_pipeline import CustomQueryComponent
+from llama_index.core.retrievers import BaseRetriever
 from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle, QueryType
 from llama_index.core.service_context_elements.llm_predictor import (
     LLMPredictorType,
 )
 from llama_index.core.settings import Settings
+from opentelemetry import context as otel_context
+from opentelemetry import trace
+
+import docq
+from docq.config import ENV_VAR_DOCQ_RETRIEVAL_MAX_WORKERS
+
+tracer = trace.get_tracer(__name__, docq.__version_str__)
 
 DEFAULT_CONTEXT_PROMPT = (
     "Here is some context that may be relevant:\n"
@@ -46,8 +57,9 @@ class ResponseWithChatHistory(CustomQueryComponent):
           chat_history: List[ChatMessage] - Chat history. Forms the message collection sent to the LLM for response generation. The context user message is appended to the end of this.
           nodes: List[NodeWithScore] - Context nodes from retrieval. Optionally, after being reranked. Each nodes text is added to the context user prompt for final response generation.
           query_str: str - the user query. Used added to the context user prompt for final response generation.
+      streaming: bool - Stream the response. Defaults to False.
       Output: dict
-          response: str - The generated response from the LLM
+          response: ChatResponse - The generated response from the LLM. A generator of `ChatResponse` deltas when streaming.
           source_nodes: List[NodeWithScore] - The source nodes used to generate the response.
     """
 
@@ -57,6 +69,9 @@ class ResponseWithChatHistory(CustomQueryComponent):
         default=DEFAULT_CONTEXT_PROMPT,
         description="Context prompt to use for the LLM",
     )
+    streaming: bool = Field(
+        default=False, description="Return a generator of response deltas from `stream_chat` instead of waiting."
+    )
     # query_str: Optional[str] = Field(default=None, description="The user query")
 
     # chat_history: Optional[List[ChatMessage]] = Field(default=None, description="Chat history")
@@ -110,7 +125,7 @@ class ResponseWithChatHistory(CustomQueryComponent):
 
         prepared_context = self._prepare_context(chat_history, nodes, query_str)
 
-        response = self.llm.chat(prepared_context)
+        response = self.llm.stream_chat(prepared_context) if self.streaming else self.llm.chat(prepared_context)
         return {"response": response, "source_nodes": nodes}
 
     async def _arun_component(self: Self, **kwargs: Any) -> Dict[str, Any]:
@@ -122,7 +137,9 @@ class ResponseWithChatHistory(CustomQueryComponent):
 
         prepared_context = self._prepare_context(chat_history, nodes, query_str)
 
-        response = await self.llm.achat(prepared_context)
+        response = (
+            await self.llm.astream_chat(prepared_context) if self.streaming else await self.llm.achat(prepared_context)
+        )
 
         return {"response": response, "source_nodes": nodes}
 
@@ -162,6 +179,27 @@ class BaseQueryTransform(ChainableMixin, PromptMixin):
 
         return self._run(query_bundle, metadata=metadata)
 
+    async def _arun(self: Self, query_bundle: QueryBundle, metadata: Dict) -> QueryBundle:
+        """Run query transform asynchronously. Defaults to the sync implementation."""
+        return self._run(query_bundle, metadata=metadata)
+
+    async def arun(
+        self: Self,
+        query_bundle_or_str: QueryType,
+        metadata: Optional[Dict] = None,
+    ) -> QueryBundle:
+        """Run query transform asynchronously."""
+        metadata = metadata or {}
+        if isinstance(query_bundle_or_str, str):
+            query_bundle = QueryBundle(
+                query_str=query_bundle_or_str,
+                custom_embedding_strs=[query_bundle_or_str],
+            )
+        else:
+            query_bundle = query_bundle_or_str
+
+        return await self._arun(query_bundle, metadata=metadata)
+
     def __call__(
         self: Self,
         query_bundle_or_str: QueryType,
@@ -210,9 +248,12 @@ class QueryTransformComponent(QueryComponent):
         return {"query_str": output.query_str}
 
     async def _arun_component(self: Self, **kwargs: Any) -> Any:
-        """Run component."""
-        # TODO: true async not implemented yet
-        return self._run_component(**kwargs)
+        """Run component asynchronously."""
+        output = await self.query_transform.arun(
+            kwargs["query_str"],
+            metadata=kwargs["metadata"],
+        )
+        return {"query_str": output.query_str}
 
     @property
     def input_keys(self: Self) -> InputKeys:
@@ -283,6 +324,18 @@ class HyDEQueryTransform(BaseQueryTransform):
             custom_embedding_strs=embedding_strs,
         )
 
+    async def _arun(self: Self, query_bundle: QueryBundle, metadata: Dict) -> QueryBundle:
+        """Run query transform asynchronously."""
+        query_str = query_bundle.query_str
+        hypothetical_doc = await self._llm.apredict(self._hyde_prompt, query_str=query_str, **self._promp_args)
+        embedding_strs = [hypothetical_doc]
+        if self._include_original:
+            embedding_strs.extend(query_bundle.embedding_strs)
+        return QueryBundle(
+            query_str=query_str,
+            custom_embedding_strs=embedding_strs,
+        )
+
 class KwargPackComponent(QueryComponent):
     """Kwarg pack component.
 
@@ -330,4 +383,75 @@ class KwargPackComponent(QueryComponent):
     @property
     def output_keys(self) -> OutputKeys:
         """Output keys."""
-        return OutputKeys.from_keys({"output"})
\ No newline at end of file
+        return OutputKeys.from_keys({"output"})
+
+_retrieval_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get(ENV_VAR_DOCQ_RETRIEVAL_MAX_WORKERS, 8)), thread_name_prefix="docq-retrieval"
+)
+"""Bounded, process-wide pool shared by all parallel retrievals so concurrent requests can't spawn unbounded threads."""
+
+
+class ParallelRetrieverComponent(QueryComponent):
+    """Run a set of named retrievers concurrently against the same query.
+
+    Used to fan out retrieval across the indices of multiple spaces (and across vector and BM25 lookups) so latency
+    is close to that of the slowest retriever rather than the sum. Each retriever's result list is an output keyed by
+    its name. Link each output to a `KwargPackComponent` so all lists can be fused together, e.g. with RRF.
+
+    Inputs: dict
+        query_str: str - The query to run against every retriever.
+    Outputs: dict
+        {name}: List[NodeWithScore] - One result list per retriever.
+    """
+
+    retrievers: Dict[str, BaseRetriever] = Field(..., description="Retrievers keyed by a unique name.")
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def set_callback_manager(self: Self, callback_manager: Any) -> None:
+        """Set callback manager."""
+
+    def _validate_component_inputs(self: Self, input: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate component inputs during run_component."""
+        if "query_str" not in input:
+            raise ValueError("Input must have key 'query_str'")
+        input["query_str"] = validate_and_convert_stringable(input["query_str"])
+        return input
+
+    def _run_component(self: Self, **kwargs: Any) -> Dict[str, List[NodeWithScore]]:
+        """Run the retrievers on the shared thread pool."""
+        query_str = kwargs["query_str"]
+        ctx = otel_context.get_current()
+
+        def _retrieve(name: str, retriever: BaseRetriever) -> List[NodeWithScore]:
+            token = otel_context.attach(ctx)  # keep retriever spans under the caller's trace
+            try:
+                with tracer.start_as_current_span("ParallelRetrieverComponent.retrieve") as span:
+                    span.set_attributes({"retriever_name": name, "retriever": retriever.__class__.__name__})
+                    nodes = retriever.retrieve(query_str)
+                    span.set_attribute("num_nodes", len(nodes))
+                    return nodes
+            finally:
+                otel_context.detach(token)
+
+        futures = {
+            name: _retrieval_executor.submit(_retrieve, name, retriever) for name, retriever in self.retrievers.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+    async def _arun_component(self: Self, **kwargs: Any) -> Dict[str, List[NodeWithScore]]:
+        """Run the retrievers concurrently as asyncio tasks."""
+        query_str = kwargs["query_str"]
+        results = await asyncio.gather(*(retriever.aretrieve(query_str) for retriever in self.retrievers.values()))
+        return dict(zip(self.retrievers.keys(), results))
+
+    @property
+    def input_keys(self: Self) -> InputKeys:
+        """Input keys."""
+        return InputKeys.from_keys({"query_str"})
+
+    @property
+    def output_keys(self: Self) -> OutputKeys:
+        """Output keys."""
+        return OutputKeys.from_keys(set(self.retrievers.keys()))
@@ -0,0 +1,325 @@
+"""Docq owned Llama Index vector store implementations."""
+
+import json
+import logging as log
+import os
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Self, Set, Type
+
+import docq
+import fsspec
+import numpy as np
+from fsspec.implementations.local import LocalFileSystem
+from opentelemetry import trace
+
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores import SimpleVectorStore
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+
+tracer = trace.get_tracer(__name__, docq.__version_str__)
+
+VECTORS_FILENAME = "vectors.npy"
+"""Contiguous float32 matrix of shape (num_nodes, embedding_dim) in numpy .npy format."""
+VECTOR_IDS_FILENAME = "vector_ids.json"
+"""Row aligned node ids and ref doc ids for `VECTORS_FILENAME`."""
+LEGACY_VECTOR_STORE_FILENAMES = ["default__vector_store.json", "vector_store.json"]
+"""JSON files written by Llama Index `SimpleVectorStore`, replaced by the binary files when next persisted."""
+
+_persist_dir_locks: Dict[str, threading.RLock] = {}
+_persist_dir_locks_lock = threading.Lock()
+
+
+def _persist_dir_lock(persist_dir: str) -> threading.RLock:
+    """The lock serialising writes to a persist dir, and reads of the multi-file vector store in it."""
+    with _persist_dir_locks_lock:
+        return _persist_dir_locks.setdefault(os.path.abspath(persist_dir), threading.RLock())
+
+
+class MemmapVectorStore(BasePydanticVectorStore):
+    """A vector store persisted as a binary float32 matrix that's memory-mapped on load.
+
+    The Llama Index `SimpleVectorStore` persists embeddings as JSON lists of floats. Large spaces spend most of
+    their load time parsing float text and hold every embedding as Python floats. This store writes a `.npy` matrix
+    plus a small id table, opens the matrix with `numpy.memmap` and does top-k with a single matrix-vector product.
+
+    Adds and deletes are cheap, reindexing adds nodes in batches and deletes documents one at a time. Added embeddings
+    are held as pending chunks and deleted rows are only marked. Both are applied with a single copy of the matrix the
+    next time it's needed, i.e. to query or persist.
+
+    Only the default (cosine similarity) query mode is supported. Metadata filters are not supported.
+    Text is not stored, nodes are fetched from the docstore by the index.
+    """
+
+    stores_text: bool = False
+    is_embedding_query: bool = True
+
+    _embeddings: np.ndarray = PrivateAttr()
+    _pending: List[np.ndarray] = PrivateAttr(default_factory=list)
+    """Embeddings added since the matrix was last compacted, their rows follow those of `_embeddings`."""
+    _deleted: Set[int] = PrivateAttr(default_factory=set)
+    """Rows deleted since the matrix was last compacted."""
+    _norms: Optional[np.ndarray] = PrivateAttr(default=None)
+    _node_ids: List[str] = PrivateAttr(default_factory=list)
+    _ref_doc_ids: List[Optional[str]] = PrivateAttr(default_factory=list)
+    _rows_by_node_id: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _rows_by_ref_doc_id: Dict[Optional[str], List[int]] = PrivateAttr(default_factory=dict)
+
+    def __init__(
+        self: Self,
+        embeddings: Optional[np.ndarray] = None,
+        node_ids: Optional[List[str]] = None,
+        ref_doc_ids: Optional[List[Optional[str]]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Initialise the store. Without arguments an empty in-memory store is created."""
+        super().__init__(**kwargs)
+        self._embeddings = embeddings if embeddings is not None else np.empty((0, 0), dtype=np.float32)
+        self._node_ids = node_ids or []
+        self._ref_doc_ids = ref_doc_ids or [None] * len(self._node_ids)
+        if len(self._node_ids) != self._embeddings.shape[0] or len(self._ref_doc_ids) != len(self._node_ids):
+            raise ValueError("Embeddings, node ids and ref doc ids must have the same number of rows.")
+        self._index_rows()
+
+    @classmethod
+    def class_name(cls: Type["MemmapVectorStore"]) -> str:
+        """Class name."""
+        return "MemmapVectorStore"
+
+    @property
+    def client(self: Self) -> None:
+        """No client, the store is local."""
+        return None
+
+    def __len__(self: Self) -> int:
+        """Number of embeddings in the store."""
+        return len(self._node_ids) - len(self._deleted)
+
+    def __bool__(self: Self) -> bool:
+        """Always true, even when empty. `StorageContext.from_defaults()` swaps falsy vector stores for the default."""
+        return True
+
+    def _index_rows(self: Self) -> None:
+        self._rows_by_node_id = {node_id: i for i, node_id in enumerate(self._node_ids)}
+        self._rows_by_ref_doc_id = {}
+        for i, ref_doc_id in enumerate(self._ref_doc_ids):
+            self._rows_by_ref_doc_id.setdefault(ref_doc_id, []).append(i)
+
+    def _dim(self: Self) -> Optional[int]:
+        if self._embeddings.shape[0] > 0:
+            return self._embeddings.shape[1]
+        return self._pending[0].shape[1] if self._pending else None
+
+    def get(self: Self, text_id: str) -> List[float]:
+        """Get the embedding for a node id."""
+        self._compact()
+        return self._embeddings[self._rows_by_node_id[text_id]].tolist()
+
+    def add(self: Self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        """Add nodes with embeddings to the store."""
+        if not nodes:
+            return []
+        new_embeddings = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        dim = self._dim()
+        if dim is not None and new_embeddings.shape[1] != dim:
+            raise ValueError(f"Embedding dimension {new_embeddings.shape[1]} doesn't match store dimension {dim}.")
+        self._pending.append(new_embeddings)
+        for node in nodes:
+            row = len(self._node_ids)
+            self._node_ids.append(node.node_id)
+            self._ref_doc_ids.append(node.ref_doc_id)
+            self._rows_by_node_id[node.node_id] = row
+            self._rows_by_ref_doc_id.setdefault(node.ref_doc_id, []).append(row)
+        self._norms = None
+        return [node.node_id for node in nodes]
+
+    def delete(self: Self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """Delete all nodes of a document from the store."""
+        for row in self._rows_by_ref_doc_id.pop(ref_doc_id, []):
+            self._delete_row(row)
+
+    def delete_nodes(self: Self, node_ids: Optional[List[str]] = None, **delete_kwargs: Any) -> None:
+        """Delete nodes from the store by node id."""
+        for node_id in node_ids or []:
+            row = self._rows_by_node_id.get(node_id)
+            if row is not None:
+                self._rows_by_ref_doc_id[self._ref_doc_ids[row]].remove(row)
+                self._delete_row(row)
+
+    def _delete_row(self: Self, row: int) -> None:
+        self._deleted.add(row)
+        if self._rows_by_node_id.get(self._node_ids[row]) == row:
+            del self._rows_by_node_id[self._node_ids[row]]
+        self._norms = None
+
+    def _compact(self: Self) -> None:
+        """Apply pending adds and deletes to the matrix, copying it once."""
+        if not self._pending and not self._deleted:
+            return
+        parts = [part for part in [self._embeddings, *self._pending] if part.shape[0] > 0]
+        embeddings = np.concatenate([np.asarray(part) for part in parts]) if parts else self._embeddings
+        if self._deleted:
+            keep = [i for i in range(len(self._node_ids)) if i not in self._deleted]
+            embeddings = embeddings[keep] if keep else np.empty((0, 0), dtype=np.float32)
+            self._node_ids = [self._node_ids[i] for i in keep]
+            self._ref_doc_ids = [self._ref_doc_ids[i] for i in keep]
+        self._embeddings = embeddings
+        self._pending = []
+        self._deleted = set()
+        self._norms = None
+        self._index_rows()
+
+    def query(self: Self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        """Return the top-k most similar nodes by cosine similarity."""
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise NotImplementedError(f"MemmapVectorStore does not support query mode '{query.mode}'")
+        if query.filters is not None:
+            raise NotImplementedError("MemmapVectorStore does not support metadata filters")
+        if query.query_embedding is None:
+            raise ValueError("Query embedding is required.")
+        self._compact()
+        if len(self) == 0:
+            return VectorStoreQueryResult(nodes=None, similarities=[], ids=[])
+
+        rows = np.arange(len(self))
+        if query.node_ids or query.doc_ids:
+            node_ids_ = set(query.node_ids or [])
+            doc_ids_ = set(query.doc_ids or [])
+            rows = np.asarray(
+                [
+                    i
+                    for i, (node_id, ref_doc_id) in enumerate(zip(self._node_ids, self._ref_doc_ids))
+                    if (not node_ids_ or node_id in node_ids_) and (not doc_ids_ or ref_doc_id in doc_ids_)
+                ],
+                dtype=np.int64,
+            )
+            if rows.size == 0:
+                return VectorStoreQueryResult(nodes=None, similarities=[], ids=[])
+
+        q = np.asarray(query.query_embedding, dtype=np.float32)
+        q_norm = float(np.linalg.norm(q)) or 1.0
+        norms = self._get_norms()
+        if rows.size == len(self):
+            scores = (self._embeddings @ q) / (norms * q_norm)
+        else:
+            scores = (self._embeddings[rows] @ q) / (norms[rows] * q_norm)
+
+        top_k = min(query.similarity_top_k, scores.size)
+        if top_k <= 0:
+            return VectorStoreQueryResult(nodes=None, similarities=[], ids=[])
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return VectorStoreQueryResult(
+            nodes=None,
+            similarities=[float(scores[i]) for i in top],
+            ids=[self._node_ids[int(rows[i])] for i in top],
+        )
+
+    def _get_norms(self: Self) -> np.ndarray:
+        """Row norms of the embedding matrix. Computed once per load and cached."""
+        self._compact()
+        if self._norms is None:
+            norms = np.linalg.norm(self._embeddings, axis=1)
+            norms[norms == 0] = 1.0
+            self._norms = norms.astype(np.float32)
+        return self._norms
+
+    def persist(self: Self, persist_path: str, fs: Optional[fsspec.AbstractFileSystem] = None) -> None:
+        """Persist to the directory of `persist_path`.
+
+        `StorageContext.persist()` passes the path of the JSON file a `SimpleVectorStore` would write. Only the
+        directory is used. Legacy JSON vector store files in the directory are removed once the binary files are written.
+        """
+        if fs is not None and not isinstance(fs, LocalFileSystem):
+            raise NotImplementedError("MemmapVectorStore only supports the local filesystem")
+        persist_dir = os.path.dirname(persist_path)
+        os.makedirs(persist_dir, exist_ok=True)
+        self._compact()
+        with tracer.start_as_current_span("MemmapVectorStore.persist") as span, _persist_dir_lock(persist_dir):
+            span.set_attributes({"persist_dir": persist_dir, "num_vectors": len(self)})
+            vectors_path = os.path.join(persist_dir, VECTORS_FILENAME)
+            ids_path = os.path.join(persist_dir, VECTOR_IDS_FILENAME)
+
+            # write to uniquely named temp files and swap in so a reader never sees a half written store.
+            vectors_fd, vectors_tmp = tempfile.mkstemp(dir=persist_dir, prefix=f"{VECTORS_FILENAME}.", suffix=".tmp")
+            ids_fd, ids_tmp = tempfile.mkstemp(dir=persist_dir, prefix=f"{VECTOR_IDS_FILENAME}.", suffix=".tmp")
+            try:
+                with os.fdopen(vectors_fd, "wb") as f:
+                    np.save(f, np.ascontiguousarray(self._embeddings, dtype=np.float32))
+                with os.fdopen(ids_fd, "w") as f:
+                    json.dump({"node_ids": self._node_ids, "ref_doc_ids": self._ref_doc_ids}, f)
+                os.replace(vectors_tmp, vectors_path)
+                os.replace(ids_tmp, ids_path)
+            finally:
+                for tmp in (vectors_tmp, ids_tmp):
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+
+            for filename in LEGACY_VECTOR_STORE_FILENAMES:
+                legacy_path = os.path.join(persist_dir, filename)
+                if os.path.exists(legacy_path):
+                    os.remove(legacy_path)
+
+    @classmethod
+    def exists(cls: Type["MemmapVectorStore"], persist_dir: str) -> bool:
+        """Check if a binary vector store has been persisted in the directory."""
+        return os.path.exists(os.path.join(persist_dir, VECTORS_FILENAME)) and os.path.exists(
+            os.path.join(persist_dir, VECTOR_IDS_FILENAME)
+        )
+
+    @classmethod
+    def from_persist_dir(
+        cls: Type["MemmapVectorStore"], persist_dir: str, migrate: bool = False
+    ) -> "MemmapVectorStore":
+        """Load the store from a directory, memory-mapping the embeddings.
+
+        If only a legacy `SimpleVectorStore` JSON file exists it's converted in memory. It's replaced with the binary
+        format when the store is next persisted, e.g. by a reindex, or straight away if `migrate` is True. If nothing
+        is persisted an empty store is returned.
+        """
+        with tracer.start_as_current_span("MemmapVectorStore.from_persist_dir") as span, _persist_dir_lock(persist_dir):
+            span.set_attribute("persist_dir", persist_dir)
+            if not cls.exists(persist_dir):
+                legacy_path = next(
+                    (
+                        os.path.join(persist_dir, f)
+                        for f in LEGACY_VECTOR_STORE_FILENAMES
+                        if os.path.exists(os.path.join(persist_dir, f))
+                    ),
+                    None,
+                )
+                if legacy_path is None:
+                    return cls()
+                store = cls.from_simple_vector_store(SimpleVectorStore.from_persist_path(legacy_path))
+                if not migrate:
+                    return store
+                log.info("Migrating legacy JSON vector store '%s' to binary format", legacy_path)
+                span.add_event("legacy_vector_store_migrated", {"legacy_path": legacy_path, "num_vectors": len(store)})
+                store.persist(legacy_path)
+
+            with open(os.path.join(persist_dir, VECTOR_IDS_FILENAME), "r") as f:
+                ids = json.load(f)
+            embeddings = np.load(os.path.join(persist_dir, VECTORS_FILENAME), mmap_mode="r")
+            if embeddings.ndim != 2:
+                embeddings = embeddings.reshape((len(ids["node_ids"]), -1))
+            span.set_attribute("num_vectors", len(ids["node_ids"]))
+            return cls(embeddings=embeddings, node_ids=ids["node_ids"], ref_doc_ids=ids["ref_doc_ids"])
+
+    @classmethod
+    def from_simple_vector_store(
+        cls: Type["MemmapVectorStore"], simple_vector_store: SimpleVectorStore
+    ) -> "MemmapVectorStore":
+        """Create an in-memory store from the data of a Llama Index `SimpleVectorStore`."""
+        data = simple_vector_store.data
+        node_ids = list(data.embedding_dict.keys())
+        if not node_ids:
+            return cls()
+        embeddings = np.asarray([data.embedding_dict[node_id] for node_id in node_ids], dtype=np.float32)
+        ref_doc_ids = [data.text_id_to_ref_doc_id.get(node_id) for node_id in node_ids]
+        return cls(embeddings=embeddings, node_ids=node_ids, ref_doc_ids=ref_doc_ids)
@@ -1,15 +1,17 @@
 """Functions for utilising LLMs."""
 
+import asyncio
 import logging as log
 import os
 import traceback
-from typing import List, Optional
+from functools import partial
+from typing import Any, Generator, List, Optional
 from uu import Error
 
 import docq
 from docq.domain import SpaceKey
 from docq.manage_assistants import Assistant, llama_index_chat_prompt_template_from_assistant
-from docq.manage_indices import _load_index_from_storage, load_indices_from_storage
+from docq.manage_indices import _load_index_from_storage, load_bm25_index, load_indices_from_storage
 from docq.model_selection.main import (
     LLM_MODEL_COLLECTIONS,
     LlmUsageSettingsCollection,
@@ -17,18 +19,25 @@ from docq.model_selection.main import (
     ModelProvider,
     _get_service_context,
 )
+from docq.support import response_cache
+from docq.support.llama_index.bm25 import BM25IndexRetriever
 from docq.support.llama_index.node_post_processors import reciprocal_rank_fusion
 from docq.support.llama_index.query_pipeline_components import (
     HyDEQueryTransform,
     KwargPackComponent,
+    ParallelRetrieverComponent,
     ResponseWithChatHistory,
 )
 from docq.support.store import get_models_dir
-from llama_index.core.base.response.schema import RESPONSE_TYPE, Response
+from llama_index.core.base.response.schema import RESPONSE_TYPE, Response, StreamingResponse
 from llama_index.core.chat_engine import SimpleChatEngine
-from llama_index.core.chat_engine.types import AGENT_CHAT_RESPONSE_TYPE, AgentChatResponse
+from llama_index.core.chat_engine.types import (
+    AGENT_CHAT_RESPONSE_TYPE,
+    AgentChatResponse,
+    StreamingAgentChatResponse,
+)
 from llama_index.core.indices.base import BaseIndex
-from llama_index.core.llms import ChatMessage
+from llama_index.core.llms import ChatMessage, MessageRole
 from llama_index.core.prompts import PromptTemplate, PromptType
 from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.core.query_pipeline import (
@@ -43,7 +52,6 @@ from llama_index.core.retrievers.fusion_retriever import FUSION_MODES
 
 # load_index_from_storage
 from llama_index.embeddings.huggingface_optimum import OptimumEmbedding
-from llama_index.retrievers.bm25 import BM25Retriever
 from opentelemetry import trace
 from opentelemetry.trace import Status, StatusCode
 
@@ -105,7 +113,9 @@ def get_hybrid_fusion_retriever_query(
     for index in indices:
         vector_retriever = index.as_retriever(similarity_top_k=similarity_top_k)
         retrievers.append(vector_retriever)
-        bm25_retriever = BM25Retriever.from_defaults(docstore=index.docstore, similarity_top_k=similarity_top_k)
+        bm25_retriever = BM25IndexRetriever(
+            load_bm25_index(index), docstore=index.docstore, similarity_top_k=similarity_top_k
+        )
         retrievers.append(bm25_retriever)
 
     # the default prompt doesn't return JUST the list of queries when using some none OAI models like Llama3.
@@ -153,6 +163,34 @@ def run_chat(
     return output
 
 
+def run_chat_stream(
+    input_: str, history: List[ChatMessage], model_settings_collection: LlmUsageSettingsCollection, assistant: Assistant
+) -> StreamingAgentChatResponse:
+    """Streaming version of `run_chat()`. The answer tokens are yielded by `response_gen`."""
+    with tracer.start_as_current_span(name="run_chat_stream"):
+        engine = SimpleChatEngine.from_defaults(
+            service_context=_get_service_context(model_settings_collection),
+            kwargs=model_settings_collection.model_usage_settings[ModelCapability.CHAT].additional_args,
+            system_prompt=assistant.system_message_content,
+            chat_history=history,
+        )
+        return engine.stream_chat(input_)
+
+
+async def arun_chat(
+    input_: str, history: List[ChatMessage], model_settings_collection: LlmUsageSettingsCollection, assistant: Assistant
+) -> AgentChatResponse:
+    """Async version of `run_chat()`."""
+    with tracer.start_as_current_span(name="arun_chat"):
+        engine = SimpleChatEngine.from_defaults(
+            service_context=_get_service_context(model_settings_collection),
+            kwargs=model_settings_collection.model_usage_settings[ModelCapability.CHAT].additional_args,
+            system_prompt=assistant.system_message_content,
+            chat_history=history,
+        )
+        return await engine.achat(input_)
+
+
 def run_ask(
     input_: str,
     history: List[ChatMessage],
@@ -163,6 +201,17 @@ def run_ask(
     return run_ask2(input_, history, model_settings_collection, assistant, spaces)
 
 
+async def arun_ask(
+    input_: str,
+    history: List[ChatMessage],
+    model_settings_collection: LlmUsageSettingsCollection,
+    assistant: Assistant,
+    spaces: list[SpaceKey] | None = None,
+) -> RESPONSE_TYPE | AGENT_CHAT_RESPONSE_TYPE:
+    """Async version of `run_ask()`."""
+    return await arun_ask2(input_, history, model_settings_collection, assistant, spaces)
+
+
 @tracer.start_as_current_span(name="run_ask")
 def run_ask1(
     input_: str,
@@ -241,15 +290,22 @@ def run_ask1(
     return output
 
 
-@tracer.start_as_current_span(name="run_ask2")
-def run_ask2(
+def _build_ask_pipeline(
     input_: str,
     history: List[ChatMessage],
     model_settings_collection: LlmUsageSettingsCollection,
     assistant: Assistant,
     spaces: Optional[list[SpaceKey]] = None,
-) -> RESPONSE_TYPE | AGENT_CHAT_RESPONSE_TYPE:
-    """Implements logic of run_ask() using LlamaIndex query pipelines."""
+    streaming: bool = False,
+) -> tuple[QueryPipeline, dict[str, Any]]:
+    """Declare the RAG query pipeline used by `run_ask2()` and `arun_ask2()`.
+
+    Args:
+        streaming: When True the `response` output of the pipeline is a generator of `ChatResponse` deltas.
+
+    Returns:
+        The pipeline and the kwargs to run it with.
+    """
     span = trace.get_current_span()
 
     service_context = _get_service_context(model_settings_collection)
@@ -280,32 +336,41 @@ def run_ask2(
                 "similarity_top_k": similarity_top_k,
             }
         )
-        # print("indices:", len(indices))
-        # TODO: adjust ask2 to work with multiple spaces.
-        vector_retriever = indices[0].as_retriever(similarity_top_k=similarity_top_k)
-        span.add_event(
-            name="vector_retriever_object_created",
-            attributes={
-                "retriever": vector_retriever.__class__.__name__,
-                "index_id": indices[0].index_id,
-                "index_struct_cls": indices[0].index_struct_cls.__name__,
-                "similarity_top_k": similarity_top_k,
-            },
-        )
-        # retriever = get_hybrid_fusion_retriever_query(indices, model_settings_collection)
-        if not indices[0].docstore:
-            raise ValueError("The docstore is empty, cannot create BM25Retriever")
-
-        bm25_retriever = BM25Retriever.from_defaults(docstore=indices[0].docstore, similarity_top_k=similarity_top_k)
-        span.add_event(
-            name="bm25_retriever_object_created",
-            attributes={
-                "retriever": bm25_retriever.__class__.__name__,
-                "index_id": indices[0].index_id,
-                "index_struct_cls": indices[0].index_struct_cls.__name__,
-                "similarity_top_k": similarity_top_k,
-            },
-        )
+        if len(indices) == 0:
+            raise ValueError("No Spaces given to search.")
+
+        # Every space is searched. Vector and BM25 lookups for all spaces run concurrently within each retrieval leg.
+        query_retrievers: dict[str, BaseRetriever] = {}
+        rewrite_retrievers: dict[str, BaseRetriever] = {}
+        for i, index in enumerate(indices):
+            vector_retriever = index.as_retriever(similarity_top_k=similarity_top_k)
+            query_retrievers[f"v_query_nodes_{i}"] = vector_retriever
+            rewrite_retrievers[f"v_rewrite_nodes_{i}"] = vector_retriever
+            span.add_event(
+                name="vector_retriever_object_created",
+                attributes={
+                    "retriever": vector_retriever.__class__.__name__,
+                    "index_id": index.index_id,
+                    "index_struct_cls": index.index_struct_cls.__name__,
+                    "similarity_top_k": similarity_top_k,
+                },
+            )
+            if not index.docstore:
+                log.warning("run_ask2(): docstore for index '%s' is empty, skipping BM25 retrieval.", index.index_id)
+                continue
+            bm25_retriever = BM25IndexRetriever(
+                load_bm25_index(index), docstore=index.docstore, similarity_top_k=similarity_top_k
+            )
+            query_retrievers[f"bm25_query_nodes_{i}"] = bm25_retriever
+            span.add_event(
+                name="bm25_retriever_object_created",
+                attributes={
+                    "retriever": bm25_retriever.__class__.__name__,
+                    "index_id": index.index_id,
+                    "index_struct_cls": index.index_struct_cls.__name__,
+                    "similarity_top_k": similarity_top_k,
+                },
+            )
 
         # query_engine = RetrieverQueryEngine.from_args(
         #     retriever=retriever,
@@ -360,12 +425,21 @@ def run_ask2(
     kwargpack_component = KwargPackComponent()
     span.add_event(name="kwargpack_component_created")
 
-    rerank_component = FnComponent(fn=reciprocal_rank_fusion)
+    # one global top-k across all spaces and retrieval legs.
+    rerank_component = FnComponent(fn=partial(reciprocal_rank_fusion, top_k=similarity_top_k))
     span.add_event(name="rerank_component_created")
 
+    query_retrievers_component = ParallelRetrieverComponent(retrievers=query_retrievers)
+    rewrite_retrievers_component = ParallelRetrieverComponent(retrievers=rewrite_retrievers)
+    span.add_event(
+        name="parallel_retriever_components_created",
+        attributes={"num_query_retrievers": len(query_retrievers), "num_rewrite_retrievers": len(rewrite_retrievers)},
+    )
+
     response_component = ResponseWithChatHistory(
         llm=llm,
         system_prompt=assistant.system_message_content,
+        streaming=streaming,
     )
     span.add_event(name="response_component_created")
 
@@ -374,10 +448,8 @@ def run_ask2(
         modules={
             "input": input_component,
             "hyde_query_transform": hyde_query_transform_component,
-            "v_rewrite_retriever": vector_retriever,
-            "v_query_retriever": vector_retriever,
-            # "bm25_rewrite_retriever": bm25_retriever,
-            "bm25_query_retriever": bm25_retriever,
+            "rewrite_retrievers": rewrite_retrievers_component,
+            "query_retrievers": query_retrievers_component,
             "join": kwargpack_component,
             "RRF_reranker": rerank_component,
             "response_component": response_component,
@@ -390,20 +462,22 @@ def run_ask2(
     pipeline.add_link("input", "hyde_query_transform", src_key="query_str", dest_key="query_str")
 
     # run multiple retrievals (note we don't do BM25 with the hallucinated query. in a new thread it doesn't make sense)
-    pipeline.add_link(
-        "hyde_query_transform", "v_rewrite_retriever"
-    )  # vector search with the *hallucinated* query (HyDE)
-    pipeline.add_link("input", "v_query_retriever", src_key="query_str")  # vector search with the *original* query
-    pipeline.add_link("input", "bm25_query_retriever", src_key="query_str")  # BM25 search with the *original* query
+    # vector search, across all spaces, with the *hallucinated* query (HyDE)
+    pipeline.add_link("hyde_query_transform", "rewrite_retrievers", src_key="query_str", dest_key="query_str")
+    # vector and BM25 search, across all spaces, with the *original* query
+    pipeline.add_link("input", "query_retrievers", src_key="query_str", dest_key="query_str")
 
     # each input to the Kwargpack component needs a dest key -- it's the key on the dict so can be anything.
     # then, the kwargpack component will pack all the inputs into a dict of lists of nodes called 'join'. It's intentionally this for RRF rerank algo to work.
-    pipeline.add_link("v_rewrite_retriever", "join", dest_key="v_rewrite_nodes")
-    pipeline.add_link("v_query_retriever", "join", dest_key="v_query_nodes")
-    pipeline.add_link("bm25_query_retriever", "join", dest_key="bm25_query_nodes")
+    # there's one list per space per retrieval leg so RRF fuses them all in one go.
+    for retrievers_component_name, retrievers_ in (
+        ("rewrite_retrievers", rewrite_retrievers),
+        ("query_retrievers", query_retrievers),
+    ):
+        for nodes_key in retrievers_:
+            pipeline.add_link(retrievers_component_name, "join", src_key=nodes_key, dest_key=nodes_key)
 
     # RRF reranker needs the packed dict of node list from each retrieval
-    # TODO: add top k
     pipeline.add_link("join", "RRF_reranker", src_key="output", dest_key="results")
 
     # synthesizer needs the reranked nodes,  query str, and chat history
@@ -425,13 +499,42 @@ def run_ask2(
 
     # output, intermediates = pipeline.run_with_intermediates(input_)
 
-    span.add_event(name="query_pipeline_execution_started")
-    output, intermediates = pipeline.run_with_intermediates(
-        query_str=input_,
-        chat_history=history,
-        chat_history_str=history_str,
-        callback_manager=service_context.callback_manager,
+    run_kwargs = {
+        "query_str": input_,
+        "chat_history": history,
+        "chat_history_str": history_str,
+        "callback_manager": service_context.callback_manager,
+    }
+    return pipeline, run_kwargs
+
+
+def _response_from_pipeline_output(output: dict[str, Any]) -> Response:
+    return Response(
+        response=output.get("response", "blah!").message.content, source_nodes=output.get("source_nodes", [])
     )
+
+
+@tracer.start_as_current_span(name="run_ask2")
+def run_ask2(
+    input_: str,
+    history: List[ChatMessage],
+    model_settings_collection: LlmUsageSettingsCollection,
+    assistant: Assistant,
+    spaces: Optional[list[SpaceKey]] = None,
+) -> RESPONSE_TYPE | AGENT_CHAT_RESPONSE_TYPE:
+    """Implements logic of run_ask() using LlamaIndex query pipelines."""
+    span = trace.get_current_span()
+    cache_context = _get_response_cache_context(input_, history, model_settings_collection, assistant, spaces)
+    if cache_context is not None:
+        cached_response = response_cache.lookup(*cache_context)
+        if cached_response is not None:
+            span.add_event(name="response_cache_hit")
+            return cached_response
+
+    pipeline, run_kwargs = _build_ask_pipeline(input_, history, model_settings_collection, assistant, spaces)
+
+    span.add_event(name="query_pipeline_execution_started")
+    output, intermediates = pipeline.run_with_intermediates(**run_kwargs)
     span.add_event(name="query_pipeline_execution_finished")
 
     # # debug code
@@ -453,9 +556,105 @@ def run_ask2(
 
     # print("ANSWER:", output.get("response", "blah!").message)
 
-    return Response(
-        response=output.get("response", "blah!").message.content, source_nodes=output.get("source_nodes", [])
-    )
+    response = _response_from_pipeline_output(output)
+    if cache_context is not None:
+        response_cache.store(*cache_context, input_, response)
+    return response
+
+
+def _get_response_cache_context(
+    input_: str,
+    history: List[ChatMessage],
+    model_settings_collection: LlmUsageSettingsCollection,
+    assistant: Assistant,
+    spaces: Optional[list[SpaceKey]],
+) -> Optional[tuple[response_cache.ResponseCacheScope, list[float]]]:
+    """Get the response cache scope and query embedding for a question, or None if it shouldn't be cached.
+
+    Only the first question in a conversation is cached. Follow ups depend on the conversation so they aren't.
+    """
+    if not response_cache.is_enabled() or not spaces:
+        return None
+    if any(message.role == MessageRole.ASSISTANT for message in history):
+        return None
+    scope = response_cache.get_scope(spaces, assistant, model_settings_collection.key)
+    if scope is None:
+        return None
+    query_embedding = _get_service_context(model_settings_collection).embed_model.get_query_embedding(input_)
+    return scope, query_embedding
+
+
+def run_ask_stream(
+    input_: str,
+    history: List[ChatMessage],
+    model_settings_collection: LlmUsageSettingsCollection,
+    assistant: Assistant,
+    spaces: Optional[list[SpaceKey]] = None,
+) -> StreamingResponse:
+    """Streaming version of `run_ask()`. Retrieval runs up front, the answer tokens are yielded by `response_gen`."""
+    with tracer.start_as_current_span(name="run_ask_stream") as span:
+        cache_context = _get_response_cache_context(input_, history, model_settings_collection, assistant, spaces)
+        if cache_context is not None:
+            cached_response = response_cache.lookup(*cache_context)
+            if cached_response is not None:
+                span.add_event(name="response_cache_hit")
+                return StreamingResponse(
+                    response_gen=iter([str(cached_response.response)]), source_nodes=cached_response.source_nodes
+                )
+
+        pipeline, run_kwargs = _build_ask_pipeline(
+            input_, history, model_settings_collection, assistant, spaces, streaming=True
+        )
+
+        span.add_event(name="query_pipeline_execution_started")
+        output = pipeline.run(**run_kwargs)
+        span.add_event(name="query_pipeline_execution_finished")
+        source_nodes = output.get("source_nodes", [])
+
+        def _response_gen() -> Generator[str, None, None]:
+            chunks = []
+            for chat_response in output["response"]:
+                chunks.append(chat_response.delta or "")
+                yield chunks[-1]
+            if cache_context is not None:
+                response_cache.store(*cache_context, input_, Response("".join(chunks), source_nodes=source_nodes))
+
+        return StreamingResponse(response_gen=_response_gen(), source_nodes=source_nodes)
+
+
+async def arun_ask2(
+    input_: str,
+    history: List[ChatMessage],
+    model_settings_collection: LlmUsageSettingsCollection,
+    assistant: Assistant,
+    spaces: Optional[list[SpaceKey]] = None,
+) -> RESPONSE_TYPE | AGENT_CHAT_RESPONSE_TYPE:
+    """Async version of `run_ask2()`.
+
+    The pipeline is run with `QueryPipeline.arun` which awaits the modules with no pending upstream dependencies
+    together. So the vector and BM25 retrievals with the original query run concurrently with the HyDE LLM call.
+    """
+    with tracer.start_as_current_span(name="arun_ask2") as span:
+        # the cache is sync (embedding call and SQLite) so keep it off the event loop.
+        cache_context = await asyncio.to_thread(
+            _get_response_cache_context, input_, history, model_settings_collection, assistant, spaces
+        )
+        if cache_context is not None:
+            cached_response = await asyncio.to_thread(response_cache.lookup, *cache_context)
+            if cached_response is not None:
+                span.add_event(name="response_cache_hit")
+                return cached_response
+
+        pipeline, run_kwargs = _build_ask_pipeline(input_, history, model_settings_collection, assistant, spaces)
+
+        span.add_event(name="query_pipeline_execution_started")
+        output = await pipeline.arun(**run_kwargs)
+        span.add_event(name="query_pipeline_execution_finished")
+
+        response = _response_from_pipeline_output(output)
+        if cache_context is not None:
+            await asyncio.to_thread(response_cache.store, *cache_context, input_, response)
+        return response
 
 
 @tracer.start_as_current_span(name="_default_response")
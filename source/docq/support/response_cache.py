@@ -0,0 +1,228 @@
+"""Opt-in semantic cache of RAG responses.
+
+The same handful of questions get asked over and over, e.g. in Slack channels and public Ask widgets. A question
+whose embedding is close enough to one already answered against the same spaces (at the same index generation), with
+the same assistant and model collection, gets the stored answer and source nodes without running the pipeline.
+
+Entries are stored per org in SQLite with a TTL and LRU eviction. They are removed when any of their spaces are
+reindexed. Enable with `DOCQ_RESPONSE_CACHE_ENABLED=true`.
+"""
+
+import hashlib
+import json
+import logging as log
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, Optional, Sequence
+
+import docq
+import numpy as np
+from docq.config import (
+    ENV_VAR_DOCQ_RESPONSE_CACHE_ENABLED,
+    ENV_VAR_DOCQ_RESPONSE_CACHE_MAX_ENTRIES,
+    ENV_VAR_DOCQ_RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+    ENV_VAR_DOCQ_RESPONSE_CACHE_TTL_SECONDS,
+)
+from docq.domain import Assistant, SpaceKey
+from docq.support.store import (
+    SqliteSchema,
+    ensure_schema,
+    get_index_dir_state,
+    get_sqlite_org_response_cache_file,
+    sqlite_connection,
+)
+from llama_index.core.base.response.schema import Response
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.storage.docstore.utils import doc_to_json, json_to_doc
+from opentelemetry import trace
+
+tracer = trace.get_tracer(__name__, docq.__version_str__)
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+DEFAULT_TTL_SECONDS = 60 * 60 * 24  # 1 day
+DEFAULT_MAX_ENTRIES = 1000  # per org
+
+_SPACES_SEPARATOR = "|"
+
+SQL_CREATE_RESPONSE_CACHE_TABLE = """
+CREATE TABLE IF NOT EXISTS response_cache (
+    id INTEGER PRIMARY KEY,
+    scope_key TEXT NOT NULL,
+    spaces TEXT NOT NULL,
+    query TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    response TEXT NOT NULL,
+    source_nodes TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_accessed_at REAL NOT NULL
+)
+"""
+
+SQL_CREATE_RESPONSE_CACHE_SCOPE_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_response_cache_scope_key ON response_cache (scope_key, created_at)
+"""
+
+RESPONSE_CACHE_SCHEMA = SqliteSchema(
+    name="response_cache",
+    migrations=(SQL_CREATE_RESPONSE_CACHE_TABLE, SQL_CREATE_RESPONSE_CACHE_SCOPE_INDEX),
+)
+
+
+@dataclass
+class ResponseCacheScope:
+    """Identifies the set of answers a question can be matched against."""
+
+    org_id: int
+    key: str
+    """Hash of the spaces with their index generations, the assistant and the model settings collection."""
+    spaces: str
+    """Delimited space key values. Used to invalidate entries when a space is reindexed."""
+
+
+def is_enabled() -> bool:
+    """Check if the response cache has been turned on."""
+    return os.environ.get(ENV_VAR_DOCQ_RESPONSE_CACHE_ENABLED, "false").lower() in ("true", "1", "yes")
+
+
+def _similarity_threshold() -> float:
+    return float(os.environ.get(ENV_VAR_DOCQ_RESPONSE_CACHE_SIMILARITY_THRESHOLD, DEFAULT_SIMILARITY_THRESHOLD))
+
+
+def _ttl_seconds() -> float:
+    return float(os.environ.get(ENV_VAR_DOCQ_RESPONSE_CACHE_TTL_SECONDS, DEFAULT_TTL_SECONDS))
+
+
+def _max_entries() -> int:
+    return int(os.environ.get(ENV_VAR_DOCQ_RESPONSE_CACHE_MAX_ENTRIES, DEFAULT_MAX_ENTRIES))
+
+
+@contextmanager
+def _connect(org_id: int) -> Iterator[sqlite3.Connection]:
+    db_file = get_sqlite_org_response_cache_file(org_id)
+    ensure_schema(db_file, RESPONSE_CACHE_SCHEMA)
+    with sqlite_connection(db_file) as connection:
+        yield connection
+
+
+def _normalise(embedding: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def get_scope(
+    spaces: list[SpaceKey], assistant: Assistant, model_settings_collection_key: str
+) -> Optional[ResponseCacheScope]:
+    """Get the cache scope for a question against a set of spaces.
+
+    The current index generation of each space is part of the key so answers from before a reindex never match.
+
+    Returns:
+        None if the spaces are empty or span more than one org. These aren't cached.
+    """
+    org_ids = {space.org_id for space in spaces}
+    if len(org_ids) != 1:
+        return None
+
+    space_states = sorted((space.value(), get_index_dir_state(space)[0]) for space in spaces)
+    key_parts = {
+        "spaces": space_states,
+        "assistant": [assistant.key, assistant.system_message_content],
+        "model_settings_collection": model_settings_collection_key,
+    }
+    key = hashlib.sha256(json.dumps(key_parts, sort_keys=True).encode("utf-8")).hexdigest()
+    spaces_value = _SPACES_SEPARATOR + _SPACES_SEPARATOR.join(value for value, _ in space_states) + _SPACES_SEPARATOR
+    return ResponseCacheScope(org_id=org_ids.pop(), key=key, spaces=spaces_value)
+
+
+def lookup(scope: ResponseCacheScope, query_embedding: Sequence[float]) -> Optional[Response]:
+    """Return the stored answer for the most similar, unexpired question in scope that's within the threshold."""
+    with tracer.start_as_current_span("response_cache.lookup") as span:
+        now = time.time()
+        with _connect(scope.org_id) as connection:
+            rows = connection.execute(
+                "SELECT id, embedding FROM response_cache WHERE scope_key = ? AND created_at >= ?",
+                (scope.key, now - _ttl_seconds()),
+            ).fetchall()
+            span.set_attribute("candidates", len(rows))
+            if not rows:
+                span.set_attribute("hit", False)
+                return None
+
+            query_vector = _normalise(query_embedding)
+            candidates = [
+                (id_, np.frombuffer(embedding, dtype=np.float32))
+                for id_, embedding in rows
+                if len(embedding) == query_vector.nbytes
+            ]
+            if not candidates:
+                span.set_attribute("hit", False)
+                return None
+            similarities = np.stack([vector for _, vector in candidates]) @ query_vector
+            best = int(np.argmax(similarities))
+            span.set_attribute("best_similarity", float(similarities[best]))
+            if similarities[best] < _similarity_threshold():
+                span.set_attribute("hit", False)
+                return None
+
+            id_ = candidates[best][0]
+            response, source_nodes = connection.execute(
+                "SELECT response, source_nodes FROM response_cache WHERE id = ?", (id_,)
+            ).fetchone()
+            connection.execute("UPDATE response_cache SET last_accessed_at = ? WHERE id = ?", (now, id_))
+            connection.commit()
+
+        span.set_attribute("hit", True)
+        return Response(
+            response=response,
+            source_nodes=[
+                NodeWithScore(node=json_to_doc(x["node"]), score=x["score"]) for x in json.loads(source_nodes)
+            ],
+        )
+
+
+def store(scope: ResponseCacheScope, query_embedding: Sequence[float], query_str: str, response: Response) -> None:
+    """Store an answer. Expired entries are removed and the least recently used evicted beyond the max entries."""
+    with tracer.start_as_current_span("response_cache.store") as span:
+        now = time.time()
+        source_nodes = json.dumps(
+            [{"node": doc_to_json(x.node), "score": x.score} for x in (response.source_nodes or [])]
+        )
+        with _connect(scope.org_id) as connection:
+            connection.execute(
+                "INSERT INTO response_cache (scope_key, spaces, query, embedding, response, source_nodes, created_at, last_accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    scope.key,
+                    scope.spaces,
+                    query_str,
+                    _normalise(query_embedding).tobytes(),
+                    str(response.response),
+                    source_nodes,
+                    now,
+                    now,
+                ),
+            )
+            expired = connection.execute(
+                "DELETE FROM response_cache WHERE created_at < ?", (now - _ttl_seconds(),)
+            ).rowcount
+            evicted = connection.execute(
+                "DELETE FROM response_cache WHERE id NOT IN (SELECT id FROM response_cache ORDER BY last_accessed_at DESC LIMIT ?)",
+                (_max_entries(),),
+            ).rowcount
+            connection.commit()
+        span.set_attributes({"expired": expired, "evicted": evicted})
+
+
+def invalidate_space(space: SpaceKey) -> int:
+    """Remove all entries that include the space. Returns the number of entries removed."""
+    with _connect(space.org_id) as connection:
+        removed = connection.execute(
+            "DELETE FROM response_cache WHERE instr(spaces, ?) > 0",
+            (f"{_SPACES_SEPARATOR}{space.value()}{_SPACES_SEPARATOR}",),
+        ).rowcount
+        connection.commit()
+    log.debug("response_cache.invalidate_space(): space %s, %s entries removed", space, removed)
+    return removed
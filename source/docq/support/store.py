@@ -1,17 +1,23 @@
 """Functions for utilising storage."""
 
+import itertools
 import logging as log
 import os
 import shutil
+import sqlite3
+import threading
 import time
-from contextlib import suppress
+import weakref
+from contextlib import contextmanager, suppress
+from dataclasses import dataclass
 from enum import Enum
 from threading import Timer
-from typing import Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Self, Sequence, Tuple, Union
 
 import docq
 from docq.config import ENV_VAR_DOCQ_DATA, OrganisationFeatureType, SpaceType
 from docq.domain import SpaceKey
+from docq.support.llama_index.vector_stores import MemmapVectorStore
 from llama_index.core.storage import StorageContext
 from opentelemetry import trace
 
@@ -33,6 +39,8 @@ class _SqliteFilename(Enum):
     USAGE = "usage.db"
     SYSTEM = "system.db"
     SLACK_MESSAGES = "slack_messages.db"
+    RESPONSE_CACHE = "response_cache.db"
+    EMBEDDING_CACHE = "embedding_cache.db"
 
 
 class _DataScope(Enum):
@@ -62,6 +70,13 @@ HISTORY_THREAD_TABLE_NAME = "history_thread_{feature}"
 INACTIVITY_THRESHOLD = 60 * 60 * 2 * 24  # 1 day
 CLEANUP_FREQUENCY = 60 * 60 * 1  # 1 hour
 
+SQLITE_BUSY_TIMEOUT_SECONDS = 5.0
+"""How long a statement waits for another connection's lock before failing with 'database is locked'."""
+SQLITE_CACHE_SIZE_KIB = 16 * 1024
+"""Page cache size of each pooled connection."""
+SQLITE_MMAP_SIZE_BYTES = 256 * 1024 * 1024
+"""How much of each database file pooled connections read through a memory map rather than read() calls."""
+
 
 def _get_path(
     store: _StoreDir, data_scope: _DataScope, subtype: Optional[str] = None, filename: Optional[str] = None
@@ -146,6 +161,26 @@ def get_index_dir(space: SpaceKey) -> str:
         store=_StoreDir.INDEX, data_scope=_data_scope, subtype=os.path.join(str(space.org_id), str(space.id_))
     )
 
+
+def get_index_dir_state(space: SpaceKey) -> tuple[int, int]:
+    """Get the generation and total size of the persisted index for a space.
+
+    The generation is the latest modification time (ns) of any file in the index dir. It changes whenever the index is
+    persisted, including by another process, so it can be used to detect stale copies of a loaded index.
+
+    Returns:
+        (generation, size_bytes). (0, 0) if the index dir is empty.
+    """
+    generation, size_bytes = 0, 0
+    with os.scandir(get_index_dir(space)) as entries:
+        for entry in entries:
+            if entry.is_file():
+                stat_ = entry.stat()
+                generation = max(generation, stat_.st_mtime_ns)
+                size_bytes += stat_.st_size
+    return generation, size_bytes
+
+
 def get_sqlite_usage_file(user_id: int) -> str:
     """Get the SQLite file for storing usage related data. All usage related data is segregated by user i.e. inherently PERSONAL."""
     return _get_path(
@@ -189,6 +224,320 @@ def get_sqlite_org_slack_messages_file(org_id: int) -> str:
     )
 
 
+def get_sqlite_org_response_cache_file(org_id: int) -> str:
+    """Get the SQLite file for the org scoped cache of RAG responses."""
+    return _get_path(
+        store=_StoreDir.SQLITE,
+        data_scope=_DataScope.ORG,
+        subtype=str(org_id),
+        filename=_SqliteFilename.RESPONSE_CACHE.value,
+    )
+
+
+def get_sqlite_embedding_cache_file() -> str:
+    """Get the SQLite file for the cache of embeddings. Entries are keyed by content hash so it's global."""
+    return _get_path(
+        store=_StoreDir.SQLITE, data_scope=_DataScope.GLOBAL, filename=_SqliteFilename.EMBEDDING_CACHE.value
+    )
+
+
+@dataclass(eq=False)
+class _PooledConnection:
+    connection: sqlite3.Connection
+    file_id: Optional[Tuple[int, int]]
+    """(device, inode) of the database file when connected, to notice the file being deleted or replaced."""
+    depth: int = 0
+    """How many `sqlite_connection()` blocks are using the connection on its thread."""
+
+
+def _sqlite_file_id(db_file: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat_ = os.stat(db_file)
+    except FileNotFoundError:
+        return None
+    return stat_.st_dev, stat_.st_ino
+
+
+class _SqliteConnectionPool:
+    """Long-lived SQLite connections, one per thread per database file.
+
+    sqlite3 connections can't be shared between threads, so rather than opening a connection for every call each
+    thread keeps one per database file and reuses it. A thread's connections are closed when it exits. Connections
+    use WAL mode so readers don't block the writer or each other.
+    """
+
+    def __init__(self: Self) -> None:
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.open_count = 0
+
+    def checkout(self: Self, db_file: str, detect_types: int) -> _PooledConnection:
+        """Get this thread's connection to a database file, connecting if there isn't one."""
+        connections: Dict[Tuple[str, int], _PooledConnection] = self._local.__dict__.setdefault("connections", {})
+        key = (db_file, detect_types)
+        pooled = connections.get(key)
+        if pooled is not None and pooled.depth == 0 and pooled.file_id != _sqlite_file_id(db_file):
+            # e.g. public session data cleaned up, reconnect rather than use a deleted file.
+            log.debug("SQLite file %s was deleted or replaced, reconnecting", db_file)
+            del connections[key]
+            pooled = None
+        if pooled is None:
+            pooled = connections[key] = self._connect(db_file, detect_types)
+        return pooled
+
+    @tracer.start_as_current_span(name="_SqliteConnectionPool._connect")
+    def _connect(self: Self, db_file: str, detect_types: int) -> _PooledConnection:
+        span = trace.get_current_span()
+        connection = sqlite3.connect(db_file, detect_types=detect_types, timeout=SQLITE_BUSY_TIMEOUT_SECONDS)
+        try:
+            # persistent, only changes the file the first time.
+            connection.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.OperationalError as e:
+            log.warning("Failed to switch %s to WAL mode, another connection may be using it. Error: %s", db_file, e)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KIB}")
+        connection.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE_BYTES}")
+        pooled = _PooledConnection(connection, _sqlite_file_id(db_file))
+        weakref.finalize(pooled, self._close, connection)
+
+        with self._lock:
+            self.open_count += 1
+            open_count = self.open_count
+        span.set_attributes({"sqlite.file": os.path.basename(db_file), "sqlite.open_connections": open_count})
+        log.debug("Opened SQLite connection to %s, %d open", db_file, open_count)
+        return pooled
+
+    def _close(self: Self, connection: sqlite3.Connection) -> None:
+        with suppress(sqlite3.Error):
+            connection.close()
+        with self._lock:
+            self.open_count -= 1
+
+
+_sqlite_pool = _SqliteConnectionPool()
+_savepoint_ids = itertools.count()
+
+
+@contextmanager
+def sqlite_connection(db_file: str, detect_types: int = 0) -> Iterator[sqlite3.Connection]:
+    """Use this thread's pooled connection to a SQLite database file.
+
+    A drop-in replacement for `closing(sqlite3.connect(...))`: anything not committed by the end of the block is
+    rolled back, as closing the connection would, but the connection is kept open for the next call. Blocks can be
+    nested, only the outermost rolls back.
+
+    Args:
+        db_file: The database file, from one of the `get_sqlite_*_file()` functions.
+        detect_types: As for `sqlite3.connect()`. Connections with different values are pooled separately.
+    """
+    pooled = _sqlite_pool.checkout(db_file, detect_types)
+    pooled.depth += 1
+    try:
+        yield pooled.connection
+    finally:
+        pooled.depth -= 1
+        if pooled.depth == 0 and pooled.connection.in_transaction:
+            pooled.connection.rollback()
+
+
+@contextmanager
+def transaction(db_file: str, detect_types: int = 0) -> Iterator[sqlite3.Connection]:
+    """Run a block as a single write transaction on this thread's pooled connection to a SQLite database file.
+
+    The transaction is committed if the block succeeds and rolled back if it raises. It starts with the write lock
+    taken (`BEGIN IMMEDIATE`) so concurrent writers queue up front rather than failing part way through. A transaction
+    inside another on the same database is a savepoint of the outer one.
+
+    Args:
+        db_file: The database file, from one of the `get_sqlite_*_file()` functions.
+        detect_types: As for `sqlite3.connect()`.
+    """
+    with tracer.start_as_current_span("store.transaction") as span, sqlite_connection(
+        db_file, detect_types
+    ) as connection:
+        span.set_attributes(
+            {"sqlite.file": os.path.basename(db_file), "sqlite.open_connections": _sqlite_pool.open_count}
+        )
+        if connection.in_transaction:
+            savepoint = f"docq_savepoint_{next(_savepoint_ids)}"
+            connection.execute(f"SAVEPOINT {savepoint}")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute(f"ROLLBACK TO {savepoint}")
+                raise
+            finally:
+                connection.execute(f"RELEASE {savepoint}")
+            return
+
+        start = time.perf_counter()
+        connection.execute("BEGIN IMMEDIATE")
+        span.set_attribute("sqlite.lock_wait_ms", round((time.perf_counter() - start) * 1000, 3))
+        try:
+            yield connection
+        except BaseException:
+            connection.rollback()
+            raise
+        connection.commit()
+
+
+_SQLITE_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+_BULK_INSERT_MAX_ROWS_PER_STATEMENT = 500
+
+
+def bulk_insert(
+    connection: sqlite3.Connection,
+    table: str,
+    columns: Sequence[str],
+    rows: Sequence[Sequence[Any]],
+    return_ids: bool = False,
+) -> List[int]:
+    """Insert rows into a table with as few statements as possible.
+
+    Without `return_ids` this is a single `executemany()`. `executemany()` discards the rows of a `RETURNING` clause,
+    so with `return_ids` the rows are inserted with multi-row `INSERT ... RETURNING id` statements instead, as many
+    rows per statement as the bound parameter limit allows. Run it inside `transaction()` so the insert is one write.
+
+    Args:
+        connection: The connection, usually from `transaction()`.
+        table: The table name. Not escaped, must not come from user input.
+        columns: The columns the values of each row are for.
+        rows: The rows to insert.
+        return_ids: Return the ids (rowids) of the inserted rows.
+
+    Returns:
+        The ids of the inserted rows, in the order of `rows`, if `return_ids`. Otherwise empty.
+    """
+    column_list = ", ".join(columns)
+    row_placeholders = f"({', '.join('?' * len(columns))})"
+    if not return_ids:
+        connection.executemany(f"INSERT INTO {table} ({column_list}) VALUES {row_placeholders}", rows)  # noqa: S608
+        return []
+
+    if not _SQLITE_HAS_RETURNING:
+        sql = f"INSERT INTO {table} ({column_list}) VALUES {row_placeholders}"  # noqa: S608
+        ids = []
+        for row in rows:
+            ids.append(connection.execute(sql, row).lastrowid)
+        return ids
+
+    max_rows = max(
+        1,
+        min(
+            _BULK_INSERT_MAX_ROWS_PER_STATEMENT,
+            connection.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER) // max(1, len(columns)),
+        ),
+    )
+    ids = []
+    for start in range(0, len(rows), max_rows):
+        chunk = rows[start : start + max_rows]
+        values = ", ".join([row_placeholders] * len(chunk))
+        returned = connection.execute(
+            f"INSERT INTO {table} ({column_list}) VALUES {values} RETURNING id",  # noqa: S608
+            [value for row in chunk for value in row],
+        ).fetchall()
+        # RETURNING order isn't defined, ids are assigned in VALUES order.
+        ids.extend(sorted(row[0] for row in returned))
+    return ids
+
+
+SQL_CREATE_SCHEMA_VERSIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS docq_schema_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+SchemaMigration = Union[str, Callable[[sqlite3.Connection], None]]
+"""A single SQL statement or a function that migrates using the connection it's given. Must not commit."""
+
+
+@dataclass(frozen=True)
+class SqliteSchema:
+    """A named, versioned set of tables in a SQLite database file.
+
+    The first migration creates the schema and each after takes it up a version. Only ever append migrations, files
+    at any older version are brought up to date by running the ones they haven't had.
+    """
+
+    name: str
+    migrations: Tuple[SchemaMigration, ...]
+
+    @property
+    def version(self: Self) -> int:
+        """The latest version."""
+        return len(self.migrations)
+
+
+_ensured_schemas: Dict[Tuple[str, str], Tuple[Optional[Tuple[int, int, int]], int]] = {}
+"""(database file, schema name) to the stamp of the file and the version the schema was last ensured at."""
+_ensure_schema_lock = threading.Lock()
+
+
+def _sqlite_file_stamp(db_file: str) -> Optional[Tuple[int, int, int]]:
+    """The id of a database file and when it last changed.
+
+    Unlike a pooled connection nothing holds the file open between `ensure_schema()` calls, so once it's deleted the
+    filesystem can reuse its inode for a new file. The change time tells the two apart. In WAL mode the file itself only
+    changes at checkpoints, so the schema is rarely checked again.
+    """
+    try:
+        stat_ = os.stat(db_file)
+    except FileNotFoundError:
+        return None
+    return stat_.st_dev, stat_.st_ino, stat_.st_ctime_ns
+
+
+def ensure_schema(db_file: str, *schemas: SqliteSchema) -> None:
+    """Create or migrate schemas in a database file to their latest versions.
+
+    The database is only checked the first time in a process, or if the file has since been replaced or checkpointed,
+    so this is cheap enough to call before every use of the schema. Call it before opening a connection to the file,
+    migrating takes the file's write lock.
+    """
+    stamp = _sqlite_file_stamp(db_file)
+    if stamp is not None and all(
+        _ensured_schemas.get((db_file, schema.name)) == (stamp, schema.version) for schema in schemas
+    ):
+        return
+
+    with _ensure_schema_lock:
+        for schema in schemas:
+            if stamp is None or _ensured_schemas.get((db_file, schema.name)) != (stamp, schema.version):
+                _migrate_schema(db_file, schema)
+        stamp = _sqlite_file_stamp(db_file)
+        for schema in schemas:
+            _ensured_schemas[(db_file, schema.name)] = (stamp, schema.version)
+
+
+@tracer.start_as_current_span(name="store._migrate_schema")
+def _migrate_schema(db_file: str, schema: SqliteSchema) -> None:
+    span = trace.get_current_span()
+    with transaction(db_file) as connection:
+        connection.execute(SQL_CREATE_SCHEMA_VERSIONS_TABLE)
+        row = connection.execute("SELECT version FROM docq_schema_versions WHERE name = ?", (schema.name,)).fetchone()
+        version = row[0] if row else 0
+        span.set_attributes({"schema": schema.name, "from_version": version, "to_version": schema.version})
+        if version > schema.version:
+            log.warning(
+                "Schema %s in %s is at version %d, newer than %d", schema.name, db_file, version, schema.version
+            )
+        if version >= schema.version:
+            return
+
+        for migration in schema.migrations[version:]:
+            if isinstance(migration, str):
+                connection.execute(migration)
+            else:
+                migration(connection)
+        connection.execute(
+            "INSERT OR REPLACE INTO docq_schema_versions (name, version, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
+            (schema.name, schema.version),
+        )
+    log.info("Migrated schema %s in %s from version %d to %d", schema.name, db_file, version, schema.version)
+
+
 def get_history_table_name(type_: OrganisationFeatureType) -> str:
     """Get the history table name for a feature."""
     # Note that because it's used for database table name, `lower()` is used to ensure it's all lowercase.
@@ -221,12 +570,16 @@ def _clean_public_chat_history() -> None:
 
 @tracer.start_as_current_span(name="_get_storage_context")
 def _get_storage_context(space: SpaceKey) -> StorageContext:
-    return StorageContext.from_defaults(persist_dir=get_index_dir(space))
+    # Legacy JSON vector stores are converted in memory, the reindex job replaces them when it persists the index.
+    persist_dir = get_index_dir(space)
+    return StorageContext.from_defaults(
+        persist_dir=persist_dir, vector_store=MemmapVectorStore.from_persist_dir(persist_dir)
+    )
 
 
 @tracer.start_as_current_span(name="_get_default_storage_context")
 def _get_default_storage_context() -> StorageContext:
-    return StorageContext.from_defaults()
+    return StorageContext.from_defaults(vector_store=MemmapVectorStore())
 
 
 def _init() -> None:
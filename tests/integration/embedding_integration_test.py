@@ -6,7 +6,7 @@ from typing import Self
 
 from docq.config import SpaceType
 from docq.domain import SpaceKey
-from docq.manage_spaces import _create_vector_index, _persist_index
+from docq.manage_indices import _create_empty_vector_index, _persist_index, _upsert_documents
 from docq.model_selection.main import (
     get_model_settings_collection,
 )
@@ -36,7 +36,8 @@ class TestCreateIndex(unittest.TestCase):
 
         # Act
         # result_index = _create_document_summary_index(documents, model_settings_collection)
-        result_index = _create_vector_index(documents, model_settings_collection)
+        result_index = _create_empty_vector_index(model_settings_collection)
+        _upsert_documents(result_index, documents, model_settings_collection)
         _persist_index(result_index, SpaceKey(type_=SpaceType.SHARED, id_=9, org_id=9999, summary="test space"))
         result_nodes = result_index.as_retriever().retrieve("This is the first document.")
 
@@ -4,7 +4,7 @@ import pytest
 from docq.config import SpaceType
 from docq.domain import SpaceKey
 from docq.manage_assistants import get_assistant_or_default
-from docq.manage_indices import _create_vector_index
+from docq.manage_indices import _create_empty_vector_index, _upsert_documents
 from docq.model_selection.main import get_model_settings_collection
 from docq.support import llm
 from llama_index.core.base.response.schema import Response
@@ -39,7 +39,8 @@ def test_run_ask2_query_pipeline_logic(setup_environment):
     )
     documents = [doc1, doc2]
 
-    result_index = _create_vector_index(documents, model_settings_collection)
+    result_index = _create_empty_vector_index(model_settings_collection)
+    _upsert_documents(result_index, documents, model_settings_collection)
     space1 = SpaceKey(type_=SpaceType.SHARED, id_=9, org_id=9999, summary="test space")
     spaces = [space1]
 
@@ -0,0 +1,67 @@
+"""Tests for docq.data_source.support.html_parsing."""
+from typing import List
+
+import pytest
+from bs4 import BeautifulSoup
+from docq.data_source.support.html_parsing import HtmlParser, LxmlHtmlParser, PythonHtmlParser
+from docq.data_source.support.web_extracting import (
+    BaseTextExtractor,
+    GenericKnowledgeBaseExtractor,
+    GenericTextExtractor,
+    ReadTheDocsTextExtractor,
+)
+
+PAGE = """<!DOCTYPE html>
+<html><head><title>Docs &amp; guides</title><link rel="canonical stylesheet" href="/guide?utm_source=x">
+<style>p { color: red; }</style><script>var p = "<p>not text</p>";</script></head>
+<body><div class="header nav"><a class="reference internal" href="/install">Install</a>
+<a href="https://other.test/page">Other</a><a class="reference" href="/api#x">API</a><a>No href</a></div>
+<div role="main"><h1 class="doc-title">Getting <em>started</em></h1><h2>Subtitle</h2>
+<p>First <b>paragraph</b><br>with a break.</p><p>Second paragraph</p>
+<div class="kb-subtitle">Knowledge base <span>subtitle</span></div></div>
+<p>Last &lt;p&gt; &#169;</p></body></html>"""
+
+
+def _parsers() -> List[HtmlParser]:
+    parsers: List[HtmlParser] = [PythonHtmlParser()]
+    try:
+        parsers.append(LxmlHtmlParser())
+    except ImportError:
+        pass
+    return parsers
+
+
+@pytest.mark.parametrize("parser", _parsers(), ids=lambda parser: parser.name)
+@pytest.mark.parametrize(
+    "extractor",
+    [
+        GenericTextExtractor,
+        ReadTheDocsTextExtractor,
+        lambda parser: GenericKnowledgeBaseExtractor("doc-title", "kb-subtitle", parser=parser),
+    ],
+)
+def test_extract_page_matches_beautifulsoup(parser: HtmlParser, extractor: type) -> None:
+    """The single pass extraction gives what the BeautifulSoup extract methods do."""
+    extractor: BaseTextExtractor = extractor(parser=parser)
+    soup = BeautifulSoup(PAGE, "html.parser")
+    page_url = "https://docs.test/guide/"
+
+    page = extractor.extract_page(PAGE, page_url)
+
+    assert page.text == extractor.extract_text(soup, page_url)
+    assert page.title == extractor.extract_title(soup)
+    assert page.subtitle == extractor.extract_subtitle(soup)
+    assert page.links == extractor.extract_links(soup, page_url, page_url)
+    assert page.canonical_url == "https://docs.test/guide"
+
+
+@pytest.mark.parametrize("parser", _parsers(), ids=lambda parser: parser.name)
+def test_extract_page_empty_and_filtered(parser: HtmlParser) -> None:
+    """Empty pages get the default title, the include filter applies to links."""
+    extractor = GenericTextExtractor(parser=parser)
+
+    assert extractor.extract_page("", "https://docs.test/").title == "web page"
+    assert extractor.extract_page(PAGE, "https://docs.test/", include_filter="^/").links == [
+        "https://docs.test/install",
+        "https://docs.test/api#x",
+    ]
@@ -0,0 +1,103 @@
+"""Tests for docq.data_source.support.manifest."""
+import os
+import tempfile
+
+from docq.data_source.support.manifest import SyncManifest, load_manifest, save_manifest
+
+
+def _download(temp_dir: str, source_uri: str, content: bytes) -> tuple[str, str, int, int]:
+    local_path = os.path.join(temp_dir, os.path.basename(source_uri))
+    with open(local_path, "wb") as f:
+        f.write(content)
+    return (source_uri, local_path, 1, len(content))
+
+
+def _first_sync(temp_dir: str) -> SyncManifest:
+    manifest = SyncManifest()
+    for name, version in [("a", "v1"), ("b", "v1"), ("c", "v1")]:
+        assert not manifest.is_unchanged(f"/{name}", version, 1)
+        assert manifest.add_downloaded(_download(temp_dir, f"/{name}", name.encode()))
+    save_manifest(manifest.current, temp_dir)
+    return manifest
+
+
+def test_full_sync_extracts_everything() -> None:
+    """Without a previous manifest every file is downloaded and extracted."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        manifest = _first_sync(temp_dir)
+
+        assert not manifest.is_incremental
+        assert manifest.unchanged_sources == set()
+        assert {d.link for d in manifest.get_document_list()} == {"/a", "/b", "/c"}
+
+
+def test_incremental_sync_skips_unchanged() -> None:
+    """Unchanged versions aren't downloaded, same content isn't extracted and missing files are deleted."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        _first_sync(temp_dir)
+        manifest = SyncManifest(load_manifest(temp_dir))
+
+        assert manifest.is_unchanged("/a", "v1", 1)
+        # touched but content is the same
+        assert not manifest.is_unchanged("/b", "v2", 1)
+        assert not manifest.add_downloaded(_download(temp_dir, "/b", b"b"))
+        # new file
+        assert not manifest.is_unchanged("/d", "v1", 1)
+        assert manifest.add_downloaded(_download(temp_dir, "/d", b"d"))
+
+        assert manifest.is_incremental
+        assert manifest.unchanged_sources == {"/a", "/b"}
+        assert manifest.deleted_sources == {"/c"}
+        assert {d.link for d in manifest.get_document_list()} == {"/a", "/b", "/d"}
+
+
+def test_failed_file_is_synced_again() -> None:
+    """A discarded file isn't in the saved manifest so isn't skipped next time."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        manifest = SyncManifest()
+        manifest.is_unchanged("/a", "v1", 1)
+        manifest.add_downloaded(_download(temp_dir, "/a", b"a"))
+        manifest.discard("/a")
+        save_manifest(manifest.current, temp_dir)
+
+        assert not SyncManifest(load_manifest(temp_dir)).is_unchanged("/a", "v1", 1)
+
+
+def test_web_pages_are_fetched_conditionally() -> None:
+    """Validators of the last sync are sent back, not modified pages are kept and the same text isn't reindexed."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        manifest = SyncManifest()
+        assert manifest.add_content("https://docs.test/a", "hash-a", 10, 1, version='"v1"')
+        assert manifest.add_content(
+            "https://docs.test/b", "hash-b", 10, 1, last_modified="Mon, 01 Jan 2024 00:00:00 GMT"
+        )
+        save_manifest(manifest.current, temp_dir)
+
+        manifest = SyncManifest(load_manifest(temp_dir))
+
+        assert manifest.conditional_headers("https://docs.test/a") == {"If-None-Match": '"v1"'}
+        assert manifest.conditional_headers("https://docs.test/c") == {}
+        assert manifest.keep_unchanged("https://docs.test/a") is not None
+        assert not manifest.add_content("https://docs.test/b", "hash-b", 10, 2)
+        assert manifest.unchanged_sources == {"https://docs.test/a", "https://docs.test/b"}
+        assert manifest.deleted_sources == set()
+
+
+def test_duplicate_pages_are_not_listed_or_kept_in_the_index() -> None:
+    """Near-duplicate pages aren't in the document list, and a page indexed last time that's now one is deleted."""
+    manifest = SyncManifest()
+    manifest.add_content("https://docs.test/a", "hash-a", 1, 1, '"a1"')
+    manifest.add_content("https://docs.test/b", "hash-a", 1, 1, '"b1"')
+
+    manifest = SyncManifest(manifest.current)
+    manifest.keep_unchanged("https://docs.test/a")
+    manifest.add_duplicate("https://docs.test/b", "https://docs.test/a", "hash-a", 1, 2, '"b1"')
+
+    assert [d.link for d in manifest.get_document_list()] == ["https://docs.test/a"]
+    assert manifest.deleted_sources == {"https://docs.test/b"}
+
+    manifest = SyncManifest(manifest.current)
+    manifest.add_duplicate("https://docs.test/b", "https://docs.test/a", "hash-a", 1, 3, '"b1"')
+
+    assert manifest.conditional_headers("https://docs.test/b") == {"If-None-Match": '"b1"'}
+    assert manifest.deleted_sources == {"https://docs.test/a"}
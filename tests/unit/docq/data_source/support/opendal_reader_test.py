@@ -0,0 +1,110 @@
+"""Tests for downloading and extracting files in docq.data_source.support.opendal_reader.base."""
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Generator, Optional
+from unittest.mock import patch
+
+import pytest
+from docq.data_source.support.background import iter_in_background
+from docq.data_source.support.opendal_reader import base
+
+
+@pytest.fixture(autouse=True)
+def executor() -> Generator[ThreadPoolExecutor, None, None]:
+    """Extract in threads rather than spawning worker processes."""
+    with ThreadPoolExecutor(max_workers=2) as executor, patch.object(
+        base, "get_extraction_executor", return_value=executor
+    ):
+        yield executor
+
+
+def _downloaded_files(temp_dir: str, *texts: str) -> list[tuple[str, str, int, int]]:
+    downloaded_files = []
+    for i, text in enumerate(texts):
+        local_path = os.path.join(temp_dir, f"{i}.txt")
+        with open(local_path, "w") as f:
+            f.write(text)
+        downloaded_files.append((f"/source/{i}.txt", local_path, 0, len(text)))
+    return downloaded_files
+
+
+def test_iter_extracted_files_keeps_order_and_deletes_files() -> None:
+    """Documents come back in download order, metadata is applied and local copies are removed."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        downloaded_files = _downloaded_files(temp_dir, "one", "two", "three")
+
+        documents = list(
+            base.iter_extracted_files(
+                downloaded_files, file_metadata=lambda source: {"source_uri": source}, max_pending=2
+            )
+        )
+
+        assert [d.text for d in documents] == ["one", "two", "three"]
+        assert [d.metadata["source_uri"] for d in documents] == [f[0] for f in downloaded_files]
+        assert os.listdir(temp_dir) == []
+
+
+def test_extraction_timeout_counts_from_submission() -> None:
+    """Files stuck behind a slow one time out with it rather than each waiting the full timeout in turn."""
+    failed = []
+    with tempfile.TemporaryDirectory() as temp_dir, patch.object(
+        base, "_submit_extraction", side_effect=lambda *args: Future()
+    ):
+        downloaded_files = _downloaded_files(temp_dir, "one", "two", "three")
+
+        start = time.monotonic()
+        documents = list(
+            base.iter_extracted_files(downloaded_files, max_pending=3, timeout=0.2, on_failed=failed.append)
+        )
+        elapsed = time.monotonic() - start
+
+        assert documents == []
+        assert failed == downloaded_files
+        assert elapsed < 0.4
+        assert os.listdir(temp_dir) == []
+
+
+def test_failed_file_is_skipped() -> None:
+    """A file that fails to extract doesn't stop the others."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        downloaded_files = _downloaded_files(temp_dir, "one", "two")
+        missing = ("/source/missing.txt", os.path.join(temp_dir, "missing.txt"), 0, 0)
+
+        documents = asyncio.run(base.extract_files([downloaded_files[0], missing, downloaded_files[1]]))
+
+        assert [d.text for d in documents] == ["one", "two"]
+
+
+def test_downloads_are_concurrent_and_retried() -> None:
+    """Files download in parallel up to the limit, transient errors are retried and failed files skipped."""
+    lock = threading.Lock()
+    in_flight, max_in_flight, attempts = 0, 0, {}
+
+    def _download(file: dict) -> Optional[tuple[str, str, int, int]]:
+        nonlocal in_flight, max_in_flight
+        with lock:
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            attempts[file["name"]] = attempts.get(file["name"], 0) + 1
+        time.sleep(0.02)
+        with lock:
+            in_flight -= 1
+        if file["name"] == "flaky" and attempts["flaky"] == 1:
+            raise ConnectionError("reset")
+        if file["name"] == "missing":
+            raise type("NotFound", (Exception,), {"status_code": 404})()
+        return (file["name"], file["name"], 0, 0)
+
+    files = [{"name": str(i)} for i in range(8)] + [{"name": "flaky"}, {"name": "missing"}]
+    with patch.object(base, "DOWNLOAD_RETRY_BACKOFF_SECONDS", 0):
+        downloaded = list(
+            iter_in_background(lambda: base.iter_downloads_in_threads(files, _download, max_concurrency=3), 3)
+        )
+
+    assert sorted(d[0] for d in downloaded) == sorted([str(i) for i in range(8)] + ["flaky"])
+    assert max_in_flight == 3
+    assert (attempts["flaky"], attempts["missing"]) == (2, 1)
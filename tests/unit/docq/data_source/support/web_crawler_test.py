@@ -0,0 +1,154 @@
+"""Tests for docq.data_source.support.web_crawler."""
+import asyncio
+import re
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from docq.data_source.support.web_crawler import WebCrawler, normalise_url
+
+ROBOTS = "User-agent: *\nDisallow: /private/\n"
+
+
+def _site(pages: Dict[str, str]) -> httpx.MockTransport:
+    def _handle(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/robots.txt":
+            return httpx.Response(200, text=ROBOTS)
+        html = pages.get(str(request.url))
+        if html is None:
+            return httpx.Response(404)
+        return httpx.Response(200, text=html, headers={"content-type": "text/html"})
+
+    return httpx.MockTransport(_handle)
+
+
+def _parse(url: str, html: str) -> Tuple[Optional[str], List[str]]:
+    return url, re.findall(r'href="([^"]+)"', html)
+
+
+def _links(*hrefs: str) -> str:
+    return "".join(f'<a href="{href}">link</a>' for href in hrefs)
+
+
+def test_crawl_follows_links_to_max_depth() -> None:
+    """Links are followed recursively up to the depth limit, skipping disallowed and off-site pages beyond the seeds."""
+    pages = {
+        "https://docs.test/": _links("/a", "/private/secret", "https://other.test/x"),
+        "https://docs.test/a": _links("/b#section", "https://other.test/y"),
+        "https://docs.test/b": _links("/c"),
+        "https://docs.test/c": "",
+        "https://docs.test/private/secret": "",
+        "https://other.test/x": _links("https://docs.test/a"),
+        "https://other.test/y": "",
+    }
+    crawler = WebCrawler(transport=_site(pages))
+
+    crawled = list(crawler.iter_pages(["https://docs.test/"], _parse, max_depth=2, include_seeds=False))
+
+    assert sorted(page.url for page in crawled) == ["https://docs.test/a", "https://docs.test/b", "https://other.test/x"]
+    assert {page.url: page.depth for page in crawled}["https://docs.test/b"] == 2
+
+
+def test_crawl_limits_requests_per_host() -> None:
+    """No more than the per host limit of requests are in flight to one host."""
+    in_flight, max_in_flight = 0, 0
+
+    async def _handle(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, max_in_flight
+        if request.url.path == "/robots.txt":
+            return httpx.Response(404)
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, text="", headers={"content-type": "text/html"})
+
+    crawler = WebCrawler(max_concurrency=8, per_host_concurrency=2, transport=httpx.MockTransport(_handle))
+    urls = [f"https://docs.test/{i}" for i in range(10)]
+
+    assert len(list(crawler.iter_pages(urls, _parse))) == 10
+    assert max_in_flight == 2
+
+
+def test_crawl_pages_from_sitemap_index() -> None:
+    """Sitemap indexes are followed to the pages their sitemaps list."""
+    sitemaps = {
+        "/sitemap.xml": '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        "<sitemap><loc>https://docs.test/pages.xml</loc></sitemap></sitemapindex>",
+        "/pages.xml": '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        "<url><loc>https://docs.test/a</loc></url><url><loc>https://docs.test/b</loc></url></urlset>",
+    }
+
+    def _handle(request: httpx.Request) -> httpx.Response:
+        if request.url.path in sitemaps:
+            return httpx.Response(200, text=sitemaps[request.url.path], headers={"content-type": "application/xml"})
+        if request.url.path == "/robots.txt":
+            return httpx.Response(404)
+        return httpx.Response(200, text="", headers={"content-type": "text/html"})
+
+    crawler = WebCrawler(transport=httpx.MockTransport(_handle))
+
+    crawled = list(crawler.iter_pages(["https://docs.test/"], _parse, from_sitemaps=True))
+
+    assert sorted(page.url for page in crawled) == ["https://docs.test/a", "https://docs.test/b"]
+
+
+def test_crawl_only_sitemap_pages_matching_include_filter() -> None:
+    """Pages listed by a sitemap that don't match the include filter aren't fetched."""
+    sitemap = (
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        "<url><loc>https://docs.test/docs/a</loc></url><url><loc>https://docs.test/blog/b</loc></url></urlset>"
+    )
+    fetched = []
+
+    def _handle(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/sitemap.xml":
+            return httpx.Response(200, text=sitemap, headers={"content-type": "application/xml"})
+        if request.url.path == "/robots.txt":
+            return httpx.Response(404)
+        fetched.append(str(request.url))
+        return httpx.Response(200, text="", headers={"content-type": "text/html"})
+
+    crawler = WebCrawler(transport=httpx.MockTransport(_handle))
+
+    crawled = list(crawler.iter_pages(["https://docs.test/"], _parse, from_sitemaps=True, include_filter="/docs/"))
+
+    assert [page.url for page in crawled] == ["https://docs.test/docs/a"]
+    assert fetched == ["https://docs.test/docs/a"]
+
+
+def test_normalise_url_collapses_variants() -> None:
+    """Fragments and tracking parameters are dropped and query parameters sorted."""
+    assert normalise_url("/a?b=2&utm_source=x&a=1#top", "https://Docs.Test/index") == "https://docs.test/a?a=1&b=2"
+    assert normalise_url("mailto:someone@docs.test") is None
+
+
+def test_conditional_fetch_not_modified() -> None:
+    """Pages are fetched with the conditional headers and a 304 is yielded as not modified without parsing."""
+    parsed = []
+
+    def _handle(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/robots.txt":
+            return httpx.Response(404)
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"etag": '"v1"'})
+        return httpx.Response(200, text="", headers={"content-type": "text/html", "etag": '"v2"'})
+
+    def _parse_and_record(url: str, html: str) -> Tuple[Optional[str], List[str]]:
+        parsed.append(url)
+        return _parse(url, html)
+
+    crawler = WebCrawler(transport=httpx.MockTransport(_handle))
+    headers = {"https://docs.test/a": {"If-None-Match": '"v1"'}}
+
+    crawled = {
+        page.url: page
+        for page in crawler.iter_pages(
+            ["https://docs.test/a", "https://docs.test/b"],
+            _parse_and_record,
+            conditional_headers=lambda url: headers.get(url, {}),
+        )
+    }
+
+    assert crawled["https://docs.test/a"].not_modified
+    assert (crawled["https://docs.test/b"].not_modified, crawled["https://docs.test/b"].etag) == (False, '"v2"')
+    assert parsed == ["https://docs.test/b"]
@@ -0,0 +1,96 @@
+"""Tests for BeautifulSoupWebReader in docq.data_source.support.web_extracting."""
+import asyncio
+from typing import Dict, FrozenSet, List, Set
+
+import httpx
+from docq.data_source.support.manifest import SyncManifest
+from docq.data_source.support.web_crawler import WebCrawler
+from docq.data_source.support.web_extracting import (
+    BeautifulSoupWebReader,
+    GenericTextExtractor,
+    normalised_text_hash,
+)
+from docq.domain import SourcePageType
+from llama_index.core.schema import Document
+
+PAGES = {
+    "/": '<a href="/a">a</a><a href="/a?print=1">print</a><a href="/b">b</a><a href="/c">c</a>',
+    "/a": '<link rel="canonical" href="https://docs.test/a"><p>Page A</p>',
+    "/a?print=1": '<link rel="canonical" href="https://docs.test/a"><p>Page A for printing</p>',
+    "/b": "<p>Page   B</p>",
+    "/c": "<p>page b</p>",
+}
+
+
+def _reader(
+    etags: Dict[str, str],
+    manifest: SyncManifest,
+    pages: Dict[str, str] = PAGES,
+    slow: FrozenSet[str] = frozenset(),
+    max_concurrency: int = 1,
+) -> BeautifulSoupWebReader:
+    async def _handle(request: httpx.Request) -> httpx.Response:
+        path = request.url.raw_path.decode()
+        if path == "/robots.txt":
+            return httpx.Response(404)
+        if path in slow:
+            await asyncio.sleep(0.1)
+        if path in etags and request.headers.get("if-none-match") == etags[path]:
+            return httpx.Response(304)
+        headers = {"content-type": "text/html", **({"etag": etags[path]} if path in etags else {})}
+        return httpx.Response(200, text=pages[path], headers=headers)
+
+    crawler = WebCrawler(max_concurrency=max_concurrency, transport=httpx.MockTransport(_handle))
+    return BeautifulSoupWebReader({"default": GenericTextExtractor()}, crawler=crawler, manifest=manifest)
+
+
+def _source_uris(documents: List[Document]) -> Set[str]:
+    return {document.metadata["source_uri"] for document in documents}
+
+
+def test_duplicates_collapsed_and_unchanged_pages_skipped() -> None:
+    """Pages with the same canonical URL or text are indexed once, pages not modified since the last sync are skipped."""
+    manifest = SyncManifest()
+    documents = _reader({"/a": '"a1"'}, manifest).load_data(["https://docs.test/"], None, SourcePageType.index_page)
+
+    assert _source_uris(documents) == {"https://docs.test/a", "https://docs.test/b"}
+    assert {item.link for item in manifest.get_document_list()} == {"https://docs.test/a", "https://docs.test/b"}
+    assert manifest.current["https://docs.test/a?print=1"].duplicate_of == "https://docs.test/a"
+    assert manifest.current["https://docs.test/c"].duplicate_of == "https://docs.test/b"
+    assert normalised_text_hash("Page   B") == normalised_text_hash("page b")
+
+    manifest = SyncManifest(manifest.current)
+    documents = _reader({"/a": '"a1"'}, manifest).load_data(["https://docs.test/"], None, SourcePageType.index_page)
+
+    assert documents == []
+    assert len(manifest.unchanged_sources) == 2
+    assert manifest.deleted_sources == set()
+
+
+def test_kept_duplicate_does_not_depend_on_crawl_order() -> None:
+    """The page at the canonical URL, else the smallest URL, is kept even if a near-duplicate finishes first."""
+    pages = {**PAGES, "/": '<a href="/c">c</a><a href="/a?print=1">print</a><a href="/b">b</a><a href="/a">a</a>'}
+    manifest = SyncManifest()
+    reader = _reader({}, manifest, pages, slow=frozenset({"/a", "/b"}), max_concurrency=4)
+
+    documents = reader.load_data(["https://docs.test/"], None, SourcePageType.index_page)
+
+    assert _source_uris(documents) == {"https://docs.test/a", "https://docs.test/b"}
+
+
+def test_near_duplicate_of_unchanged_page_not_indexed() -> None:
+    """A variant of a page that's not modified is collapsed into it, and is fetched conditionally next sync."""
+    etags = {"/a": '"a1"', "/a?print=1": '"p1"'}
+    manifest = SyncManifest()
+    _reader(etags, manifest).load_data(["https://docs.test/"], None, SourcePageType.index_page)
+
+    manifest = SyncManifest(manifest.current)
+    assert manifest.conditional_headers("https://docs.test/a?print=1") == {"If-None-Match": '"p1"'}
+    pages = {**PAGES, "/a?print=1": '<link rel="canonical" href="https://docs.test/a"><p>Page A, new print layout</p>'}
+    reader = _reader({"/a": '"a1"'}, manifest, pages, slow=frozenset({"/a"}), max_concurrency=4)
+    documents = reader.load_data(["https://docs.test/"], None, SourcePageType.index_page)
+
+    assert documents == []
+    assert manifest.unchanged_sources == {"https://docs.test/a", "https://docs.test/b"}
+    assert manifest.deleted_sources == set()
+    assert manifest.current["https://docs.test/a?print=1"].duplicate_of == "https://docs.test/a"
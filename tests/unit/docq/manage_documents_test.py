@@ -35,9 +35,9 @@ class TestManageDocuments(unittest.TestCase):
         self.file_source_node.append(Mock(node=file_node, score=1))
         self.source_template = "\n##### Source:\n{file_sources}"
 
-    @patch("docq.manage_documents.reindex")
+    @patch("docq.manage_documents.enqueue_reindex")
     @patch("docq.manage_documents.get_upload_file")
-    def test_upload(self: Self, get_upload_file: Mock, reindex: Mock) -> None:
+    def test_upload(self: Self, get_upload_file: Mock, enqueue_reindex: Mock) -> None:
         """Test upload."""
         with tempfile.NamedTemporaryFile() as temp_file:
             from docq.manage_documents import upload
@@ -47,7 +47,7 @@ class TestManageDocuments(unittest.TestCase):
             file_content = bytes("test", "utf-8")
             upload(temp_file.name, file_content, space)
 
-            reindex.assert_called_once_with(space)
+            enqueue_reindex.assert_called_once_with(space)
             get_upload_file.assert_called_once_with(space, temp_file.name)
             assert os.path.exists(temp_file.name), f"Path {temp_file.name} should exist"
             assert os.path.isfile(temp_file.name), f"File {temp_file.name} should be a file"
@@ -64,8 +64,9 @@ class TestManageDocuments(unittest.TestCase):
         assert get_file(file_name, space) == file_name, "File name should match"
         get_upload_file.assert_called_once_with(space, file_name)
 
+    @patch("docq.manage_documents.enqueue_reindex")
     @patch("docq.manage_documents.get_upload_file")
-    def test_delete(self: Self, get_upload_file: Mock) -> None:
+    def test_delete(self: Self, get_upload_file: Mock, enqueue_reindex: Mock) -> None:
         """Test delete."""
         from docq.manage_documents import delete
 
@@ -83,10 +84,11 @@ class TestManageDocuments(unittest.TestCase):
             assert not os.path.exists(file_name), f"File {file_name} should not exist"
             assert os.path.exists(ctrl_file_name), f"Control file {ctrl_file_name} should exist"
             get_upload_file.assert_called_once_with(space, file_name)
+            enqueue_reindex.assert_called_once_with(space)
 
-    @patch("docq.manage_documents.reindex")
+    @patch("docq.manage_documents.enqueue_reindex")
     @patch("docq.manage_documents.get_upload_dir")
-    def test_delete_all(self: Self, get_upload_dir: Mock, reindex: Mock) -> None:
+    def test_delete_all(self: Self, get_upload_dir: Mock, enqueue_reindex: Mock) -> None:
         """Test delete_all."""
         from docq.manage_documents import delete_all
 
@@ -102,7 +104,7 @@ class TestManageDocuments(unittest.TestCase):
 
             assert not os.path.exists(upload_dir), f"Directory {temp_dir} should not exist"
             get_upload_dir.assert_called_once_with(space)
-            reindex.assert_called_once_with(space)
+            enqueue_reindex.assert_called_once_with(space)
 
     def test_is_web_address(self: Self) -> None:
         """Test _is_web_address."""
@@ -0,0 +1,137 @@
+"""Tests for docq.manage_indexing_jobs module."""
+import tempfile
+from typing import Generator
+from unittest.mock import Mock, patch
+
+import pytest
+from docq import manage_indexing_jobs
+from docq.config import SpaceType
+from docq.domain import SpaceKey
+from docq.manage_indexing_jobs import IndexingJobStatus
+from docq.manage_indices import IndexingCancelledError
+
+SPACE = SpaceKey(SpaceType.SHARED, 1, 1000)
+OTHER_SPACE = SpaceKey(SpaceType.SHARED, 2, 1000)
+
+
+@pytest.fixture(autouse=True)
+def worker_pool() -> Generator[Mock, None, None]:
+    """Jobs are claimed and run by the tests rather than worker threads."""
+    with tempfile.TemporaryDirectory() as temp_dir, patch(
+        "docq.manage_indexing_jobs.get_sqlite_shared_system_file", return_value=f"{temp_dir}/sql_system.db"
+    ), patch("docq.manage_indexing_jobs._worker_pool") as pool:
+        manage_indexing_jobs._init()
+        yield pool
+
+
+def test_enqueue_coalesces_queued_jobs(worker_pool: Mock) -> None:
+    """A second request for a space with a queued job joins that job."""
+    job_id = manage_indexing_jobs.enqueue_reindex(SPACE)
+
+    assert manage_indexing_jobs.enqueue_reindex(SPACE) == job_id
+    assert manage_indexing_jobs.enqueue_reindex(OTHER_SPACE) != job_id
+    worker_pool.notify.assert_called()
+
+
+def test_one_running_job_per_space() -> None:
+    """A job queued behind a running job of the same space isn't claimed until it finishes."""
+    first_id = manage_indexing_jobs.enqueue_reindex(SPACE)
+    first = manage_indexing_jobs._claim_next_job()
+    assert first is not None and first.id_ == first_id
+
+    second_id = manage_indexing_jobs.enqueue_reindex(SPACE)
+    assert second_id != first_id
+    assert manage_indexing_jobs._claim_next_job() is None
+
+    manage_indexing_jobs._finish_job(first_id, IndexingJobStatus.SUCCEEDED)
+    second = manage_indexing_jobs._claim_next_job()
+    assert second is not None and second.id_ == second_id
+
+
+def test_run_job_records_progress() -> None:
+    """Progress reported while reindexing is stored against the job."""
+
+    def _reindex(space: SpaceKey, progress: manage_indexing_jobs.IndexingProgress) -> None:
+        progress.on_documents_loaded(3)
+        progress.on_nodes_parsed(10)
+        progress.on_nodes_embedded(10)
+
+    job_id = manage_indexing_jobs.enqueue_reindex(SPACE)
+    with patch("docq.manage_spaces._reindex", side_effect=_reindex):
+        manage_indexing_jobs._run_job(manage_indexing_jobs._claim_next_job())
+
+    job = manage_indexing_jobs.get_job(job_id)
+    assert job is not None
+    assert (job.status, job.documents_loaded, job.nodes_to_embed, job.nodes_embedded) == (
+        IndexingJobStatus.SUCCEEDED,
+        3,
+        10,
+        10,
+    )
+    assert job.is_finished and job.finished_at is not None
+
+
+def test_run_job_failure() -> None:
+    """A reindex error fails the job with the error message."""
+    job_id = manage_indexing_jobs.enqueue_reindex(SPACE)
+    with patch("docq.manage_spaces._reindex", side_effect=ValueError("No data source")):
+        manage_indexing_jobs._run_job(manage_indexing_jobs._claim_next_job())
+
+    job = manage_indexing_jobs.get_job(job_id)
+    assert job is not None and job.status == IndexingJobStatus.FAILED
+    assert job.error == "No data source"
+
+
+def test_cancel_queued_job() -> None:
+    """A queued job is cancelled straight away and not claimed."""
+    job_id = manage_indexing_jobs.enqueue_reindex(SPACE)
+
+    assert manage_indexing_jobs.cancel_job(job_id)
+    assert manage_indexing_jobs.get_job(job_id).status == IndexingJobStatus.CANCELLED
+    assert manage_indexing_jobs._claim_next_job() is None
+    assert not manage_indexing_jobs.cancel_job(job_id)
+
+
+def test_cancel_running_job() -> None:
+    """A running job stops at its next progress check."""
+
+    def _reindex(space: SpaceKey, progress: manage_indexing_jobs.IndexingProgress) -> None:
+        assert manage_indexing_jobs.cancel_job(job_id)
+        progress.check_cancelled()
+
+    job_id = manage_indexing_jobs.enqueue_reindex(SPACE)
+    with patch("docq.manage_spaces._reindex", side_effect=_reindex):
+        assert manage_indexing_jobs._run_job(manage_indexing_jobs._claim_next_job()) == IndexingJobStatus.CANCELLED
+
+    assert manage_indexing_jobs.get_job(job_id).cancel_requested
+    with pytest.raises(IndexingCancelledError):
+        manage_indexing_jobs._JobProgress(job_id).check_cancelled()
+
+
+def test_running_job_with_live_lease_is_left_alone() -> None:
+    """Another process starting up or claiming jobs doesn't requeue a job whose owner is still heartbeating."""
+    job_id = manage_indexing_jobs.enqueue_reindex(SPACE)
+    assert manage_indexing_jobs._claim_next_job(worker_id="first") is not None
+
+    manage_indexing_jobs._init()
+    assert manage_indexing_jobs._claim_next_job(worker_id="second") is None
+    assert manage_indexing_jobs.get_job(job_id).status == IndexingJobStatus.RUNNING
+
+
+def test_job_with_expired_lease_is_taken_over() -> None:
+    """A running job whose lease expired is claimed again and the old owner can't finish it."""
+    job_id = manage_indexing_jobs.enqueue_reindex(SPACE)
+    assert manage_indexing_jobs._claim_next_job(worker_id="first") is not None
+
+    with patch("docq.manage_indexing_jobs.LEASE_SECONDS", -1):
+        job = manage_indexing_jobs._claim_next_job(worker_id="second")
+    assert job is not None and job.id_ == job_id
+
+    with pytest.raises(IndexingCancelledError):
+        manage_indexing_jobs._JobProgress(job_id, worker_id="first").check_cancelled()
+    manage_indexing_jobs._finish_job(job_id, IndexingJobStatus.FAILED, worker_id="first")
+    assert manage_indexing_jobs.get_job(job_id).status == IndexingJobStatus.RUNNING
+
+    manage_indexing_jobs._renew_leases(worker_id="second")
+    manage_indexing_jobs._finish_job(job_id, IndexingJobStatus.SUCCEEDED, worker_id="second")
+    assert manage_indexing_jobs.get_job(job_id).status == IndexingJobStatus.SUCCEEDED
@@ -0,0 +1,149 @@
+"""Test manage_indices.py."""
+import os
+import tempfile
+from unittest.mock import Mock, patch
+
+from docq.domain import SpaceKey, SpaceType
+from docq.manage_indices import (
+    _assign_document_ids,
+    _delete_documents_except,
+    _load_bm25_index_from_storage,
+    _upsert_documents,
+    document_content_hash,
+    iter_document_batches,
+)
+from docq.support.llama_index.vector_stores import MemmapVectorStore
+from llama_index.core import StorageContext, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import Document
+
+
+def _documents(*texts: str) -> list[Document]:
+    documents = [
+        Document(text=text, metadata={"source_uri": f"/files/{i}.txt", "indexed_on": 1.0})
+        for i, text in enumerate(texts)
+    ]
+    _assign_document_ids(documents)
+    return documents
+
+
+def _index(documents: list[Document]) -> VectorStoreIndex:
+    index = VectorStoreIndex.from_documents(
+        documents,
+        storage_context=StorageContext.from_defaults(vector_store=MemmapVectorStore()),
+        embed_model=MockEmbedding(embed_dim=4),
+    )
+    for document in documents:
+        index.docstore.set_document_hash(document.id_, document_content_hash(document))
+    return index
+
+
+def test_document_ids_are_stable() -> None:
+    """The same source loaded twice gets the same ids, pages of a source get different ids."""
+    first = [
+        Document(text="a", metadata={"source_uri": "/x.pdf"}),
+        Document(text="b", metadata={"source_uri": "/x.pdf"}),
+    ]
+    second = [
+        Document(text="a", metadata={"source_uri": "/x.pdf"}),
+        Document(text="b", metadata={"source_uri": "/x.pdf"}),
+    ]
+    _assign_document_ids(first)
+    _assign_document_ids(second)
+
+    assert [d.id_ for d in first] == [d.id_ for d in second]
+    assert first[0].id_ != first[1].id_
+
+
+def test_document_ids_carry_across_batches() -> None:
+    """Pages of a source split across batches get the same ids as when loaded in one go."""
+    whole = [Document(text=t, metadata={"source_uri": "/x.pdf"}) for t in "abc"]
+    _assign_document_ids(whole)
+
+    streamed = [Document(text=t, metadata={"source_uri": "/x.pdf"}) for t in "abc"]
+    ordinals: dict[str, int] = {}
+    for batch in iter_document_batches(streamed, batch_size=2):
+        _assign_document_ids(batch, ordinals)
+
+    assert [d.id_ for d in streamed] == [d.id_ for d in whole]
+
+
+def test_content_hash_ignores_indexed_on() -> None:
+    """Reloading a document doesn't change its hash just because the indexed timestamp changed."""
+    assert document_content_hash(Document(text="a", metadata={"indexed_on": 1.0})) == document_content_hash(
+        Document(text="a", metadata={"indexed_on": 2.0})
+    )
+
+
+def _service_context() -> Mock:
+    return Mock(transformations=[SentenceSplitter()], embed_model=MockEmbedding(embed_dim=4))
+
+
+def _contents(index: VectorStoreIndex) -> dict[str, str]:
+    """Text of each document in the index by source uri, from the nodes left in the docstore and vector store."""
+    node_ids = set(index.vector_store._rows_by_node_id)
+    return {
+        node.metadata["source_uri"]: node.get_content()
+        for node in index.docstore.docs.values()
+        if node.node_id in node_ids
+    }
+
+
+@patch("docq.manage_indices._get_service_context", return_value=_service_context())
+def test_upsert_inserts_new_and_replaces_changed_documents(_: Mock) -> None:
+    """New documents are inserted, changed ones replaced, unchanged ones skipped."""
+    index = _index(_documents("one", "two"))
+
+    reloaded = _documents("one", "two changed", "three")
+    with patch.object(index, "insert_nodes", wraps=index.insert_nodes) as insert_nodes:
+        num_inserted, num_replaced = _upsert_documents(index, reloaded, Mock(model_usage_settings={}))
+
+    assert (num_inserted, num_replaced) == (2, 1)
+    assert [n.get_content() for n in insert_nodes.call_args.args[0]] == ["two changed", "three"]
+    assert _contents(index) == {"/files/0.txt": "one", "/files/1.txt": "two changed", "/files/2.txt": "three"}
+    assert len(index.vector_store) == 3
+
+
+@patch("docq.manage_indices._get_service_context", return_value=_service_context())
+def test_upsert_unchanged_is_a_no_op(_: Mock) -> None:
+    """Nothing is inserted or deleted when no documents changed."""
+    index = _index(_documents("one", "two"))
+
+    with patch.object(index, "insert_nodes") as insert_nodes:
+        assert _upsert_documents(index, _documents("one", "two"), Mock(model_usage_settings={})) == (0, 0)
+
+    insert_nodes.assert_not_called()
+    assert len(index.vector_store) == 2
+
+
+def test_delete_documents_missing_from_source() -> None:
+    """Documents not seen in the reindex are deleted from the docstore and vector store."""
+    documents = _documents("one", "two", "three")
+    index = _index(documents)
+
+    assert _delete_documents_except(index, {documents[0].id_, documents[2].id_}) == 1
+    assert _contents(index) == {"/files/0.txt": "one", "/files/2.txt": "three"}
+    assert len(index.vector_store) == 2
+
+
+def test_delete_keeps_unchanged_sources() -> None:
+    """Documents of sources an incremental sync skipped as unchanged aren't deleted."""
+    documents = _documents("one", "two", "three")
+    index = _index(documents)
+
+    assert _delete_documents_except(index, {documents[0].id_}, {"/files/1.txt"}) == 1
+    assert set(index.docstore.get_all_ref_doc_info().keys()) == {documents[0].id_, documents[1].id_}
+    assert _contents(index) == {"/files/0.txt": "one", "/files/1.txt": "two"}
+
+
+def test_missing_bm25_index_is_built_in_memory() -> None:
+    """A space without a persisted BM25 index gets one built for queries without writing to the index dir."""
+    index = _index(_documents("alpha", "beta"))
+    with tempfile.TemporaryDirectory() as temp_dir, patch(
+        "docq.manage_indices.get_index_dir", return_value=temp_dir
+    ), patch("docq.manage_indices.get_index_dir_state", return_value=(1, 0)):
+        bm25_index = _load_bm25_index_from_storage(SpaceKey(SpaceType.PERSONAL, 999, 1), index)
+
+        assert os.listdir(temp_dir) == []
+    assert bm25_index.search("beta", top_k=1)[0][0] in index.docstore.docs
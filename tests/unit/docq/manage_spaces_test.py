@@ -11,6 +11,7 @@ import pytest
 from docq import manage_spaces
 from docq.access_control.main import SpaceAccessor, SpaceAccessType
 from docq.config import SpaceType
+from docq.data_source.main import DocumentSync
 from docq.domain import SpaceKey
 from llama_index.core.schema import Document
 
@@ -77,8 +78,12 @@ def test_db_init(manage_spaces_test_dir: tuple) -> None:
     #         get_service_context.assert_called_once_with(model_settings_collection)
     #         get_default_storage_context.assert_called_once()
 
+    @patch("docq.manage_spaces._persist_bm25_index")
     @patch("docq.manage_spaces._persist_index")
-    @patch("docq.manage_spaces._create_vector_index")
+    @patch("docq.manage_spaces._delete_documents_except", return_value=0)
+    @patch("docq.manage_spaces._upsert_documents", return_value=(1, 0))
+    @patch("docq.manage_spaces._create_empty_vector_index")
+    @patch("docq.manage_spaces._load_index_for_update", return_value=None)
     @patch("docq.manage_spaces.get_saved_model_settings_collection")
     @patch("docq.manage_spaces.get_space_data_source")
     @patch("docq.manage_spaces.SpaceDataSources")
@@ -87,22 +92,62 @@ def test_db_init(manage_spaces_test_dir: tuple) -> None:
         mock_SpaceDataSources,
         mock_get_space_data_source,
         mock_get_saved_model_settings_collection,
-        mock_create_vector_index,
+        mock_load_index_for_update,
+        mock_create_empty_vector_index,
+        mock_upsert_documents,
+        mock_delete_documents_except,
         mock_persist_index,
+        mock_persist_bm25_index,
     ):
         # Arrange
         mock_space = MagicMock(spec=SpaceKey, id_="test_id", org_id="test_org_id")
+        mock_commit = Mock()
         mock_get_space_data_source.return_value = ("ds_type", "ds_configs")
-        mock_SpaceDataSources.__getitem__.return_value.value.load.return_value = [
-            Document(doc_id="testid", text="test", extra_info={"source_uri": "https://example.com"})
-        ]
-        mock_create_vector_index.return_value = "vector_index"
+        mock_SpaceDataSources.__getitem__.return_value.value.sync_documents.return_value = (
+            iter([Document(doc_id="testid", text="test", extra_info={"source_uri": "https://example.com"})]),
+            DocumentSync(on_commit=mock_commit),
+        )
+        mock_create_empty_vector_index.return_value = "vector_index"
 
         # Act
         manage_spaces.reindex(mock_space)
 
         # Assert
+        mock_upsert_documents.assert_called_once()
+        mock_delete_documents_except.assert_called_once()
         mock_persist_index.assert_called_once_with("vector_index", mock_space)
+        mock_commit.assert_called_once()
+
+
+@patch("docq.manage_spaces._persist_bm25_index")
+@patch("docq.manage_spaces._persist_index")
+@patch("docq.manage_spaces.get_saved_model_settings_collection")
+@patch("docq.manage_spaces.get_space_data_source", return_value=("ds_type", {}))
+@patch("docq.manage_spaces.SpaceDataSources")
+def test_reindex_emptied_source_deletes_documents(
+    space_data_sources: MagicMock, _: MagicMock, __: MagicMock, persist_index: MagicMock, ___: MagicMock
+) -> None:
+    """When every document is removed from a full sync source they're deleted from the existing index."""
+    from docq.manage_indices import _assign_document_ids
+    from docq.support.llama_index.vector_stores import MemmapVectorStore
+    from llama_index.core import StorageContext, VectorStoreIndex
+    from llama_index.core.embeddings import MockEmbedding
+
+    documents = [Document(text="test", metadata={"source_uri": "/files/test.txt"})]
+    _assign_document_ids(documents)
+    index = VectorStoreIndex.from_documents(
+        documents,
+        storage_context=StorageContext.from_defaults(vector_store=MemmapVectorStore()),
+        embed_model=MockEmbedding(embed_dim=4),
+    )
+    space_data_sources.__getitem__.return_value.value.sync_documents.return_value = (iter([]), DocumentSync())
+    space = SpaceKey(SpaceType.SHARED, 1, TEST_ORG_ID)
+
+    with patch("docq.manage_spaces._load_index_for_update", return_value=index):
+        manage_spaces._reindex(space)
+
+    assert index.docstore.get_all_ref_doc_info() == {}
+    persist_index.assert_called_once_with(index, space)
 
 
 @patch("docq.manage_indices.get_index_dir")
@@ -191,7 +236,7 @@ def test_create_shared_space(manage_spaces_test_dir: tuple) -> None:
     space_datasource_type = "create_shared_space test ds_type"
     space_datasource_configs = {"create_shared_space test": "create_shared_space test"}
 
-    with patch("docq.manage_spaces.reindex") as reindex:
+    with patch("docq.manage_spaces.enqueue_reindex") as enqueue_reindex:
         space = create_shared_space(
             TEST_ORG_ID,
             space_name,
@@ -210,7 +255,7 @@ def test_create_shared_space(manage_spaces_test_dir: tuple) -> None:
         assert result[2] == space_datasource_type, "Space datasource_type mismatch."
         assert result[3] == json.dumps(space_datasource_configs), "Space datasource_configs mismatch."
 
-    reindex.assert_called_once_with(space)
+    enqueue_reindex.assert_called_once_with(space)
 
 
 def test_create_thread_space(manage_spaces_test_dir: tuple) -> None:
@@ -228,7 +273,7 @@ def test_create_thread_space(manage_spaces_test_dir: tuple) -> None:
             re.fullmatch(pattern, thread_space_name) is not None
         ), f"{thread_space_name} does not match pattern {pattern}"
 
-    with patch("docq.manage_spaces.reindex") as reindex:
+    with patch("docq.manage_spaces.enqueue_reindex") as enqueue_reindex:
         from docq.manage_spaces import create_thread_space
         space = create_thread_space(
             TEST_ORG_ID,
@@ -247,7 +292,7 @@ def test_create_thread_space(manage_spaces_test_dir: tuple) -> None:
         assert result[2] == space_datasource_type, "Space datasource_type mismatch."
         assert_pattern(str(test_thread_id), space_summary, result[0])
 
-    reindex.assert_called_once_with(space)
+    enqueue_reindex.assert_called_once_with(space)
 
 
 def test_get_thread_space() -> None:
@@ -256,7 +301,7 @@ def test_get_thread_space() -> None:
     space_datasource_type = "get_thread_space test ds_type"
     test_thread_id = 4321
 
-    with patch("docq.manage_spaces.reindex") as reindex:
+    with patch("docq.manage_spaces.enqueue_reindex") as enqueue_reindex:
         from docq.manage_spaces import create_thread_space
         space = create_thread_space(
             TEST_ORG_ID,
@@ -266,7 +311,7 @@ def test_get_thread_space() -> None:
         )
 
     assert space is not None, "Space not found."
-    reindex.assert_called_once_with(space)
+    enqueue_reindex.assert_called_once_with(space)
 
     from docq.manage_spaces import get_thread_space
     space_result = get_thread_space(TEST_ORG_ID, test_thread_id)
@@ -0,0 +1,80 @@
+"""Tests for docq.manage_sync_schedules module."""
+import sqlite3
+import tempfile
+from contextlib import closing
+from datetime import datetime, timedelta
+from typing import Generator
+from unittest.mock import patch
+
+import pytest
+from docq import manage_indexing_jobs, manage_sync_schedules
+from docq.config import SpaceType
+from docq.domain import SpaceKey
+from docq.manage_indexing_jobs import IndexingJobStatus
+from docq.manage_spaces import SQL_CREATE_SPACES_TABLE
+
+SPACES = [SpaceKey(SpaceType.SHARED, id_, 1000) for id_ in (1, 2, 3)]
+
+
+@pytest.fixture(autouse=True)
+def _db() -> Generator[None, None, None]:
+    """Schedules are run by the tests rather than the scheduler thread."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_file = f"{temp_dir}/sql_system.db"
+        with patch("docq.manage_indexing_jobs.get_sqlite_shared_system_file", return_value=db_file), patch(
+            "docq.manage_sync_schedules.get_sqlite_shared_system_file", return_value=db_file
+        ), patch("docq.manage_indexing_jobs._worker_pool"), patch("docq.manage_sync_schedules._scheduler"):
+            with closing(sqlite3.connect(db_file)) as connection:
+                connection.execute(SQL_CREATE_SPACES_TABLE)
+                connection.executemany(
+                    "INSERT INTO spaces (id, org_id, name, space_type) VALUES (?, ?, ?, ?)",
+                    [(s.id_, s.org_id, f"space {s.id_}", s.type_.name) for s in SPACES],
+                )
+                connection.commit()
+            manage_indexing_jobs._init()
+            manage_sync_schedules._init()
+            yield
+
+
+def test_due_schedule_is_queued_and_moves_on() -> None:
+    """A due schedule queues a reindex and its next run is about one interval later."""
+    schedule = manage_sync_schedules.set_schedule(SPACES[0], 60)
+    assert manage_sync_schedules.run_due_schedules(datetime.utcnow()) == 0
+
+    now = schedule.next_run_at + timedelta(seconds=1)
+    assert manage_sync_schedules.run_due_schedules(now) == 1
+
+    schedule = manage_sync_schedules.get_schedule(SPACES[0])
+    assert schedule is not None and schedule.last_job_id is not None
+    assert timedelta(minutes=54) <= schedule.next_run_at - now <= timedelta(minutes=66)
+    assert manage_indexing_jobs.get_job(schedule.last_job_id).status == IndexingJobStatus.QUEUED
+    assert manage_sync_schedules.run_due_schedules(now) == 0
+
+
+def test_cap_holds_back_schedules() -> None:
+    """No more scheduled jobs than the cap are queued or running, the rest run once a slot frees up."""
+    for space in SPACES:
+        manage_sync_schedules.set_schedule(space, 60)
+    now = datetime.utcnow() + timedelta(hours=2)
+
+    with patch.dict("os.environ", {"DOCQ_SYNC_MAX_CONCURRENT": "2"}):
+        assert manage_sync_schedules.run_due_schedules(now) == 2
+        assert manage_sync_schedules.run_due_schedules(now) == 0
+
+        job = manage_indexing_jobs._claim_next_job()
+        assert job is not None
+        manage_indexing_jobs._finish_job(job.id_, IndexingJobStatus.SUCCEEDED)
+        assert manage_sync_schedules.run_due_schedules(now) == 1
+
+
+def test_invalid_schedules_are_rejected() -> None:
+    """Intervals that are too short and thread spaces are rejected, deleting works once."""
+    with pytest.raises(ValueError):
+        manage_sync_schedules.set_schedule(SPACES[0], 1)
+    with pytest.raises(ValueError):
+        manage_sync_schedules.set_schedule(SpaceKey(SpaceType.THREAD, 1, 1000), 60)
+
+    manage_sync_schedules.set_schedule(SPACES[0], 60)
+    assert manage_sync_schedules.delete_schedule(SPACES[0])
+    assert not manage_sync_schedules.delete_schedule(SPACES[0])
+    assert manage_sync_schedules.get_schedule(SPACES[0]) is None
@@ -0,0 +1,55 @@
+"""Tests for docq.model_selection.main."""
+import threading
+import time
+from unittest.mock import Mock
+
+from docq.model_selection.main import _ModelCache
+
+
+def test_get_or_create_builds_once_per_key() -> None:
+    """The factory is only called on first use of a (kind, collection key)."""
+    cache = _ModelCache()
+    factory = Mock(side_effect=lambda: object())
+
+    first = cache.get_or_create("llm", "openai_latest", factory)
+    second = cache.get_or_create("llm", "openai_latest", factory)
+    other = cache.get_or_create("embed_model", "openai_latest", factory)
+
+    assert first is second
+    assert other is not first
+    assert factory.call_count == 2
+
+
+def test_concurrent_first_use_builds_once() -> None:
+    """Threads racing on first use share a single built value."""
+    cache = _ModelCache()
+    calls = []
+
+    def _factory() -> object:
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_create("llm", "k", _factory))) for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+
+
+def test_invalidate_collection_key() -> None:
+    """Invalidating a collection key rebuilds only that collection's values."""
+    cache = _ModelCache()
+    a = cache.get_or_create("llm", "a", object)
+    b = cache.get_or_create("llm", "b", object)
+
+    cache.invalidate("a")
+
+    assert cache.get_or_create("llm", "a", object) is not a
+    assert cache.get_or_create("llm", "b", object) is b
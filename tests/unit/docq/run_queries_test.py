@@ -0,0 +1,161 @@
+"""Test run_queries.py."""
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from typing import Self
+from unittest.mock import Mock, patch
+
+from docq.config import OrganisationFeatureType
+from docq.domain import FeatureKey
+from docq.support.store import sqlite_connection
+
+
+class TestQueryStream(unittest.TestCase):
+    """Test run_queries.query_stream."""
+
+    def setUp(self: Self) -> None:
+        """Prepare test data."""
+        self.feature = FeatureKey(OrganisationFeatureType.CHAT_PRIVATE, 1234)
+
+    @patch("docq.run_queries._save_messages")
+    @patch("docq.run_queries.run_chat_stream")
+    @patch("docq.run_queries.get_history_as_chat_messages")
+    def test_query_stream_yields_tokens_then_saves(
+        self: Self, get_history_as_chat_messages: Mock, run_chat_stream: Mock, _save_messages: Mock
+    ) -> None:
+        """Tokens are yielded as generated and the full message is saved once the stream completes."""
+        from docq.run_queries import query_stream
+
+        get_history_as_chat_messages.return_value = []
+        run_chat_stream.return_value = Mock(response_gen=iter(["Hello", " world"]), source_nodes=[])
+        _save_messages.return_value = ["saved"]
+
+        gen = query_stream("hi", self.feature, 1, Mock(), Mock())
+        tokens = []
+        while True:
+            try:
+                tokens.append(next(gen))
+                _save_messages.assert_not_called()
+            except StopIteration as stop:
+                rows = stop.value
+                break
+
+        assert tokens == ["Hello", " world"]
+        assert rows == ["saved"]
+        data, feature = _save_messages.call_args.args
+        assert [(x[0], x[1]) for x in data] == [("hi", True), ("Hello world", False)]
+        assert feature == self.feature
+
+
+    @patch("docq.run_queries._save_messages")
+    @patch("docq.run_queries.run_chat_stream")
+    @patch("docq.run_queries.get_history_as_chat_messages")
+    def test_query_stream_saves_when_closed_early(
+        self: Self, get_history_as_chat_messages: Mock, run_chat_stream: Mock, _save_messages: Mock
+    ) -> None:
+        """The question and the answer streamed so far are saved when the consumer stops early."""
+        from docq.run_queries import query_stream
+
+        get_history_as_chat_messages.return_value = []
+        run_chat_stream.return_value = Mock(response_gen=iter(["Hello", " world"]), source_nodes=[])
+
+        gen = query_stream("hi", self.feature, 1, Mock(), Mock())
+        assert next(gen) == "Hello"
+        gen.close()
+
+        data, _ = _save_messages.call_args.args
+        assert [(x[0], x[1]) for x in data] == [("hi", True), ("Hello", False)]
+
+
+class TestHistory(unittest.TestCase):
+    """Test chat history threads and messages against a database."""
+
+    def setUp(self: Self) -> None:
+        """Point the usage file at a temp database."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        usage_file = os.path.join(self.temp_dir.name, "usage.db")
+        patcher = patch("docq.run_queries.get_sqlite_usage_file", return_value=usage_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.temp_dir.cleanup)
+        self.usage_file = usage_file
+        self.feature = FeatureKey(OrganisationFeatureType.CHAT_PRIVATE, 1234)
+
+    def test_list_thread_history_pages(self: Self) -> None:
+        """Threads created in the same second page by id without gaps or repeats."""
+        from docq.run_queries import create_history_thread, list_thread_history
+
+        ids = [create_history_thread(f"topic {i}", self.feature) for i in range(5)]
+
+        first = list_thread_history(self.feature, limit=2)
+        second = list_thread_history(self.feature, limit=2, after_id=first[-1][0])
+        last = list_thread_history(self.feature, limit=2, after_id=second[-1][0])
+
+        assert [t[0] for t in first + second + last] == ids[::-1]
+        assert [t[0] for t in list_thread_history(self.feature, limit=2, offset=2)] == [t[0] for t in second]
+        assert len(list_thread_history(self.feature)) == 5
+
+    def test_history_pages_back_through_same_timestamp(self: Self) -> None:
+        """Paging back by (timestamp, id) includes messages that share the cutoff timestamp."""
+        from docq.run_queries import _save_messages, create_history_thread, history
+
+        thread_id = create_history_thread("topic", self.feature)
+        timestamp = datetime(2024, 1, 1)
+        _save_messages([(f"message {i}", i % 2 == 0, timestamp, thread_id) for i in range(5)], self.feature)
+
+        latest = history(datetime(2025, 1, 1), 2, self.feature, thread_id)
+        earlier = history(latest[0][3], 2, self.feature, thread_id, before_id=latest[0][0])
+
+        assert [m[1] for m in earlier + latest] == ["message 1", "message 2", "message 3", "message 4"]
+
+    def test_history_queries_use_indexes(self: Self) -> None:
+        """The message and thread queries are index range scans, not table scans and sorts."""
+        from docq.run_queries import create_history_thread
+
+        create_history_thread("topic", self.feature)
+        with sqlite_connection(self.usage_file) as connection:
+            messages_plan = str(
+                connection.execute(
+                    "EXPLAIN QUERY PLAN SELECT id FROM history_chat_private WHERE thread_id = 1 AND timestamp < 0 "
+                    "ORDER BY timestamp DESC, id DESC LIMIT 10"
+                ).fetchall()
+            )
+            threads_plan = str(
+                connection.execute(
+                    "EXPLAIN QUERY PLAN SELECT id FROM history_thread_chat_private ORDER BY created_at DESC, id DESC"
+                ).fetchall()
+            )
+
+        assert "idx_history_chat_private_thread_id_timestamp" in messages_plan
+        assert "TEMP B-TREE" not in messages_plan
+        assert "idx_history_thread_chat_private_created_at" in threads_plan
+
+    def test_list_thread_history_with_first_message(self: Self) -> None:
+        """Each thread comes with its first human message, topics are updated together."""
+        from docq.run_queries import (
+            _save_messages,
+            create_history_thread,
+            list_thread_history_with_first_message,
+            update_thread_topics,
+        )
+
+        empty_id = create_history_thread("New thread 1", self.feature)
+        thread_id = create_history_thread("New thread 2", self.feature)
+        _save_messages(
+            [
+                ("Hi there!", False, datetime(2024, 1, 1, 0, 0), thread_id),
+                ("first question", True, datetime(2024, 1, 1, 0, 1), thread_id),
+                ("second question", True, datetime(2024, 1, 1, 0, 2), thread_id),
+            ],
+            self.feature,
+        )
+
+        threads = list_thread_history_with_first_message(self.feature)
+        assert [(t[0], t[1], t[3]) for t in threads] == [
+            (thread_id, "New thread 2", "first question"),
+            (empty_id, "New thread 1", None),
+        ]
+
+        update_thread_topics([(thread_id, "first question"), (empty_id, "empty")], self.feature)
+        assert [t[1] for t in list_thread_history_with_first_message(self.feature)] == ["first question", "empty"]
@@ -0,0 +1,68 @@
+"""Tests for docq.support.index_cache."""
+from docq.support.index_cache import IndexCache
+
+
+def test_get_miss_then_hit() -> None:
+    """A put entry is returned by get and counted as a hit."""
+    cache = IndexCache(max_entries=2, max_bytes=100)
+    key = ("SHARED_1_2", "openai_latest", 1)
+
+    assert cache.get(key) is None
+    cache.put(key, "index", 10)
+    assert cache.get(key) == "index"
+
+    stats = cache.stats()
+    assert stats.misses == 1
+    assert stats.hits == 1
+    assert stats.entries == 1
+    assert stats.size_bytes == 10
+
+
+def test_evicts_lru_by_entry_count() -> None:
+    """The least recently used entry is evicted when the entry count is exceeded."""
+    cache = IndexCache(max_entries=2, max_bytes=100)
+    cache.put(("a", "m", 1), "a", 1)
+    cache.put(("b", "m", 1), "b", 1)
+    cache.get(("a", "m", 1))
+    cache.put(("c", "m", 1), "c", 1)
+
+    assert ("a", "m", 1) in cache
+    assert ("b", "m", 1) not in cache
+    assert ("c", "m", 1) in cache
+    assert cache.stats().evictions == 1
+
+
+def test_evicts_by_size() -> None:
+    """Entries are evicted until the total size is within bounds and oversized entries are not cached."""
+    cache = IndexCache(max_entries=10, max_bytes=100)
+    cache.put(("a", "m", 1), "a", 60)
+    cache.put(("b", "m", 1), "b", 60)
+
+    assert ("a", "m", 1) not in cache
+    assert cache.stats().size_bytes == 60
+
+    cache.put(("c", "m", 1), "c", 101)
+    assert ("c", "m", 1) not in cache
+
+
+def test_new_generation_replaces_stale_entry() -> None:
+    """A new generation for the same space and model collection replaces the old one."""
+    cache = IndexCache(max_entries=10, max_bytes=100)
+    cache.put(("a", "m", 1), "old", 10)
+    cache.put(("a", "m", 2), "new", 10)
+
+    assert ("a", "m", 1) not in cache
+    assert cache.get(("a", "m", 2)) == "new"
+    assert cache.stats().size_bytes == 10
+
+
+def test_invalidate_space() -> None:
+    """Invalidating a space removes all its entries across model collections."""
+    cache = IndexCache(max_entries=10, max_bytes=100)
+    cache.put(("a", "m1", 1), "a1", 10)
+    cache.put(("a", "m2", 1), "a2", 10)
+    cache.put(("b", "m1", 1), "b1", 10)
+
+    assert cache.invalidate("a") == 2
+    assert len(cache) == 1
+    assert cache.stats().invalidations == 2
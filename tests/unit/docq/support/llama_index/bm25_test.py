@@ -0,0 +1,67 @@
+"""Tests for docq.support.llama_index.bm25."""
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from docq.support.llama_index.bm25 import BM25_INDEX_FILENAME, BM25Index, BM25IndexRetriever
+from llama_index.core.schema import QueryBundle, TextNode
+from llama_index.core.storage.docstore import SimpleDocumentStore
+
+NODES = [
+    TextNode(id_="n1", text="The capital of France is Paris."),
+    TextNode(id_="n2", text="The capital of Germany is Berlin."),
+    TextNode(id_="n3", text="Mr bingbongbob is the CEO of banging_the_bang_bang inc."),
+]
+
+
+def test_search_ranks_matching_nodes() -> None:
+    """Nodes containing the query terms are returned, best match first."""
+    bm25_index = BM25Index.build(NODES)
+
+    results = bm25_index.search("Who is the CEO of banging_the_bang_bang?", top_k=2)
+
+    assert results[0][0] == "n3"
+    assert all(node_id != "n1" for node_id, _ in results)
+
+
+def test_search_without_matching_terms() -> None:
+    """No results are returned when none of the query terms are indexed."""
+    bm25_index = BM25Index.build(NODES)
+
+    assert bm25_index.search("zzzzz", top_k=2) == []
+
+
+def test_persist_and_load() -> None:
+    """A persisted index returns the same results after loading."""
+    bm25_index = BM25Index.build(NODES)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        bm25_index.persist(temp_dir)
+        assert BM25Index.exists(temp_dir)
+
+        loaded = BM25Index.load(temp_dir)
+
+    assert loaded.node_ids == bm25_index.node_ids
+    assert loaded.search("capital of Germany", top_k=1) == bm25_index.search("capital of Germany", top_k=1)
+
+
+def test_concurrent_persists() -> None:
+    """Persisting the same dir at once from several threads succeeds and leaves no temp files behind."""
+    bm25_index = BM25Index.build(NODES)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda _: bm25_index.persist(temp_dir), range(8)))
+
+        assert os.listdir(temp_dir) == [BM25_INDEX_FILENAME]
+        assert BM25Index.load(temp_dir).node_ids == bm25_index.node_ids
+
+
+def test_retriever_returns_docstore_nodes() -> None:
+    """The retriever fetches the matching nodes from the docstore."""
+    docstore = SimpleDocumentStore()
+    docstore.add_documents(NODES)
+    retriever = BM25IndexRetriever(BM25Index.from_docstore(docstore), docstore=docstore, similarity_top_k=1)
+
+    nodes = retriever.retrieve(QueryBundle(query_str="capital of France"))
+
+    assert len(nodes) == 1
+    assert nodes[0].node.node_id == "n1"
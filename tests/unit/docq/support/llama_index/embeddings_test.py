@@ -0,0 +1,143 @@
+"""Tests for docq.support.llama_index.embeddings."""
+import asyncio
+import itertools
+import os
+import tempfile
+from typing import Generator, List
+from unittest.mock import Mock, patch
+
+import pytest
+from docq.support.llama_index.embeddings import CachedEmbedding, EmbeddingCache, embed_nodes
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.schema import TextNode
+
+
+@pytest.fixture(autouse=True)
+def _env() -> Generator[None, None, None]:
+    with tempfile.TemporaryDirectory() as temp_dir, patch.dict(os.environ, {"DOCQ_DATA": temp_dir}):
+        yield
+
+
+def _cached_embedding(cache: EmbeddingCache, namespace: str = "TEST:mock") -> tuple[CachedEmbedding, MockEmbedding]:
+    embed_model = MockEmbedding(embed_dim=4)
+    return CachedEmbedding(embed_model, namespace=namespace, cache=cache), embed_model
+
+
+def test_only_misses_are_embedded() -> None:
+    """Texts already embedded aren't sent to the wrapped model again."""
+    cached_embedding, embed_model = _cached_embedding(EmbeddingCache())
+    cached_embedding.get_text_embedding_batch(["a", "b"])
+
+    with patch.object(MockEmbedding, "_get_text_embeddings", wraps=embed_model._get_text_embeddings) as inner:
+        embeddings = cached_embedding.get_text_embedding_batch(["a", "b", "c"])
+
+    inner.assert_called_once_with(["c"])
+    assert len(embeddings) == 3
+
+
+def test_disk_tier_survives_memory_clear() -> None:
+    """Embeddings are read back from SQLite once the in-memory tier is emptied."""
+    cache = EmbeddingCache()
+    cached_embedding, embed_model = _cached_embedding(cache)
+    expected = cached_embedding.get_query_embedding("what is docq?")
+    cache.clear_memory()
+
+    with patch.object(MockEmbedding, "_get_query_embedding") as inner:
+        assert cached_embedding.get_query_embedding("what is docq?") == expected
+
+    inner.assert_not_called()
+
+
+def test_disk_tier_evicts_least_recently_used() -> None:
+    """Beyond the max disk entries the entries least recently added or read are evicted."""
+    cache = EmbeddingCache(max_disk_entries=2)
+    with patch("docq.support.llama_index.embeddings.time") as time_:
+        time_.time.side_effect = itertools.count()
+        cache.put_many({"a": [1.0]})
+        cache.put_many({"b": [2.0]})
+        cache.clear_memory()
+        cache.get_many(["a"])
+        cache.put_many({"c": [3.0]})
+        cache.clear_memory()
+
+        assert cache.get_many(["a", "b", "c"]) == {"a": [1.0], "c": [3.0]}
+
+
+def test_namespaces_do_not_collide() -> None:
+    """The same text embedded by a different model isn't a hit."""
+    cache = EmbeddingCache()
+    _cached_embedding(cache, namespace="TEST:one")[0].get_text_embedding("a")
+    other, embed_model = _cached_embedding(cache, namespace="TEST:two")
+
+    with patch.object(MockEmbedding, "_get_text_embeddings", wraps=embed_model._get_text_embeddings) as inner:
+        other.get_text_embedding("a")
+
+    inner.assert_called_once_with(["a"])
+
+
+class RateLimitError(Exception):
+    """Stands in for `openai.RateLimitError`."""
+
+    status_code = 429
+    response = Mock(headers={"retry-after-ms": "10"})
+
+
+def test_embed_nodes_bounded_concurrency() -> None:
+    """All nodes are embedded in batches with no more than the max number of requests in flight."""
+    embed_model = MockEmbedding(embed_dim=4, embed_batch_size=2)
+    in_flight, max_in_flight = 0, 0
+
+    async def _embed(texts: List[str]) -> List[List[float]]:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return [[1.0, 0.0, 0.0, 0.0]] * len(texts)
+
+    nodes = [TextNode(text=f"node {i}") for i in range(10)]
+    with patch.object(MockEmbedding, "_aget_text_embeddings", side_effect=_embed):
+        throughput = embed_nodes(nodes, embed_model, max_concurrency=3)
+
+    assert (throughput.num_nodes, throughput.num_batches) == (10, 5)
+    assert max_in_flight == 3
+    assert all(node.embedding is not None for node in nodes)
+
+
+def test_embed_nodes_retries_rate_limited_batches() -> None:
+    """A rate limited batch is retried after the backoff the provider asked for."""
+    embed_model = MockEmbedding(embed_dim=4, embed_batch_size=2)
+    calls = 0
+
+    async def _embed(texts: List[str]) -> List[List[float]]:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RateLimitError()
+        return [[1.0, 0.0, 0.0, 0.0]] * len(texts)
+
+    nodes = [TextNode(text=f"node {i}") for i in range(4)]
+    with patch.object(MockEmbedding, "_aget_text_embeddings", side_effect=_embed):
+        throughput = embed_nodes(nodes, embed_model, max_concurrency=2)
+
+    assert throughput.num_rate_limited == 1
+    assert throughput.num_nodes == 4
+    assert calls == 3
+
+
+def test_embed_nodes_reuses_one_event_loop() -> None:
+    """Separate calls share a long-lived loop, so a memoized model's async client isn't left bound to a closed one."""
+    embed_model = MockEmbedding(embed_dim=4, embed_batch_size=2)
+    loops = []
+
+    async def _embed(texts: List[str]) -> List[List[float]]:
+        loops.append(asyncio.get_running_loop())
+        return [[1.0, 0.0, 0.0, 0.0]] * len(texts)
+
+    with patch.object(MockEmbedding, "_aget_text_embeddings", side_effect=_embed):
+        embed_nodes([TextNode(text="first")], embed_model)
+        embed_nodes([TextNode(text="second")], embed_model)
+
+    assert len(loops) == 2
+    assert loops[0] is loops[1]
+    assert not loops[0].is_closed()
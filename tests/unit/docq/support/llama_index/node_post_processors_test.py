@@ -0,0 +1,27 @@
+"""Tests for docq.support.llama_index.node_post_processors."""
+from docq.support.llama_index.node_post_processors import reciprocal_rank_fusion
+from llama_index.core.schema import NodeWithScore, TextNode
+
+
+def _nodes(*texts: str) -> list[NodeWithScore]:
+    return [NodeWithScore(node=TextNode(text=text), score=1.0 / (i + 1)) for i, text in enumerate(texts)]
+
+
+def test_rrf_fuses_lists_from_multiple_spaces() -> None:
+    """Nodes ranked highly in several lists are ranked first."""
+    results = {
+        "v_query_nodes_0": _nodes("a", "b", "c"),
+        "bm25_query_nodes_0": _nodes("b", "a"),
+        "v_query_nodes_1": _nodes("b", "d"),
+    }
+
+    fused = reciprocal_rank_fusion(results)
+
+    assert [n.node.get_content() for n in fused] == ["b", "a", "d", "c"]
+
+
+def test_rrf_top_k() -> None:
+    """Only the global top k fused nodes are returned."""
+    results = {"x": _nodes("a", "b", "c"), "y": _nodes("c", "d")}
+
+    assert len(reciprocal_rank_fusion(results, top_k=2)) == 2
@@ -0,0 +1,132 @@
+"""Tests for docq.support.llama_index.query_pipeline_components."""
+import asyncio
+import time
+from typing import Dict, List, Self
+
+from docq.support.llama_index.query_pipeline_components import (
+    BaseQueryTransform,
+    KwargPackComponent,
+    ParallelRetrieverComponent,
+)
+from llama_index.core.query_pipeline import InputComponent, QueryPipeline
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+DELAY = 0.2
+"""Seconds each stub LLM call or retrieval waits for."""
+
+
+class _UpperCaseQueryTransform(BaseQueryTransform):
+    def __init__(self: Self) -> None:
+        super().__init__()
+        self.async_calls = 0
+
+    def _get_prompts(self: Self) -> Dict:
+        return {}
+
+    def _update_prompts(self: Self, prompts: Dict) -> None:
+        pass
+
+    def _run(self: Self, query_bundle: QueryBundle, metadata: Dict) -> QueryBundle:
+        return QueryBundle(query_str=query_bundle.query_str.upper())
+
+    async def _arun(self: Self, query_bundle: QueryBundle, metadata: Dict) -> QueryBundle:
+        self.async_calls += 1
+        return self._run(query_bundle, metadata)
+
+
+def test_query_transform_component_arun_uses_async_transform() -> None:
+    """The async component path awaits the transform's async implementation."""
+    transform = _UpperCaseQueryTransform()
+    component = transform.as_query_component()
+
+    output = asyncio.run(component.arun_component(query_str="hello"))
+
+    assert output == {"query_str": "HELLO"}
+    assert transform.async_calls == 1
+
+
+class _SlowHyDETransform(_UpperCaseQueryTransform):
+    """Stands in for HyDE, the LLM round-trip is a sleep."""
+
+    def __init__(self: Self, events: List[tuple]) -> None:
+        super().__init__()
+        self.events = events
+
+    async def _arun(self: Self, query_bundle: QueryBundle, metadata: Dict) -> QueryBundle:
+        self.events.append(("hyde", "start", time.perf_counter()))
+        await asyncio.sleep(DELAY)
+        self.events.append(("hyde", "end", time.perf_counter()))
+        return self._run(query_bundle, metadata)
+
+
+class _SlowRetriever(BaseRetriever):
+    def __init__(self: Self, name: str, events: List[tuple]) -> None:
+        super().__init__()
+        self.name = name
+        self.events = events
+
+    def _retrieve(self: Self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        raise NotImplementedError()
+
+    async def _aretrieve(self: Self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        self.events.append((self.name, "start", time.perf_counter()))
+        await asyncio.sleep(DELAY)
+        self.events.append((self.name, "end", time.perf_counter()))
+        return [NodeWithScore(node=TextNode(text=f"{self.name}: {query_bundle.query_str}"), score=1.0)]
+
+
+def test_parallel_retriever_component_arun_overlaps_retrievers() -> None:
+    """The async path waits on all retrievers at once, taking about as long as one."""
+    events: List[tuple] = []
+    component = ParallelRetrieverComponent(
+        retrievers={"vector": _SlowRetriever("vector", events), "bm25": _SlowRetriever("bm25", events)}
+    )
+
+    start = time.perf_counter()
+    output = asyncio.run(component.arun_component(query_str="hello"))
+    elapsed = time.perf_counter() - start
+
+    assert output["vector"][0].node.get_content() == "vector: hello"
+    assert elapsed < 1.5 * DELAY
+    assert [(name, phase) for name, phase, _ in events][:2] == [("vector", "start"), ("bm25", "start")]
+
+
+def test_hyde_overlaps_original_query_retrieval() -> None:
+    """In the ask pipeline, as linked by `_build_ask_pipeline()`, retrieval with the original query runs during the
+    HyDE LLM call. Only retrieval with the HyDE query waits for it.
+    """
+    events: List[tuple] = []
+    query_retrievers = {name: _SlowRetriever(name, events) for name in ("v_query", "bm25_query")}
+    rewrite_retrievers = {"v_rewrite": _SlowRetriever("v_rewrite", events)}
+    pipeline = QueryPipeline(
+        modules={
+            "input": InputComponent(),
+            "hyde_query_transform": _SlowHyDETransform(events).as_query_component(),
+            "rewrite_retrievers": ParallelRetrieverComponent(retrievers=rewrite_retrievers),
+            "query_retrievers": ParallelRetrieverComponent(retrievers=query_retrievers),
+            "join": KwargPackComponent(),
+        }
+    )
+    pipeline.add_link("input", "hyde_query_transform", src_key="query_str", dest_key="query_str")
+    pipeline.add_link("hyde_query_transform", "rewrite_retrievers", src_key="query_str", dest_key="query_str")
+    pipeline.add_link("input", "query_retrievers", src_key="query_str", dest_key="query_str")
+    for component_name, retrievers in (
+        ("rewrite_retrievers", rewrite_retrievers),
+        ("query_retrievers", query_retrievers),
+    ):
+        for nodes_key in retrievers:
+            pipeline.add_link(component_name, "join", src_key=nodes_key, dest_key=nodes_key)
+
+    start = time.perf_counter()
+    output = asyncio.run(pipeline.arun(query_str="hello"))
+    elapsed = time.perf_counter() - start
+
+    assert output["v_rewrite"][0].node.get_content() == "v_rewrite: HELLO"
+    assert output["bm25_query"][0].node.get_content() == "bm25_query: hello"
+    times = {(name, phase): at for name, phase, at in events}
+    for name in query_retrievers:
+        assert times[(name, "start")] < times[("hyde", "end")]
+    assert times[("v_rewrite", "start")] >= times[("hyde", "end")]
+    # sequentially this is HyDE, then both retrieval legs: 3 x DELAY.
+    assert elapsed < 2.5 * DELAY
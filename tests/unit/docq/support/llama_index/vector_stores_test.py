@@ -0,0 +1,145 @@
+"""Tests for docq.support.llama_index.vector_stores."""
+import os
+import tempfile
+import threading
+
+import numpy as np
+from docq.support.llama_index.vector_stores import VECTORS_FILENAME, MemmapVectorStore
+from llama_index.core import StorageContext
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores import SimpleVectorStore
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+
+def _node(node_id: str, ref_doc_id: str, embedding: list[float]) -> TextNode:
+    return TextNode(
+        id_=node_id,
+        text=node_id,
+        embedding=embedding,
+        relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=ref_doc_id)},
+    )
+
+
+NODES = [
+    _node("n1", "d1", [1.0, 0.0, 0.0]),
+    _node("n2", "d1", [0.0, 1.0, 0.0]),
+    _node("n3", "d2", [0.7, 0.7, 0.0]),
+]
+
+
+def test_query_top_k_by_cosine_similarity() -> None:
+    """Top-k results are ordered by cosine similarity."""
+    store = MemmapVectorStore()
+    store.add(NODES)
+
+    result = store.query(VectorStoreQuery(query_embedding=[1.0, 0.1, 0.0], similarity_top_k=2))
+
+    assert result.ids == ["n1", "n3"]
+    assert result.similarities[0] > result.similarities[1]
+
+
+def test_delete_ref_doc() -> None:
+    """Deleting a document removes all its nodes."""
+    store = MemmapVectorStore()
+    store.add(NODES)
+    store.delete("d1")
+
+    result = store.query(VectorStoreQuery(query_embedding=[1.0, 0.0, 0.0], similarity_top_k=5))
+
+    assert result.ids == ["n3"]
+
+
+def test_persist_and_load_memory_mapped() -> None:
+    """A persisted store is loaded with the embeddings memory-mapped."""
+    store = MemmapVectorStore()
+    store.add(NODES)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store.persist(os.path.join(temp_dir, "default__vector_store.json"))
+        assert os.path.exists(os.path.join(temp_dir, VECTORS_FILENAME))
+
+        loaded = MemmapVectorStore.from_persist_dir(temp_dir)
+
+        assert len(loaded) == 3
+        assert isinstance(loaded._embeddings, np.memmap)
+        result = loaded.query(VectorStoreQuery(query_embedding=[0.0, 1.0, 0.0], similarity_top_k=1))
+        assert result.ids == ["n2"]
+
+
+def test_migrates_legacy_json_store() -> None:
+    """A legacy SimpleVectorStore JSON file is read as is, and replaced by the binary format when persisted."""
+    simple_store = SimpleVectorStore()
+    simple_store.add(NODES)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        legacy_path = os.path.join(temp_dir, "default__vector_store.json")
+        simple_store.persist(legacy_path)
+
+        loaded = MemmapVectorStore.from_persist_dir(temp_dir)
+
+        assert len(loaded) == 3
+        assert os.path.exists(legacy_path)
+        assert not MemmapVectorStore.exists(temp_dir)
+
+        loaded.persist(legacy_path)
+
+        assert not os.path.exists(legacy_path)
+        assert MemmapVectorStore.exists(temp_dir)
+        assert len(MemmapVectorStore.from_persist_dir(temp_dir, migrate=True)) == 3
+
+
+def test_empty_store_used_by_storage_context() -> None:
+    """An empty store isn't swapped for the default by the storage context."""
+    store = MemmapVectorStore()
+
+    assert StorageContext.from_defaults(vector_store=store).vector_store is store
+
+
+def test_adds_and_deletes_compacted_once() -> None:
+    """Batched adds and per document deletes are only applied to the matrix when it's next needed."""
+    store = MemmapVectorStore()
+    for i in range(10):
+        store.add([_node(f"n{i}", f"d{i}", [float(i), 1.0, 0.0])])
+    for i in range(0, 10, 2):
+        store.delete(f"d{i}")
+    store.delete_nodes(["n1"])
+    store.add([_node("n0", "d0", [0.0, 1.0, 0.0])])
+
+    assert len(store) == 5
+    assert len(store._pending) == 11
+    assert store._embeddings.shape == (0, 0)
+
+    result = store.query(VectorStoreQuery(query_embedding=[0.0, 1.0, 0.0], similarity_top_k=5))
+
+    assert result.ids == ["n0", "n3", "n5", "n7", "n9"]
+    assert store._embeddings.shape == (5, 3)
+    assert store._pending == [] and store._deleted == set()
+    assert store.get("n3") == [3.0, 1.0, 0.0]
+
+
+def test_concurrent_persist_and_load() -> None:
+    """Concurrent persists of a directory don't clobber each other's temp files, loads see a whole store."""
+    stores = []
+    for i in range(4):
+        store = MemmapVectorStore()
+        store.add([_node(f"n{i}-{j}", "d", [float(i), float(j), 1.0]) for j in range(i + 1)])
+        stores.append(store)
+    errors = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        persist_path = os.path.join(temp_dir, "default__vector_store.json")
+
+        def _persist_and_load(store: MemmapVectorStore) -> None:
+            try:
+                for _ in range(20):
+                    store.persist(persist_path)
+                    MemmapVectorStore.from_persist_dir(temp_dir)
+            except Exception as e:  # noqa: BLE001
+                errors.append(e)
+
+        threads = [threading.Thread(target=_persist_and_load, args=(store,)) for store in stores]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert [f for f in os.listdir(temp_dir) if f.endswith(".tmp")] == []
+        assert len(MemmapVectorStore.from_persist_dir(temp_dir)) in {1, 2, 3, 4}
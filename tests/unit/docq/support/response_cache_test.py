@@ -0,0 +1,74 @@
+"""Tests for docq.support.response_cache."""
+import os
+import tempfile
+from typing import Generator
+from unittest.mock import patch
+
+import pytest
+from docq.config import SpaceType
+from docq.domain import Assistant, SpaceKey
+from docq.support import response_cache
+from llama_index.core.base.response.schema import Response
+from llama_index.core.schema import NodeWithScore, TextNode
+
+SPACE = SpaceKey(SpaceType.SHARED, 1, 9999)
+OTHER_SPACE = SpaceKey(SpaceType.SHARED, 2, 9999)
+ASSISTANT = Assistant("default", "Default", "You are helpful.", "{query_str}", "openai_latest")
+
+
+@pytest.fixture(autouse=True)
+def _env() -> Generator[None, None, None]:
+    with tempfile.TemporaryDirectory() as temp_dir, patch.dict(os.environ, {"DOCQ_DATA": temp_dir}):
+        yield
+
+
+def _store(spaces: list[SpaceKey], embedding: list[float], answer: str) -> response_cache.ResponseCacheScope:
+    scope = response_cache.get_scope(spaces, ASSISTANT, "openai_latest")
+    assert scope is not None
+    node = NodeWithScore(node=TextNode(id_="n1", text="The capital of France is Paris."), score=0.8)
+    response_cache.store(scope, embedding, "What's the capital of France?", Response(answer, source_nodes=[node]))
+    return scope
+
+
+def test_lookup_similar_query() -> None:
+    """A query embedding within the threshold returns the stored answer and source nodes."""
+    scope = _store([SPACE], [1.0, 0.0, 0.0], "Paris")
+
+    cached = response_cache.lookup(scope, [0.99, 0.01, 0.0])
+
+    assert cached is not None
+    assert cached.response == "Paris"
+    assert cached.source_nodes[0].node.node_id == "n1"
+    assert cached.source_nodes[0].score == 0.8
+
+
+def test_lookup_dissimilar_query() -> None:
+    """A query embedding outside the threshold is a miss."""
+    scope = _store([SPACE], [1.0, 0.0, 0.0], "Paris")
+
+    assert response_cache.lookup(scope, [0.0, 1.0, 0.0]) is None
+
+
+def test_scope_is_per_space_set() -> None:
+    """Answers for one set of spaces aren't returned for another."""
+    _store([SPACE], [1.0, 0.0, 0.0], "Paris")
+
+    other_scope = response_cache.get_scope([SPACE, OTHER_SPACE], ASSISTANT, "openai_latest")
+
+    assert response_cache.lookup(other_scope, [1.0, 0.0, 0.0]) is None
+
+
+def test_invalidate_space() -> None:
+    """Entries that include a reindexed space are removed."""
+    scope = _store([SPACE, OTHER_SPACE], [1.0, 0.0, 0.0], "Paris")
+
+    assert response_cache.invalidate_space(OTHER_SPACE) == 1
+    assert response_cache.lookup(scope, [1.0, 0.0, 0.0]) is None
+
+
+def test_ttl_expiry() -> None:
+    """Expired entries are a miss."""
+    scope = _store([SPACE], [1.0, 0.0, 0.0], "Paris")
+
+    with patch.dict(os.environ, {"DOCQ_RESPONSE_CACHE_TTL_SECONDS": "-1"}):
+        assert response_cache.lookup(scope, [1.0, 0.0, 0.0]) is None
@@ -1,18 +1,27 @@
 """Store module unit tests."""
 import os
+import sqlite3
 import tempfile
-from typing import TypeVar
+import threading
+import time
+from typing import Any, Generator, TypeVar
+from unittest.mock import patch
 
 import pytest
 from docq.config import OrganisationFeatureType, SpaceType
 from docq.domain import SpaceKey
 from docq.support.store import (
+    SqliteSchema,
+    bulk_insert,
+    ensure_schema,
     get_history_table_name,
     get_index_dir,
     get_sqlite_shared_system_file,
     get_sqlite_usage_file,
     get_upload_dir,
     get_upload_file,
+    sqlite_connection,
+    transaction,
 )
 
 Self = TypeVar("Self", bound="TestGetPath")
@@ -83,3 +92,163 @@ class TestGetPath:
 def test_get_history_table_name(type_: OrganisationFeatureType, expected: str) -> None:
     """Test get history table name."""
     assert get_history_table_name(type_) == expected
+
+
+@pytest.fixture()
+def db_file() -> Generator[str, None, None]:
+    """A database file with an empty table."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_file = os.path.join(temp_dir, "test.db")
+        with sqlite_connection(db_file) as connection:
+            connection.execute("CREATE TABLE t (v INTEGER)")
+        yield db_file
+
+
+def test_sqlite_connection_pooled_per_thread(db_file: str) -> None:
+    """A thread reuses its connection to a file, in WAL mode, other threads get their own."""
+    with sqlite_connection(db_file) as first, sqlite_connection(db_file) as nested:
+        assert first is nested
+        assert first.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    with sqlite_connection(db_file) as again:
+        assert again is first
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(sqlite_connection(db_file).__enter__()))
+    thread.start()
+    thread.join()
+    assert other[0] is not first
+
+
+def test_sqlite_connection_rolls_back_uncommitted(db_file: str) -> None:
+    """Writes not committed by the end of the outermost block are discarded, as closing the connection would."""
+    with sqlite_connection(db_file) as connection:
+        connection.execute("INSERT INTO t VALUES (1)")
+        with sqlite_connection(db_file):
+            pass
+        assert connection.in_transaction
+
+    with sqlite_connection(db_file) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM t").fetchone() == (0,)
+
+
+def test_transaction_commits_or_rolls_back(db_file: str) -> None:
+    """A transaction is committed when the block succeeds, a nested one rolls back only its own writes."""
+    with transaction(db_file) as connection:
+        connection.execute("INSERT INTO t VALUES (1)")
+        with pytest.raises(ValueError), transaction(db_file) as nested:
+            nested.execute("INSERT INTO t VALUES (2)")
+            raise ValueError()
+
+    with pytest.raises(sqlite3.IntegrityError), transaction(db_file) as connection:
+        connection.execute("INSERT INTO t VALUES (3)")
+        raise sqlite3.IntegrityError()
+
+    with sqlite_connection(db_file) as connection:
+        assert connection.execute("SELECT v FROM t").fetchall() == [(1,)]
+
+
+def test_sqlite_connection_reconnects_when_file_deleted(db_file: str) -> None:
+    """A connection to a file that's since been deleted isn't reused."""
+    with sqlite_connection(db_file) as first:
+        pass
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_file + suffix):
+            os.remove(db_file + suffix)
+
+    with sqlite_connection(db_file) as connection:
+        assert connection is not first
+        assert connection.execute("SELECT name FROM sqlite_master").fetchall() == []
+
+
+def test_ensure_schema_migrates_once(db_file: str) -> None:
+    """Migrations run once per file, appended migrations take an existing file up to the latest version."""
+    calls = []
+
+    def _add_column(connection: sqlite3.Connection) -> None:
+        calls.append(connection)
+        connection.execute("ALTER TABLE s ADD COLUMN name TEXT")
+
+    schema = SqliteSchema(name="s", migrations=("CREATE TABLE s (id INTEGER)",))
+    ensure_schema(db_file, schema)
+    ensure_schema(db_file, schema)
+    migrated = SqliteSchema(name="s", migrations=(*schema.migrations, _add_column))
+    ensure_schema(db_file, migrated)
+    ensure_schema(db_file, migrated)
+
+    assert len(calls) == 1
+    with sqlite_connection(db_file) as connection:
+        assert [row[1] for row in connection.execute("PRAGMA table_info(s)")] == ["id", "name"]
+        assert connection.execute("SELECT version FROM docq_schema_versions WHERE name = 's'").fetchone() == (2,)
+
+
+def test_ensure_schema_rolls_back_failed_migration(db_file: str) -> None:
+    """A failed migration leaves the schema at its previous version, and is retried next time."""
+    schema = SqliteSchema(name="s", migrations=("CREATE TABLE s (id INTEGER)", "ALTER TABLE missing ADD COLUMN x"))
+    with pytest.raises(sqlite3.OperationalError):
+        ensure_schema(db_file, schema)
+    with pytest.raises(sqlite3.OperationalError):
+        ensure_schema(db_file, schema)
+
+    with sqlite_connection(db_file) as connection:
+        assert connection.execute("SELECT name FROM sqlite_master WHERE name = 's'").fetchone() is None
+
+
+def test_ensure_schema_after_file_replaced(db_file: str) -> None:
+    """A file that's been replaced since the schema was ensured is migrated again."""
+    schema = SqliteSchema(name="s", migrations=("CREATE TABLE s (id INTEGER)",))
+    ensure_schema(db_file, schema)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_file + suffix):
+            os.remove(db_file + suffix)
+
+    ensure_schema(db_file, schema)
+    with sqlite_connection(db_file) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM s").fetchone() == (0,)
+
+
+def test_ensure_schema_after_file_replaced_with_same_inode() -> None:
+    """A replaced file is migrated again even if the filesystem gave it the inode of the deleted one."""
+    schema = SqliteSchema(name="s", migrations=("CREATE TABLE s (id INTEGER)",))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_file = os.path.join(temp_dir, "test.db")
+        # in another thread so its pooled connection is closed when it exits and nothing holds the file open.
+        thread = threading.Thread(target=ensure_schema, args=(db_file, schema))
+        thread.start()
+        thread.join()
+        deleted = os.stat(db_file)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_file + suffix):
+                os.remove(db_file + suffix)
+        time.sleep(0.01)
+        sqlite3.connect(db_file).close()
+
+        stat = os.stat
+
+        def _stat(path: str, *args: Any, **kwargs: Any) -> os.stat_result:
+            result = stat(path, *args, **kwargs)
+            if path != db_file:
+                return result
+            fields = [result[0], deleted.st_ino, deleted.st_dev, *result[3:10]]
+            return os.stat_result(fields, {"st_ctime_ns": result.st_ctime_ns})
+
+        with patch("os.stat", _stat):
+            ensure_schema(db_file, schema)
+        with sqlite_connection(db_file) as connection:
+            assert connection.execute("SELECT COUNT(*) FROM s").fetchone() == (0,)
+
+
+@pytest.mark.parametrize("return_ids", [True, False])
+def test_bulk_insert(db_file: str, return_ids: bool) -> None:
+    """Rows are inserted in order, with their ids if asked for, across as many statements as needed."""
+    rows = [(f"name {i}", i) for i in range(7)]
+    with transaction(db_file) as connection:
+        connection.execute("CREATE TABLE b (id INTEGER PRIMARY KEY, name TEXT, v INTEGER)")
+        connection.execute("INSERT INTO b (name, v) VALUES ('existing', -1)")
+        with patch("docq.support.store._BULK_INSERT_MAX_ROWS_PER_STATEMENT", 3):
+            ids = bulk_insert(connection, "b", ("name", "v"), rows, return_ids=return_ids)
+        assert bulk_insert(connection, "b", ("name", "v"), [], return_ids=return_ids) == []
+
+    with sqlite_connection(db_file) as connection:
+        inserted = connection.execute("SELECT id, name, v FROM b WHERE v >= 0 ORDER BY id").fetchall()
+    assert [row[1:] for row in inserted] == rows
+    assert ids == ([row[0] for row in inserted] if return_ids else [])
@@ -0,0 +1,89 @@
+"""Test the streaming responses of the chat and RAG completion handlers."""
+import json
+import os
+from typing import Generator, Self
+from unittest.mock import Mock, PropertyMock, patch
+
+from docq.config import ENV_VAR_DOCQ_AZURE_OPENAI_API_BASE2
+from tornado.testing import AsyncHTTPTestCase
+from tornado.web import Application
+
+# routes are added to the Tornado application Streamlit runs, this stands in for it. Must exist before handlers import.
+_app = Application()
+os.environ.setdefault(ENV_VAR_DOCQ_AZURE_OPENAI_API_BASE2, "https://test.openai.azure.com")
+
+from web.api.base_handlers import BaseRequestHandler  # noqa: E402
+from web.api.chat_completion_handler import ChatCompletionHandler  # noqa: E402, F401
+from web.api.rag_completion_handler import RagCompletionHandler  # noqa: E402, F401
+
+USER = {"uid": 1, "fullname": "Test User", "super_admin": False, "username": "test@docq.ai"}
+
+
+def _fails_after_first_token(*args: object, **kwargs: object) -> Generator[str, None, list]:
+    yield "Hello"
+    raise RuntimeError("saving messages failed")
+
+
+def _events(body: bytes) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.decode().strip().split("\n\n"):
+        lines = block.split("\n")
+        event = lines[0].removeprefix("event: ")
+        data = "\n".join(line.removeprefix("data: ") for line in lines[1:])
+        events.append((event, json.loads(data)))
+    return events
+
+
+class TestStreamingErrors(AsyncHTTPTestCase):
+    """A failure part way through a stream ends it with an `error` event."""
+
+    def get_app(self: Self) -> Application:
+        """The application the handlers are routed in."""
+        return _app
+
+    def setUp(self: Self) -> None:
+        """Authenticate requests as a test user."""
+        super().setUp()
+        patcher = patch("web.api.utils.auth_utils.decode_jwt", return_value={"data": USER})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _post(self: Self, path: str, body: dict) -> list[tuple[str, dict]]:
+        response = self.fetch(
+            path, method="POST", body=json.dumps(body), headers={"Authorization": "Bearer test"}, raise_error=False
+        )
+        assert response.code == 200
+        assert response.headers["Content-Type"] == "text/event-stream"
+        return _events(response.body)
+
+    @patch("docq.run_queries.query_stream", side_effect=_fails_after_first_token)
+    @patch("docq.run_queries.thread_exists", return_value=True)
+    @patch("web.api.chat_completion_handler.get_assistant_fixed", return_value={"default": Mock()})
+    @patch("web.api.chat_completion_handler.get_model_settings_collection")
+    def test_chat_completion(self: Self, *_: Mock) -> None:
+        """The chat completion stream ends with an error event after the tokens sent."""
+        events = self._post("/api/v1/chat/completion", {"input": "hi", "threadId": 1, "stream": True})
+
+        assert events == [
+            ("token", {"delta": "Hello"}),
+            ("error", {"reason": "An unexpected error occurred.", "statusCode": 500}),
+        ]
+
+    @patch("docq.run_queries.query_stream", side_effect=_fails_after_first_token)
+    @patch.object(BaseRequestHandler, "selected_org_id", new_callable=PropertyMock, return_value=1)
+    @patch("web.api.rag_completion_handler.manage_spaces")
+    @patch("web.api.rag_completion_handler.get_assistant_or_default")
+    @patch("web.api.rag_completion_handler.get_model_settings_collection")
+    def test_rag_completion(self: Self, _: Mock, __: Mock, manage_spaces: Mock, *___: Mock) -> None:
+        """The RAG completion stream ends with an error event after the tokens sent."""
+        manage_spaces.is_space_empty.return_value = True
+
+        events = self._post(
+            "/api/v1/rag/completion",
+            {"input": "hi", "threadId": 1, "assistantScopedId": "global_1", "stream": True},
+        )
+
+        assert events == [
+            ("token", {"delta": "Hello"}),
+            ("error", {"reason": "An unexpected error occurred.", "statusCode": 500}),
+        ]
@@ -1,12 +1,14 @@
 """Base request handlers."""
 import json
-from typing import Any, Optional, Self
+import logging as log
+from typing import Any, Generator, Optional, Self
 
 import docq.manage_organisations as m_orgs
 from opentelemetry import trace
 from tornado.web import HTTPError, RequestHandler
 
-from web.api.models import UserModel
+from web.api.models import MessagesResponseModel, UserModel
+from web.api.utils.docq_utils import get_message_object
 from web.utils.handlers import _default_org_id as get_default_org_id
 
 tracer = trace.get_tracer(__name__)
@@ -43,6 +45,72 @@ class BaseRequestHandler(RequestHandler):
         print("get_current_user() called")
         return self._current_user
 
+    def start_event_stream(self: Self) -> None:
+        """Set the response headers for a server-sent events (SSE) response."""
+        self.set_header("Content-Type", "text/event-stream")
+        self.set_header("Cache-Control", "no-cache")
+        self.set_header("X-Accel-Buffering", "no")  # stop reverse proxies buffering the stream
+
+    def write_event(self: Self, data: str, event: Optional[str] = None) -> None:
+        """Write a single server-sent event and flush it to the client."""
+        if event is not None:
+            self.write(f"event: {event}\n")
+        for line in data.splitlines() or [""]:
+            self.write(f"data: {line}\n")
+        self.write("\n")
+        self.flush()
+
+    def write_error_event(self: Self, reason: str = "An unexpected error occurred.", status_code: int = 500) -> None:
+        """End an event stream with an `error` event, i.e. `{"reason": "...", "statusCode": 500}`, and finish.
+
+        Once the first event is flushed the status and headers have been sent, so `write_error()` can't respond.
+        """
+        self.write_event(json.dumps({"reason": reason, "statusCode": status_code}), event="error")
+        self.finish()
+
+    def write_token_events(self: Self, token_gen: Generator[str, None, Any]) -> Any:
+        """Write each token from the generator as a `token` event i.e. `{"delta": "..."}`.
+
+        Returns:
+            The generator return value.
+        """
+        try:
+            while True:
+                try:
+                    token = next(token_gen)
+                except StopIteration as stop:
+                    return stop.value
+                self.write_event(json.dumps({"delta": token}), event="token")
+        finally:
+            # if writing failed, e.g. the client disconnected, let the generator clean up now rather than on GC.
+            token_gen.close()
+
+    def write_messages(self: Self, result: list, meta: Optional[dict[str, str]] = None, by_alias: bool = False) -> None:
+        """Write the saved messages of a completion as a `MessagesResponseModel`."""
+        messages = list(map(get_message_object, result))
+        self.write(MessagesResponseModel(response=messages, meta=meta).model_dump(by_alias=by_alias))
+
+    def write_messages_event_stream(
+        self: Self, token_gen: Generator[str, None, list], meta: Optional[dict[str, str]] = None, by_alias: bool = False
+    ) -> None:
+        """Stream a completion as server-sent events.
+
+        Each token is a `token` event, see `write_token_events()`. The saved messages the generator returns are the
+        final `messages` event. If it fails part way through the stream ends with an `error` event.
+        """
+        self.start_event_stream()
+        try:
+            result = self.write_token_events(token_gen)
+            messages = list(map(get_message_object, result))
+            response_model = MessagesResponseModel(response=messages, meta=meta)
+            self.write_event(response_model.model_dump_json(by_alias=by_alias), event="messages")
+        except Exception as e:
+            span = trace.get_current_span()
+            span.set_status(trace.StatusCode.ERROR, "Streaming the response failed.")
+            span.record_exception(e)
+            log.exception("Streaming the completion failed: %s", e)
+            self.write_error_event()
+
     def write_error(self: Self, status_code: int, **kwargs: Any) -> None:
         self.set_header("Content-Type", "application/json")
         error_response = {
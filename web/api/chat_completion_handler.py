@@ -11,9 +11,7 @@ from pydantic import Field, ValidationError
 from tornado.web import HTTPError
 
 from web.api.base_handlers import BaseRequestHandler
-from web.api.models import MessagesResponseModel
 from web.api.utils.auth_utils import authenticated
-from web.api.utils.docq_utils import get_message_object
 from web.api.utils.pydantic_utils import CamelModel
 from web.utils.streamlit_application import st_app
 
@@ -29,6 +27,7 @@ class ChatCompletionPostRequestModel(CamelModel):
     )  # TODO: this needs to have structure not just a string.
     llm_settings_collection_name: Optional[str] = Field(None)
     assistant_key: Optional[str] = Field(None)
+    stream: bool = Field(False, description="Stream the response as server-sent events.")
 
 
 @st_app.api_route("/api/v1/chat/completion")
@@ -49,6 +48,9 @@ class ChatCompletionHandler(BaseRequestHandler):
         curl -X POST -H "Content-Type: application/json" -H "Authorization: Bearer expected_token" -d /
         '{"input":"what is the sun?", "llmSettingsCollectionName": "option modelsettngs name"}' http://localhost:8501/api/v1/chat/completion
         ```
+
+        Set `"stream": true` to get a `text/event-stream` response. Each `token` event carries a `{"delta": "..."}`
+        chunk of the answer. A final `messages` event carries the saved messages, or an `error` event if it failed.
         """
         # with tracer.start_as_current_span("PostChatCompletionHandler") as span:
         span = trace.get_current_span()
@@ -89,17 +91,19 @@ class ChatCompletionHandler(BaseRequestHandler):
                 span.record_exception(ValueError(f"Thread with thread_id '{thread_id}' not found."))
                 raise HTTPError(status_code=400, log_message=f"Thread with thread_id '{thread_id}' not found.")
 
-            result = rq.query(
-                input_=payload.input_,
-                feature=feature,
-                thread_id=thread_id,
-                model_settings_collection=model_usage_settings,
-                assistant=assistant,
-            )
-            messages = list(map(get_message_object, result))
-            response_model = MessagesResponseModel(response=messages, meta={"model_settings": model_usage_settings.key})
-
-            self.write(response_model.model_dump())
+            query_args = {
+                "input_": payload.input_,
+                "feature": feature,
+                "thread_id": thread_id,
+                "model_settings_collection": model_usage_settings,
+                "assistant": assistant,
+            }
+            meta = {"model_settings": model_usage_settings.key}
+            if payload.stream:
+                self.write_messages_event_stream(rq.query_stream(**query_args), meta=meta)
+                return
+
+            self.write_messages(rq.query(**query_args), meta=meta)
 
         except Exception as e:
             span.set_status(trace.StatusCode.ERROR, "Bad request.")
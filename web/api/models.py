@@ -9,6 +9,7 @@ from .utils.pydantic_utils import CamelModel
 
 SPACE_TYPE = Literal["PERSONAL", "SHARED", "PUBLIC", "THREAD"]
 FEATURE = Literal["rag", "chat"]
+INDEXING_JOB_STATUS = Literal["queued", "running", "succeeded", "failed", "cancelled"]
 
 class UserModel(BaseModel):
     """Pydantic model for a user data."""
@@ -55,6 +56,40 @@ class SpaceModel(CamelModel):
     updated_at: str
 
 
+class IndexingJobModel(CamelModel):
+    """Model for a space indexing job."""
+
+    id_: int = Field(..., alias="id", serialization_alias="id")
+    space_id: int
+    status: INDEXING_JOB_STATUS
+    documents_loaded: Optional[int] = None
+    nodes_to_embed: Optional[int] = None
+    nodes_embedded: Optional[int] = None
+    cancel_requested: bool
+    error: Optional[str] = None
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
+
+class SyncScheduleModel(CamelModel):
+    """Model for the automatic re-sync schedule of a space."""
+
+    space_id: int
+    interval_minutes: int
+    enabled: bool
+    next_run_at: str
+    last_run_at: Optional[str] = None
+    last_job_id: Optional[int] = None
+
+
+class SyncSchedulePutRequestModel(CamelModel):
+    """Pydantic model for the request body to set the re-sync schedule of a space."""
+
+    interval_minutes: int
+    enabled: bool = True
+
+
 class BaseResponseModel(CamelModel, ABC):
     """All HTTP API response models should inherit from this class."""
 
@@ -97,6 +132,24 @@ class SpacesResponseModel(BaseResponseModel):
     response: list[SpaceModel]
 
 
+class IndexingJobResponseModel(BaseResponseModel):
+    """HTTP response model for a single indexing job."""
+
+    response: IndexingJobModel
+
+
+class IndexingJobsResponseModel(BaseResponseModel):
+    """HTTP response model for a **list** of indexing jobs."""
+
+    response: list[IndexingJobModel]
+
+
+class SyncScheduleResponseModel(BaseResponseModel):
+    """HTTP response model for the re-sync schedule of a space."""
+
+    response: SyncScheduleModel
+
+
 class ThreadPostRequestModel(CamelModel):
     """Pydantic model for the request body."""
     topic: str
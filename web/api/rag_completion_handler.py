@@ -14,8 +14,6 @@ from pydantic import Field, ValidationError
 from tornado.web import HTTPError
 
 from web.api.base_handlers import BaseRequestHandler
-from web.api.models import MessagesResponseModel
-from web.api.utils.docq_utils import get_message_object
 from web.utils.streamlit_application import st_app
 
 from .utils.auth_utils import authenticated
@@ -31,6 +29,7 @@ class PostRequestModel(CamelModel):
     thread_id: int
     assistant_scoped_id: str
     space_ids: Optional[list[int]] = Field(None)  # for now only shared spaces are supported
+    stream: bool = Field(False, description="Stream the response as server-sent events.")
 
 
 @tracer.start_as_current_span(name="RagCompletionHandler")
@@ -40,7 +39,12 @@ class RagCompletionHandler(BaseRequestHandler):
 
     @authenticated
     def post(self: Self) -> None:
-        """Handle RAG completion request."""
+        """Handle RAG completion request.
+
+        Set `stream` to true in the payload to get a `text/event-stream` response. Each `token` event carries a
+        `{"delta": "..."}` chunk of the answer. A final `messages` event carries the saved messages, or an `error`
+        event if it failed.
+        """
         try:
             feature = FeatureKey(
                 type_=OrganisationFeatureType.ASK_SHARED, id_=self.current_user.uid
@@ -56,44 +60,25 @@ class RagCompletionHandler(BaseRequestHandler):
             if not assistant:
                 raise HTTPError(400, reason="Invalid assistant_scoped_id")
 
-            space_exists = manage_spaces.thread_space_exists(thread_id=request_model.thread_id)
-
-            thread_space = None
-            if space_exists:
-                # space exists globally, check if it's in this org_id
-                thread_space = manage_spaces.get_thread_space(self.selected_org_id, request_model.thread_id)
-
-            # thread_space = get_thread_space(self.selected_org_id, request_model.thread_id)
-
-            if thread_space is None:
-                raise HTTPError(404, reason="This threads Thread Space not available")
-
-            space_keys = []
-            if request_model.space_ids:
-                spaces = get_shared_spaces(space_ids=request_model.space_ids)
-                space_keys = [SpaceKey(id_=space[0], org_id=space[1], type_=SpaceType.SHARED) for space in spaces]
-
-            print("space_keys:", space_keys)
-            if not manage_spaces.is_space_empty(thread_space):
-                # is empty i.e. no docs then theirs no index so ignore thread_space
-                space_keys.append(thread_space)
-
+            space_keys = self._get_space_keys(request_model)
             model_settings_collection = get_model_settings_collection(assistant.llm_settings_collection_key)
 
-            result = rq.query(
-                input_=request_model.input_,
-                feature=feature,
-                thread_id=request_model.thread_id,
-                model_settings_collection=model_settings_collection,
-                assistant=assistant,
-                spaces=space_keys,
-            )
-
-            if result:
-                messages = list(map(get_message_object, result))
-                self.write(MessagesResponseModel(response=messages).model_dump(by_alias=True))
-            else:
+            query_args = {
+                "input_": request_model.input_,
+                "feature": feature,
+                "thread_id": request_model.thread_id,
+                "model_settings_collection": model_settings_collection,
+                "assistant": assistant,
+                "spaces": space_keys,
+            }
+            if request_model.stream:
+                self.write_messages_event_stream(rq.query_stream(**query_args), by_alias=True)
+                return
+
+            result = rq.query(**query_args)
+            if not result:
                 raise HTTPError(500, reason="Internal server error", log_message="Internal server error")
+            self.write_messages(result, by_alias=True)
         except ValidationError as e:
             logging.error("ValidationError:", e)
             raise HTTPError(
@@ -107,3 +92,28 @@ class RagCompletionHandler(BaseRequestHandler):
         except Exception as e:
             logging.error("Exception:", e)
             raise HTTPError(500, reason="Internal server error", log_message=str(e)) from e
+
+    def _get_space_keys(self: Self, request_model: PostRequestModel) -> list[SpaceKey]:
+        """The requested shared spaces plus the thread space if it has documents."""
+        space_exists = manage_spaces.thread_space_exists(thread_id=request_model.thread_id)
+
+        thread_space = None
+        if space_exists:
+            # space exists globally, check if it's in this org_id
+            thread_space = manage_spaces.get_thread_space(self.selected_org_id, request_model.thread_id)
+
+        # thread_space = get_thread_space(self.selected_org_id, request_model.thread_id)
+
+        if thread_space is None:
+            raise HTTPError(404, reason="This threads Thread Space not available")
+
+        space_keys = []
+        if request_model.space_ids:
+            spaces = get_shared_spaces(space_ids=request_model.space_ids)
+            space_keys = [SpaceKey(id_=space[0], org_id=space[1], type_=SpaceType.SHARED) for space in spaces]
+
+        print("space_keys:", space_keys)
+        if not manage_spaces.is_space_empty(thread_space):
+            # is empty i.e. no docs then theirs no index so ignore thread_space
+            space_keys.append(thread_space)
+        return space_keys
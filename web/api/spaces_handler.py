@@ -1,16 +1,30 @@
 """Spaces handler endpoint for the API. /api/spaces handler."""
+from datetime import datetime
 from typing import Optional, Self
 
+import docq.manage_indexing_jobs as m_indexing_jobs
 import docq.manage_spaces as m_spaces
+import docq.manage_sync_schedules as m_sync_schedules
 import docq.run_queries as rq
 from docq.data_source.list import SpaceDataSources
+from docq.domain import SpaceKey
 from docq.manage_documents import upload
 from py import log
 from pydantic import BaseModel, ValidationError
 from tornado.web import HTTPError
 
 from web.api.base_handlers import BaseRequestHandler
-from web.api.models import SPACE_TYPE, SpaceModel, SpacesResponseModel
+from web.api.models import (
+    SPACE_TYPE,
+    IndexingJobModel,
+    IndexingJobResponseModel,
+    IndexingJobsResponseModel,
+    SpaceModel,
+    SpacesResponseModel,
+    SyncScheduleModel,
+    SyncSchedulePutRequestModel,
+    SyncScheduleResponseModel,
+)
 from web.api.utils.auth_utils import authenticated
 from web.api.utils.docq_utils import get_feature_key, get_space
 from web.utils.streamlit_application import st_app
@@ -46,6 +60,44 @@ def _map_to_space_model(space: tuple) -> SpaceModel:
     )
 
 
+def _format_timestamp(value: Optional[datetime]) -> Optional[str]:
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value else None
+
+
+def _map_to_indexing_job_model(job: m_indexing_jobs.IndexingJob) -> IndexingJobModel:
+    return IndexingJobModel(
+        id=job.id_,
+        space_id=job.space.id_,
+        status=job.status.value,
+        documents_loaded=job.documents_loaded,
+        nodes_to_embed=job.nodes_to_embed,
+        nodes_embedded=job.nodes_embedded,
+        cancel_requested=job.cancel_requested,
+        error=job.error,
+        created_at=job.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+        started_at=_format_timestamp(job.started_at),
+        finished_at=_format_timestamp(job.finished_at),
+    )
+
+
+def _map_to_sync_schedule_model(schedule: m_sync_schedules.SyncSchedule) -> SyncScheduleModel:
+    return SyncScheduleModel(
+        space_id=schedule.space.id_,
+        interval_minutes=schedule.interval_minutes,
+        enabled=schedule.enabled,
+        next_run_at=schedule.next_run_at.strftime("%Y-%m-%d %H:%M:%S"),
+        last_run_at=_format_timestamp(schedule.last_run_at),
+        last_job_id=schedule.last_job_id,
+    )
+
+
+def _get_space_indexing_job(space: SpaceKey, job_id: int) -> m_indexing_jobs.IndexingJob:
+    job = m_indexing_jobs.get_job(job_id)
+    if job is None or job.space.value() != space.value():
+        raise HTTPError(404, reason="Not Found", log_message="Indexing job not found")
+    return job
+
+
 @st_app.api_route("/api/v1/spaces")
 class SpacesHandler(BaseRequestHandler):
     """Handle /api/v1/spaces action requests."""
@@ -140,3 +192,83 @@ class SpaceFileUploadHandler(BaseRequestHandler):
 
         upload(fname[: self.__FILE_NAME_LIMIT], fileinfo["body"], space)
         self.write(f"File {fname} is uploaded successfully.")
+
+
+@st_app.api_route("/api/v1/spaces/{space_id}/indexing-jobs")
+class SpaceIndexingJobsHandler(BaseRequestHandler):
+    """Handle /api/v1/spaces/{space_id}/indexing-jobs requests."""
+
+    @authenticated
+    def get(self: Self, space_id: int) -> None:
+        """GET the most recent indexing jobs of a space, newest first.
+
+        query params:
+            limit: int max number of jobs, default 10
+        """
+        space = get_space(self.selected_org_id, space_id)
+        try:
+            limit = int(self.get_query_argument("limit", "10"))
+        except ValueError as e:
+            raise HTTPError(400, reason="Bad request", log_message="limit must be an integer") from e
+        jobs = m_indexing_jobs.list_jobs(space, limit)
+        response = IndexingJobsResponseModel(response=[_map_to_indexing_job_model(job) for job in jobs])
+        self.write(response.model_dump(by_alias=True))
+
+    @authenticated
+    def post(self: Self, space_id: int) -> None:
+        """POST queue a job to reindex the space. Coalesced into the queued job of the space if there's one."""
+        space = get_space(self.selected_org_id, space_id)
+        job = _get_space_indexing_job(space, m_indexing_jobs.enqueue_reindex(space))
+        self.set_status(202)
+        self.write(IndexingJobResponseModel(response=_map_to_indexing_job_model(job)).model_dump(by_alias=True))
+
+
+@st_app.api_route("/api/v1/spaces/{space_id}/indexing-jobs/{job_id}")
+class SpaceIndexingJobHandler(BaseRequestHandler):
+    """Handle /api/v1/spaces/{space_id}/indexing-jobs/{job_id} requests."""
+
+    @authenticated
+    def get(self: Self, space_id: int, job_id: int) -> None:
+        """GET an indexing job with its progress."""
+        job = _get_space_indexing_job(get_space(self.selected_org_id, space_id), int(job_id))
+        self.write(IndexingJobResponseModel(response=_map_to_indexing_job_model(job)).model_dump(by_alias=True))
+
+    @authenticated
+    def delete(self: Self, space_id: int, job_id: int) -> None:
+        """DELETE cancel an indexing job."""
+        job = _get_space_indexing_job(get_space(self.selected_org_id, space_id), int(job_id))
+        if not m_indexing_jobs.cancel_job(job.id_):
+            raise HTTPError(409, reason="Conflict", log_message="Indexing job has already finished")
+        job = _get_space_indexing_job(job.space, job.id_)
+        self.write(IndexingJobResponseModel(response=_map_to_indexing_job_model(job)).model_dump(by_alias=True))
+
+
+@st_app.api_route("/api/v1/spaces/{space_id}/sync-schedule")
+class SpaceSyncScheduleHandler(BaseRequestHandler):
+    """Handle /api/v1/spaces/{space_id}/sync-schedule requests."""
+
+    @authenticated
+    def get(self: Self, space_id: int) -> None:
+        """GET the automatic re-sync schedule of a space."""
+        schedule = m_sync_schedules.get_schedule(get_space(self.selected_org_id, space_id))
+        if schedule is None:
+            raise HTTPError(404, reason="Not Found", log_message="Space has no sync schedule")
+        self.write(SyncScheduleResponseModel(response=_map_to_sync_schedule_model(schedule)).model_dump(by_alias=True))
+
+    @authenticated
+    def put(self: Self, space_id: int) -> None:
+        """PUT re-sync a space automatically every `intervalMinutes`, e.g. 1440 for nightly."""
+        space = get_space(self.selected_org_id, space_id)
+        try:
+            request = SyncSchedulePutRequestModel.model_validate_json(self.request.body)
+            schedule = m_sync_schedules.set_schedule(space, request.interval_minutes, request.enabled)
+        except (ValidationError, ValueError) as e:
+            raise HTTPError(400, reason="Bad request", log_message=str(e)) from e
+        self.write(SyncScheduleResponseModel(response=_map_to_sync_schedule_model(schedule)).model_dump(by_alias=True))
+
+    @authenticated
+    def delete(self: Self, space_id: int) -> None:
+        """DELETE stop re-syncing a space automatically."""
+        if not m_sync_schedules.delete_schedule(get_space(self.selected_org_id, space_id)):
+            raise HTTPError(404, reason="Not Found", log_message="Space has no sync schedule")
+        self.set_status(204)
@@ -45,8 +45,9 @@ class ThreadsHandler(BaseRequestHandler):
         """Handle GET request.
 
         Query Parameters:
-            page: int - The page number.
-            page_size: int - The number of items per page.
+            page: int - The page number, starting from 1. Ignored if `after` is given.
+            page_size: int - The number of items per page. All threads if not given.
+            after: int - The id of the last thread of the previous page. Cheaper than `page` for deep pages.
             order: Literal["asc", "desc"] - The order of the items.
 
         Response:
@@ -55,7 +56,19 @@ class ThreadsHandler(BaseRequestHandler):
         feature = get_feature_key(self.current_user.uid, feature_)
 
         try:
-            threads = rq.list_thread_history(feature)
+            page = int(self.get_argument("page", "1"))
+            page_size = self.get_argument("page_size", None)
+            limit = int(page_size) if page_size is not None else None
+            after = self.get_argument("after", None)
+            after_id = int(after) if after is not None else None
+        except ValueError as e:
+            raise HTTPError(status_code=400, reason="Invalid page, page_size or after", log_message=str(e)) from e
+        if page < 1 or (limit is not None and limit < 1):
+            raise HTTPError(status_code=400, reason="Invalid page or page_size")
+
+        try:
+            offset = (page - 1) * limit if limit is not None and after_id is None else 0
+            threads = rq.list_thread_history(feature, limit=limit, after_id=after_id, offset=offset)
             thread_response = (
                 [ThreadModel(**_get_thread_object(threads[i])) for i in range(len(threads))] if len(threads) > 0 else []
             )
@@ -10,6 +10,9 @@ SESSION_KEY_NAME_FORM_VALIDATION_STATE = "_docq_form_validation_state"
 
 ENV_VAR_DOCQ_POSTHOG_PROJECT_API_KEY = "DOCQ_POSTHOG_PROJECT_API_KEY"
 
+UPLOAD_INDEXING_WAIT_SECONDS = 60
+"""How long a chat waits for an uploaded file to be indexed before answering without it."""
+
 
 class SessionKeySubName(Enum):
     """Second-level names for session keys."""
@@ -46,6 +49,8 @@ class SessionKeyNameForChat(Enum):
     CUTOFF = "cutoff"
     HISTORY = "history"
     THREAD = "thread"
+    PENDING_INPUT = "pending_input"
+    THREADS = "threads"
 
 
 NUMBER_OF_MSGS_TO_LOAD = 10
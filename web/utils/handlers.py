@@ -9,7 +9,7 @@ import random
 import re
 import time
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Generator, List, Optional, Tuple
 from urllib.parse import unquote_plus
 
 import streamlit as st
@@ -17,10 +17,12 @@ from docq import (
     config,
     domain,
     manage_documents,
+    manage_indexing_jobs,
     manage_organisations,
     manage_settings,
     manage_space_groups,
     manage_spaces,
+    manage_sync_schedules,
     manage_user_groups,
     manage_users,
     run_queries,
@@ -38,6 +40,7 @@ from docq.model_selection.main import (
     LlmUsageSettingsCollection,
     get_model_settings_collection,
     get_saved_model_settings_collection,
+    invalidate_model_cache,
 )
 from docq.services.smtp_service import mailer_ready, send_verification_email
 from docq.support.auth_utils import _get_cookies as get_cookies
@@ -48,6 +51,7 @@ from streamlit.components.v1 import html
 
 from .constants import (
     NUMBER_OF_MSGS_TO_LOAD,
+    UPLOAD_INDEXING_WAIT_SECONDS,
     SessionKeyNameForAuth,
     SessionKeyNameForChat,
     SessionKeyNameForSettings,
@@ -536,11 +540,14 @@ def query_chat_history(feature: domain.FeatureKey) -> None:
     thread_id = get_chat_session(feature.type_, SessionKeyNameForChat.THREAD)
     if thread_id is None:
         raise ValueError("Thread id in session state was None")
-    history = run_queries.history(curr_cutoff, NUMBER_OF_MSGS_TO_LOAD, feature, thread_id)
-
     history_from_session = get_chat_session(feature.type_, SessionKeyNameForChat.HISTORY)
     if history_from_session is None:
         raise ValueError("History in session state was None")
+    # page back from the earliest message loaded, by id too so messages with the same timestamp aren't skipped.
+    before_id = (
+        history_from_session[0][0] if history_from_session and history_from_session[0][3] == curr_cutoff else None
+    )
+    history = run_queries.history(curr_cutoff, NUMBER_OF_MSGS_TO_LOAD, feature, thread_id, before_id=before_id)
     set_chat_session(
         history + history_from_session,
         feature.type_,
@@ -602,7 +609,11 @@ def _setup_chat_thread_space(feature: domain.FeatureKey, org_id:int, thread_id:
     if space is not None:
         file = st.session_state.get(f"chat_file_uploader_{feature.value()}", None)
         if file:
-            manage_documents.upload(file.name, file.getvalue(), space)
+            job_id = manage_documents.upload(file.name, file.getvalue(), space)
+            # the file is used to answer the next question so wait for it to be indexed, within reason.
+            job = manage_indexing_jobs.wait_for_job(job_id, timeout=UPLOAD_INDEXING_WAIT_SECONDS)
+            if job is not None and not job.is_finished:
+                st.toast(f"'{file.name}' is still being indexed. It will be used to answer questions once it's done.")
             st.session_state[f"chat_file_uploader_{feature.value()}"] = None
 
     return space
@@ -634,23 +645,46 @@ def handle_chat_input(feature: domain.FeatureKey) -> None:
         )
         data.append((RootModel[Message](output_message).model_dump_json(), False, datetime.now(), thread_id))
         result = run_queries._save_messages(data, feature)
+        _invalidate_chat_history_threads(feature)
 
     else:
-        thread_id = get_chat_session(feature.type_, SessionKeyNameForChat.THREAD)
-        if thread_id is None:
-            raise ValueError("Thread id in session state was None")
+        # answered by `handle_chat_input_stream()` while the page renders so tokens show up as they're generated.
+        set_chat_session(req, feature.type_, SessionKeyNameForChat.PENDING_INPUT)
+
+    get_chat_session(feature.type_, SessionKeyNameForChat.HISTORY).extend(result)
 
-        if feature.type_ is config.OrganisationFeatureType.CHAT_PRIVATE or config.OrganisationFeatureType.ASK_SHARED:
-            _thread_space = _setup_chat_thread_space(feature, select_org_id, thread_id)
-            spaces = _get_chat_spaces(feature)
-            if _thread_space is not None and not manage_spaces.is_space_empty(_thread_space):
-                spaces.append(_thread_space)
 
-            saved_model_settings = get_model_settings_collection(
-                assistant.llm_settings_collection_key
-            )  # get_saved_model_settings_collection(select_org_id)
+def handle_pop_pending_chat_input(feature: domain.FeatureKey) -> Optional[str]:
+    """Get the chat input waiting to be answered, if any, and clear it."""
+    req = get_chat_session(feature.type_, SessionKeyNameForChat.PENDING_INPUT)
+    set_chat_session(None, feature.type_, SessionKeyNameForChat.PENDING_INPUT)
+    return req
+
+
+def handle_chat_input_stream(feature: domain.FeatureKey, req: str) -> Generator[str, None, None]:
+    """Answer a chat input, yielding the response text as it's generated. Use with `st.write_stream()`."""
+    thread_id = get_chat_session(feature.type_, SessionKeyNameForChat.THREAD)
+    if thread_id is None:
+        raise ValueError("Thread id in session state was None")
+    select_org_id = get_selected_org_id()
+    if select_org_id is None:
+        raise ValueError("Selected org id was None")
+
+    assistant = get_assistant_or_default(get_selected_assistant(), org_id=select_org_id)
+
+    result = []
+    if feature.type_ is config.OrganisationFeatureType.CHAT_PRIVATE or config.OrganisationFeatureType.ASK_SHARED:
+        _thread_space = _setup_chat_thread_space(feature, select_org_id, thread_id)
+        spaces = _get_chat_spaces(feature)
+        if _thread_space is not None and not manage_spaces.is_space_empty(_thread_space):
+            spaces.append(_thread_space)
+
+        saved_model_settings = get_model_settings_collection(
+            assistant.llm_settings_collection_key
+        )  # get_saved_model_settings_collection(select_org_id)
 
-            result = run_queries.query(req, feature, thread_id, saved_model_settings, assistant, spaces)
+        result = yield from run_queries.query_stream(req, feature, thread_id, saved_model_settings, assistant, spaces)
+        _invalidate_chat_history_threads(feature)
 
     get_chat_session(feature.type_, SessionKeyNameForChat.HISTORY).extend(result)
 
@@ -812,7 +846,36 @@ def handle_create_space() -> SpaceKey:
 
 def handle_reindex_space(space: SpaceKey) -> None:
     log.debug("handle re-indexing space: %s", space)
-    manage_spaces.reindex(space)
+    manage_indexing_jobs.enqueue_reindex(space)
+
+
+def handle_list_indexing_jobs(space: SpaceKey, limit: int = 10) -> List[manage_indexing_jobs.IndexingJob]:
+    """Handle list the recent indexing jobs of a space."""
+    return manage_indexing_jobs.list_jobs(space, limit)
+
+
+def handle_get_sync_schedule(space: SpaceKey) -> Optional[manage_sync_schedules.SyncSchedule]:
+    """Handle get the automatic re-sync schedule of a space."""
+    return manage_sync_schedules.get_schedule(space)
+
+
+def handle_update_sync_schedule(space: SpaceKey) -> None:
+    """Handle update the automatic re-sync schedule of a space. An interval of 0 turns it off."""
+    key = f"sync_schedule_{space.value()}"
+    interval_minutes = int(st.session_state[f"{key}_interval_minutes"] or 0)
+    try:
+        if interval_minutes == 0:
+            manage_sync_schedules.delete_schedule(space)
+        else:
+            manage_sync_schedules.set_schedule(space, interval_minutes)
+    except ValueError as e:
+        set_error_state_for_ui(key=key, error=str(e), message="Failed to update the sync schedule.", trace_id="")
+
+
+def handle_cancel_indexing_job(job_id: int) -> None:
+    """Handle cancel indexing job."""
+    if not manage_indexing_jobs.cancel_job(job_id):
+        log.info("Indexing job %s has already finished", job_id)
 
 
 def get_space_data_source(space: SpaceKey) -> Tuple[str, dict]:
@@ -913,6 +976,10 @@ def handle_update_organisation_settings() -> None:  # noqa: D103
         },
         org_id=current_org_id,
     )
+    # rebuild the org's models with the updated settings on next use.
+    invalidate_model_cache(
+        st.session_state[f"org_settings_default_{config.OrganisationSettingsKey.MODEL_COLLECTION.name}"][0]
+    )
     set_settings_session(
         {
             config.OrganisationSettingsKey.ENABLED_FEATURES.name: [
@@ -934,6 +1001,7 @@ def _create_new_thread(feature: domain.FeatureKey) -> int:
     topic = f"New thread {rnd}{milliseconds}"
 
     thread_id = run_queries.create_history_thread(topic, feature)
+    _invalidate_chat_history_threads(feature)
     return thread_id
 
 
@@ -1064,22 +1132,32 @@ def handle_redirect_to_url(url: str, key: str) -> None:
     )
 
 
-def _create_topic_summery(topic: str, feature: domain.FeatureKey, thread_id: int) -> str:
-    """Create a topic summary."""
+def handle_get_chat_history_threads(feature: domain.FeatureKey) -> List[Tuple[int, str, datetime]]:
+    """Get chat history threads.
+
+    Cached in the session until a thread is created or a message is saved, the sidebar renders on every rerun.
+    Threads that still have the default topic get their first question as the topic.
+    """
+    threads = get_chat_session(feature.type_, SessionKeyNameForChat.THREADS)
+    if threads is not None:
+        return threads
+
     default_topic = r"New thread \d+"
-    if re.match(default_topic, topic):
-        thread_summery = run_queries.get_chat_summerised_history(feature, thread_id)        # TODO: Generate topic from summery using AI
-        if len(thread_summery) > 0:
-            first_query = thread_summery[0][1]
-            topic = first_query[:100]
-            run_queries.update_thread_topic(topic, feature, thread_id)
-    return topic
+    threads, new_topics = [], []
+    for id_, topic, created_at, first_message in run_queries.list_thread_history_with_first_message(feature):
+        # TODO: Generate topic from summery using AI
+        if first_message and re.match(default_topic, topic or ""):
+            topic = first_message[:100]
+            new_topics.append((id_, topic))
+        threads.append((id_, topic, created_at))
+    run_queries.update_thread_topics(new_topics, feature)
 
+    set_chat_session(threads, feature.type_, SessionKeyNameForChat.THREADS)
+    return threads
 
-def handle_get_chat_history_threads(feature: domain.FeatureKey) -> List[Tuple[int, str, datetime]]:
-    """Get chat history threads."""
-    threads = run_queries.list_thread_history(feature)
-    return [ (t[0], _create_topic_summery(t[1], feature, t[0]), t[2]) for t in threads ] # type: ignore
+
+def _invalidate_chat_history_threads(feature: domain.FeatureKey) -> None:
+    set_chat_session(None, feature.type_, SessionKeyNameForChat.THREADS)
 
 
 def handle_click_chat_history_thread(feature: domain.FeatureKey, thread_id: int) -> None:
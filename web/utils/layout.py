@@ -26,6 +26,7 @@ from docq.domain import AssistantType, ConfigKey, DocumentListItem, FeatureKey,
 from docq.extensions import ExtensionContext
 from docq.integrations.slack.models import SlackInstallation
 from docq.manage_assistants import list_assistants
+from docq.manage_indexing_jobs import IndexingJob
 from docq.model_selection.main import (
     LlmUsageSettingsCollection,
     get_model_settings_collection,
@@ -64,7 +65,9 @@ from .handlers import (
     get_space_data_source,
     get_space_data_source_choice_by_type,
     handle_archive_org,
+    handle_cancel_indexing_job,
     handle_chat_input,
+    handle_chat_input_stream,
     handle_check_account_activated,
     handle_check_mailer_ready,
     handle_check_user_exists,
@@ -83,6 +86,7 @@ from .handlers import (
     handle_get_chat_history_threads,
     handle_get_gravatar_url,
     handle_get_linked_space_group_index,
+    handle_get_sync_schedule,
     handle_get_system_settings,
     handle_get_thread_space,
     handle_get_user_email,
@@ -90,6 +94,7 @@ from .handlers import (
     handle_install_docq_slack_application,
     handle_link_slack_channel_to_space_group,
     handle_list_documents,
+    handle_list_indexing_jobs,
     handle_list_orgs,
     handle_list_slack_channels,
     handle_list_slack_installations,
@@ -97,6 +102,7 @@ from .handlers import (
     handle_logout,
     handle_manage_space_permissions,
     handle_org_selection_change,
+    handle_pop_pending_chat_input,
     handle_public_session,
     handle_redirect_to_url,
     handle_reindex_space,
@@ -105,6 +111,7 @@ from .handlers import (
     handle_update_organisation_settings,
     handle_update_space_details,
     handle_update_space_group,
+    handle_update_sync_schedule,
     handle_update_system_settings,
     handle_update_user,
     handle_update_user_group,
@@ -789,6 +796,17 @@ def _chat_message(message_: str, is_user: bool) -> None:
             st.markdown(message_, unsafe_allow_html=True)
 
 
+def _stream_pending_chat_input(feature: FeatureKey) -> None:
+    """Show the question submitted this run and stream the answer to it."""
+    pending_input = handle_pop_pending_chat_input(feature)
+    if pending_input:
+        _chat_message(pending_input, True)
+        with st.chat_message(
+            "assistant", avatar="https://github.com/docqai/docq/blob/main/docs/assets/logo.jpg?raw=true"
+        ):
+            st.write_stream(handle_chat_input_stream(feature, pending_input))
+
+
 def _personal_ask_style() -> None:
     """Custom style for personal ask."""
     st.write(
@@ -1159,6 +1177,8 @@ def chat_ui(feature: FeatureKey) -> None:
                 else:
                     _chat_message(x[1], x[2])
 
+        _stream_pending_chat_input(feature)
+
     st.chat_input(
         "Type your question here",
         key=f"chat_input_{feature.value()}",
@@ -1199,6 +1219,70 @@ def _render_document_upload(space: SpaceKey, documents: List) -> None:
         st.warning(f"You cannot upload more than {max_size} documents.")
 
 
+def _render_indexing_job_status(space: SpaceKey) -> None:
+    """Show the progress of the latest indexing job of a space. Only polls for updates while the job is in progress."""
+    jobs = handle_list_indexing_jobs(space, limit=1)
+    if not jobs:
+        return
+    if jobs[0].is_finished:
+        _render_finished_indexing_job(jobs[0])
+    else:
+        _render_indexing_job_progress(space)
+
+
+@st.fragment(run_every=2)
+def _render_indexing_job_progress(space: SpaceKey) -> None:
+    """Refreshes itself while the latest indexing job is in progress. Reruns the page, to stop polling, once it's done."""
+    jobs = handle_list_indexing_jobs(space, limit=1)
+    if not jobs or jobs[0].is_finished:
+        st.rerun()
+    job = jobs[0]
+    if job.nodes_to_embed:
+        st.progress(
+            min((job.nodes_embedded or 0) / job.nodes_to_embed, 1.0),
+            text=f"Indexing: {job.nodes_embedded or 0} of {job.nodes_to_embed} chunks embedded from {job.documents_loaded} documents",
+        )
+    elif job.documents_loaded is not None:
+        st.info(f"Indexing: {job.documents_loaded} documents loaded")
+    else:
+        st.info(f"Indexing {job.status.value} ...")
+    st.button(
+        "Cancel" if not job.cancel_requested else "Cancelling...",
+        key=f"cancel_indexing_job_{job.id_}",
+        disabled=job.cancel_requested,
+        on_click=handle_cancel_indexing_job,
+        args=(job.id_,),
+    )
+
+
+def _render_finished_indexing_job(job: IndexingJob) -> None:
+    finished_at = job.finished_at.strftime("%Y-%m-%d %H:%M:%S UTC") if job.finished_at else ""
+    message = f"Last indexed {finished_at}: {job.status.value}"
+    if job.error:
+        st.error(f"{message}. {job.error}")
+    else:
+        st.caption(message)
+
+
+def _render_sync_schedule_ui(space: SpaceKey) -> None:
+    """Set how often a space is re-synced automatically."""
+    key = f"sync_schedule_{space.value()}"
+    schedule = handle_get_sync_schedule(space)
+    with st.expander("Auto re-sync"):
+        st.number_input(
+            "Re-sync every (minutes, 0 for never)",
+            min_value=0,
+            step=60,
+            value=schedule.interval_minutes if schedule else 0,
+            key=f"{key}_interval_minutes",
+            help="For example 60 for hourly or 1440 for nightly. Runs are spread out a little so spaces don't all sync at once.",
+        )
+        st.button("Save", key=f"{key}_save", on_click=handle_update_sync_schedule, args=(space,))
+        _handle_error_state_ui(key=key, bubble_error_message=True)
+        if schedule:
+            st.caption(f"Next re-sync {schedule.next_run_at.strftime('%Y-%m-%d %H:%M UTC')}")
+
+
 def documents_ui(space: SpaceKey) -> None:
     """Displays the UI for managing documents in a space."""
     permission = get_shared_space_permissions(space.id_)
@@ -1217,6 +1301,8 @@ def documents_ui(space: SpaceKey) -> None:
 
     if show_reindex:
         st.button("Reindex", key=f"reindex_{space.value()}_top", on_click=handle_reindex_space, args=(space,))
+        _render_indexing_job_status(space)
+        _render_sync_schedule_ui(space)
 
     if documents:
         label = "Documents"